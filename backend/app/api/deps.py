@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.security import decode_token
 from app.services.supabase_client import supabase
@@ -9,7 +9,7 @@ logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user from JWT token."""
     
     token = credentials.credentials
@@ -19,6 +19,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     try:
         result = supabase.auth.get_user(token)
         if result.user:
+            # Lets CacheInvalidationMiddleware bump this user's cache tags
+            request.state.user_id = str(result.user.id)
             return result.user
         else:
             logger.warning("Supabase get_user returned no user")
@@ -10,9 +10,9 @@ from app.services.supabase_client import supabase
 from app.services.stripe_service import StripeService
 from app.services.feature_gate import feature_gate, require_feature, require_limit
 from app.services.upc_converter import upc_converter
-from app.services.product_data_service import product_data_service
 from app.services.asin_ranking_service import asin_ranking_service
 from app.services.asin_comparison_service import asin_comparison_service
+from app.services.asin_candidate_enricher import asin_candidate_enricher
 from app.services.sp_api_client import sp_api_client
 from app.tasks.analysis import analyze_single_product, batch_analyze_products, get_user_cost_settings
 from app.tasks.base import run_async
@@ -126,37 +126,9 @@ async def analyze_single(
             if asin_status == "multiple" and len(potential_asins) > 1:
                 logger.warning(f"⚠️ Multiple ASINs found for UPC {upc_clean}: {len(potential_asins)} matches")
                 
-                # IMPROVEMENT 3 & 5: Get parent ASIN info and quality indicators
-                potential_asins_enhanced = []
-                for asin_data in potential_asins:
-                    asin = asin_data.get('asin')
-                    
-                    # Check for parent ASIN
-                    parent_asin = await sp_api_client.get_parent_asin(asin)
-                    is_parent = parent_asin is None or parent_asin == asin
-                    
-                    # Get quality indicators
-                    quality = await sp_api_client.get_asin_quality_indicators(asin)
-                    
-                    # Get product data with fallback
-                    product_data = await product_data_service.get_product_data(asin)
-                    
-                    enhanced_asin = {
-                        **asin_data,
-                        'is_parent': is_parent,
-                        'parent_asin': parent_asin,
-                        'quality_indicators': quality,
-                        'title': product_data.get('title') or asin_data.get('title'),
-                        'image': product_data.get('image') or asin_data.get('image'),
-                        'brand': product_data.get('brand') or asin_data.get('brand'),
-                        'category': product_data.get('category') or asin_data.get('category'),
-                    }
-                    
-                    # Add warning if child variation
-                    if parent_asin and parent_asin != asin:
-                        enhanced_asin['warning'] = f"This is a variation. Parent ASIN: {parent_asin}"
-                    
-                    potential_asins_enhanced.append(enhanced_asin)
+                # IMPROVEMENT 3 & 5: Parent ASIN info and quality indicators for all
+                # candidates at once (one catalog search + one Keepa batch, cached per UPC)
+                potential_asins_enhanced = await asin_candidate_enricher.enrich(upc_clean, potential_asins)
                 
                 # IMPROVEMENT 9: Find differences between ASINs
                 asins_with_differences = asin_comparison_service.find_differences(potential_asins_enhanced)
@@ -8,6 +8,7 @@ import logging
 
 from app.api.deps import get_current_user
 from app.services.brand_restriction_detector import BrandRestrictionDetector
+from app.services.brand_restriction_index import brand_restriction_index
 from app.services.supabase_client import supabase
 
 logger = logging.getLogger(__name__)
@@ -140,6 +141,8 @@ async def add_supplier_override(
             # Insert
             result = supabase.table('supplier_brand_overrides').insert(override_data).execute()
         
+        brand_restriction_index.invalidate()
+        
         return {
             'success': True,
             'override': result.data[0] if result.data else None
@@ -4,7 +4,7 @@ Brands API - Manage product brands for ungating tracking.
 from fastapi import APIRouter, Depends, HTTPException
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
-from app.services.redis_client import cached
+from app.services.response_cache import cached
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
@@ -34,7 +34,7 @@ class UpdateBrandRequest(BaseModel):
 # ============================================
 
 @router.get("")
-@cached(ttl=60)
+@cached(ttl=60, tags=("brands:{user_id}",))
 async def get_brands(current_user = Depends(get_current_user)):
     """Get all brands for the user."""
     user_id = str(current_user.id)
@@ -8,6 +8,7 @@ from typing import Optional, List
 from datetime import datetime
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
+from app.services.buy_list_builder import buy_list_builder
 import logging
 import uuid
 
@@ -310,83 +311,17 @@ async def add_item_to_buy_list(
         if buy_list_check.data.get("status") not in ["draft", "approved"]:
             raise HTTPException(400, "Cannot add items to buy list in current status")
         
-        # Get product and product_source data
-        product_query = supabase.table("products")\
-            .select("id, sell_price, profit_amount, roi_percentage, margin_percentage")\
-            .eq("id", data.product_id)\
-            .eq("user_id", user_id)\
-            .single()\
-            .execute()
-        
-        if not product_query.data:
+        plan = buy_list_builder.plan(user_id, [data.dict()])
+        if plan["not_found"]:
             raise HTTPException(404, "Product not found")
-        
-        product = product_query.data
-        
-        # Get product_source for cost
-        product_source = None
-        if data.product_source_id:
-            source_query = supabase.table("product_sources")\
-                .select("*")\
-                .eq("id", data.product_source_id)\
-                .eq("product_id", data.product_id)\
-                .single()\
-                .execute()
-            
-            if source_query.data:
-                product_source = source_query.data
-        else:
-            # Get first active product_source for this product
-            source_query = supabase.table("product_sources")\
-                .select("*")\
-                .eq("product_id", data.product_id)\
-                .eq("is_active", True)\
-                .limit(1)\
-                .execute()
-            
-            if source_query.data:
-                product_source = source_query.data[0]
-        
-        if not product_source:
+        if not plan["items"]:
             raise HTTPException(400, "No active product source found for this product")
         
-        # Calculate costs
-        unit_cost = float(product_source.get("wholesale_cost") or product_source.get("buy_cost") or 0)
-        total_cost = unit_cost * data.quantity
-        
-        # Get expected values from product
-        expected_sell_price = float(product.get("sell_price", 0)) if product.get("sell_price") else None
-        expected_profit = float(product.get("profit_amount", 0)) if product.get("profit_amount") else None
-        expected_roi = float(product.get("roi_percentage", 0)) if product.get("roi_percentage") else None
-        expected_margin = float(product.get("margin_percentage", 0)) if product.get("margin_percentage") else None
-        
-        # Calculate expected profit for this quantity
-        if expected_profit is not None:
-            expected_profit = expected_profit * data.quantity
-        
-        # Create item
-        item_data = {
-            "buy_list_id": buy_list_id,
-            "product_id": data.product_id,
-            "product_source_id": product_source.get("id"),
-            "quantity": data.quantity,
-            "unit_cost": unit_cost,
-            "total_cost": total_cost,
-            "expected_sell_price": expected_sell_price,
-            "expected_profit": expected_profit,
-            "expected_roi": expected_roi,
-            "expected_margin": expected_margin,
-            "notes": data.notes
-        }
-        
-        response = supabase.table("buy_list_items")\
-            .upsert(item_data, on_conflict="buy_list_id,product_id,product_source_id")\
-            .execute()
-        
-        if not response.data:
+        items = buy_list_builder.write(buy_list_id, plan["items"])
+        if not items:
             raise HTTPException(500, "Failed to add item to buy list")
         
-        return {"item": response.data[0]}
+        return {"item": items[0]}
     except HTTPException:
         raise
     except Exception as e:
@@ -549,6 +484,12 @@ async def finalize_buy_list(
 class CreateBuyListFromProductsRequest(BaseModel):
     product_ids: List[str]
     name: Optional[str] = None
+    dry_run: bool = False
+
+
+class AddProductsToBuyListRequest(BaseModel):
+    product_ids: List[str]
+    dry_run: bool = False
 
 
 @router.post("/create-from-products")
@@ -556,7 +497,13 @@ async def create_buy_list_from_products(
     request: CreateBuyListFromProductsRequest = Body(...),
     current_user=Depends(get_current_user)
 ):
-    """Create a new buy list and add multiple products at once."""
+    """
+    Create a new buy list and add multiple products at once.
+    
+    Each product gets its cheapest active source at the source's MOQ. With
+    dry_run=true nothing is written; the response holds the planned items
+    and projected spend / ROI.
+    """
     user_id = str(current_user.id)
     product_ids = request.product_ids
     name = request.name
@@ -565,6 +512,16 @@ async def create_buy_list_from_products(
         if not product_ids:
             raise HTTPException(400, "No products provided")
         
+        plan = buy_list_builder.plan(user_id, [{"product_id": pid} for pid in product_ids])
+        
+        if request.dry_run:
+            return {
+                "dry_run": True,
+                "items": plan["items"],
+                "projection": plan["projection"],
+                "errors": plan["errors"]
+            }
+        
         # Generate name if not provided
         if not name:
             name = f"Buy List - {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
@@ -585,74 +542,8 @@ async def create_buy_list_from_products(
         
         buy_list_id = buy_list_response.data[0]["id"]
         
-        # Add products
-        added_items = []
-        errors = []
-        
-        for product_id in product_ids:
-            try:
-                # Get product and product_source
-                product_query = supabase.table("products")\
-                    .select("id, sell_price, profit_amount, roi_percentage, margin_percentage")\
-                    .eq("id", product_id)\
-                    .eq("user_id", user_id)\
-                    .single()\
-                    .execute()
-                
-                if not product_query.data:
-                    errors.append(f"Product {product_id} not found")
-                    continue
-                
-                product = product_query.data
-                
-                # Get first active product_source
-                source_query = supabase.table("product_sources")\
-                    .select("*")\
-                    .eq("product_id", product_id)\
-                    .eq("is_active", True)\
-                    .limit(1)\
-                    .execute()
-                
-                if not source_query.data:
-                    errors.append(f"No active product source for product {product_id}")
-                    continue
-                
-                product_source = source_query.data[0]
-                
-                # Calculate costs
-                unit_cost = float(product_source.get("wholesale_cost") or product_source.get("buy_cost") or 0)
-                quantity = product_source.get("moq", 1)
-                total_cost = unit_cost * quantity
-                
-                # Get expected values
-                expected_sell_price = float(product.get("sell_price", 0)) if product.get("sell_price") else None
-                expected_profit = float(product.get("profit_amount", 0)) * quantity if product.get("profit_amount") else None
-                expected_roi = float(product.get("roi_percentage", 0)) if product.get("roi_percentage") else None
-                expected_margin = float(product.get("margin_percentage", 0)) if product.get("margin_percentage") else None
-                
-                # Create item
-                item_data = {
-                    "buy_list_id": buy_list_id,
-                    "product_id": product_id,
-                    "product_source_id": product_source.get("id"),
-                    "quantity": quantity,
-                    "unit_cost": unit_cost,
-                    "total_cost": total_cost,
-                    "expected_sell_price": expected_sell_price,
-                    "expected_profit": expected_profit,
-                    "expected_roi": expected_roi,
-                    "expected_margin": expected_margin,
-                }
-                
-                item_response = supabase.table("buy_list_items")\
-                    .upsert(item_data, on_conflict="buy_list_id,product_id,product_source_id")\
-                    .execute()
-                
-                if item_response.data:
-                    added_items.append(item_response.data[0])
-            except Exception as e:
-                logger.error(f"Error adding product {product_id} to buy list: {e}")
-                errors.append(f"Failed to add product {product_id}: {str(e)}")
+        # One bulk insert; the summary trigger fills in the totals
+        added_items = buy_list_builder.write(buy_list_id, plan["items"])
         
         # Get updated buy list
         buy_list_response = supabase.table("buy_lists")\
@@ -662,9 +553,9 @@ async def create_buy_list_from_products(
             .execute()
         
         return {
-            "buy_list": buy_list_response.data[0] if buy_list_response.data else None,
+            "buy_list": buy_list_response.data,
             "added_items": len(added_items),
-            "errors": errors
+            "errors": plan["errors"]
         }
     except HTTPException:
         raise
@@ -672,3 +563,56 @@ async def create_buy_list_from_products(
         logger.error(f"Error creating buy list from products: {e}", exc_info=True)
         raise HTTPException(500, f"Failed to create buy list: {str(e)}")
 
+
+@router.post("/{buy_list_id}/items/bulk")
+async def add_products_to_buy_list(
+    buy_list_id: str,
+    request: AddProductsToBuyListRequest = Body(...),
+    current_user=Depends(get_current_user)
+):
+    """
+    Add multiple products to an existing buy list in one write.
+    
+    With dry_run=true nothing is written; the projection covers the new
+    items only.
+    """
+    user_id = str(current_user.id)
+    
+    try:
+        if not request.product_ids:
+            raise HTTPException(400, "No products provided")
+        
+        buy_list_check = supabase.table("buy_lists")\
+            .select("id, status")\
+            .eq("id", buy_list_id)\
+            .eq("user_id", user_id)\
+            .single()\
+            .execute()
+        
+        if not buy_list_check.data:
+            raise HTTPException(404, "Buy list not found")
+        
+        if buy_list_check.data.get("status") not in ["draft", "approved"]:
+            raise HTTPException(400, "Cannot add items to buy list in current status")
+        
+        plan = buy_list_builder.plan(user_id, [{"product_id": pid} for pid in request.product_ids])
+        
+        if request.dry_run:
+            return {
+                "dry_run": True,
+                "items": plan["items"],
+                "projection": plan["projection"],
+                "errors": plan["errors"]
+            }
+        
+        added_items = buy_list_builder.write(buy_list_id, plan["items"])
+        return {
+            "added_items": len(added_items),
+            "projection": plan["projection"],
+            "errors": plan["errors"]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error adding products to buy list: {e}", exc_info=True)
+        raise HTTPException(500, f"Failed to add products: {str(e)}")
@@ -5,6 +5,8 @@ from pydantic import BaseModel
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
 from app.services.asin_analyzer import ASINAnalyzer
+from app.services.telegram_deal_stats import telegram_deal_stats, empty_stats
+from app.services.telegram_deal_promotion import telegram_deal_promoter
 from app.tasks.analysis import analyze_single_product, batch_analyze_products
 import uuid
 from app.services.redis_client import cache_service, get_redis_client
@@ -26,6 +28,7 @@ router = APIRouter()
 class AnalyzeBatchRequest(BaseModel):
     deal_ids: Optional[List[str]] = None
     analyze_all_pending: bool = True
+    limit: Optional[int] = None  # Cap on deals promoted, oldest first
 
 
 # =====================================================
@@ -34,68 +37,21 @@ class AnalyzeBatchRequest(BaseModel):
 
 @router.get("/stats")
 async def get_deal_stats(current_user=Depends(get_current_user)):
-    """Get deal statistics - OPTIMIZED single query."""
-    import time
-    start_time = time.time()
+    """Get deal statistics from the trigger-maintained telegram_deal_stats table."""
     user_id = str(current_user.id)
     
     try:
-        # SINGLE QUERY - get deals with analysis ROI in one go
-        result = supabase.table("telegram_deals")\
-            .select("status, analysis_id, analyses!telegram_deals_analysis_id_fkey(roi)")\
-            .eq("user_id", user_id)\
-            .execute()
-        
-        deals = result.data or []
-        total = len(deals)
-        
-        # Count by status
-        pending = 0
-        analyzed = 0
-        profitable = 0
-        error_count = 0
-        
-        for deal in deals:
-            deal_status = deal.get("status") or "pending"
-            deal_status_lower = deal_status.lower() if deal_status else "pending"
-            
-            if deal_status_lower == "pending":
-                pending += 1
-            elif deal_status_lower == "error":
-                error_count += 1
-            elif deal_status_lower == "analyzed":
-                analyzed += 1
-                # Check ROI from joined analysis
-                analysis = deal.get("analyses")
-                # Supabase returns analysis as dict or list depending on join
-                if analysis:
-                    if isinstance(analysis, list) and len(analysis) > 0:
-                        roi = analysis[0].get("roi") or 0
-                    elif isinstance(analysis, dict):
-                        roi = analysis.get("roi") or 0
-                    else:
-                        roi = 0
-                    if roi >= 30:
-                        profitable += 1
-        
-        stats_time = time.time() - start_time
-        logger.info(f"Stats query completed in {stats_time:.3f}s")
-        
-        result = {
-            "total": total,
-            "pending": pending,
-            "analyzed": analyzed,
-            "profitable": profitable,
-            "error": error_count
-        }
-        
-        return result
+        stats = telegram_deal_stats.get(user_id)
+        if stats is None:
+            # Stats table not migrated yet - count the deals
+            stats = telegram_deal_stats.count_from_deals(user_id)
+        return stats
         
     except Exception as e:
         logger.error(f"Stats error: {e}")
         import traceback
         traceback.print_exc()
-        return {"total": 0, "pending": 0, "analyzed": 0, "profitable": 0, "error": 0}
+        return empty_stats()
 
 
 @router.get("")
@@ -332,76 +288,24 @@ async def analyze_batch(
     request: AnalyzeBatchRequest = AnalyzeBatchRequest(),
     current_user=Depends(get_current_user)
 ):
-    """Analyze multiple deals at once."""
+    """
+    Analyze multiple deals at once: promote them to products in bulk and
+    queue one batch analysis job. Without deal_ids, every pending deal is
+    promoted (up to request.limit).
+    """
     user_id = str(current_user.id)
     
-    deal_ids = request.deal_ids
-    
-    # If no specific IDs, get all pending
-    if not deal_ids and request.analyze_all_pending:
-        result = supabase.table("telegram_deals")\
-            .select("id")\
-            .eq("user_id", user_id)\
-            .eq("status", "pending")\
-            .limit(20)\
-            .execute()
-        deal_ids = [d["id"] for d in (result.data or [])]
-    
-    if not deal_ids:
+    deal_ids = request.deal_ids or None
+    if not deal_ids and not request.analyze_all_pending:
         return {"analyzed": 0, "errors": 0, "message": "No pending deals", "results": []}
     
-    # Get all deals and create/get products
-    product_ids = []
-    deal_to_product = {}
-    
-    for deal_id in deal_ids[:100]:  # Limit to 100
-        try:
-            # Get deal
-            deal_result = supabase.table("telegram_deals")\
-                .select("asin, buy_cost, channel_id")\
-                .eq("id", deal_id)\
-                .eq("user_id", user_id)\
-                .limit(1)\
-                .execute()
-            
-            if not deal_result.data:
-                continue
-            
-            deal = deal_result.data[0]
-            asin = deal["asin"]
-            
-            # Get or create product
-            existing_product = supabase.table("products")\
-                .select("id")\
-                .eq("user_id", user_id)\
-                .eq("asin", asin)\
-                .limit(1)\
-                .execute()
-            
-            if existing_product.data:
-                product_id = existing_product.data[0]["id"]
-            else:
-                new_product = supabase.table("products").insert({
-                    "user_id": user_id,
-                    "asin": asin,
-                    "status": "pending"
-                }).execute()
-                product_id = new_product.data[0]["id"] if new_product.data else None
-            
-            if product_id:
-                product_ids.append(product_id)
-                deal_to_product[deal_id] = product_id
-                
-                # Update deal to link to product
-                supabase.table("telegram_deals").update({
-                    "status": "analyzing",
-                    "product_id": product_id
-                }).eq("id", deal_id).execute()
-        except Exception as e:
-            logger.error(f"Error processing deal {deal_id}: {e}")
+    promotion = telegram_deal_promoter.promote(user_id, deal_ids=deal_ids, limit=request.limit)
+    deal_to_product = promotion["deal_to_product"]
+    product_ids = promotion["product_ids"]
     
-    if not product_ids:
-        return {"analyzed": 0, "errors": 0, "message": "No valid products to analyze", "results": []}
+    if not deal_to_product:
+        message = "No valid products to analyze" if deal_ids else "No pending deals"
+        return {"analyzed": 0, "errors": 0, "message": message, "results": []}
     
     # Create job and queue batch analysis
     job_id = str(uuid.uuid4())
@@ -411,7 +315,7 @@ async def analyze_batch(
         "type": "batch_analyze",
         "status": "pending",
         "total_items": len(product_ids),
-        "metadata": {"deal_ids": deal_ids, "deal_to_product": deal_to_product}
+        "metadata": {"deal_ids": list(deal_to_product), "deal_to_product": deal_to_product}
     }).execute()
     
     # Queue to Celery
@@ -421,6 +325,8 @@ async def analyze_batch(
         "job_id": job_id,
         "status": "queued",
         "queued": len(product_ids),
+        "deals": len(deal_to_product),
+        "products_created": promotion["created"],
         "message": f"Queued {len(product_ids)} products for analysis. Poll /jobs/{job_id} for results."
     }
 
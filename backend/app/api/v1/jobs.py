@@ -148,6 +148,13 @@ async def list_upload_jobs(
     }
 
 
+@router.get("/asin-lookup/metrics")
+async def get_asin_lookup_metrics(current_user = Depends(get_current_user)):
+    """ASIN lookup queue depth, lag, retries and throughput."""
+    from app.services.asin_lookup_queue import asin_lookup_queue
+    return asin_lookup_queue.metrics()
+
+
 @router.get("/{job_id}")
 async def get_job(job_id: str, current_user = Depends(get_current_user)):
     """Get job status."""
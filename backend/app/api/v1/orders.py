@@ -1,13 +1,15 @@
 """
 Orders API - Manage purchase requests to suppliers
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 import logging
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
+from app.services.order_summaries import order_summaries
+from app.services.deal_listing import InvalidCursor
 
 logger = logging.getLogger(__name__)
 
@@ -189,115 +191,37 @@ async def create_order(
 
 @router.get("")
 async def get_orders(
+    response: Response,
     status: Optional[str] = Query(None),
     supplier_id: Optional[str] = Query(None),
-    limit: int = Query(100, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
     current_user=Depends(get_current_user)
 ):
     """
-    Get all orders for user.
+    Get order summaries for user, newest first.
     Optionally filter by status or supplier.
+    
+    Each order carries supplier, items_count, total_units, subtotal,
+    total_discount and discounted_subtotal; items are loaded by
+    GET /orders/{order_id}. When there are more orders, the X-Next-Cursor
+    response header holds the cursor for the next page.
     """
     user_id = str(current_user.id)
     
     try:
-        # Start with base query
-        query = supabase.table('orders') \
-            .select('*, supplier:suppliers(id, name, contact_name, contact_email), items:order_items(*, product:products(*))') \
-            .eq('user_id', user_id) \
-            .order('created_at', desc=True) \
-            .limit(limit)
-        
-        if status:
-            query = query.eq('status', status)
-        
-        if supplier_id:
-            query = query.eq('supplier_id', supplier_id)
-        
-        result = query.execute()
-        
-        # Calculate items_count and format response
-        orders = result.data or []
-        for order in orders:
-            items = order.get('items', []) or []
-            order['items_count'] = len(items)
-            # Calculate subtotals for each item
-            for item in items:
-                quantity = item.get('quantity', 1) or 1
-                unit_cost = item.get('unit_cost', 0) or 0
-                discount = item.get('discount', 0) or 0
-                item['subtotal'] = round((quantity * float(unit_cost)) - float(discount), 2)
-        
-        logger.info(f"✅ Retrieved {len(orders)} orders for user {user_id}")
-        return orders
-        
+        page = order_summaries.page(user_id, status=status, supplier_id=supplier_id, cursor=cursor, limit=limit)
+    except InvalidCursor as cursor_error:
+        raise HTTPException(400, str(cursor_error))
     except Exception as e:
         logger.error(f"❌ Failed to get orders: {e}", exc_info=True)
-        # Try simpler query without nested joins as fallback
-        try:
-            logger.info("🔄 Retrying with simpler query (no nested joins)...")
-            query = supabase.table('orders') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .order('created_at', desc=True) \
-                .limit(limit)
-            
-            if status:
-                query = query.eq('status', status)
-            
-            if supplier_id:
-                query = query.eq('supplier_id', supplier_id)
-            
-            result = query.execute()
-            orders = result.data or []
-            
-            # Manually fetch supplier and items for each order
-            for order in orders:
-                order['items_count'] = 0
-                order['items'] = []
-                
-                # Get supplier
-                if order.get('supplier_id'):
-                    try:
-                        supplier_result = supabase.table('suppliers') \
-                            .select('id, name, contact_name, contact_email') \
-                            .eq('id', order['supplier_id']) \
-                            .eq('user_id', user_id) \
-                            .single() \
-                            .execute()
-                        if supplier_result.data:
-                            order['supplier'] = supplier_result.data
-                    except:
-                        order['supplier'] = None
-                
-                # Get items
-                try:
-                    items_result = supabase.table('order_items') \
-                        .select('*, product:products(*)') \
-                        .eq('order_id', order['id']) \
-                        .execute()
-                    
-                    items = items_result.data or []
-                    order['items'] = items
-                    order['items_count'] = len(items)
-                    
-                    # Calculate subtotals
-                    for item in items:
-                        quantity = item.get('quantity', 1) or 1
-                        unit_cost = item.get('unit_cost', 0) or 0
-                        discount = item.get('discount', 0) or 0
-                        item['subtotal'] = round((quantity * float(unit_cost)) - float(discount), 2)
-                except Exception as items_error:
-                    logger.warning(f"Failed to fetch items for order {order.get('id')}: {items_error}")
-                    order['items'] = []
-                    order['items_count'] = 0
-            
-            logger.info(f"✅ Retrieved {len(orders)} orders (fallback query)")
-            return orders
-            
-        except Exception as fallback_error:
-            logger.error(f"❌ Fallback query also failed: {fallback_error}", exc_info=True)
-            raise HTTPException(500, f"Failed to retrieve orders: {str(fallback_error)}")
+        raise HTTPException(500, f"Failed to retrieve orders: {str(e)}")
+    
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    
+    logger.info(f"✅ Retrieved {len(page['orders'])} orders for user {user_id}")
+    return page["orders"]
 
 
 @router.get("/{order_id}")
@@ -19,6 +19,7 @@ class GeneratePORequest(BaseModel):
     supplier_order_id: str
     template_id: Optional[str] = None
     send_email: bool = True
+    regenerate: bool = False  # New PO number/PDF even if the order already has one
 
 
 class CreateEmailTemplateRequest(BaseModel):
@@ -42,7 +43,7 @@ async def generate_and_send_po(
     
     try:
         # Verify order belongs to user
-        order_result = supabase.table('supplier_orders').select('id, user_id').eq(
+        order_result = supabase.table('supplier_orders').select('id, user_id, updated_at').eq(
             'id', request.supplier_order_id
         ).limit(1).execute()
         
@@ -55,26 +56,19 @@ async def generate_and_send_po(
         # Initialize service
         po_service = POEmailService(user_id)
         
-        # Generate PO number
-        po_number = await po_service.generate_po_number()
-        
-        # Generate PDF
-        pdf_bytes = await po_service.generate_po_pdf(
+        # Latest PO for the order (stored PDF, no re-render) or a new one
+        document = await po_service.get_po_document(
             request.supplier_order_id,
-            po_number
+            not_before=order_result.data[0].get('updated_at'),
+            regenerate=request.regenerate
         )
         
-        if not pdf_bytes:
+        if not document:
             raise HTTPException(500, "Failed to generate PDF")
         
-        # Create PO generation record
-        po_gen_result = await po_service.create_po_generation(
-            supplier_order_id=request.supplier_order_id,
-            pdf_bytes=pdf_bytes,
-            pdf_filename=f"{po_number}.pdf"
-        )
-        
-        po_generation_id = po_gen_result['po_generation_id']
+        po_number = document['po_number']
+        pdf_bytes = document['pdf_bytes']
+        po_generation_id = document['po_generation_id']
         
         # Send email if requested
         email_result = None
@@ -84,19 +78,10 @@ async def generate_and_send_po(
                     supplier_order_id=request.supplier_order_id,
                     po_number=po_number,
                     template_id=request.template_id,
-                    pdf_bytes=pdf_bytes
+                    pdf_bytes=pdf_bytes,
+                    po_generation_id=po_generation_id
                 )
-                
-                # Update PO generation status
-                supabase.table('po_generations').update({
-                    'status': 'sent',
-                    'email_sent_at': 'now()'
-                }).eq('id', po_generation_id).execute()
-                
-                # Update order status
-                supabase.table('supplier_orders').update({
-                    'status': 'sent'
-                }).eq('id', request.supplier_order_id).execute()
+                # The PO generation and order are marked sent when the outbox delivers it
             
             except Exception as e:
                 logger.error(f"Failed to send email: {e}")
@@ -109,6 +94,7 @@ async def generate_and_send_po(
             'po_generation_id': po_generation_id,
             'pdf_generated': True,
             'email_sent': email_result is not None and 'error' not in email_result,
+            'email_queued': bool(email_result and email_result.get('queued')),
             'email_result': email_result
         }
     
@@ -12,11 +12,15 @@ import uuid
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
 from app.services.prep_center_service import PrepCenterService
+from app.services.prep_fee_matrix import prep_fee_matrix
+from app.tasks.repricing import reprice_user_analyses
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/prep-centers", tags=["prep-centers"])
 
+AUTO_ASSIGN_CHUNK_SIZE = 200  # Product IDs per query (keeps the in.() filter URL short)
+
 
 class PrepCenterCreate(BaseModel):
     company_name: str
@@ -74,6 +78,14 @@ class ProductPrepAssignmentRequest(BaseModel):
     strategy: str = "cheapest"  # 'cheapest', 'fastest', 'capability'
 
 
+def _queue_repricing(user_id: str, product_ids: List[str]):
+    """Prep cost changed - re-price the products' stored analyses (no re-analysis)."""
+    try:
+        reprice_user_analyses.delay(user_id, product_ids=product_ids)
+    except Exception as e:
+        logger.warning(f"Could not queue repricing for {len(product_ids)} products: {e}")
+
+
 @router.post("")
 async def create_prep_center(
     prep_center: PrepCenterCreate,
@@ -89,6 +101,7 @@ async def create_prep_center(
         data["updated_at"] = datetime.utcnow().isoformat()
         
         result = supabase.table("prep_centers").insert(data).execute()
+        prep_fee_matrix.invalidate(user_id)
         
         if not result.data:
             raise HTTPException(500, "Failed to create prep center")
@@ -179,6 +192,7 @@ async def update_prep_center(
             .update(data)\
             .eq("id", prep_center_id)\
             .execute()
+        prep_fee_matrix.invalidate(user_id)
         
         return {"prep_center": result.data[0] if result.data else None}
         
@@ -213,6 +227,7 @@ async def delete_prep_center(
             .delete()\
             .eq("id", prep_center_id)\
             .execute()
+        prep_fee_matrix.invalidate(user_id)
         
         return {"success": True}
         
@@ -251,6 +266,7 @@ async def create_fee(
         data["updated_at"] = datetime.utcnow().isoformat()
         
         result = supabase.table("prep_center_fees").insert(data).execute()
+        prep_fee_matrix.invalidate(user_id)
         
         return {"fee": result.data[0] if result.data else None}
         
@@ -384,6 +400,8 @@ async def assign_product_to_prep(
             .eq("id", product_id)\
             .execute()
         
+        _queue_repricing(user_id, [product_id])
+        
         return {
             "assignment": result.data[0] if result.data else None,
             "prep_cost_per_unit": total_prep_cost,
@@ -434,62 +452,35 @@ async def auto_assign_multiple_products(
     user_id = str(current_user.id)
     
     try:
-        assignments = []
-        
-        for product_id in product_ids:
-            # Get product
+        products = []
+        for i in range(0, len(product_ids), AUTO_ASSIGN_CHUNK_SIZE):
             product_res = supabase.table("products")\
                 .select("*")\
-                .eq("id", product_id)\
+                .in_("id", product_ids[i:i + AUTO_ASSIGN_CHUNK_SIZE])\
                 .eq("user_id", user_id)\
-                .single()\
                 .execute()
-            
-            if not product_res.data:
-                continue
-            
-            product = product_res.data
-            
-            # Auto-assign
-            assignment = PrepCenterService.auto_assign_prep_center(product, user_id, strategy)
-            
-            if assignment:
-                # Save assignment (same logic as single assignment)
-                supabase.table("product_prep_assignments")\
-                    .update({"is_active": False})\
-                    .eq("product_id", product_id)\
-                    .eq("user_id", user_id)\
-                    .execute()
-                
-                assignment_data = {
-                    "product_id": product_id,
-                    "prep_center_id": assignment["prep_center_id"],
-                    "user_id": user_id,
-                    "assignment_reason": assignment["assignment_reason"],
-                    "required_services": assignment["required_services"],
-                    "total_prep_cost_per_unit": assignment["total_prep_cost_per_unit"],
-                    "breakdown": assignment["breakdown"],
-                    "is_active": True,
-                    "created_at": datetime.utcnow().isoformat(),
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-                
-                supabase.table("product_prep_assignments").insert(assignment_data).execute()
-                
-                # Update product
-                supabase.table("products")\
-                    .update({
-                        "prep_cost_per_unit": assignment["total_prep_cost_per_unit"],
-                        "prep_center_id": assignment["prep_center_id"]
-                    })\
-                    .eq("id", product_id)\
-                    .execute()
-                
-                assignments.append({
-                    "product_id": product_id,
-                    "prep_center_id": assignment["prep_center_id"],
-                    "prep_cost": assignment["total_prep_cost_per_unit"]
-                })
+            products.extend(product_res.data or [])
+        
+        # One pass over the cached fee matrix for the whole batch
+        results = PrepCenterService.auto_assign_prep_centers(products, user_id, strategy)
+        chosen = {
+            product["id"]: assignment
+            for product, assignment in zip(products, results)
+            if assignment
+        }
+        PrepCenterService.save_assignments(user_id, chosen)
+        
+        assignments = [
+            {
+                "product_id": product_id,
+                "prep_center_id": assignment["prep_center_id"],
+                "prep_cost": assignment["total_prep_cost_per_unit"]
+            }
+            for product_id, assignment in chosen.items()
+        ]
+        
+        if assignments:
+            _queue_repricing(user_id, list(chosen))
         
         return {
             "assigned": len(assignments),
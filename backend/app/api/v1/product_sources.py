@@ -5,6 +5,8 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from typing import Dict, Any
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
+from app.services.repricing_service import COST_FIELDS
+from app.tasks.repricing import reprice_user_analyses
 import logging
 
 logger = logging.getLogger(__name__)
@@ -40,6 +42,9 @@ async def update_product_source(
         if not result.data:
             raise HTTPException(500, "Update failed")
         
+        if COST_FIELDS & set(updates):
+            _queue_repricing(user_id, product_source.data['product_id'])
+        
         return {"success": True, "product_source": result.data[0]}
         
     except HTTPException:
@@ -67,6 +72,9 @@ async def create_product_source(
         if not result.data:
             raise HTTPException(500, "Create failed")
         
+        if result.data[0].get('product_id'):
+            _queue_repricing(user_id, result.data[0]['product_id'])
+        
         return {"success": True, "product_source": result.data[0]}
         
     except HTTPException:
@@ -75,3 +83,10 @@ async def create_product_source(
         logger.error(f"Product source creation failed: {e}", exc_info=True)
         raise HTTPException(500, str(e))
 
+
+def _queue_repricing(user_id: str, product_id: str):
+    """Cost inputs changed - re-price the product's stored analysis (no re-analysis)."""
+    try:
+        reprice_user_analyses.delay(str(user_id), product_ids=[product_id])
+    except Exception as e:
+        logger.warning(f"Could not queue repricing for product {product_id}: {e}")
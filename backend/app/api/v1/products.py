@@ -8,7 +8,7 @@ import base64
 import binascii
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
-from app.services.redis_client import cached
+from app.services.response_cache import cached, cache_stats
 from app.core.redis import get_cached, set_cached, delete_cached, get_cache_info
 import uuid
 from pydantic import BaseModel
@@ -24,6 +24,7 @@ from pathlib import Path
 from datetime import datetime
 from app.core.config import settings
 from app.services.column_mapper import column_mapper
+from app.services.deal_listing import deal_listing, InvalidCursor
 
 logger = logging.getLogger(__name__)
 SYNC_PROCESSING_THRESHOLD = settings.SYNC_PROCESSING_THRESHOLD
@@ -418,7 +419,7 @@ def upsert_deal(product_id: str, supplier_id: Optional[str], data: dict) -> Dict
 @router.get("")
 @router.get("/")
 @router.get("/deals")  # Alias for frontend compatibility
-@cached(ttl=10)  # Cache for 10 seconds (reduced from 30 for faster updates)
+@cached(ttl=30, tags=("deals:{user_id}",))  # Writes bump the tag, so the TTL only bounds drift from other writers
 async def get_deals(
     stage: Optional[str] = Query(None),
     source: Optional[str] = Query(None),
@@ -428,13 +429,18 @@ async def get_deals(
     search: Optional[str] = Query(None),
     asin_status: Optional[str] = Query(None),
     limit: int = Query(50, le=100),
-    offset: int = Query(0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    offset: int = Query(0, description="Deprecated - use cursor"),
     current_user = Depends(get_current_user)
 ):
     """
     Get all deals (product + source combinations) using PostgreSQL RPC function.
     100% database-side filtering - highly scalable and accurate.
     
+    Pages newest first with a keyset cursor: pass next_cursor from the
+    previous response to get the next page (has_more says whether there is
+    one). offset still works for older clients but gets slower with depth.
+    
     Supports filtering by asin_status:
     - 'asin_found': Has real ASIN (not PENDING_*, not Unknown)
     - 'needs_selection': Needs ASIN selection from multiple options
@@ -446,88 +452,36 @@ async def get_deals(
     logger.info(f"🔍 get_deals called - asin_status={asin_status}, stage={stage}, user_id={user_id}")
     
     try:
-        # Use PostgreSQL RPC function for 100% database-side filtering
-        # This ensures filtering is accurate and scalable
-        rpc_params = {
-            'p_user_id': user_id,
-            'p_asin_status': asin_status if asin_status and asin_status != 'all' else None,
-            'p_stage': stage,
-            'p_source': source,
-            'p_supplier_id': supplier_id,
-            'p_min_roi': min_roi,
-            'p_min_profit': min_profit,
-            'p_search': search,
-            'p_limit': limit,
-            'p_offset': offset
+        filters = {
+            'asin_status': asin_status if asin_status and asin_status != 'all' else None,
+            'stage': stage,
+            'source': source,
+            'supplier_id': supplier_id,
+            'min_roi': min_roi,
+            'min_profit': min_profit,
+            'search': search
         }
+        next_cursor = None
+        has_more = None
+        
+        if offset and not cursor:
+            # Offset paging for older clients
+            rpc_params = {f'p_{k}': v for k, v in filters.items() if v is not None}
+            rpc_params.update({'p_user_id': user_id, 'p_limit': limit, 'p_offset': offset})
+            result = supabase.rpc('filter_product_deals', rpc_params).execute()
+            deals = result.data or []
+        else:
+            try:
+                page = deal_listing.page(user_id, filters, cursor=cursor, limit=limit)
+            except InvalidCursor as cursor_error:
+                raise HTTPException(400, str(cursor_error))
+            deals = page["deals"]
+            next_cursor = page["next_cursor"]
+            has_more = page["has_more"]
         
-        # Remove None values to avoid passing NULL unnecessarily
-        rpc_params = {k: v for k, v in rpc_params.items() if v is not None}
-        
-        result = supabase.rpc('filter_product_deals', rpc_params).execute()
-        deals = result.data or []
-        
-        # Add purchase history data for each deal
-        if deals:
-            product_ids = [d.get('product_id') for d in deals if d.get('product_id')]
-            if product_ids:
-                try:
-                    # Get purchase quantities from supplier_order_items
-                    from datetime import datetime, timedelta
-                    now = datetime.utcnow()
-                    
-                    # Aggregate purchase quantities for last 30, 60, 90 days
-                    purchase_history = {}
-                    
-                    # Get all valid supplier order IDs for this user
-                    valid_orders = supabase.table('supplier_orders')\
-                        .select('id')\
-                        .eq('user_id', user_id)\
-                        .in_('status', ['sent', 'confirmed', 'in_transit', 'received'])\
-                        .execute()
-                    
-                    valid_order_ids = [o['id'] for o in (valid_orders.data or [])]
-                    
-                    if valid_order_ids:
-                        for days in [30, 60, 90]:
-                            cutoff_date = (now - timedelta(days=days)).isoformat()
-                            
-                            purchase_query = supabase.table('supplier_order_items')\
-                                .select('product_id, quantity')\
-                                .in_('product_id', product_ids)\
-                                .in_('supplier_order_id', valid_order_ids)\
-                                .gte('created_at', cutoff_date)\
-                                .execute()
-                            
-                            # Aggregate by product_id
-                            for item in purchase_query.data or []:
-                                pid = item['product_id']
-                                qty = item.get('quantity', 0)
-                                
-                                if pid not in purchase_history:
-                                    purchase_history[pid] = {}
-                                
-                                purchase_history[pid][f'bought_last_{days}d'] = \
-                                    purchase_history[pid].get(f'bought_last_{days}d', 0) + qty
-                    
-                    # Add purchase history to deals
-                    for deal in deals:
-                        pid = deal.get('product_id')
-                        if pid and pid in purchase_history:
-                            deal.update(purchase_history[pid])
-                        else:
-                            # Set defaults if no purchase history
-                            deal['bought_last_30d'] = 0
-                            deal['bought_last_60d'] = 0
-                            deal['bought_last_90d'] = 0
-                            
-                except Exception as purchase_error:
-                    logger.warning(f"Failed to fetch purchase history: {purchase_error}")
-                    # Set defaults on error
-                    for deal in deals:
-                        deal['bought_last_30d'] = 0
-                        deal['bought_last_60d'] = 0
-                        deal['bought_last_90d'] = 0
+        # Keyset rows carry bought_last_30d/60d/90d from the RPC; offset pages
+        # read them from the rollup view in one query
+        deal_listing.add_purchase_history(deals)
         
         # Log filter application for debugging
         if asin_status:
@@ -540,9 +494,12 @@ async def get_deals(
         else:
             logger.info(f"📋 No ASIN filter - returned {len(deals)} deals")
         
-        # Get counts for each status (for UI filters) - only if no filters applied
+        # Counts for the UI filters - one read of the trigger-maintained counts table
         counts = {}
-        if not stage and not source and not supplier_id and not asin_status and not search:
+        filter_counts = deal_listing.counts(user_id)
+        if filter_counts is not None:
+            counts = deal_listing.asin_status_counts(filter_counts)
+        elif not stage and not source and not supplier_id and not asin_status and not search:
             try:
                 # Use the existing RPC function for counts (already optimized)
                 stats_result = supabase.rpc('get_asin_stats', {'p_user_id': user_id}).execute()
@@ -563,12 +520,17 @@ async def get_deals(
         
         response = {
             "deals": deals,
-            "total": len(deals),
+            # Exact when the filters map onto a counted bucket, otherwise None
+            "total": deal_listing.filtered_total(filter_counts, filters),
+            "next_cursor": next_cursor,
+            "has_more": has_more,
             "counts": counts if counts else None
         }
         logger.info(f"📤 Returning {len(deals)} deals (filter: {asin_status})")
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch deals: {e}", exc_info=True)
         # Check if RPC function doesn't exist
@@ -619,10 +581,16 @@ async def get_deals(
 @router.get("/stats/asin-status")
 async def get_asin_status_stats(current_user = Depends(get_current_user)):
     """
-    Get ASIN status stats using PostgreSQL RPC function with Redis caching.
-    100% database-side counting, cached for 10 seconds for sub-10ms response times.
+    Get ASIN status stats from the trigger-maintained deal_filter_counts table.
+    Falls back to the get_asin_stats RPC (cached for 10 seconds) if the table
+    isn't available.
     """
     user_id = str(current_user.id)
+    
+    filter_counts = deal_listing.counts(user_id)
+    if filter_counts is not None:
+        return deal_listing.asin_status_counts(filter_counts)
+    
     cache_key = f"asin_stats:{user_id}"
     
     # Check cache first
@@ -703,7 +671,9 @@ async def get_cache_status(current_user = Depends(get_current_user)):
             "stats": {
                 "keyspace_hits": cache_info.get("keyspace_hits", 0),
                 "keyspace_misses": cache_info.get("keyspace_misses", 0)
-            }
+            },
+            # Hit/stale/miss/error counts per cached endpoint
+            "endpoints": cache_stats()
         }
         logger.info(f"Cache status requested by user {user_id}")
         return response
@@ -723,11 +693,27 @@ async def get_cache_status(current_user = Depends(get_current_user)):
         }
 
 @router.get("/stats")
-@cached(ttl=10)  # Cache stats for 10 seconds (reduced from 60 for faster updates)
+@cached(ttl=60, tags=("deals:{user_id}",))
 async def get_stats(current_user = Depends(get_current_user)):
     """Get counts by stage and source. Cached for performance."""
     user_id = str(current_user.id)
     
+    # Materialized counts (same stage mapping as below, applied by the triggers)
+    filter_counts = deal_listing.counts(user_id)
+    if filter_counts is not None:
+        stats = {
+            "stages": {"new": 0, "analyzing": 0, "reviewed": 0, "top_products": 0, "buy_list": 0, "ordered": 0},
+            "sources": {"telegram": 0, "csv": 0, "manual": 0, "quick_analyze": 0},
+            "total": filter_counts["all"]
+        }
+        for stage, count in filter_counts["stage"].items():
+            if stage in stats["stages"]:
+                stats["stages"][stage] = count
+        for source, count in filter_counts["source"].items():
+            if source in stats["sources"]:
+                stats["sources"][source] = count
+        return stats
+    
     try:
         # Get all product_deals with stage and status
         result = supabase.table("product_deals")\
@@ -787,7 +773,7 @@ async def get_stats(current_user = Depends(get_current_user)):
         raise HTTPException(500, str(e))
 
 @router.get("/by-asin/{asin}")
-@cached(ttl=60)
+@cached(ttl=60, tags=("deals:{user_id}", "asin:{user_id}:{asin}"))
 async def get_deals_for_asin(asin: str, current_user = Depends(get_current_user)):
     """
     Get all deals for a specific ASIN (compare suppliers).
@@ -1793,22 +1779,24 @@ async def confirm_csv_upload(
                 if len(products_needing_lookup) > 100:
                     logger.info(f"📦 Large upload ({len(products_needing_lookup)} items) - queuing to background for efficient batch processing")
                     
-                    # Queue to Celery for background processing
+                    # Queue on the ASIN lookup stream (one Celery task as fallback without Redis)
                     try:
-                        from app.tasks.asin_lookup import lookup_product_asins
+                        from app.tasks.asin_lookup import queue_asin_lookups, lookup_product_asins
                         product_ids = [p['id'] for p in products_needing_lookup]
-                        task = lookup_product_asins.delay(product_ids)
-                        logger.info(f"✅ Queued background ASIN lookup task {task.id} for {len(product_ids)} products")
+                        metadata = {"source": "csv_upload", "filename": request.filename}
+                        if queue_asin_lookups(products_needing_lookup) is not None:
+                            metadata["queue"] = "asin_lookup_stream"
+                            logger.info(f"✅ Queued {len(product_ids)} products on the ASIN lookup stream")
+                        else:
+                            task = lookup_product_asins.delay(product_ids)
+                            metadata["celery_task_id"] = task.id
+                            logger.info(f"✅ Queued background ASIN lookup task {task.id} for {len(product_ids)} products")
                         
                         # Update job to show it's queued
                         if job_id:
                             supabase.table("jobs").update({
                                 "status": "pending",
-                                "metadata": {
-                                    "source": "csv_upload",
-                                    "filename": request.filename,
-                                    "celery_task_id": task.id
-                                }
+                                "metadata": metadata
                             }).eq("id", job_id).execute()
                     except Exception as e:
                         logger.error(f"Failed to queue background task: {e}", exc_info=True)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
+from app.services.repricing_service import repricing_service, PRICING_MODE_COLUMNS
+from app.tasks.repricing import reprice_user_analyses
 from app.core.exceptions import NotFoundError
 
 router = APIRouter()
@@ -32,6 +34,13 @@ class CostSettingsUpdate(BaseModel):
     inbound_rate_per_lb: Optional[float] = None  # New field name
 
 
+class CostWhatIfRequest(BaseModel):
+    default_prep_cost: Optional[float] = None
+    inbound_rate_per_lb: Optional[float] = None
+    pricing_mode: Optional[str] = None  # current, 30d_avg, 90d_avg, 365d_avg
+    product_ids: Optional[List[str]] = None  # Default: every analyzed product
+
+
 class PreferencesUpdate(BaseModel):
     default_pricing_mode: Optional[str] = None  # current, 30d_avg, 90d_avg, 365d_avg
 
@@ -262,6 +271,7 @@ async def update_cost_settings(data: CostSettingsUpdate, current_user=Depends(ge
             result = supabase.table("user_cost_settings").insert(save_data).execute()
         
         if result.data:
+            _queue_repricing(current_user.id, update_data)
             return {
                 "inbound_rate_per_lb": result.data[0].get("inbound_rate_per_lb", 0.35),
                 "default_prep_cost": result.data[0].get("default_prep_cost", 0.10),
@@ -286,9 +296,56 @@ async def update_cost_settings(data: CostSettingsUpdate, current_user=Depends(ge
         defaults.update(update_data)
         result = supabase.table("user_settings").insert(defaults).execute()
     
+    _queue_repricing(current_user.id, update_data)
     return result.data[0] if result.data else {}
 
 
+def _queue_repricing(user_id: str, update_data: dict):
+    """Re-price stored analyses that depend on the changed cost settings (no re-analysis)."""
+    changed = []
+    if "inbound_rate_per_lb" in update_data or "default_inbound_shipping" in update_data:
+        changed.append("inbound_rate_per_lb")
+    if "default_prep_cost" in update_data:
+        changed.append("default_prep_cost")
+    if not changed:
+        return
+    try:
+        reprice_user_analyses.delay(str(user_id), changed_settings=changed)
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).warning(f"Could not queue repricing: {e}")
+
+
+@router.post("/costs/what-if")
+async def cost_settings_what_if(data: CostWhatIfRequest, current_user=Depends(get_current_user)):
+    """
+    Dry run: how ROI across analyzed products would shift under different
+    cost settings or pricing mode. Uses stored market data; nothing is saved.
+    """
+    pricing_mode = data.pricing_mode or "current"
+    if pricing_mode not in PRICING_MODE_COLUMNS:
+        raise HTTPException(400, f"pricing_mode must be one of: {', '.join(PRICING_MODE_COLUMNS)}")
+    
+    current = await get_cost_settings(current_user)
+    proposed = {
+        k: v for k, v in {
+            "default_prep_cost": data.default_prep_cost,
+            "inbound_rate_per_lb": data.inbound_rate_per_lb,
+        }.items() if v is not None
+    }
+    
+    result = repricing_service.what_if(
+        str(current_user.id),
+        current,
+        proposed,
+        pricing_mode=pricing_mode,
+        product_ids=data.product_ids,
+    )
+    result["current_settings"] = current
+    result["proposed_settings"] = {**current, **proposed, "pricing_mode": pricing_mode}
+    return result
+
+
 @router.get("/profit-rules")
 async def get_profit_rules(current_user=Depends(get_current_user)):
     """Get profit rules (min ROI, min profit, max rank)."""
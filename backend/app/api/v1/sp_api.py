@@ -398,6 +398,31 @@ async def get_sales_estimate(
         raise HTTPException(500, str(e))
 
 
+@router.get("/token-stats")
+async def get_token_stats(current_user = Depends(get_current_user)):
+    """
+    LWA access-token cache stats: refresh counts, failures and latency,
+    for this process and shared across all workers.
+    """
+    from app.services.sp_api_token_broker import token_broker
+    return token_broker.get_stats()
+
+
+@router.get("/fee-engine-stats")
+async def get_fee_engine_stats(current_user = Depends(get_current_user)):
+    """
+    Local fee engine calibration: schedule version in use and, per size tier,
+    how far local estimates drift from SP-API getMyFeesEstimate.
+    """
+    from app.services.fba_fee_engine import fba_fee_engine, CONFIDENCE_THRESHOLD, DRIFT_TOLERANCE
+    return {
+        "schedule_version": fba_fee_engine.version,
+        "confidence_threshold": CONFIDENCE_THRESHOLD,
+        "drift_tolerance": DRIFT_TOLERANCE,
+        "drift": fba_fee_engine.get_drift(),
+    }
+
+
 @router.get("/test/{asin}")
 async def test_sp_api(asin: str):
     """Test endpoint - NO AUTH. For testing only."""
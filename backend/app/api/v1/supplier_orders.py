@@ -9,6 +9,7 @@ from datetime import datetime
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
 from app.services.prep_instructions_service import PrepInstructionsService
+from app.tasks.po_documents import render_purchase_orders
 import logging
 import uuid
 
@@ -291,6 +292,12 @@ async def create_orders_from_buy_list(
         if not created_orders:
             raise HTTPException(500, "Failed to create any orders")
         
+        # Render every new order's PO in one background job
+        try:
+            render_purchase_orders.delay(user_id, [o["id"] for o in created_orders])
+        except Exception as e:
+            logger.warning(f"Could not queue PO rendering for buy list {buy_list_id}: {e}")
+        
         # Update buy list status to 'ordered' if all items were processed
         supabase.table("buy_lists")\
             .update({"status": "ordered", "updated_at": datetime.utcnow().isoformat()})\
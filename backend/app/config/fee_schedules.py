@@ -0,0 +1,146 @@
+"""
+VERSIONED FBA FEE SCHEDULES (US marketplace)
+
+Data for app/services/fba_fee_engine.py. Add a new entry when Amazon
+publishes a fee change instead of editing an old one - analyses record the
+schedule_version they were priced with, and calibration drift is tracked
+per version.
+
+Units: dimensions in inches, weights in pounds, fees in USD.
+"""
+from typing import Dict, Any, Optional
+from datetime import date
+
+# Size tiers are checked in order; the first tier whose limits fit wins.
+# Limits: longest side, median side, shortest side, unit weight (lb).
+_SIZE_TIERS_2024 = [
+    {"name": "Small Standard", "longest": 15, "median": 12, "shortest": 0.75, "max_weight_lb": 1},
+    {"name": "Large Standard", "longest": 18, "median": 14, "shortest": 8, "max_weight_lb": 20},
+    {"name": "Large Bulky", "longest": 59, "median": 33, "shortest": 33, "max_weight_lb": 50},
+    {"name": "Extra-Large", "longest": None, "median": None, "shortest": None, "max_weight_lb": None},
+]
+
+# Per referral category: list of [price_up_to, rate]; the last band has price_up_to None.
+# Matched by substring like profit_calculator.get_referral_rate(); categories not
+# listed fall back to that table and count as low confidence.
+_REFERRAL_BANDS_2024 = {
+    "Beauty": [[10.00, 0.08], [None, 0.15]],
+    "Health": [[10.00, 0.08], [None, 0.15]],
+    "Baby Products": [[10.00, 0.08], [None, 0.15]],
+    "Grocery": [[15.00, 0.08], [None, 0.15]],
+    "Clothing": [[15.00, 0.05], [20.00, 0.10], [None, 0.17]],
+    "Jewelry": [[250.00, 0.20], [None, 0.05]],
+    "Watches": [[1500.00, 0.16], [None, 0.03]],
+    "Electronics": [[None, 0.08]],
+    "Computers": [[None, 0.08]],
+    "Camera": [[None, 0.08]],
+    "Automotive": [[None, 0.12]],
+    "Home": [[None, 0.15]],
+    "Kitchen": [[None, 0.15]],
+    "Toys": [[None, 0.15]],
+    "Pet Supplies": [[None, 0.15]],
+    "Office Products": [[None, 0.15]],
+    "Sports": [[None, 0.15]],
+    "Tools": [[None, 0.15]],
+    "Lawn & Garden": [[None, 0.15]],
+    "Furniture": [[None, 0.15]],
+    "Books": [[None, 0.15]],
+    "Music": [[None, 0.15]],
+    "Video Games": [[None, 0.15]],
+    "Shoes": [[None, 0.15]],
+}
+
+FEE_SCHEDULES: Dict[str, Dict[str, Any]] = {
+    "2024-02": {
+        "effective_from": "2024-02-05",
+        "size_tiers": _SIZE_TIERS_2024,
+        "dimensional_weight_divisor": 139,
+        # Dimensional weight only applies above Small Standard
+        "dimensional_weight_tiers": ["Large Standard", "Large Bulky", "Extra-Large"],
+        # Fulfillment fee by tier: weight bands [[max_shipping_weight_lb, fee], ...], then
+        # per_lb_over above the last band's weight
+        "fulfillment": {
+            "Small Standard": {
+                "bands": [[0.125, 3.06], [0.25, 3.15], [0.375, 3.24], [0.5, 3.33],
+                          [0.625, 3.43], [0.75, 3.53], [0.875, 3.60], [1.0, 3.65]],
+                "per_lb_over": 0.0,
+            },
+            "Large Standard": {
+                "bands": [[0.25, 3.68], [0.5, 3.90], [0.75, 4.15], [1.0, 4.55],
+                          [1.25, 4.99], [1.5, 5.37], [1.75, 5.52], [2.0, 5.77],
+                          [2.25, 5.94], [2.5, 6.10], [2.75, 6.24], [3.0, 6.36]],
+                "per_lb_over": 0.32,
+            },
+            "Large Bulky": {
+                "bands": [[1.0, 9.61]],
+                "per_lb_over": 0.38,
+            },
+            "Extra-Large": {
+                "bands": [[1.0, 26.33]],
+                "per_lb_over": 0.38,
+            },
+        },
+        # Added to the fulfillment fee by listing price
+        "price_adjustments": [
+            {"max_price": 10.00, "amount": -0.77},  # Low-price FBA rate
+        ],
+        "referral": {
+            "default_rate": 0.15,
+            "minimum_fee": 0.30,
+            "categories": _REFERRAL_BANDS_2024,
+        },
+    },
+    "2025-01": {
+        "effective_from": "2025-01-15",
+        "size_tiers": _SIZE_TIERS_2024,
+        "dimensional_weight_divisor": 139,
+        "dimensional_weight_tiers": ["Large Standard", "Large Bulky", "Extra-Large"],
+        "fulfillment": {
+            "Small Standard": {
+                "bands": [[0.125, 3.06], [0.25, 3.15], [0.375, 3.24], [0.5, 3.33],
+                          [0.625, 3.43], [0.75, 3.53], [0.875, 3.60], [1.0, 3.65]],
+                "per_lb_over": 0.0,
+            },
+            "Large Standard": {
+                "bands": [[0.25, 3.68], [0.5, 3.90], [0.75, 4.15], [1.0, 4.55],
+                          [1.25, 4.99], [1.5, 5.37], [1.75, 5.52], [2.0, 5.77],
+                          [2.25, 5.94], [2.5, 6.10], [2.75, 6.24], [3.0, 6.36]],
+                "per_lb_over": 0.32,
+            },
+            "Large Bulky": {
+                "bands": [[1.0, 9.61]],
+                "per_lb_over": 0.38,
+            },
+            "Extra-Large": {
+                "bands": [[1.0, 26.33]],
+                "per_lb_over": 0.38,
+            },
+        },
+        "price_adjustments": [
+            {"max_price": 10.00, "amount": -0.77},  # Low-price FBA rate
+            {"min_price": 50.00, "amount": 0.26},   # Higher rate above $50
+        ],
+        "referral": {
+            "default_rate": 0.15,
+            "minimum_fee": 0.30,
+            "categories": _REFERRAL_BANDS_2024,
+        },
+    },
+}
+
+
+def get_fee_schedule(version: Optional[str] = None, on: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Fee schedule by version, or the newest one in effect on `on` (default today).
+    Adds a "version" key to the returned dict.
+    """
+    if version:
+        return {**FEE_SCHEDULES[version], "version": version}
+
+    on = on or date.today()
+    in_effect = [
+        (v, s) for v, s in FEE_SCHEDULES.items()
+        if date.fromisoformat(s["effective_from"]) <= on
+    ] or list(FEE_SCHEDULES.items())[:1]
+    version, schedule = max(in_effect, key=lambda item: item[1]["effective_from"])
+    return {**schedule, "version": version}
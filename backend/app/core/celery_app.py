@@ -33,6 +33,11 @@ celery_app = Celery(
         "app.tasks.genius_scoring_tasks",
         "app.tasks.inventory_tasks",
         "app.tasks.supplier_performance_tasks",
+        "app.tasks.usage_metering",
+        "app.tasks.repricing",
+        "app.tasks.sales_velocity",
+        "app.tasks.po_documents",
+        "app.tasks.email_outbox",
     ],
     task_always_eager=False  # Don't execute tasks synchronously
 )
@@ -81,15 +86,19 @@ celery_app.conf.update(
             "task": "app.tasks.telegram.check_all_channels",
             "schedule": 60.0,  # Every 60 seconds
         },
-        "process-pending-asins": {
-            "task": "app.tasks.asin_lookup.process_pending_asin_lookups",
-            "schedule": 300.0,  # Every 5 minutes
-            "args": (100,),  # Process 100 products per run
+        "reconcile-telegram-deal-stats": {
+            "task": "app.tasks.telegram.reconcile_telegram_deal_stats",
+            "schedule": 3600.0,  # Hourly - triggers keep the stats current, this only corrects drift
+        },
+        "sweep-analysis-work-queues": {
+            "task": "app.tasks.analysis.sweep_work_queues",
+            "schedule": 60.0,  # Every 60 seconds - requeues pulls from dead workers
+            "options": {"queue": "analysis"}
         },
-        "process-pending-asin-lookups-new": {
+        "reconcile-asin-lookups": {
             "task": "app.tasks.asin_lookup.process_pending_asin_lookups",
-            "schedule": 1800.0,  # Every 30 minutes (backup to the 5-minute job)
-            "args": (100,),
+            "schedule": 900.0,  # Every 15 minutes - lookups are event driven, this only reconciles
+            "options": {"queue": "default"}
         },
         "refresh-genius-scores-daily": {
             "task": "app.tasks.genius_scoring_tasks.refresh_genius_scores_daily",
@@ -101,6 +110,21 @@ celery_app.conf.update(
             "schedule": crontab(hour=2, minute=0),  # 2 AM every day
             "options": {"queue": "default"}
         },
+        "flush-usage-meters": {
+            "task": "app.tasks.usage_metering.flush_usage_meters",
+            "schedule": 30.0,  # Every 30 seconds
+            "options": {"queue": "default"}
+        },
+        "drain-email-outbox": {
+            "task": "app.tasks.email_outbox.drain_email_outbox",
+            "schedule": 60.0,  # Every 60 seconds - enqueue also nudges a drain, this picks up retries
+            "options": {"queue": "default"}
+        },
+        "refit-sales-velocity-model-daily": {
+            "task": "app.tasks.sales_velocity.refit_sales_velocity_model",
+            "schedule": crontab(hour=4, minute=0),  # 4 AM every day, after the inventory/genius jobs
+            "options": {"queue": "default"}
+        },
     },
 )
 
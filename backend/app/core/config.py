@@ -95,6 +95,7 @@ class Settings(BaseSettings):
     # Celery Configuration
     CELERY_WORKERS: int = 8  # Number of parallel workers for batch processing
     CELERY_PROCESS_BATCH_SIZE: int = 100  # Batch size for processing (matches Keepa batch size)
+    CELERY_TARGET_PULL_SECONDS: float = 20.0  # Work-queue pulls are sized to take about this long
     
     # Cache Configuration
     KEEPA_CACHE_HOURS: int = 24  # Hours to cache Keepa data
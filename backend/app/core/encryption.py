@@ -2,6 +2,7 @@
 Token encryption for secure storage of OAuth tokens.
 """
 import os
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -16,6 +17,12 @@ def _get_encryption_key() -> bytes:
     if not secret:
         raise ValueError("SECRET_KEY not set")
     
+    return _derive_key(secret)
+
+
+@lru_cache(maxsize=4)
+def _derive_key(secret: bytes) -> bytes:
+    """PBKDF2 (100k iterations) once per SECRET_KEY, not on every encrypt/decrypt."""
     # Use PBKDF2 to derive a proper key
     salt = b"habexa_token_salt_v1"  # Static salt is OK here since SECRET_KEY is unique
     kdf = PBKDF2HMAC(
@@ -7,6 +7,7 @@ from app.core.config import settings
 from app.api.v1 import deals, analysis, suppliers, notifications, settings as api_settings, watchlist, orders, billing, telegram, amazon, keepa, debug, market, sp_api, products, brands, jobs, batch, buy_list, buy_lists, supplier_orders, tpl, fba_shipments, financial, templates, prep_centers, auth, users, upload, favorites, products_bulk, product_sources, pack_variants, brand_restrictions, cost_intelligence, po_emails, recommendations, upload_templates, shipping_profiles
 from app.routers import analyzer
 from app.middleware.performance import PerformanceMiddleware
+from app.middleware.cache_invalidation import CacheInvalidationMiddleware
 import logging
 from datetime import datetime
 import os
@@ -23,6 +24,9 @@ app = FastAPI(
 # Performance monitoring - add FIRST to track all requests
 app.add_middleware(PerformanceMiddleware)
 
+# Bump response cache tags after successful writes
+app.add_middleware(CacheInvalidationMiddleware)
+
 # CORS - MUST be added before other middleware
 # Production frontend URL
 PRODUCTION_FRONTEND_URL = "https://habexa-frontend.onrender.com"
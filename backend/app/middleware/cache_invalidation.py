@@ -0,0 +1,57 @@
+"""
+Bump response cache tags after successful API writes.
+
+Any POST/PUT/PATCH/DELETE under these prefixes can change products,
+product_sources or jobs, so it invalidates the user's cached deal lists,
+stats and per-ASIN views. Runs once the endpoint has returned and before
+the response goes out, so the client's next read never sees the old entry.
+"""
+import logging
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.config import settings
+from app.services.response_cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Path prefix (after /api/v1) -> extra tags to bump besides the user's deal tags
+INVALIDATING_PREFIXES = {
+    "/products": (),
+    "/product-sources": (),
+    "/deals": (),
+    "/jobs": (),
+    "/upload": (),
+    "/analyze": (),
+    "/analyzer": (),
+    "/pack-variants": (),
+    "/buy-list": (),
+    "/buy-lists": (),
+    "/supplier-orders": (),
+    "/brands": ("brands:{user_id}",),
+}
+
+
+class CacheInvalidationMiddleware(BaseHTTPMiddleware):
+    """Invalidate a user's cached responses after their writes succeed."""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+
+        if request.method not in WRITE_METHODS or response.status_code >= 400:
+            return response
+
+        # Set by get_current_user
+        user_id = getattr(request.state, "user_id", None)
+        if not user_id or not request.url.path.startswith(settings.API_V1_PREFIX):
+            return response
+
+        path = request.url.path[len(settings.API_V1_PREFIX):]
+        for prefix, extra_tags in INVALIDATING_PREFIXES.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                invalidate_user(user_id, (tag.format(user_id=user_id) for tag in extra_tags))
+                break
+
+        return response
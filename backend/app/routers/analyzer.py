@@ -15,6 +15,7 @@ import io
 from app.api.deps import get_current_user
 from app.services.supabase_client import supabase
 from app.services.profitability_calculator import ProfitabilityCalculator
+from app.services.deal_listing import deal_listing, InvalidCursor
 
 router = APIRouter(prefix="/analyzer", tags=["analyzer"])
 logger = logging.getLogger(__name__)
@@ -54,6 +55,7 @@ async def get_analyzer_products(
     filters: AnalyzerFilters = Body(default={}),
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     sort_by: str = Query('roi_percentage'),
     sort_order: str = Query('desc', regex='^(asc|desc)$'),
     current_user = Depends(get_current_user)
@@ -67,104 +69,101 @@ async def get_analyzer_products(
     - Profitability range filtering
     - Market metrics filtering
     - Boolean flag filtering
-    - Sorting on any column
-    - Pagination
+    - Sorting on ROI, profit, BSR, ASIN, title and seller counts
+    - Keyset pagination: pass next_cursor back as cursor (page > 1 without a
+      cursor still works, via offset)
     """
     user_id = str(current_user.id)
     
     try:
-        # Build base query - use product_deals view (already has all joined data)
-        # Include pack variants count
-        query = supabase.table('product_deals').select(
-            '''
-            *,
-            pack_variants:product_pack_variants(count)
-            ''',
-            count='exact'
-        ).eq('user_id', user_id)
-        
-        # Apply filters
-        if filters.search:
-            # Search in ASIN or title - use ilike for case-insensitive search
-            search_term = f"%{filters.search}%"
-            # Supabase doesn't support OR in filters easily, so we'll filter in Python if needed
-            # For now, search in ASIN first
-            query = query.ilike('asin', search_term)
-        
-        if filters.category:
-            query = query.eq('category', filters.category)
-        
-        if filters.supplier_id:
-            query = query.eq('supplier_id', filters.supplier_id)
-        
-        # Profitability filters (from products table via view)
-        if filters.min_roi is not None:
-            query = query.gte('roi', filters.min_roi)
-        
-        if filters.max_roi is not None:
-            query = query.lte('roi', filters.max_roi)
-        
-        if filters.min_margin is not None:
-            # Note: margin might not be in view, may need to calculate or add to view
-            pass  # TODO: Add margin to product_deals view
-        
-        if filters.min_profit is not None:
-            query = query.gte('profit', filters.min_profit)
-        
-        if filters.profit_tier:
-            # Note: profit_tier might not be in view, filter in Python
-            pass  # TODO: Add profit_tier to product_deals view or filter after
-        
-        # Market filters
-        if filters.min_est_sales is not None:
-            # Note: est_monthly_sales might not be in view
-            pass  # TODO: Add to view or filter after
-        
-        if filters.max_bsr is not None:
-            query = query.lte('bsr', filters.max_bsr)
-        
-        if filters.max_fba_sellers is not None:
-            query = query.lte('fba_seller_count', filters.max_fba_sellers)
-        
-        # Boolean filters
-        if filters.is_profitable is not None:
-            # Note: is_profitable might not be in view
-            pass  # TODO: Add to view or filter after
-        
-        if filters.amazon_sells is not None:
-            query = query.eq('amazon_sells', filters.amazon_sells)
-        
-        # Sorting - map frontend sort fields to view columns
         sort_field_map = {
             'roi_percentage': 'roi',
-            'margin_percentage': 'margin',
             'profit_amount': 'profit',
-            'est_monthly_sales': 'est_monthly_sales',
             'current_sales_rank': 'bsr',
             'asin': 'asin',
             'title': 'title',
-            'category': 'category',
             'fba_seller_count': 'fba_seller_count',
             'seller_count': 'seller_count',
         }
+        # list_product_deals only orders by these; category, margin_percentage
+        # and est_monthly_sales aren't sort keys of product_deals, so they're
+        # rejected instead of quietly falling back to ROI
+        if sort_by not in sort_field_map:
+            raise HTTPException(
+                400,
+                f"Unsupported sort_by '{sort_by}'. Use one of: {', '.join(sort_field_map)}"
+            )
+        db_sort_field = sort_field_map[sort_by]
+        
+        # margin, profit_tier, est_monthly_sales and is_profitable aren't on
+        # product_deals yet (TODO), so they don't filter here
+        deal_filters = {
+            'search': filters.search,
+            'category': filters.category,
+            'supplier_id': filters.supplier_id,
+            'min_roi': filters.min_roi,
+            'max_roi': filters.max_roi,
+            'min_profit': filters.min_profit,
+            'max_bsr': filters.max_bsr,
+            'max_fba_sellers': filters.max_fba_sellers,
+            'amazon_sells': filters.amazon_sells,
+        }
         
-        db_sort_field = sort_field_map.get(sort_by, 'roi')
+        next_cursor = None
+        has_more = None
         
-        if sort_order == 'desc':
-            query = query.order(db_sort_field, desc=True)
+        if page > 1 and not cursor:
+            # Page-number paging for older clients - offset, so deep pages get slower
+            query = supabase.table('product_deals').select('*').eq('user_id', user_id)
+            if filters.search:
+                query = query.ilike('asin', f"%{filters.search}%")
+            if filters.category:
+                query = query.eq('category', filters.category)
+            if filters.supplier_id:
+                query = query.eq('supplier_id', filters.supplier_id)
+            if filters.min_roi is not None:
+                query = query.gte('roi', filters.min_roi)
+            if filters.max_roi is not None:
+                query = query.lte('roi', filters.max_roi)
+            if filters.min_profit is not None:
+                query = query.gte('profit', filters.min_profit)
+            if filters.max_bsr is not None:
+                query = query.lte('bsr', filters.max_bsr)
+            if filters.max_fba_sellers is not None:
+                query = query.lte('fba_seller_count', filters.max_fba_sellers)
+            if filters.amazon_sells is not None:
+                query = query.eq('amazon_sells', filters.amazon_sells)
+            
+            # One order param - PostgREST applies only one, so deal_id breaks
+            # ties in the same param. postgrest-py < 0.14 (pinned via
+            # supabase 2.0.3) treats range()'s end as exclusive.
+            offset = (page - 1) * page_size
+            direction = 'desc' if sort_order == 'desc' else 'asc'
+            rows = query.order(f"{db_sort_field}.{direction},deal_id.{direction}")\
+                .range(offset, offset + page_size)\
+                .execute().data or []
         else:
-            query = query.order(db_sort_field)
-        
-        # Pagination
-        offset = (page - 1) * page_size
-        query = query.range(offset, offset + page_size - 1)
+            try:
+                result = deal_listing.page(
+                    user_id,
+                    deal_filters,
+                    sort=db_sort_field,
+                    desc=(sort_order == 'desc'),
+                    cursor=cursor,
+                    limit=page_size,
+                )
+            except InvalidCursor as e:
+                raise HTTPException(400, str(e))
+            rows = result['deals']
+            next_cursor = result['next_cursor']
+            has_more = result['has_more']
         
-        # Execute
-        response = query.execute()
+        # Total from the materialized counts - no count='exact' scan per request
+        total = deal_listing.filtered_total(deal_listing.counts(user_id), deal_filters)
         
         # Format products for frontend
         products = []
-        for item in response.data:
+        for item in rows:
             products.append({
                 'id': item.get('product_id'),
                 'deal_id': item.get('deal_id'),
@@ -230,12 +229,16 @@ async def get_analyzer_products(
         
         return {
             'products': products,
-            'total': response.count or 0,
+            'total': total,
             'page': page,
             'page_size': page_size,
-            'total_pages': ((response.count or 0) + page_size - 1) // page_size if response.count else 0
+            'total_pages': (total + page_size - 1) // page_size if total is not None else None,
+            'next_cursor': next_cursor,
+            'has_more': has_more
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analyzer query failed: {e}", exc_info=True)
         raise HTTPException(500, f"Failed to fetch products: {str(e)}")
@@ -11,6 +11,7 @@ from urllib.parse import urlencode
 from app.services.supabase_client import supabase
 from app.core.encryption import encrypt_token, decrypt_token
 from app.core.config import settings
+from app.services.sp_api_token_broker import token_broker
 
 logger = logging.getLogger(__name__)
 
@@ -104,6 +105,9 @@ class AmazonOAuthService:
                     on_conflict="user_id,marketplace_id"
                 ).execute()
                 
+                # Don't serve an access token brokered for a previously connected account
+                token_broker.invalidate(token_broker.user_key(user_id, connection_data["marketplace_id"]))
+                
                 logger.info(f"Amazon account connected for user {user_id}")
                 
                 return {
@@ -180,12 +184,18 @@ class AmazonOAuthService:
         """Disconnect user's Amazon account."""
         
         try:
-            supabase.table("amazon_connections").update({
+            result = supabase.table("amazon_connections").update({
                 "is_connected": False,
                 "refresh_token_encrypted": None,
                 "last_error": "User disconnected",
             }).eq("user_id", user_id).execute()
             
+            # Brokered access tokens would otherwise stay usable until they expire
+            marketplaces = {row.get("marketplace_id") for row in result.data or []} - {None}
+            marketplaces.add(settings.MARKETPLACE_ID or "ATVPDKIKX0DER")
+            for marketplace_id in marketplaces:
+                token_broker.invalidate(token_broker.user_key(user_id, marketplace_id))
+            
             logger.info(f"Amazon account disconnected for user {user_id}")
             return True
         except Exception as e:
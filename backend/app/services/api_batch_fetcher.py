@@ -2,10 +2,13 @@
 Universal API batch fetcher.
 
 Handles 1 ASIN or 10,000 ASINs with the same code.
-Intelligently batches API calls for optimal performance.
+SP-API and Keepa are fetched concurrently, each result is extracted as it
+arrives, and products are written back in bulk (see _PipelineRun).
 """
+import time
+import inspect
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 import asyncio
 
@@ -19,6 +22,32 @@ from app.services.api_field_extractor import (
 
 logger = logging.getLogger(__name__)
 
+# Called with a progress snapshot after each fetch batch and write; may be async
+ProgressCallback = Callable[[Dict[str, Any]], Any]
+
+# products columns the extractors produce - the only ones written back. Must
+# match v_api_columns in CREATE_BULK_UPDATE_PRODUCT_API_DATA_RPC.sql.
+API_DATA_COLUMNS = frozenset({
+    # SP-API catalog (SPAPIExtractor)
+    'binding', 'brand', 'brand_name', 'browse_nodes', 'bsr', 'bullet_points', 'category',
+    'category_rank', 'color', 'current_sales_rank', 'description', 'dimension_unit', 'ean',
+    'features', 'image_url', 'images', 'is_oversized', 'is_top_level_category', 'isbn',
+    'item_height', 'item_length', 'item_weight', 'item_width', 'manufacturer', 'model_number',
+    'package_height', 'package_length', 'package_quantity', 'package_weight', 'package_width',
+    'part_number', 'product_group', 'product_type', 'size', 'style', 'subcategory', 'title',
+    'upc', 'weight_unit',
+    # Keepa (KeepaExtractor)
+    'age_in_days', 'amazon_price_30_day_avg', 'amazon_price_90_day_avg', 'amazon_price_current',
+    'buy_box_price', 'buy_box_price_30d_avg', 'buy_box_price_365d_avg', 'buy_box_price_90d_avg',
+    'buybox_price_current', 'fba_fees', 'fba_seller_count', 'first_available_date', 'in_stock',
+    'is_hazmat', 'lowest_price', 'new_price_30_day_avg', 'new_price_90_day_avg',
+    'new_price_current', 'out_of_stock_percentage', 'rating_average', 'review_count',
+    'review_velocity', 'sales_rank_180_day_avg', 'sales_rank_30_day_avg', 'sales_rank_90_day_avg',
+    'sales_rank_drops_30_day', 'sales_rank_drops_90_day', 'seller_count',
+    # Raw responses
+    'sp_api_raw_response', 'sp_api_last_fetched', 'keepa_raw_response', 'keepa_last_fetched',
+})
+
 
 class APIBatchFetcher:
     """
@@ -28,13 +57,15 @@ class APIBatchFetcher:
     
     SP_API_BATCH_SIZE = 20
     KEEPA_BATCH_SIZE = 100
+    WRITE_BATCH_SIZE = 100  # Products per bulk_update_product_api_data call
     
     @classmethod
     async def fetch_and_store(
         cls,
         asins: List[str],
         user_id: str,
-        force_refetch: bool = False
+        force_refetch: bool = False,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Dict[str, Any]:
         """
         The ONE method that does everything.
@@ -43,6 +74,9 @@ class APIBatchFetcher:
             asins: List of ASINs (1 to 10,000+)
             user_id: User who owns these products
             force_refetch: Skip cache, fetch fresh data
+            progress_callback: Receives {'stage', 'total', 'sp_api_done',
+                'keepa_done', 'written', 'write_batches', 'elapsed_seconds',
+                'timings'} as the run progresses
             
         Returns:
             {
@@ -52,7 +86,10 @@ class APIBatchFetcher:
                 'keepa_success': 95,
                 'keepa_failed': 0,
                 'updated': 100,
-                'errors': []
+                'write_batches': 1,
+                'errors': [],
+                'timings': {'sp_api_seconds', 'keepa_seconds',
+                            'extract_seconds', 'write_seconds'}
             }
         """
         start_time = datetime.utcnow()
@@ -105,230 +142,271 @@ class APIBatchFetcher:
         
         logger.warning(f"🔥 API BATCH FETCHER STARTED: {len(asins)} ASINs for user {user_id}")
         
-        results = {
+        run = _PipelineRun(asins, user_id, progress_callback, cls.WRITE_BATCH_SIZE)
+        results = await run.execute()
+        
+        # ============================================
+        # SUMMARY
+        # ============================================
+        end_time = datetime.utcnow()
+        results['duration_seconds'] = (end_time - start_time).total_seconds()
+        timings = results['timings']
+        
+        logger.warning(
+            f"🎉 API BATCH FETCHER COMPLETE:\n"
+            f"  Total ASINs: {results['total']}\n"
+            f"  SP-API: {results['sp_api_success']} success, {results['sp_api_failed']} failed ({timings['sp_api_seconds']:.1f}s)\n"
+            f"  Keepa: {results['keepa_success']} success, {results['keepa_failed']} failed ({timings['keepa_seconds']:.1f}s)\n"
+            f"  Extract: {timings['extract_seconds']:.1f}s\n"
+            f"  Database: {results['updated']} products updated in {results['write_batches']} batches ({timings['write_seconds']:.1f}s)\n"
+            f"  Errors: {len(results['errors'])}\n"
+            f"  Duration: {results['duration_seconds']:.1f}s"
+        )
+        
+        return results
+
+
+class _PipelineRun:
+    """
+    One fetch_and_store call.
+    
+    The SP-API catalog stream (paced by the shared catalog token bucket) and
+    the Keepa stream (paced by Keepa's token budget) run concurrently. Each
+    result is extracted as it arrives and buffered by ASIN; every
+    WRITE_BATCH_SIZE buffered products go to bulk_update_product_api_data in
+    one call, on a single writer so writes never overlap each other. An ASIN
+    whose SP-API and Keepa data land in different batches is written twice,
+    each time with only its own columns.
+    """
+    
+    def __init__(self, asins: List[str], user_id: str, progress_callback: Optional[ProgressCallback], write_batch_size: int):
+        self.asins = asins
+        self.user_id = user_id
+        self.progress_callback = progress_callback
+        self.write_batch_size = write_batch_size
+        
+        self.results = {
             'total': len(asins),
             'sp_api_success': 0,
             'sp_api_failed': 0,
             'keepa_success': 0,
             'keepa_failed': 0,
             'updated': 0,
+            'write_batches': 0,
             'errors': [],
-            'duration_seconds': 0
+            'duration_seconds': 0,
+            'timings': {
+                'sp_api_seconds': 0.0,   # Stream start to last catalog item
+                'keepa_seconds': 0.0,    # Stream start to last Keepa chunk
+                'extract_seconds': 0.0,  # Summed across both streams
+                'write_seconds': 0.0,    # Summed across write batches
+            },
         }
+        self.buffer: Dict[str, Dict[str, Any]] = {}
+        self.updated_asins = set()
+        self.writes: asyncio.Queue = asyncio.Queue()
+        self.started = time.monotonic()
+    
+    async def execute(self) -> Dict[str, Any]:
+        writer = asyncio.ensure_future(self._writer())
+        try:
+            await asyncio.gather(self._fetch_sp_api(), self._fetch_keepa())
+            self._queue_write(force=True)
+        finally:
+            await self.writes.put(None)
+            await writer
         
-        # ============================================
-        # STEP 1: FETCH SP-API CATALOG IN BATCHES OF 20
-        # ============================================
-        logger.info(f"📦 STEP 1/3: Fetching SP-API catalog (batches of {cls.SP_API_BATCH_SIZE})")
-        sp_data = {}
-        
-        for i in range(0, len(asins), cls.SP_API_BATCH_SIZE):
-            batch = asins[i:i + cls.SP_API_BATCH_SIZE]
-            batch_num = i // cls.SP_API_BATCH_SIZE + 1
-            total_batches = (len(asins) + cls.SP_API_BATCH_SIZE - 1) // cls.SP_API_BATCH_SIZE
-            
-            try:
-                logger.info(f"  📡 SP-API Batch {batch_num}/{total_batches}: Fetching {len(batch)} ASINs")
-                
-                # Call SP-API - returns dict of {asin: {processed, raw}}
-                try:
-                    response = await sp_api_client.get_catalog_items(
-                        asins=batch,
-                        marketplace_id='ATVPDKIKX0DER',
-                        included_data=['summaries', 'images', 'attributes', 'salesRanks']
-                    )
-                    
-                    # Store both processed and raw
-                    for asin_key, data in response.items():
-                        if data:
-                            sp_data[asin_key] = data
-                            results['sp_api_success'] += 1
-                            raw_size = len(str(data.get('raw', {}))) if isinstance(data, dict) and 'raw' in data else len(str(data))
-                            logger.debug(f"    ✓ {asin_key}: {raw_size} chars raw response")
-                except Exception as e:
-                    logger.error(f"  ❌ SP-API batch {batch_num} call failed: {e}", exc_info=True)
-                    results['sp_api_failed'] += len(batch)
-                    results['errors'].append(f"SP-API batch {batch_num} call: {str(e)}")
+        self.results['updated'] = len(self.updated_asins)
+        await self._report('complete')
+        return self.results
+    
+    # ==========================================
+    # FETCH STAGES
+    # ==========================================
+    
+    async def _fetch_sp_api(self):
+        logger.info(f"📦 SP-API catalog: streaming {len(self.asins)} ASINs")
+        results = self.results
+        try:
+            async for asin_key, data in sp_api_client.iter_catalog_items(
+                self.asins,
+                marketplace_id='ATVPDKIKX0DER',
+                included_data=['summaries', 'images', 'attributes', 'salesRanks']
+            ):
+                if not data:
+                    results['sp_api_failed'] += 1
                     continue
                 
-                logger.info(f"  ✅ Batch {batch_num} complete: {len(response)} items")
-                
-                # Rate limit protection (avoid throttling)
-                await asyncio.sleep(0.2)
+                results['sp_api_success'] += 1
+                self._add(asin_key, self._extract_sp_api, data)
                 
-            except Exception as e:
-                logger.error(f"  ❌ SP-API batch {batch_num} failed: {e}", exc_info=True)
-                results['sp_api_failed'] += len(batch)
-                results['errors'].append(f"SP-API batch {batch_num}: {str(e)}")
-                
-                # Continue with other batches even if one fails
-                continue
-        
-        logger.info(f"✅ SP-API: {results['sp_api_success']}/{len(asins)} successful")
-        
-        # ============================================
-        # 2. FETCH KEEPA IN BATCHES OF 100
-        # ============================================
-        logger.info(f"📦 Fetching Keepa data (batches of {cls.KEEPA_BATCH_SIZE})")
-        keepa_data = {}
+                done = results['sp_api_success'] + results['sp_api_failed']
+                if done % APIBatchFetcher.SP_API_BATCH_SIZE == 0:
+                    logger.info(f"  📡 SP-API catalog: {done}/{len(self.asins)} fetched")
+                    await self._report('sp_api')
+        except Exception as e:
+            logger.error(f"  ❌ SP-API catalog fetch failed: {e}", exc_info=True)
+            results['sp_api_failed'] = len(self.asins) - results['sp_api_success']
+            results['errors'].append(f"SP-API catalog: {str(e)}")
         
+        results['timings']['sp_api_seconds'] = round(time.monotonic() - self.started, 3)
+        logger.info(f"✅ SP-API: {results['sp_api_success']}/{len(self.asins)} successful")
+    
+    async def _fetch_keepa(self):
+        results = self.results
         keepa_client_instance = get_keepa_client()
         if not keepa_client_instance or not keepa_client_instance.is_configured():
             logger.warning("⚠️ Keepa not configured, skipping Keepa data fetch")
-        else:
-            for i in range(0, len(asins), cls.KEEPA_BATCH_SIZE):
-                batch = asins[i:i + cls.KEEPA_BATCH_SIZE]
-                batch_num = i // cls.KEEPA_BATCH_SIZE + 1
-                total_batches = (len(asins) + cls.KEEPA_BATCH_SIZE - 1) // cls.KEEPA_BATCH_SIZE
-                
-                try:
-                    logger.info(f"  📡 Keepa Batch {batch_num}/{total_batches}: Fetching {len(batch)} ASINs")
-                    
-                    # Call Keepa batch method
-                    keepa_response = await keepa_client_instance.get_products_batch(
-                        asins=batch,
-                        days=90,
-                        return_raw=True
-                    )
-                    
-                    # Store each product
-                    if keepa_response and 'products' in keepa_response:
-                        products = keepa_response.get('products', [])
-                        raw_response = keepa_response.get('raw_response', {})
-                        
-                        for product in products:
-                            product_asin = product.get('asin')
-                            if product_asin:
-                                keepa_data[product_asin] = {
-                                    'product': product,
-                                    'raw_response': raw_response
-                                }
-                                results['keepa_success'] += 1
-                                logger.debug(f"    ✓ {product_asin}: {len(str(product))} chars")
-                    
-                    logger.info(f"  ✅ Batch {batch_num} complete: {len(products)} products")
-                    
-                    # Rate limit protection
-                    await asyncio.sleep(0.2)
-                    
-                except Exception as e:
-                    logger.error(f"  ❌ Keepa batch {batch_num} failed: {e}", exc_info=True)
-                    results['keepa_failed'] += len(batch)
-                    results['errors'].append(f"Keepa batch {batch_num}: {str(e)}")
-                    
-                    # Continue with other batches
-                    continue
+            return
         
-        logger.warning(f"✅ KEEPA COMPLETE: {results['keepa_success']}/{len(asins)} successful")
-        
-        # ============================================
-        # STEP 3: EXTRACT & STORE ALL DATA
-        # ============================================
-        logger.info(f"💾 STEP 3/3: Extracting and storing data for {len(asins)} products")
-        
-        for idx, asin in enumerate(asins, 1):
-            if idx % 10 == 0:
-                logger.info(f"  Processing {idx}/{len(asins)}...")
-            
-            try:
-                update_data = {}
+        logger.info(f"📦 Keepa: streaming {len(self.asins)} ASINs in chunks of {APIBatchFetcher.KEEPA_BATCH_SIZE}")
+        returned = set()
+        try:
+            # Chunks arrive in completion order, paced by Keepa's token budget
+            async for chunk in keepa_client_instance.iter_products_batches(self.asins, days=90, return_raw=True):
+                raw_response = chunk.get('raw_response') or {}
+                envelope = {k: v for k, v in raw_response.items() if k != 'products'}
+                for product in chunk.get('products') or []:
+                    product_asin = product.get('asin') if product else None
+                    if not product_asin or product_asin in returned:
+                        continue
+                    returned.add(product_asin)
+                    # Each product keeps a Keepa-shaped response holding just itself
+                    self._add(product_asin, self._extract_keepa, {**envelope, 'products': [product]})
                 
-                # ===== EXTRACT SP-API DATA =====
-                if asin in sp_data:
-                    try:
-                        # Use the RAW response for extraction
-                        sp_item = sp_data[asin]
-                        if isinstance(sp_item, dict) and 'raw' in sp_item:
-                            # New format: {processed, raw}
-                            raw_response = sp_item['raw']
-                            sp_extracted = SPAPIExtractor.extract_all(raw_response)
-                            update_data.update(sp_extracted)
-                            update_data['sp_api_raw_response'] = raw_response
-                        else:
-                            # Legacy format or direct response
-                            sp_extracted = SPAPIExtractor.extract_all(sp_item)
-                            update_data.update(sp_extracted)
-                            update_data['sp_api_raw_response'] = sp_item
-                        
-                        update_data['sp_api_last_fetched'] = datetime.utcnow().isoformat()
-                        logger.debug(f"    {asin}: Extracted {len(sp_extracted)} SP-API fields")
-                    except Exception as e:
-                        logger.error(f"    {asin}: SP-API extraction failed: {e}")
-                        results['errors'].append(f"{asin} SP-API extraction: {str(e)}")
-                
-                # ===== EXTRACT KEEPA DATA =====
-                if asin in keepa_data:
-                    try:
-                        keepa_item = keepa_data[asin]
-                        product_data = keepa_item.get('product', {})
-                        raw_response = keepa_item.get('raw_response', {})
-                        
-                        # Handle different Keepa response structures
-                        if isinstance(keepa_item, dict):
-                            product_data = keepa_item.get('product', keepa_item)  # Fallback to item itself
-                            raw_response = keepa_item.get('raw_response', keepa_item)  # Fallback to item itself
-                        else:
-                            # Direct product data
-                            product_data = keepa_item
-                            raw_response = keepa_item
-                        
-                        if product_data:
-                            keepa_extracted = KeepaExtractor.extract_all({
-                                'products': [product_data] if isinstance(product_data, dict) else product_data
-                            }, asin=asin)
-                            
-                            update_data.update(keepa_extracted)
-                            update_data['keepa_raw_response'] = raw_response
-                            update_data['keepa_last_fetched'] = datetime.utcnow().isoformat()
-                            logger.debug(f"    {asin}: Extracted {len(keepa_extracted)} Keepa fields")
-                        else:
-                            logger.warning(f"    {asin}: Keepa product_data is None")
-                    except Exception as e:
-                        logger.error(f"    {asin}: Keepa extraction failed: {e}", exc_info=True)
-                        results['errors'].append(f"{asin} Keepa extraction: {str(e)}")
-                
-                # ===== UPDATE DATABASE =====
-                if update_data:
-                    try:
-                        # Update product by ASIN and user_id
-                        update_response = supabase.table('products').update(
-                            update_data
-                        ).eq('asin', asin).eq('user_id', user_id).execute()
-                        
-                        if update_response.data:
-                            results['updated'] += 1
-                            logger.debug(f"    ✅ {asin}: Updated {len(update_data)} fields")
-                        else:
-                            logger.warning(f"    ⚠️ {asin}: No product found to update")
-                            results['errors'].append(f"{asin}: Product not found in database")
-                    
-                    except Exception as e:
-                        logger.error(f"    ❌ {asin}: Database update failed: {e}", exc_info=True)
-                        results['errors'].append(f"{asin} database update: {str(e)}")
-                else:
-                    logger.warning(f"    ⚠️ {asin}: No data to update (no API responses)")
-                
-            except Exception as e:
-                logger.error(f"  ❌ {asin}: Complete failure: {e}", exc_info=True)
-                results['errors'].append(f"{asin}: {str(e)}")
+                logger.info(f"  📡 Keepa: {len(returned)}/{len(self.asins)} fetched")
+                await self._report('keepa')
+        except Exception as e:
+            logger.error(f"  ❌ Keepa fetch failed: {e}", exc_info=True)
+            results['errors'].append(f"Keepa: {str(e)}")
         
-        # ============================================
-        # SUMMARY
-        # ============================================
-        end_time = datetime.utcnow()
-        results['duration_seconds'] = (end_time - start_time).total_seconds()
+        # Failed chunks are skipped by the client - whatever didn't come back failed
+        results['keepa_success'] = len(returned)
+        results['keepa_failed'] = len(self.asins) - len(returned)
+        results['timings']['keepa_seconds'] = round(time.monotonic() - self.started, 3)
+        logger.warning(f"✅ KEEPA COMPLETE: {results['keepa_success']}/{len(self.asins)} successful")
+    
+    # ==========================================
+    # EXTRACTION
+    # ==========================================
+    
+    def _add(self, asin: str, extract: Callable[[str, Any], Dict[str, Any]], payload: Any):
+        """Extract one API result into the write buffer."""
+        started = time.perf_counter()
+        try:
+            fields = extract(asin, payload)
+        except Exception as e:
+            logger.error(f"    {asin}: extraction failed: {e}", exc_info=True)
+            self.results['errors'].append(f"{asin} extraction: {str(e)}")
+            fields = None
+        self.results['timings']['extract_seconds'] += time.perf_counter() - started
         
-        logger.warning(
-            f"🎉 API BATCH FETCHER COMPLETE:\n"
-            f"  Total ASINs: {results['total']}\n"
-            f"  SP-API: {results['sp_api_success']} success, {results['sp_api_failed']} failed\n"
-            f"  Keepa: {results['keepa_success']} success, {results['keepa_failed']} failed\n"
-            f"  Database: {results['updated']} products updated\n"
-            f"  Errors: {len(results['errors'])}\n"
-            f"  Duration: {results['duration_seconds']:.1f}s"
-        )
+        fields = {k: v for k, v in (fields or {}).items() if k in API_DATA_COLUMNS}
+        if fields:
+            self.buffer.setdefault(asin, {'asin': asin}).update(fields)
+            self._queue_write()
+    
+    @staticmethod
+    def _extract_sp_api(asin: str, sp_item: Any) -> Dict[str, Any]:
+        # Use the RAW response for extraction
+        if isinstance(sp_item, dict) and 'raw' in sp_item:
+            # New format: {processed, raw}
+            raw_response = sp_item['raw']
+        else:
+            # Legacy format or direct response
+            raw_response = sp_item
         
-        return results
+        fields = SPAPIExtractor.extract_all(raw_response)
+        fields['sp_api_raw_response'] = raw_response
+        fields['sp_api_last_fetched'] = datetime.utcnow().isoformat()
+        logger.debug(f"    {asin}: Extracted {len(fields) - 2} SP-API fields")
+        return fields
+    
+    @staticmethod
+    def _extract_keepa(asin: str, raw_response: Dict[str, Any]) -> Dict[str, Any]:
+        fields = KeepaExtractor.extract_all(raw_response, asin=asin)
+        fields['keepa_raw_response'] = raw_response
+        fields['keepa_last_fetched'] = datetime.utcnow().isoformat()
+        logger.debug(f"    {asin}: Extracted {len(fields) - 2} Keepa fields")
+        return fields
+    
+    # ==========================================
+    # BULK WRITE-BACK
+    # ==========================================
+    
+    def _queue_write(self, force: bool = False):
+        if self.buffer and (force or len(self.buffer) >= self.write_batch_size):
+            rows, self.buffer = list(self.buffer.values()), {}
+            self.writes.put_nowait(rows)
+    
+    async def _writer(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            rows = await self.writes.get()
+            if rows is None:
+                return
+            started = time.perf_counter()
+            # supabase-py is blocking - keep it off the loop so both streams keep flowing
+            updated = await loop.run_in_executor(None, self._write_rows, rows)
+            self.results['timings']['write_seconds'] += time.perf_counter() - started
+            self.results['write_batches'] += 1
+            self.updated_asins.update(updated)
+            await self._report('write')
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """One bulk RPC per batch; per-ASIN updates if the RPC isn't deployed."""
+        try:
+            result = supabase.rpc('bulk_update_product_api_data', {
+                'p_user_id': self.user_id,
+                'p_rows': rows
+            }).execute()
+            updated = [row if isinstance(row, str) else next(iter(row.values())) for row in result.data or []]
+        except Exception as e:
+            logger.warning(f"bulk_update_product_api_data failed ({e}), updating {len(rows)} products one by one")
+            updated = []
+            for row in rows:
+                asin = row['asin']
+                update_data = {k: v for k, v in row.items() if k != 'asin'}
+                try:
+                    update_response = supabase.table('products').update(
+                        update_data
+                    ).eq('asin', asin).eq('user_id', self.user_id).execute()
+                    if update_response.data:
+                        updated.append(asin)
+                except Exception as row_error:
+                    logger.error(f"    ❌ {asin}: Database update failed: {row_error}", exc_info=True)
+                    self.results['errors'].append(f"{asin} database update: {str(row_error)}")
+        
+        missing = {row['asin'] for row in rows} - set(updated)
+        for asin in missing - self.updated_asins:
+            logger.warning(f"    ⚠️ {asin}: No product found to update")
+            self.results['errors'].append(f"{asin}: Product not found in database")
+        return updated
+    
+    # ==========================================
+    # PROGRESS
+    # ==========================================
+    
+    async def _report(self, stage: str):
+        if not self.progress_callback:
+            return
+        results = self.results
+        snapshot = {
+            'stage': stage,
+            'total': results['total'],
+            'sp_api_done': results['sp_api_success'] + results['sp_api_failed'],
+            'keepa_done': results['keepa_success'] + results['keepa_failed'],
+            'written': len(self.updated_asins),
+            'write_batches': results['write_batches'],
+            'elapsed_seconds': round(time.monotonic() - self.started, 3),
+            'timings': dict(results['timings']),
+        }
+        try:
+            outcome = self.progress_callback(snapshot)
+            if inspect.isawaitable(outcome):
+                await outcome
+        except Exception as e:
+            logger.warning(f"API batch fetcher progress callback failed: {e}")
 
 
 # ============================================
@@ -338,7 +416,8 @@ class APIBatchFetcher:
 async def fetch_api_data_for_asins(
     asins: List[str],
     user_id: str,
-    force_refetch: bool = False
+    force_refetch: bool = False,
+    progress_callback: Optional[ProgressCallback] = None
 ) -> Dict[str, Any]:
     """
     Convenience function.
@@ -348,6 +427,7 @@ async def fetch_api_data_for_asins(
         asins: List of ASINs (can be 1 or 10,000+)
         user_id: User ID
         force_refetch: Skip cache (not yet implemented)
+        progress_callback: See APIBatchFetcher.fetch_and_store
         
     Returns:
         Results dict with success/failure counts
@@ -355,6 +435,7 @@ async def fetch_api_data_for_asins(
     return await APIBatchFetcher.fetch_and_store(
         asins=asins,
         user_id=user_id,
-        force_refetch=force_refetch
+        force_refetch=force_refetch,
+        progress_callback=progress_callback
     )
 
@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional
 from app.services.supabase_client import supabase
 from app.services.sp_api_client import sp_api_client
 from app.services.keepa_client import get_keepa_client
+from app.services.response_cache import invalidate_user
 from app.services.api_data_extractor import (
     should_refresh_sp_data,
     should_refresh_keepa_data
@@ -104,6 +105,7 @@ async def fetch_and_store_sp_api_data(asin: str, user_id: Optional[str] = None,
         
         if result.data and len(result.data) > 0:
             logger.info(f"✅ Stored complete SP-API data for {asin} (raw response + structured fields)")
+            invalidate_user(user_id, [f"asin:{user_id}:{asin}"])
             return result.data[0]
         else:
             # Product might not exist yet - log warning but return the data we have
@@ -215,6 +217,7 @@ async def fetch_and_store_keepa_data(asin: str, user_id: Optional[str] = None, f
         
         if result.data and len(result.data) > 0:
             logger.info(f"✅ Stored complete Keepa data for {asin} (raw response + structured fields)")
+            invalidate_user(user_id, [f"asin:{user_id}:{asin}"])
             return result.data[0]
         else:
             # Product might not exist yet - log warning but return the data we have
@@ -0,0 +1,183 @@
+"""
+Enrich ASIN candidates for a multi-match UPC before ranking.
+
+One searchCatalogItems call (identifiersType=ASIN, with relationships,
+salesRanks and images) and one Keepa batch run concurrently for every
+candidate, instead of a parent-ASIN lookup and a quality-indicator lookup
+per candidate in turn. The enriched list is cached per UPC so repeat
+lookups of the same UPC come back without any API calls (results missing
+catalog or Keepa data are cached briefly or not at all).
+"""
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+
+from app.cache import cache
+from app.services.sp_api_client import sp_api_client
+from app.services.keepa_client import keepa_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = 86400  # Same as the catalog cache
+DEGRADED_CACHE_TTL = 300  # Only one of catalog/Keepa answered - retry soon
+CATALOG_BATCH_SIZE = 20  # searchCatalogItems identifiers limit
+CATALOG_INCLUDED_DATA = ["summaries", "relationships", "salesRanks", "images"]
+
+
+def _cache_key(upc: str, marketplace_id: str) -> str:
+    return f"asin_candidates:{marketplace_id}:{upc}"
+
+
+class AsinCandidateEnricher:
+    """
+    Parent/variation info and quality indicators for all candidates at once.
+    """
+
+    async def enrich(
+        self,
+        upc: str,
+        candidates: List[Dict[str, Any]],
+        marketplace_id: str = "ATVPDKIKX0DER"
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the candidates with is_parent, parent_asin, quality_indicators
+        (bsr, review_count, rating, has_prime, is_buybox_winner, condition),
+        title, image, brand, category and a warning for child variations -
+        the shape AsinComparisonService and AsinRankingService expect.
+        """
+        key = _cache_key(upc, marketplace_id)
+        cached = cache.get(key)
+        if cached:
+            logger.info(f"✅ Cache hit for {key}")
+            return cached
+
+        asins = [c.get("asin") for c in candidates if c.get("asin")]
+        catalog, keepa = await asyncio.gather(
+            self._fetch_catalog(asins, marketplace_id),
+            self._fetch_keepa(asins),
+        )
+
+        enriched = [self._merge(c, catalog.get(c.get("asin")), keepa.get(c.get("asin"))) for c in candidates]
+        # Both fetchers return {} on failure - don't pin an outage in the cache
+        if catalog and keepa:
+            cache.set(key, enriched, ttl=CACHE_TTL)
+        elif catalog or keepa:
+            cache.set(key, enriched, ttl=DEGRADED_CACHE_TTL)
+
+        logger.info(f"🔎 Enriched {len(enriched)} ASIN candidates for UPC {upc} "
+                    f"(catalog: {len(catalog)}, keepa: {len(keepa)})")
+        return enriched
+
+    # ==========================================
+    # FETCH
+    # ==========================================
+
+    async def _fetch_catalog(self, asins: List[str], marketplace_id: str) -> Dict[str, Dict[str, Any]]:
+        """ASIN -> parsed catalog item, one searchCatalogItems call per 20 ASINs."""
+        batches = [asins[i:i + CATALOG_BATCH_SIZE] for i in range(0, len(asins), CATALOG_BATCH_SIZE)]
+        responses = await asyncio.gather(*[
+            sp_api_client.search_catalog_items(
+                batch,
+                identifiers_type="ASIN",
+                marketplace_id=marketplace_id,
+                included_data=CATALOG_INCLUDED_DATA,
+                page_size=len(batch),
+            )
+            for batch in batches
+        ], return_exceptions=True)
+
+        items = {}
+        for response in responses:
+            if isinstance(response, Exception):
+                logger.warning(f"Catalog search for ASIN candidates failed: {response}")
+                continue
+            for item in (response or {}).get("items") or []:
+                if item.get("asin"):
+                    items[item["asin"]] = self._parse_catalog_item(item)
+        return items
+
+    async def _fetch_keepa(self, asins: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            return await keepa_client.get_products_batch(asins) or {}
+        except Exception as e:
+            logger.warning(f"Keepa batch for ASIN candidates failed: {e}")
+            return {}
+
+    @staticmethod
+    def _parse_catalog_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        summary = (item.get("summaries") or [{}])[0]
+
+        parent_asin = None
+        for group in item.get("relationships") or []:
+            for relationship in group.get("relationships") or []:
+                parents = relationship.get("parentAsins") or []
+                if relationship.get("type") == "VARIATION" and parents:
+                    parent_asin = parents[0]
+                    break
+
+        bsr = None
+        for group in item.get("salesRanks") or []:
+            ranks = group.get("displayGroupRanks") or group.get("classificationRanks") or []
+            if ranks:
+                bsr = ranks[0].get("rank")
+                break
+
+        image = None
+        for image_set in item.get("images") or []:
+            for img in image_set.get("images") or []:
+                if img.get("variant") == "MAIN":
+                    image = img.get("link")
+                    break
+
+        return {
+            "title": summary.get("itemName"),
+            "brand": summary.get("brandName") or summary.get("brand"),
+            "category": summary.get("websiteDisplayGroupName") or summary.get("websiteDisplayGroup"),
+            "image": image,
+            "parent_asin": parent_asin,
+            "bsr": bsr,
+        }
+
+    # ==========================================
+    # MERGE
+    # ==========================================
+
+    @staticmethod
+    def _merge(candidate: Dict[str, Any], catalog: Optional[Dict], keepa: Optional[Dict]) -> Dict[str, Any]:
+        asin = candidate.get("asin")
+        catalog = catalog or {}
+        keepa = keepa or {}
+        current = keepa.get("current") or {}
+
+        parent_asin = catalog.get("parent_asin") or keepa.get("parent_asin")
+        if parent_asin == asin:
+            parent_asin = None
+
+        enriched = {
+            **candidate,
+            "is_parent": parent_asin is None,
+            "parent_asin": parent_asin,
+            "quality_indicators": {
+                "bsr": catalog.get("bsr") or current.get("sales_rank"),
+                "review_count": current.get("reviews_total") or 0,
+                "rating": current.get("rating") or 0,
+                # FBA offers or Amazon on the listing -> Prime eligible
+                "has_prime": bool(current.get("fba_sellers") or current.get("amazon_is_seller")),
+                # Listing has an active Buy Box
+                "is_buybox_winner": current.get("buy_box_price") is not None,
+                "condition": "new",
+            },
+            "title": catalog.get("title") or keepa.get("title") or candidate.get("title"),
+            "image": catalog.get("image") or candidate.get("image"),
+            "brand": catalog.get("brand") or keepa.get("brand") or candidate.get("brand"),
+            "category": catalog.get("category") or keepa.get("category") or candidate.get("category"),
+        }
+
+        if parent_asin:
+            enriched["warning"] = f"This is a variation. Parent ASIN: {parent_asin}"
+
+        return enriched
+
+
+# Singleton
+asin_candidate_enricher = AsinCandidateEnricher()
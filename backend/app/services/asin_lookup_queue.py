@@ -0,0 +1,310 @@
+"""
+Event-driven UPC -> ASIN lookup queue.
+
+Upload and product-create paths enqueue (upc, product_id) pairs. Each UPC
+sits in the Redis stream once no matter how many products share it:
+- asin_lookup:queued is the set of UPCs with a message in the stream
+- asin_lookup:waiting:{upc} collects the product IDs waiting on that UPC
+
+A consumer group (app.tasks.asin_lookup.consume_asin_lookup_stream) reads
+20 UPCs at a time - one SP-API catalog search - and acks when the products
+are updated. Messages a crashed consumer never acked are claimed back by the
+reconciliation sweep.
+
+If Redis loses the consumer group (restart, flush, eviction), enqueue()
+recreates the stream without it; group commands recreate the group on
+NOGROUP and retry, and the sweep re-creates it on every run.
+
+Retries for UPCs that weren't found use a sorted set scored by due time,
+with exponential delay; due retries are moved back into the stream.
+"""
+import time
+import logging
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple, TypeVar
+
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "asin_lookup:stream"
+GROUP_NAME = "asin_lookup_workers"
+QUEUED_KEY = "asin_lookup:queued"  # UPCs with a message in the stream
+WAITING_KEY = "asin_lookup:waiting:{upc}"  # product IDs waiting on a UPC
+RETRY_KEY = "asin_lookup:retry"  # zset product_id -> due timestamp
+RETRY_UPCS_KEY = "asin_lookup:retry_upcs"  # hash product_id -> upc
+LEASE_KEY = "asin_lookup:consumer"  # Held by the running consumer
+RESOLVED_KEY = "asin_lookup:resolved:{minute}"  # UPCs resolved per minute
+
+READ_BATCH_SIZE = 20  # UPCs per SP-API catalog search
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+STALE_MESSAGE_MS = 300_000  # Unacked for 5 minutes -> consumer died
+LEASE_TTL = 90
+METRICS_TTL = 3600
+
+T = TypeVar("T")
+
+
+class AsinLookupQueue:
+    """
+    Redis stream + retry sorted set for UPC lookups.
+    """
+
+    def __init__(self):
+        self._group_ready = False
+
+    def _client(self):
+        client = get_redis_client()
+        if client and not self._group_ready:
+            self._create_group(client)
+        return client
+
+    def _create_group(self, client):
+        try:
+            client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    def _with_group(self, client, command: Callable[[], T]) -> T:
+        """Run a consumer-group command, recreating the group if Redis lost it."""
+        try:
+            return command()
+        except Exception as e:
+            if "NOGROUP" not in str(e):
+                raise
+            logger.warning(f"ASIN lookup consumer group missing, recreating it: {e}")
+            self._group_ready = False
+            self._create_group(client)
+            return command()
+
+    def ensure_group(self):
+        """Create the consumer group if it doesn't exist (sweep, after a Redis restart or flush)."""
+        client = get_redis_client()
+        if client:
+            self._create_group(client)
+
+    # ==========================================
+    # PRODUCERS
+    # ==========================================
+
+    def enqueue(self, items: Iterable[Tuple[str, str]]) -> Optional[int]:
+        """
+        Queue (upc, product_id) pairs. Returns the number of UPCs newly added
+        to the stream, or None if Redis is unavailable.
+        """
+        items = [(upc, pid) for upc, pid in items if upc and pid]
+        client = self._client()
+        if not client:
+            return None
+        if not items:
+            return 0
+
+        pipe = client.pipeline()
+        for upc, product_id in items:
+            pipe.sadd(WAITING_KEY.format(upc=upc), product_id)
+            pipe.sadd(QUEUED_KEY, upc)
+        added = pipe.execute()[1::2]
+
+        new_upcs = list(dict.fromkeys(upc for (upc, _), was_added in zip(items, added) if was_added))
+        if new_upcs:
+            pipe = client.pipeline()
+            for upc in new_upcs:
+                pipe.xadd(STREAM_KEY, {"upc": upc})
+            pipe.execute()
+        return len(new_upcs)
+
+    # ==========================================
+    # CONSUMERS
+    # ==========================================
+
+    def read(self, consumer: str, count: int = READ_BATCH_SIZE, block_ms: int = 2000) -> List[Tuple[str, str]]:
+        """Next undelivered messages for this consumer as (message_id, upc)."""
+        client = self._client()
+        if not client:
+            return []
+        response = self._with_group(client, lambda: client.xreadgroup(
+            GROUP_NAME, consumer, {STREAM_KEY: ">"}, count=count, block=block_ms
+        ))
+        return [(msg_id, fields.get("upc")) for _, messages in (response or []) for msg_id, fields in messages]
+
+    def claim_stale(self, consumer: str, count: int = 100) -> List[Tuple[str, str]]:
+        """Messages another consumer read but never acked (it died)."""
+        client = self._client()
+        if not client:
+            return []
+        response = self._with_group(client, lambda: client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, consumer, STALE_MESSAGE_MS, start_id="0-0", count=count
+        ))
+        messages = response[1] if response else []
+        return [(msg_id, fields.get("upc")) for msg_id, fields in messages if fields]
+
+    def take_products(self, upc: str) -> List[str]:
+        """
+        Product IDs waiting on a UPC, removing the UPC from the queued set in
+        the same transaction - products enqueued after this get a new message.
+        """
+        client = self._client()
+        pipe = client.pipeline(transaction=True)
+        pipe.srem(QUEUED_KEY, upc)
+        pipe.smembers(WAITING_KEY.format(upc=upc))
+        pipe.delete(WAITING_KEY.format(upc=upc))
+        _, product_ids, _ = pipe.execute()
+        return list(product_ids or [])
+
+    def ack(self, message_ids: List[str]):
+        if not message_ids:
+            return
+        client = self._client()
+        pipe = client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP_NAME, *message_ids)
+        pipe.xdel(STREAM_KEY, *message_ids)
+        minute_key = RESOLVED_KEY.format(minute=int(time.time() // 60))
+        pipe.incrby(minute_key, len(message_ids))
+        pipe.expire(minute_key, METRICS_TTL)
+        pipe.execute()
+
+    # ==========================================
+    # RETRIES
+    # ==========================================
+
+    @staticmethod
+    def retry_delay(attempt: int) -> int:
+        """60s, 120s, 240s, ... capped at an hour."""
+        return min(RETRY_BASE_SECONDS * 2 ** max(attempt - 1, 0), RETRY_MAX_SECONDS)
+
+    def schedule_retry(self, product_id: str, upc: str, attempt: int):
+        client = self._client()
+        if not client:
+            return
+        pipe = client.pipeline()
+        pipe.zadd(RETRY_KEY, {product_id: time.time() + self.retry_delay(attempt)})
+        pipe.hset(RETRY_UPCS_KEY, product_id, upc)
+        pipe.execute()
+
+    def promote_due_retries(self, limit: int = 500) -> int:
+        """Move retries whose delay has passed back into the stream."""
+        client = self._client()
+        if not client:
+            return 0
+        due = client.zrangebyscore(RETRY_KEY, "-inf", time.time(), start=0, num=limit)
+        if not due:
+            return 0
+
+        pipe = client.pipeline()
+        for product_id in due:
+            pipe.zrem(RETRY_KEY, product_id)
+            pipe.hget(RETRY_UPCS_KEY, product_id)
+            pipe.hdel(RETRY_UPCS_KEY, product_id)
+        results = pipe.execute()
+
+        # ZREM returning 1 means this caller claimed the retry
+        items = [
+            (results[i * 3 + 1], product_id)
+            for i, product_id in enumerate(due)
+            if results[i * 3] and results[i * 3 + 1]
+        ]
+        self.enqueue(items)
+        return len(items)
+
+    def next_retry_in(self) -> Optional[int]:
+        """Seconds until the earliest scheduled retry is due, None if there are none."""
+        client = self._client()
+        if not client:
+            return None
+        earliest = client.zrange(RETRY_KEY, 0, 0, withscores=True)
+        if not earliest:
+            return None
+        return max(int(earliest[0][1] - time.time()) + 1, 1)
+
+    def scheduled_for_retry(self, product_ids: List[str]) -> set:
+        """Which of these products are waiting out a retry delay."""
+        client = self._client()
+        if not client or not product_ids:
+            return set()
+        pipe = client.pipeline()
+        for product_id in product_ids:
+            pipe.zscore(RETRY_KEY, product_id)
+        return {pid for pid, score in zip(product_ids, pipe.execute()) if score is not None}
+
+    # ==========================================
+    # CONSUMER LEASE
+    # ==========================================
+
+    def acquire_lease(self, consumer: str) -> bool:
+        client = self._client()
+        return bool(client and client.set(LEASE_KEY, consumer, ex=LEASE_TTL, nx=True))
+
+    def renew_lease(self, consumer: str):
+        client = self._client()
+        if client:
+            client.set(LEASE_KEY, consumer, ex=LEASE_TTL, xx=True)
+
+    def release_lease(self, consumer: str):
+        client = self._client()
+        if client and client.get(LEASE_KEY) == consumer:
+            client.delete(LEASE_KEY)
+
+    def has_consumer(self) -> bool:
+        client = self._client()
+        return bool(client and client.exists(LEASE_KEY))
+
+    def has_work(self) -> bool:
+        client = self._client()
+        return bool(client and (client.xlen(STREAM_KEY) or client.zcard(RETRY_KEY)))
+
+    # ==========================================
+    # METRICS
+    # ==========================================
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        depth: UPCs in the stream not yet acked (undelivered + in flight)
+        lag_seconds: age of the oldest of them
+        throughput: UPCs resolved this minute / in the last 5 and 60 minutes
+        """
+        client = self._client()
+        if not client:
+            return {"available": False}
+
+        now = time.time()
+        minute = int(now // 60)
+
+        def read_all():
+            pipe = client.pipeline()
+            pipe.xlen(STREAM_KEY)
+            pipe.xrange(STREAM_KEY, "-", "+", count=1)
+            pipe.xpending(STREAM_KEY, GROUP_NAME)
+            pipe.zcard(RETRY_KEY)
+            pipe.zcount(RETRY_KEY, "-inf", now)
+            pipe.exists(LEASE_KEY)
+            pipe.mget([RESOLVED_KEY.format(minute=m) for m in range(minute - 59, minute + 1)])
+            return pipe.execute()
+
+        depth, oldest, pending, retries, retries_due, consumer, resolved = self._with_group(client, read_all)
+
+        lag = 0.0
+        if oldest:
+            # Stream IDs start with the millisecond timestamp they were added at
+            lag = max(now - int(oldest[0][0].split("-")[0]) / 1000, 0.0)
+
+        per_minute = [int(v or 0) for v in resolved]
+        return {
+            "available": True,
+            "depth": depth,
+            "in_flight": (pending or {}).get("pending", 0),
+            "lag_seconds": round(lag, 1),
+            "retry_scheduled": retries,
+            "retry_due": retries_due,
+            "consumer_running": bool(consumer),
+            "throughput": {
+                "current_minute": per_minute[-1],
+                "last_5_minutes": sum(per_minute[-5:]),
+                "last_hour": sum(per_minute),
+            },
+        }
+
+
+# Singleton
+asin_lookup_queue = AsinLookupQueue()
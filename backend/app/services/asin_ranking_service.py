@@ -29,7 +29,7 @@ class AsinRankingService:
         
         for asin in asins:
             score = 0
-            quality = asin.get('quality_indicators', {})
+            quality = asin.get('quality_indicators') or {}
             
             # Prefer parent ASINs
             if asin.get('is_parent'):
@@ -60,7 +60,7 @@ class AsinRankingService:
                 logger.debug(f"{asin['asin']}: +5 (Buybox)")
             
             # Review count
-            review_count = quality.get('review_count', 0)
+            review_count = quality.get('review_count') or 0
             if review_count > 1000:
                 score += 5
             elif review_count > 100:
@@ -69,7 +69,7 @@ class AsinRankingService:
                 score += 1
             
             # Rating
-            rating = quality.get('rating', 0)
+            rating = quality.get('rating') or 0
             if rating >= 4.5:
                 score += 5
             elif rating >= 4.0:
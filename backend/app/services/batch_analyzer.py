@@ -7,6 +7,9 @@ import logging
 from typing import List, Dict
 from app.services.sp_api_client import sp_api_client
 from app.services.keepa_client import keepa_client
+from app.services.fba_fee_engine import fba_fee_engine, item_dimensions
+from app.services.profitability_engine import profitability_engine
+from app.services.cost_calculator import calculate_prep_cost
 
 logger = logging.getLogger(__name__)
 
@@ -90,6 +93,13 @@ class BatchAnalyzer:
                         "rating": data.get("rating"),
                         "review_count": data.get("review_count"),
                     })
+                    dims = item_dimensions(data)
+                    results[asin].update({
+                        "item_weight_lb": dims["weight_lb"],
+                        "item_length_in": dims["length_in"],
+                        "item_width_in": dims["width_in"],
+                        "item_height_in": dims["height_in"],
+                    })
         
         # Handle SP-API catalog results (images, titles, brands - higher quality than Keepa)
         if isinstance(catalog_data, Exception):
@@ -98,6 +108,9 @@ class BatchAnalyzer:
         else:
             logger.info(f"📸 SP-API catalog: Got data for {len(catalog_data)} products")
             for asin, catalog in catalog_data.items():
+                # get_catalog_items returns {processed, raw} per ASIN
+                if isinstance(catalog, dict) and "processed" in catalog:
+                    catalog = catalog["processed"]
                 if asin in results and catalog:
                     # SP-API catalog has higher quality images/details - use it if available
                     if catalog.get("image_url"):
@@ -205,36 +218,57 @@ class BatchAnalyzer:
                     logger.warning(f"⚠️ {asin}: No pricing AND no catalog data")
         
         # ==========================================
-        # STEP 3: SP-API FEES - Batch of 20
+        # STEP 3: FEES - Local engine first, SP-API (batch of 20) only when unsure
         # ==========================================
-        logger.info("📊 Fetching fees from SP-API...")
+        fees_start = time.time()
         
-        items_with_prices = [
-            {"asin": asin, "price": results[asin]["sell_price"]}
-            for asin in asins
-            if results[asin].get("sell_price")
-        ]
+        local_estimates = {}
+        items_for_sp_api = []
+        for asin in asins:
+            if not results[asin].get("sell_price"):
+                continue
+            estimate = fba_fee_engine.estimate(
+                results[asin]["sell_price"],
+                category=results[asin].get("category"),
+                weight_lb=results[asin].get("item_weight_lb"),
+                length_in=results[asin].get("item_length_in"),
+                width_in=results[asin].get("item_width_in"),
+                height_in=results[asin].get("item_height_in"),
+            )
+            local_estimates[asin] = estimate
+            if fba_fee_engine.needs_sp_api(asin, estimate):
+                items_for_sp_api.append({"asin": asin, "price": results[asin]["sell_price"]})
+            else:
+                self._apply_fees(results[asin], estimate, "local")
+        
+        logger.info(f"📊 Fees: {len(local_estimates) - len(items_for_sp_api)} local, {len(items_for_sp_api)} from SP-API")
         
-        for i in range(0, len(items_with_prices), SP_API_BATCH_SIZE):
-            batch = items_with_prices[i:i + SP_API_BATCH_SIZE]
+        calibration_pairs = []
+        for i in range(0, len(items_for_sp_api), SP_API_BATCH_SIZE):
+            batch = items_for_sp_api[i:i + SP_API_BATCH_SIZE]
             
             try:
                 fees_data = await sp_api_client.get_fees_estimate_batch(batch, marketplace_id)
                 
                 for asin, data in fees_data.items():
                     if asin in results:
-                        results[asin]["fees_total"] = data.get("total")
-                        # Store as both names for compatibility
-                        referral_fee = data.get("referral_fee") or 0
-                        results[asin]["referral_fee"] = referral_fee  # Standard name
-                        results[asin]["fees_referral"] = referral_fee  # Legacy name
-                        fba_fee = data.get("fba_fulfillment_fee") or 0
-                        results[asin]["fba_fee"] = fba_fee  # Standard name
-                        results[asin]["fees_fba"] = fba_fee  # Legacy name
-                        logger.debug(f"✅ {asin}: Fees - Referral: ${referral_fee}, FBA: ${fba_fee}, Total: ${data.get('total')}")
+                        self._apply_fees(results[asin], data, "sp-api")
+                        if asin in local_estimates and data.get("total"):
+                            calibration_pairs.append((local_estimates[asin], data))
+                        logger.debug(f"✅ {asin}: Fees - Referral: ${data.get('referral_fee')}, FBA: ${data.get('fba_fulfillment_fee')}, Total: ${data.get('total')}")
             except Exception as e:
                 logger.warning(f"SP-API fees batch failed for batch {i//SP_API_BATCH_SIZE + 1}: {e}")
         
+        fba_fee_engine.record_calibration(calibration_pairs)
+        
+        # SP-API had nothing for these - the local estimate beats no fees at all
+        for item in items_for_sp_api:
+            asin = item["asin"]
+            if not results[asin].get("fees_total") and asin in local_estimates:
+                self._apply_fees(results[asin], local_estimates[asin], "local")
+        
+        logger.info(f"⏱️ Fee stage: {time.time() - fees_start:.2f}s ({len(items_for_sp_api)} SP-API items, {len(calibration_pairs)} calibration samples)")
+        
         # FALLBACK: Calculate referral fees for products that didn't get them from SP-API
         from app.services.profit_calculator import get_referral_rate
         for asin in asins:
@@ -256,81 +290,19 @@ class BatchAnalyzer:
         
         # ========== STAGE 2: PROFIT CALCULATION & FILTERING (WITH SHIPPING) ==========
         if buy_costs:
-            from app.services.cost_calculator import (
-                calculate_inbound_shipping,
-                calculate_prep_cost,
-                calculate_landed_cost,
-                calculate_net_profit,
-                calculate_roi
-            )
-            
             # Get user's default rates
             inbound_rate = (user_settings or {}).get("inbound_rate_per_lb", 0.35)
             default_prep = (user_settings or {}).get("default_prep_cost", 0.10)
             
             logger.info(f"Stage 2: Calculating profitability for {len(asins)} products (with shipping)")
             
+            priced = []
             for asin in asins:
                 buy_cost = buy_costs.get(asin, 0)
                 sell_price = results[asin].get("sell_price") or results[asin].get("current_price") or 0
-                fees_total = results[asin].get("fees_total") or 0
-                weight_lb = results[asin].get("item_weight_lb")  # From Keepa (Stage 1)
                 
                 if buy_cost > 0 and sell_price > 0:
-                    # Get per-product overrides
-                    source = (source_data or {}).get(asin, {})
-                    supplier_ships_direct = source.get("supplier_ships_direct", False)
-                    rate_override = source.get("inbound_rate_override")
-                    prep_override = source.get("prep_cost_override")
-                    
-                    # Calculate shipping
-                    inbound_shipping = calculate_inbound_shipping(
-                        weight_lb=weight_lb,
-                        user_rate=inbound_rate,
-                        supplier_ships_direct=supplier_ships_direct,
-                        rate_override=rate_override
-                    )
-                    
-                    prep_cost = calculate_prep_cost(
-                        user_default=default_prep,
-                        override=prep_override
-                    )
-                    
-                    # Calculate landed cost (buy + shipping + prep)
-                    landed_cost = calculate_landed_cost(buy_cost, inbound_shipping, prep_cost)
-                    
-                    # Calculate profit WITH shipping
-                    net_profit = calculate_net_profit(sell_price, fees_total, landed_cost)
-                    roi = calculate_roi(net_profit, landed_cost)
-                    profit_margin = round((net_profit / sell_price) * 100, 2) if sell_price > 0 else 0
-                    
-                    # Update results
-                    results[asin].update({
-                        "buy_cost": buy_cost,
-                        "inbound_shipping": inbound_shipping,
-                        "prep_cost": prep_cost,
-                        "total_landed_cost": landed_cost,
-                        "net_profit": net_profit,
-                        "roi": roi,
-                        "profit_margin": profit_margin,
-                        "stage2_roi": roi,
-                        "passed_stage2": roi >= 30 and net_profit >= 3,
-                        "analysis_stage": "stage2_complete",
-                    })
-                    
-                    # PROMO calculation (also with shipping)
-                    promo_buy_cost = (promo_costs or {}).get(asin)
-                    if promo_buy_cost and promo_buy_cost > 0:
-                        promo_landed = calculate_landed_cost(promo_buy_cost, inbound_shipping, prep_cost)
-                        promo_profit = calculate_net_profit(sell_price, fees_total, promo_landed)
-                        promo_roi = calculate_roi(promo_profit, promo_landed)
-                        
-                        results[asin].update({
-                            "promo_buy_cost": promo_buy_cost,
-                            "promo_landed_cost": promo_landed,
-                            "promo_net_profit": promo_profit,
-                            "promo_roi": promo_roi,
-                        })
+                    priced.append(asin)
                 elif sell_price <= 0 or not sell_price:
                     # No valid pricing - already handled in STEP 2C
                     pass
@@ -339,6 +311,61 @@ class BatchAnalyzer:
                     results[asin]["passed_stage2"] = False
                     results[asin]["analysis_stage"] = "stage2_no_data"
             
+            if priced:
+                # One vectorized pass for the whole batch, with per-product overrides
+                sources = [(source_data or {}).get(asin, {}) for asin in priced]
+                columns = {
+                    "sell_price": [results[a].get("sell_price") or results[a].get("current_price") for a in priced],
+                    "fees_total": [results[a].get("fees_total") or 0 for a in priced],
+                    "prep_cost": [
+                        calculate_prep_cost(default_prep, s.get("prep_cost_override"), s.get("assigned_prep_cost"))
+                        for s in sources
+                    ],
+                    "weight_lb": [results[a].get("item_weight_lb") for a in priced],  # From Keepa (Stage 1)
+                    "inbound_rate": [
+                        inbound_rate if s.get("inbound_rate_override") is None else s["inbound_rate_override"]
+                        for s in sources
+                    ],
+                    "supplier_ships_direct": [bool(s.get("supplier_ships_direct")) for s in sources],
+                }
+                calc = profitability_engine.rows(profitability_engine.compute(
+                    buy_cost=[buy_costs[a] for a in priced], **columns
+                ))
+                
+                # PROMO calculation (also with shipping) - same columns, promo buy cost
+                promo_asins = [a for a in priced if ((promo_costs or {}).get(a) or 0) > 0]
+                promo_calc = {}
+                if promo_asins:
+                    index = {a: i for i, a in enumerate(priced)}
+                    promo_columns = {k: [v[index[a]] for a in promo_asins] for k, v in columns.items()}
+                    promo_rows = profitability_engine.rows(profitability_engine.compute(
+                        buy_cost=[promo_costs[a] for a in promo_asins], **promo_columns
+                    ))
+                    promo_calc = dict(zip(promo_asins, promo_rows))
+                
+                for asin, row in zip(priced, calc):
+                    results[asin].update({
+                        "buy_cost": buy_costs[asin],
+                        "inbound_shipping": row["inbound_shipping"],
+                        "prep_cost": row["prep_cost"],
+                        "total_landed_cost": row["landed_cost"],
+                        "net_profit": row["net_profit"],
+                        "roi": row["roi"],
+                        "profit_margin": row["margin"],
+                        "stage2_roi": row["roi"],
+                        "passed_stage2": row["roi"] >= 30 and row["net_profit"] >= 3,
+                        "analysis_stage": "stage2_complete",
+                    })
+                    
+                    promo = promo_calc.get(asin)
+                    if promo:
+                        results[asin].update({
+                            "promo_buy_cost": promo_costs[asin],
+                            "promo_landed_cost": promo["landed_cost"],
+                            "promo_net_profit": promo["net_profit"],
+                            "promo_roi": promo["roi"],
+                        })
+            
             passed_count = sum(1 for a in asins if results[a].get("passed_stage2"))
             logger.info(f"Stage 2: {passed_count}/{len(asins)} passed ROI filter (ROI >= 30%, profit >= $3)")
         # ========== END STAGE 2 ==========
@@ -357,7 +384,7 @@ class BatchAnalyzer:
                     days=365  # Get 365-day stats
                 )
                 
-                from app.services.keepa_data_extractor import extract_all_keepa_data, calculate_worst_case_profit
+                from app.services.keepa_data_extractor import extract_all_keepa_data
                 
                 for asin in passed_stage2_asins:
                     if asin in keepa_deep:
@@ -390,18 +417,21 @@ class BatchAnalyzer:
                         fba_lowest = keepa_data.get("fba_lowest_365d")
                         
                         if fba_lowest and fba_lowest > 0:
-                            # Estimate fees at worst price
-                            sell_price = results[asin].get("sell_price", 0)
-                            fees_total = results[asin].get("fees_total", 0)
-                            fee_ratio = fees_total / sell_price if sell_price > 0 else 0.30
-                            worst_fees = fba_lowest * fee_ratio
-                            worst_profit = fba_lowest - worst_fees - landed_cost
+                            # Fees at the worst price scale with the current fee ratio
+                            worst = profitability_engine.compute_one(
+                                sell_price=results[asin].get("sell_price") or 0,
+                                fees_total=results[asin].get("fees_total") or 0,
+                                buy_cost=landed_cost,
+                                prep_cost=0,
+                                inbound_shipping=0,
+                                worst_case_price=fba_lowest,
+                            )
                             
                             results[asin].update({
-                                "worst_case_price": round(fba_lowest, 2),
-                                "worst_case_fees": round(worst_fees, 2),
-                                "worst_case_profit": round(worst_profit, 2),
-                                "still_profitable_at_worst": worst_profit > 0,
+                                "worst_case_price": worst["worst_case_price"],
+                                "worst_case_fees": worst["worst_case_fees"],
+                                "worst_case_profit": worst["worst_case_profit"],
+                                "still_profitable_at_worst": worst["worst_case_profit"] > 0,
                             })
                         
                         # Also update with weight/dimensions from Keepa
@@ -451,7 +481,25 @@ class BatchAnalyzer:
         logger.info(f"✅ Analysis complete: {success_count}/{len(asins)} successful")
         
         return results
-    
+
+    def _apply_fees(self, result: dict, fees: dict, source: str):
+        """Copy fees (SP-API or local engine shape) onto a result under both naming schemes."""
+        result["fees_total"] = fees.get("total")
+        referral_fee = fees.get("referral_fee") or 0
+        result["referral_fee"] = referral_fee  # Standard name
+        result["fees_referral"] = referral_fee  # Legacy name
+        fba_fee = fees.get("fba_fulfillment_fee") or 0
+        result["fba_fee"] = fba_fee  # Standard name
+        result["fees_fba"] = fba_fee  # Legacy name
+        result["fees_source"] = source
+        if source == "local":
+            result["fee_confidence"] = fees.get("confidence")
+            result["fee_schedule_version"] = fees.get("schedule_version")
+            if fees.get("referral_rate") is not None:
+                result["referral_fee_percent"] = round(fees["referral_rate"] * 100, 2)
+            if fees.get("size_tier"):
+                result["size_tier"] = fees["size_tier"]
+
     def _determine_pricing_reason(self, asin: str, pricing_response: dict) -> str:
         """Determine why pricing is missing."""
         if not pricing_response:
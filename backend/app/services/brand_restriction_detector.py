@@ -4,13 +4,16 @@ Brand Restriction Detection Service
 Automatically detects and flags restricted brands during product import.
 """
 import logging
+from datetime import datetime
 from typing import Dict, Optional, List
-import re
 
 from app.services.supabase_client import supabase
+from app.services.brand_restriction_index import brand_restriction_index, normalize_brand_name
 
 logger = logging.getLogger(__name__)
 
+FLAG_UPSERT_BATCH_SIZE = 500
+
 
 class BrandRestrictionDetector:
     """Detect brand restrictions for products."""
@@ -20,9 +23,7 @@ class BrandRestrictionDetector:
     
     def normalize_brand_name(self, brand: str) -> str:
         """Normalize brand name for matching."""
-        if not brand:
-            return ""
-        return re.sub(r'[^\w\s]', '', brand.lower().strip())
+        return normalize_brand_name(brand)
     
     async def detect_and_flag(
         self,
@@ -47,28 +48,30 @@ class BrandRestrictionDetector:
                 'message': 'No brand name provided'
             }
         
-        normalized_brand = self.normalize_brand_name(brand_name)
-        
-        # Check global restrictions
-        global_restriction = await self._check_global_restriction(normalized_brand)
+        results = self.flag_products(
+            [{'id': product_id, 'brand': brand_name}],
+            supplier_id=supplier_id
+        )
+        return results.get(product_id) or {
+            'brand_status': 'unknown',
+            'message': 'Brand restriction check failed'
+        }
+    
+    def evaluate(self, brand_name: str, supplier_id: Optional[str] = None) -> Dict[str, any]:
+        """
+        Brand status from the in-memory index - no database calls.
         
-        # Check supplier override
-        supplier_override = None
-        if supplier_id:
-            supplier_override = await self._check_supplier_override(supplier_id, normalized_brand)
+        Same result shape as detect_and_flag().
+        """
+        if not brand_name:
+            return {
+                'brand_status': 'unknown',
+                'message': 'No brand name provided'
+            }
         
-        # Determine status
+        global_restriction, supplier_override = brand_restriction_index.lookup(brand_name, supplier_id)
         brand_status = self._determine_status(global_restriction, supplier_override)
         
-        # Create/update product_brand_flags
-        await self._update_product_flag(
-            product_id,
-            brand_name,
-            brand_status,
-            global_restriction.get('id') if global_restriction else None,
-            supplier_override.get('id') if supplier_override else None
-        )
-        
         return {
             'brand_status': brand_status,
             'restriction_id': global_restriction.get('id') if global_restriction else None,
@@ -76,39 +79,56 @@ class BrandRestrictionDetector:
             'message': self._get_status_message(brand_status, global_restriction, supplier_override)
         }
     
-    async def _check_global_restriction(self, normalized_brand: str) -> Optional[Dict]:
-        """Check if brand is globally restricted."""
-        try:
-            result = supabase.table('brand_restrictions').select('*').eq(
-                'brand_name_normalized', normalized_brand
-            ).limit(1).execute()
-            
-            if result.data:
-                return result.data[0]
-            return None
-        
-        except Exception as e:
-            logger.error(f"Failed to check global restriction: {e}")
-            return None
-    
-    async def _check_supplier_override(
+    def flag_products(
         self,
-        supplier_id: str,
-        normalized_brand: str
-    ) -> Optional[Dict]:
-        """Check if supplier has override for this brand."""
-        try:
-            result = supabase.table('supplier_brand_overrides').select('*').eq(
-                'supplier_id', supplier_id
-            ).eq('brand_name_normalized', normalized_brand).limit(1).execute()
+        products: List[Dict],
+        supplier_id: Optional[str] = None
+    ) -> Dict[str, Dict]:
+        """
+        Evaluate a batch of products in memory and write product_brand_flags
+        with one bulk upsert per FLAG_UPSERT_BATCH_SIZE rows.
+        
+        Args:
+            products: Dicts with 'id' and 'brand' (or 'brand_name')
+            supplier_id: Supplier for override lookup
+        
+        Returns:
+            product_id -> detect_and_flag()-style result (products without a brand are skipped)
+        """
+        results = {}
+        flags = []
+        now = datetime.utcnow().isoformat()
+        
+        for product in products:
+            brand_name = product.get('brand') or product.get('brand_name')
+            if not brand_name or not product.get('id'):
+                continue
             
-            if result.data:
-                return result.data[0]
-            return None
+            result = self.evaluate(brand_name, supplier_id)
+            results[product['id']] = result
+            flags.append({
+                'product_id': product['id'],
+                'user_id': self.user_id,
+                'brand_name': brand_name,
+                'brand_status': result['brand_status'],
+                'restriction_id': result.get('restriction_id'),
+                'override_id': result.get('override_id'),
+                'detection_method': 'auto',
+                'detected_at': now,
+                'updated_at': now
+            })
+        
+        for i in range(0, len(flags), FLAG_UPSERT_BATCH_SIZE):
+            batch = flags[i:i + FLAG_UPSERT_BATCH_SIZE]
+            try:
+                supabase.table('product_brand_flags').upsert(
+                    batch,
+                    on_conflict='product_id,brand_name'
+                ).execute()
+            except Exception as e:
+                logger.error(f"Failed to upsert {len(batch)} product brand flags: {e}")
         
-        except Exception as e:
-            logger.error(f"Failed to check supplier override: {e}")
-            return None
+        return results
     
     def _determine_status(
         self,
@@ -142,44 +162,6 @@ class BrandRestrictionDetector:
         # Unknown if no data
         return 'unknown'
     
-    async def _update_product_flag(
-        self,
-        product_id: str,
-        brand_name: str,
-        brand_status: str,
-        restriction_id: Optional[str],
-        override_id: Optional[str]
-    ):
-        """Create or update product_brand_flags record."""
-        try:
-            # Check if flag exists
-            existing = supabase.table('product_brand_flags').select('id').eq(
-                'product_id', product_id
-            ).eq('brand_name', brand_name).limit(1).execute()
-            
-            flag_data = {
-                'product_id': product_id,
-                'user_id': self.user_id,
-                'brand_name': brand_name,
-                'brand_status': brand_status,
-                'restriction_id': restriction_id,
-                'override_id': override_id,
-                'detection_method': 'auto',
-                'detected_at': 'now()'
-            }
-            
-            if existing.data:
-                # Update existing
-                supabase.table('product_brand_flags').update(flag_data).eq(
-                    'id', existing.data[0]['id']
-                ).execute()
-            else:
-                # Create new
-                supabase.table('product_brand_flags').insert(flag_data).execute()
-        
-        except Exception as e:
-            logger.error(f"Failed to update product flag: {e}")
-    
     def _get_status_message(
         self,
         brand_status: str,
@@ -228,11 +210,12 @@ class BrandRestrictionDetector:
                 result = supabase.table('brand_restrictions').update(restriction_data).eq(
                     'id', existing.data[0]['id']
                 ).execute()
-                return result.data[0] if result.data else None
             else:
                 # Insert
                 result = supabase.table('brand_restrictions').insert(restriction_data).execute()
-                return result.data[0] if result.data else None
+            
+            brand_restriction_index.invalidate()
+            return result.data[0] if result.data else None
         
         except Exception as e:
             logger.error(f"Failed to add global restriction: {e}")
@@ -0,0 +1,258 @@
+"""
+In-memory brand restriction index.
+
+Loads brand_restrictions (global) and supplier_brand_overrides (per supplier)
+once per process and keeps them in normalized-name hash maps, so uploads can
+check thousands of products without a Supabase round trip per product.
+
+Matching order: exact normalized name -> alias (spacing, "&"/"and",
+corporate suffixes) -> fuzzy (candidates from a token index, scored with
+difflib). Writers call invalidate(), which bumps a Redis version so every
+process reloads on its next lookup.
+"""
+import re
+import time
+import logging
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.supabase_client import supabase
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "brand_restrictions:version"
+INDEX_MAX_AGE_SECONDS = 600  # Reload even without a version bump (e.g. rows edited in SQL)
+VERSION_CHECK_SECONDS = 5  # At most one Redis GET per this interval, not per product
+LOAD_PAGE_SIZE = 1000
+FUZZY_MATCH_THRESHOLD = 0.9
+TOKEN_PREFIX_LENGTH = 4  # Also index token prefixes so single-token typos find candidates
+
+# Dropped when building aliases ("Procter & Gamble Co." == "procter gamble")
+IGNORED_TOKENS = {"and", "the", "inc", "llc", "ltd", "co", "corp", "corporation", "company", "brands", "brand"}
+
+
+def normalize_brand_name(brand: str) -> str:
+    """Lowercase, strip punctuation. Same rule as BrandRestrictionDetector."""
+    if not brand:
+        return ""
+    return re.sub(r'[^\w\s]', '', brand.lower().strip())
+
+
+def _tokens(brand: str) -> List[str]:
+    return normalize_brand_name(brand).split()
+
+
+def brand_aliases(brand: str) -> Set[str]:
+    """All keys a brand name should match under."""
+    tokens = _tokens(brand)
+    if not tokens:
+        return set()
+
+    core = [t for t in tokens if t not in IGNORED_TOKENS] or tokens
+    aliases = {
+        " ".join(tokens),
+        "".join(tokens),
+        " ".join(core),
+        "".join(core),
+    }
+    return {a for a in aliases if a}
+
+
+class BrandMatcher:
+    """
+    Normalized-name lookup over brand_restrictions or supplier_brand_overrides rows.
+    """
+
+    def __init__(self, rows: List[Dict]):
+        self._exact: Dict[str, Dict] = {}
+        self._alias: Dict[str, Dict] = {}
+        self._token_index: Dict[str, Set[str]] = {}
+        self._compact: Dict[str, Tuple[str, Dict]] = {}
+        self._memo: Dict[str, Optional[Dict]] = {}
+
+        for row in rows:
+            name = row.get("brand_name") or row.get("brand_name_normalized") or ""
+            canonical = " ".join(_tokens(name))
+            if not canonical:
+                continue
+
+            # Keep the stored normalized value too - older rows used SQL lower(trim())
+            for key in (canonical, row.get("brand_name_normalized")):
+                if key:
+                    self._exact.setdefault(key, row)
+
+            for alias in brand_aliases(name):
+                self._alias.setdefault(alias, row)
+
+            compact = canonical.replace(" ", "")
+            self._compact.setdefault(compact, (compact, row))
+            for token in canonical.split():
+                if token in IGNORED_TOKENS:
+                    continue
+                self._token_index.setdefault(token, set()).add(compact)
+                self._token_index.setdefault(token[:TOKEN_PREFIX_LENGTH], set()).add(compact)
+
+    def __len__(self) -> int:
+        return len(self._compact)
+
+    def match(self, brand_name: str) -> Optional[Dict]:
+        """Best matching row for a brand name, or None."""
+        if not brand_name:
+            return None
+        if brand_name in self._memo:
+            return self._memo[brand_name]
+
+        row = self._match(brand_name)
+        self._memo[brand_name] = row
+        return row
+
+    def _match(self, brand_name: str) -> Optional[Dict]:
+        normalized = normalize_brand_name(brand_name)
+        canonical = " ".join(normalized.split())
+
+        row = self._exact.get(normalized) or self._exact.get(canonical)
+        if row:
+            return row
+
+        for alias in brand_aliases(brand_name):
+            row = self._alias.get(alias)
+            if row:
+                return row
+
+        return self._fuzzy(canonical)
+
+    def _fuzzy(self, canonical: str) -> Optional[Dict]:
+        candidates: Set[str] = set()
+        for token in canonical.split():
+            if token in IGNORED_TOKENS:
+                continue
+            candidates |= self._token_index.get(token, set())
+            candidates |= self._token_index.get(token[:TOKEN_PREFIX_LENGTH], set())
+        if not candidates:
+            return None
+
+        compact = canonical.replace(" ", "")
+        best_score, best_row = 0.0, None
+        for candidate in candidates:
+            score = SequenceMatcher(None, compact, candidate).ratio()
+            if score > best_score:
+                best_score, best_row = score, self._compact[candidate][1]
+
+        return best_row if best_score >= FUZZY_MATCH_THRESHOLD else None
+
+
+class BrandRestrictionIndex:
+    """
+    Process-wide cache of global restrictions and per-supplier overrides.
+
+    Lookups compare a Redis version counter (at most one GET every
+    VERSION_CHECK_SECONDS) and reload when another process has changed
+    restrictions or overrides.
+    """
+
+    def __init__(self):
+        self._restrictions: Optional[BrandMatcher] = None
+        self._overrides: Dict[str, BrandMatcher] = {}
+        self._version: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def restrictions(self) -> BrandMatcher:
+        self._ensure_fresh()
+        if self._restrictions is None:
+            rows = self._load_all(
+                lambda: supabase.table("brand_restrictions").select(
+                    "id, brand_name, brand_name_normalized, restriction_type, category"
+                )
+            )
+            self._restrictions = BrandMatcher(rows)
+            logger.info(f"🏷️ Loaded {len(self._restrictions)} brand restrictions into memory")
+        return self._restrictions
+
+    def supplier_overrides(self, supplier_id: Optional[str]) -> Optional[BrandMatcher]:
+        if not supplier_id:
+            return None
+        self._ensure_fresh()
+        if supplier_id not in self._overrides:
+            rows = self._load_all(
+                lambda: supabase.table("supplier_brand_overrides").select(
+                    "id, supplier_id, brand_name, brand_name_normalized, override_type"
+                ).eq("supplier_id", supplier_id)
+            )
+            self._overrides[supplier_id] = BrandMatcher(rows)
+        return self._overrides[supplier_id]
+
+    def lookup(self, brand_name: str, supplier_id: Optional[str] = None) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """(global_restriction, supplier_override) for a brand."""
+        restriction = self.restrictions().match(brand_name)
+        overrides = self.supplier_overrides(supplier_id)
+        override = overrides.match(brand_name) if overrides else None
+        return restriction, override
+
+    def invalidate(self):
+        """Call after writing brand_restrictions or supplier_brand_overrides."""
+        self._clear()
+        client = get_redis_client()
+        if client:
+            try:
+                client.incr(VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"Could not bump brand restriction version: {e}")
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _clear(self):
+        self._restrictions = None
+        self._overrides = {}
+        self._loaded_at = time.time()
+
+    def _ensure_fresh(self):
+        now = time.time()
+        if self._restrictions is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return
+        self._checked_at = now
+
+        version = None
+        client = get_redis_client()
+        if client:
+            try:
+                version = client.get(VERSION_KEY)
+            except Exception:
+                pass
+
+        if version != self._version or now - self._loaded_at > INDEX_MAX_AGE_SECONDS:
+            self._clear()
+            self._version = version
+
+    def _load_all(self, build_query) -> List[Dict]:
+        """
+        Every row of the query, page by page. Raises if any page fails, so a
+        partial list is never cached (missing rows would read as unrestricted).
+        Ordered by id so the pages don't overlap or skip rows. postgrest-py
+        < 0.14 (pinned via supabase 2.0.3) treats range()'s end as exclusive.
+        """
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            try:
+                result = build_query().order("id").range(start, start + LOAD_PAGE_SIZE).execute()
+            except Exception as e:
+                logger.error(f"Failed to load brand restriction rows: {e}")
+                raise
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                break
+            start += LOAD_PAGE_SIZE
+        return rows
+
+
+# Singleton - shared by every detector in the process
+brand_restriction_index = BrandRestrictionIndex()
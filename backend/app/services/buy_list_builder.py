@@ -0,0 +1,143 @@
+"""
+Set-based buy list construction.
+
+Resolves the selected products and all their sources in one embedded query
+(per PRODUCT_CHUNK_SIZE products), picks each product's source and quantity
+in memory and writes every item with one bulk upsert. Buy list totals are
+recomputed once per statement by the buy_list_items triggers, in the same
+transaction as the insert (see database/migrations/
+ADD_BUY_LIST_STATEMENT_SUMMARY_TRIGGERS.sql).
+
+plan() is also the dry run: it returns the items and projected spend / ROI
+without writing anything.
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CHUNK_SIZE = 200  # Product IDs per query (keeps the in.() filter URL short)
+PRODUCT_COLUMNS = "id, sell_price, profit_amount, roi_percentage, margin_percentage"
+SOURCE_COLUMNS = "id, wholesale_cost, buy_cost, moq, is_active"
+
+
+def _unit_cost(source: Dict[str, Any]) -> float:
+    return float(source.get("wholesale_cost") or source.get("buy_cost") or 0)
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value else None
+
+
+class BuyListBuilder:
+    """
+    Builds buy list items for many products at once.
+
+    A selection is {"product_id", optional "product_source_id", "quantity",
+    "notes"}. Without a source the cheapest active source is used; without
+    a quantity the source's MOQ (or 1).
+    """
+
+    def plan(self, user_id: str, selections: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Items and projected totals for the selections. Nothing is written.
+
+        Returns:
+            {"items": [...], "errors": [...], "not_found": [product_id, ...],
+             "projection": {...}}
+        """
+        # Last selection wins for a product picked twice
+        by_product = {s["product_id"]: s for s in selections if s.get("product_id")}
+        products = self._load_products(user_id, list(by_product))
+
+        items, errors, not_found = [], [], []
+        for product_id, selection in by_product.items():
+            product = products.get(product_id)
+            if not product:
+                not_found.append(product_id)
+                errors.append(f"Product {product_id} not found")
+                continue
+            source = self._pick_source(product.get("sources") or [], selection.get("product_source_id"))
+            if not source:
+                errors.append(f"No active product source for product {product_id}")
+                continue
+            items.append(self._item(product, source, selection))
+
+        return {"items": items, "errors": errors, "not_found": not_found, "projection": self.project(items)}
+
+    def write(self, buy_list_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Upsert planned items into a buy list in one statement."""
+        if not items:
+            return []
+        rows = [{"buy_list_id": buy_list_id, **item} for item in items]
+        response = supabase.table("buy_list_items")\
+            .upsert(rows, on_conflict="buy_list_id,product_id,product_source_id")\
+            .execute()
+        written = response.data or []
+        logger.info(f"🛒 Wrote {len(written)} items to buy list {buy_list_id}")
+        return written
+
+    @staticmethod
+    def project(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Totals the way the buy_lists summary trigger computes them."""
+        total_cost = sum(i["total_cost"] for i in items)
+        expected_profit = sum(i["expected_profit"] or 0 for i in items)
+        return {
+            "total_products": len({i["product_id"] for i in items}),
+            "total_units": sum(i["quantity"] for i in items),
+            "total_cost": round(total_cost, 2),
+            "expected_revenue": round(sum(i["quantity"] * (i["expected_sell_price"] or 0) for i in items), 2),
+            "expected_profit": round(expected_profit, 2),
+            "expected_roi": round(expected_profit / total_cost * 100, 2) if total_cost > 0 else 0,
+        }
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    @staticmethod
+    def _load_products(user_id: str, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        products = {}
+        for i in range(0, len(product_ids), PRODUCT_CHUNK_SIZE):
+            chunk = product_ids[i:i + PRODUCT_CHUNK_SIZE]
+            response = supabase.table("products")\
+                .select(f"{PRODUCT_COLUMNS}, sources:product_sources({SOURCE_COLUMNS})")\
+                .eq("user_id", user_id)\
+                .in_("id", chunk)\
+                .execute()
+            products.update({p["id"]: p for p in response.data or []})
+        return products
+
+    @staticmethod
+    def _pick_source(sources: List[Dict[str, Any]], source_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if source_id:
+            return next((s for s in sources if s.get("id") == source_id), None)
+        active = [s for s in sources if s.get("is_active")]
+        if not active:
+            return None
+        # Cheapest priced source; unpriced sources only if nothing else
+        return min(active, key=lambda s: (_unit_cost(s) <= 0, _unit_cost(s)))
+
+    @staticmethod
+    def _item(product: Dict[str, Any], source: Dict[str, Any], selection: Dict[str, Any]) -> Dict[str, Any]:
+        quantity = max(int(selection.get("quantity") or source.get("moq") or 1), 1)
+        unit_cost = _unit_cost(source)
+        profit_amount = _optional_float(product.get("profit_amount"))
+        return {
+            "product_id": product["id"],
+            "product_source_id": source.get("id"),
+            "quantity": quantity,
+            "unit_cost": unit_cost,
+            "total_cost": round(unit_cost * quantity, 2),
+            "expected_sell_price": _optional_float(product.get("sell_price")),
+            "expected_profit": round(profit_amount * quantity, 2) if profit_amount is not None else None,
+            "expected_roi": _optional_float(product.get("roi_percentage")),
+            "expected_margin": _optional_float(product.get("margin_percentage")),
+            "notes": selection.get("notes"),
+        }
+
+
+# Singleton
+buy_list_builder = BuyListBuilder()
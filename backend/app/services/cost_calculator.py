@@ -1,9 +1,15 @@
 """
 Cost Calculator - Inbound shipping and prep cost calculations.
+
+Scalar helpers for single-product call sites. Rounding follows
+ProfitabilityEngine (fixed-point cents, half-up); batch code should call the
+engine directly.
 """
 
 from typing import Optional
 
+from app.services.profitability_engine import to_cents, DEFAULT_WEIGHT_LB
+
 
 # Weight-based inbound rates (typical for SPD/small parcel)
 WEIGHT_RATES = {
@@ -45,14 +51,15 @@ def calculate_inbound_shipping(
     
     # If no weight, estimate 0.5 lb
     if not weight_lb or weight_lb <= 0:
-        weight_lb = 0.5
+        weight_lb = DEFAULT_WEIGHT_LB
     
-    return round(weight_lb * rate, 2)
+    return int(to_cents(weight_lb * rate)) / 100
 
 
 def calculate_prep_cost(
     user_default: float = 0.10,
-    override: Optional[float] = None
+    override: Optional[float] = None,
+    assigned: Optional[float] = None
 ) -> float:
     """
     Calculate prep/labeling cost per unit.
@@ -60,13 +67,16 @@ def calculate_prep_cost(
     Args:
         user_default: User's default prep cost
         override: Per-product override
+        assigned: Per-unit cost from the product's prep center assignment
     
     Returns:
-        Prep cost per unit in dollars
+        Prep cost per unit in dollars (override, then assignment, then default)
     """
     if override is not None:
-        return round(override, 2)
-    return round(user_default, 2)
+        return int(to_cents(override)) / 100
+    if assigned is not None:
+        return int(to_cents(assigned)) / 100
+    return int(to_cents(user_default)) / 100
 
 
 def calculate_landed_cost(
@@ -79,7 +89,7 @@ def calculate_landed_cost(
     
     landed_cost = buy_cost + inbound_shipping + prep_cost
     """
-    return round(buy_cost + inbound_shipping + prep_cost, 2)
+    return int(to_cents(buy_cost) + to_cents(inbound_shipping) + to_cents(prep_cost)) / 100
 
 
 def calculate_net_profit(
@@ -92,7 +102,7 @@ def calculate_net_profit(
     
     net_profit = sell_price - fees_total - landed_cost
     """
-    return round(sell_price - fees_total - landed_cost, 2)
+    return int(to_cents(sell_price) - to_cents(fees_total) - to_cents(landed_cost)) / 100
 
 
 def calculate_roi(net_profit: float, landed_cost: float) -> float:
@@ -101,7 +111,8 @@ def calculate_roi(net_profit: float, landed_cost: float) -> float:
     
     roi = (net_profit / landed_cost) × 100
     """
-    if landed_cost <= 0:
+    landed_cents = int(to_cents(landed_cost))
+    if landed_cents <= 0:
         return 0.0
-    return round((net_profit / landed_cost) * 100, 2)
+    return round(int(to_cents(net_profit)) * 100 / landed_cents, 2)
 
@@ -0,0 +1,182 @@
+"""
+Deal listing with keyset pagination and materialized filter counts.
+
+Pages come from the list_product_deals RPC, which seeks past the last row of
+the previous page on (sort key, deal_id) instead of skipping an offset, so
+page 1,000 costs the same as page 1. Filter counts (stage, source, ASIN
+status) are read from deal_filter_counts, which triggers keep current -
+one indexed read per request instead of counting the user's deals.
+Purchase history (units bought in the last 30/60/90 days) comes from
+product_purchase_daily, summed for the page's products only.
+
+See database/migrations/ADD_DEAL_KEYSET_PAGINATION_AND_COUNTS.sql and
+ADD_PRODUCT_PURCHASE_ROLLUP.sql.
+"""
+import json
+import base64
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SORT = "deal_created_at"
+SORT_KEYS = {
+    "deal_created_at", "roi", "profit", "sell_price", "bsr",
+    "fba_seller_count", "seller_count", "asin", "title",
+}
+COUNT_BUCKET_TYPES = ("stage", "source", "asin_status")
+PURCHASE_WINDOWS = ("bought_last_30d", "bought_last_60d", "bought_last_90d")
+
+
+class InvalidCursor(ValueError):
+    """Cursor is malformed or belongs to a different sort."""
+
+
+def encode_cursor(sort: str, desc: bool, row: Dict[str, Any]) -> str:
+    payload = {"s": sort, "d": desc, "v": row.get("sort_value"), "id": row.get("deal_id")}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, desc: bool) -> Tuple[Optional[str], str]:
+    """(sort value, deal_id) of the row the previous page ended on."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, deal_id = payload.get("v"), payload["id"]
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if payload.get("s") != sort or payload.get("d") != desc:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    return value, deal_id
+
+
+class DealListing:
+    """
+    Keyset-paginated deals and O(1) filter counts for one user.
+    """
+
+    def page(
+        self,
+        user_id: str,
+        filters: Optional[Dict[str, Any]] = None,
+        sort: str = DEFAULT_SORT,
+        desc: bool = True,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        One page of deals.
+
+        Args:
+            filters: list_product_deals filters without the p_ prefix
+                (asin_status, stage, source, supplier_id, category, min_roi,
+                max_roi, min_profit, max_bsr, max_fba_sellers, amazon_sells,
+                search). None values are ignored.
+            cursor: next_cursor from the previous page
+
+        Returns:
+            {"deals": [...], "next_cursor": str or None, "has_more": bool}
+        """
+        sort = sort if sort in SORT_KEYS else DEFAULT_SORT
+        params = {f"p_{k}": v for k, v in (filters or {}).items() if v is not None}
+        params.update({
+            "p_user_id": user_id,
+            "p_sort": sort,
+            "p_sort_desc": desc,
+            "p_limit": limit + 1,  # One extra row says whether there's a next page
+        })
+        if cursor:
+            params["p_after_value"], params["p_after_id"] = decode_cursor(cursor, sort, desc)
+
+        rows = supabase.rpc("list_product_deals", params).execute().data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = encode_cursor(sort, desc, rows[-1]) if has_more else None
+        for row in rows:
+            row.pop("sort_value", None)
+
+        return {"deals": rows, "next_cursor": next_cursor, "has_more": has_more}
+
+    def counts(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        {"all": n, "stage": {...}, "source": {...}, "asin_status": {...}}, or
+        None if the counts table isn't available.
+        """
+        try:
+            result = supabase.table("deal_filter_counts")\
+                .select("bucket_type, bucket, count")\
+                .eq("user_id", user_id)\
+                .execute()
+        except Exception as e:
+            logger.warning(f"Deal filter counts unavailable: {e}")
+            return None
+
+        counts = {"all": 0, **{bucket_type: {} for bucket_type in COUNT_BUCKET_TYPES}}
+        for row in result.data or []:
+            if row["bucket_type"] == "all":
+                counts["all"] = row["count"]
+            elif row["bucket_type"] in COUNT_BUCKET_TYPES and row["count"] > 0:
+                counts[row["bucket_type"]][row["bucket"]] = row["count"]
+        return counts
+
+    def add_purchase_history(self, deals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fill bought_last_30d/60d/90d on deals that don't have them yet (rows
+        from filter_product_deals) with one read of product_purchase_rollup.
+        Products with no recent purchases, or any error, get zeros.
+        """
+        missing = [d for d in deals if PURCHASE_WINDOWS[0] not in d]
+        product_ids = list({d["product_id"] for d in missing if d.get("product_id")})
+
+        history = {}
+        if product_ids:
+            try:
+                result = supabase.table("product_purchase_rollup")\
+                    .select("product_id, " + ", ".join(PURCHASE_WINDOWS))\
+                    .in_("product_id", product_ids)\
+                    .execute()
+                history = {row["product_id"]: row for row in result.data or []}
+            except Exception as e:
+                logger.warning(f"Failed to fetch purchase history: {e}")
+
+        for deal in missing:
+            row = history.get(deal.get("product_id"), {})
+            for window in PURCHASE_WINDOWS:
+                deal[window] = row.get(window) or 0
+        return deals
+
+    @staticmethod
+    def asin_status_counts(counts: Dict[str, Any]) -> Dict[str, int]:
+        """The shape get_asin_stats returns and the products page filters use."""
+        asin_status = counts.get("asin_status") or {}
+        return {
+            "all": counts.get("all", 0),
+            "asin_found": asin_status.get("asin_found", 0),
+            "needs_selection": asin_status.get("needs_selection", 0),
+            "needs_asin": asin_status.get("needs_asin", 0),
+            "manual_entry": asin_status.get("manual_entry", 0),
+        }
+
+    @staticmethod
+    def filtered_total(counts: Optional[Dict[str, Any]], filters: Dict[str, Any]) -> Optional[int]:
+        """
+        Exact total for a filter set when it maps onto a single counted bucket
+        (no filter, asin_status only, or source only); None otherwise.
+        """
+        if counts is None:
+            return None
+        active = {k: v for k, v in filters.items() if v is not None}
+        if not active:
+            return counts.get("all", 0)
+        if len(active) == 1:
+            (key, value), = active.items()
+            if key in ("asin_status", "source"):
+                return (counts.get(key) or {}).get(value, 0)
+        return None
+
+
+# Singleton
+deal_listing = DealListing()
@@ -0,0 +1,437 @@
+"""
+Email outbox.
+
+Callers enqueue() a row into email_outbox and return; nothing talks to an
+email provider on the request path. drain() (the drain_email_outbox task)
+leases due rows, sends them concurrently through one pooled httpx client
+- using Resend's and Postmark's batch endpoints where the message allows
+it - and records every result with one complete_email_outbox call, which
+schedules retries with backoff.
+
+Per-provider pacing uses the shared Redis token buckets, so every worker
+draining the outbox stays under the same provider limit.
+
+See database/migrations/ADD_EMAIL_OUTBOX.sql.
+"""
+import os
+import uuid
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PROVIDER = os.getenv("EMAIL_PROVIDER", "resend")  # resend, sendgrid, postmark, ses
+EMAIL_API_KEY = os.getenv("EMAIL_API_KEY", "")
+EMAIL_FROM = os.getenv("EMAIL_FROM", "noreply@habexa.com")
+EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "Habexa")
+# Point every HTTP provider at one base URL, e.g. scripts/email_provider_standin.py
+EMAIL_API_BASE_URL = os.getenv("EMAIL_API_BASE_URL")
+
+CLAIM_BATCH_SIZE = 500
+LEASE_SECONDS = 300
+DRAIN_TIME_BUDGET_SECONDS = 50  # Beat runs the drain every 60s
+MAX_CONCURRENT_REQUESTS = 10
+REQUEST_TIMEOUT_SECONDS = 15
+
+# rate/burst: requests per second per provider (shared by all workers)
+PROVIDERS = {
+    "resend": {"base_url": "https://api.resend.com", "batch_size": 100, "rate": 2, "burst": 2},
+    "postmark": {"base_url": "https://api.postmarkapp.com", "batch_size": 500, "rate": 10, "burst": 10},
+    "sendgrid": {"base_url": "https://api.sendgrid.com", "batch_size": 1, "rate": 50, "burst": 50},
+    "ses": {"base_url": None, "batch_size": 1, "rate": 14, "burst": 14},
+}
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def _api_key(provider: str) -> Optional[str]:
+    """PROVIDER_API_KEY (e.g. SENDGRID_API_KEY), else EMAIL_API_KEY for the default provider."""
+    return os.getenv(f"{provider.upper()}_API_KEY") or (EMAIL_API_KEY if provider == EMAIL_PROVIDER else None)
+
+
+def _text(row: Dict[str, Any]) -> str:
+    return row.get("text_body") or (row.get("html_body") or "").replace("<br>", "\n").replace("</p>", "\n\n")
+
+
+def _sender(row: Dict[str, Any]) -> str:
+    name = row.get("from_name")
+    return f"{name} <{row['from_email']}>" if name else row["from_email"]
+
+
+def _result(row: Dict[str, Any], status: str, message_id: Optional[str] = None, error: Optional[str] = None) -> Dict:
+    return {"id": row["id"], "status": status, "provider_message_id": message_id, "error": error}
+
+
+def _failure_status(status_code: int) -> str:
+    return "retry" if status_code in RETRYABLE_STATUS_CODES else "failed"
+
+
+class EmailOutbox:
+    """
+    Enqueue emails and drain them to providers.
+    """
+
+    def __init__(self, limiters: Optional[Dict[str, Any]] = None):
+        # provider -> object with acquire_async() and penalize(); TokenBucketRateLimiter by default
+        self._limiters = limiters or {}
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def enqueue(
+        self,
+        to: str,
+        subject: str,
+        html_body: Optional[str] = None,
+        text_body: Optional[str] = None,
+        *,
+        provider: Optional[str] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+        attachments: Optional[List[Dict[str, str]]] = None,
+        idempotency_key: Optional[str] = None,
+        user_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Optional[str]:
+        """
+        Add an email to the outbox and nudge the drain worker.
+
+        attachments: [{"filename", "content" (base64), "content_type"}].
+        idempotency_key: a natural key ("welcome:{user_id}") makes enqueueing
+        the same email twice a no-op; defaults to a fresh key per call.
+
+        Returns the outbox row id, or None if the key was already queued.
+        """
+        row = {
+            "user_id": user_id,
+            "idempotency_key": idempotency_key or str(uuid.uuid4()),
+            "provider": provider or EMAIL_PROVIDER,
+            "from_email": from_email or EMAIL_FROM,
+            "from_name": EMAIL_FROM_NAME if from_name is None else from_name,
+            "to_email": to,
+            "cc_emails": cc or [],
+            "bcc_emails": bcc or [],
+            "subject": subject,
+            "html_body": html_body,
+            "text_body": text_body,
+            "attachments": attachments,
+            "context": context or {},
+        }
+        result = supabase.table("email_outbox")\
+            .upsert(row, on_conflict="idempotency_key", ignore_duplicates=True)\
+            .execute()
+        if not result.data:
+            logger.info(f"📭 Email {row['idempotency_key']} already queued")
+            return None
+
+        self._nudge()
+        return result.data[0]["id"]
+
+    async def drain(self, time_budget: float = DRAIN_TIME_BUDGET_SECONDS) -> Dict[str, int]:
+        """Claim and send due emails until the outbox is empty or the budget is spent."""
+        totals = {"claimed": 0, "sent": 0, "retry": 0, "failed": 0}
+        start = time.monotonic()
+        async with httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS),
+        ) as client:
+            while time.monotonic() - start < time_budget:
+                rows = supabase.rpc("claim_email_outbox", {
+                    "p_limit": CLAIM_BATCH_SIZE,
+                    "p_lease_seconds": LEASE_SECONDS,
+                }).execute().data or []
+                if not rows:
+                    break
+
+                results = await self.dispatch(rows, client)
+                supabase.rpc("complete_email_outbox", {"p_results": results}).execute()
+
+                totals["claimed"] += len(rows)
+                for r in results:
+                    totals[r["status"]] += 1
+                if len(rows) < CLAIM_BATCH_SIZE:
+                    break
+
+        if totals["claimed"]:
+            logger.info(f"📬 Outbox drained: {totals}")
+        return totals
+
+    async def dispatch(self, rows: List[Dict[str, Any]], client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+        """
+        Send claimed rows; one result per row. Rows are grouped per provider
+        and sent in provider batches with at most MAX_CONCURRENT_REQUESTS
+        requests in flight.
+        """
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(
+                timeout=REQUEST_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS),
+            )
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def send(provider, batch):
+            async with semaphore:
+                try:
+                    await self._acquire(provider)
+                    return await self._send(client, provider, batch)
+                except httpx.HTTPError as e:
+                    return [_result(row, "retry", error=f"{type(e).__name__}: {e}") for row in batch]
+                except Exception as e:
+                    logger.error(f"Email dispatch error ({provider}): {e}", exc_info=True)
+                    return [_result(row, "retry", error=str(e)) for row in batch]
+
+        try:
+            batches = []
+            for provider, provider_rows in self._by_provider(rows).items():
+                batches.extend((provider, b) for b in self._batches(provider, provider_rows))
+            sent = await asyncio.gather(*(send(provider, batch) for provider, batch in batches))
+        finally:
+            if own_client:
+                await client.aclose()
+
+        return [result for batch in sent for result in batch]
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _nudge(self):
+        try:
+            from app.tasks.email_outbox import drain_email_outbox
+            drain_email_outbox.delay()
+        except Exception as e:
+            # Beat drains the outbox every minute anyway
+            logger.debug(f"Could not queue outbox drain: {e}")
+
+    @staticmethod
+    def _by_provider(rows: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            grouped.setdefault(row.get("provider") or EMAIL_PROVIDER, []).append(row)
+        return grouped
+
+    @staticmethod
+    def _batches(provider: str, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        size = PROVIDERS.get(provider, {}).get("batch_size", 1)
+        if provider == "resend":
+            # Resend's batch endpoint takes no attachments
+            single = [[r] for r in rows if r.get("attachments")]
+            rows = [r for r in rows if not r.get("attachments")]
+        else:
+            single = []
+        return single + [rows[i:i + size] for i in range(0, len(rows), size)]
+
+    async def _acquire(self, provider: str):
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            from app.services.rate_limiter import TokenBucketRateLimiter
+            settings = PROVIDERS.get(provider, {"rate": 1, "burst": 1})
+            limiter = self._limiters[provider] = TokenBucketRateLimiter(
+                f"email:{provider}", rate=settings["rate"], burst=settings["burst"]
+            )
+        try:
+            await limiter.acquire_async()
+        except Exception as e:
+            logger.warning(f"Email rate limiter unavailable for {provider}, pacing locally: {e}")
+            await asyncio.sleep(1 / PROVIDERS.get(provider, {"rate": 1})["rate"])
+
+    def _penalize(self, provider: str):
+        limiter = self._limiters.get(provider)
+        if limiter is not None:
+            try:
+                limiter.penalize()
+            except Exception:
+                pass
+
+    async def _send(self, client: httpx.AsyncClient, provider: str, batch: List[Dict[str, Any]]) -> List[Dict]:
+        api_key = _api_key(provider)
+        if not api_key and provider != "ses":
+            return [_result(row, "failed", error=f"No API key configured for {provider}") for row in batch]
+
+        if provider == "resend":
+            response_rows = await self._send_resend(client, api_key, batch)
+        elif provider == "postmark":
+            response_rows = await self._send_postmark(client, api_key, batch)
+        elif provider == "sendgrid":
+            response_rows = await self._send_sendgrid(client, api_key, batch[0])
+        elif provider == "ses":
+            response_rows = [await asyncio.to_thread(self._send_ses, batch[0])]
+        else:
+            return [_result(row, "failed", error=f"Unknown email provider: {provider}") for row in batch]
+
+        if any(r["error"] and r["error"].startswith("HTTP 429") for r in response_rows):
+            self._penalize(provider)
+        return response_rows
+
+    @staticmethod
+    def _url(provider: str, path: str) -> str:
+        return f"{EMAIL_API_BASE_URL or PROVIDERS[provider]['base_url']}{path}"
+
+    async def _send_resend(self, client: httpx.AsyncClient, api_key: str, batch: List[Dict[str, Any]]) -> List[Dict]:
+        def payload(row):
+            message = {
+                "from": _sender(row),
+                "to": [row["to_email"]],
+                "subject": row["subject"],
+                "html": row.get("html_body"),
+                "text": _text(row),
+            }
+            if row.get("cc_emails"):
+                message["cc"] = row["cc_emails"]
+            if row.get("bcc_emails"):
+                message["bcc"] = row["bcc_emails"]
+            if row.get("attachments"):
+                message["attachments"] = [
+                    {"filename": a["filename"], "content": a["content"]} for a in row["attachments"]
+                ]
+            return message
+
+        headers = {"Authorization": f"Bearer {api_key}"}
+        if len(batch) == 1:
+            row = batch[0]
+            response = await client.post(
+                self._url("resend", "/emails"), json=payload(row),
+                headers={**headers, "Idempotency-Key": row["idempotency_key"]},
+            )
+            if response.status_code == 200:
+                return [_result(row, "sent", response.json().get("id"))]
+            return [_result(row, _failure_status(response.status_code),
+                            error=f"HTTP {response.status_code}: {response.text[:200]}")]
+
+        batch_key = hashlib.sha256("|".join(sorted(r["idempotency_key"] for r in batch)).encode()).hexdigest()
+        response = await client.post(
+            self._url("resend", "/emails/batch"), json=[payload(r) for r in batch],
+            headers={**headers, "Idempotency-Key": batch_key},
+        )
+        if response.status_code == 200:
+            ids = [d.get("id") for d in response.json().get("data") or []]
+            return [_result(row, "sent", ids[i] if i < len(ids) else None) for i, row in enumerate(batch)]
+        if response.status_code in (400, 422):
+            # One bad message rejects the whole batch - send individually to isolate it
+            results = []
+            for row in batch:
+                await self._acquire("resend")
+                results.extend(await self._send_resend(client, api_key, [row]))
+            return results
+        return [_result(row, _failure_status(response.status_code),
+                        error=f"HTTP {response.status_code}: {response.text[:200]}") for row in batch]
+
+    async def _send_postmark(self, client: httpx.AsyncClient, api_key: str, batch: List[Dict[str, Any]]) -> List[Dict]:
+        def payload(row):
+            message = {
+                "From": _sender(row),
+                "To": row["to_email"],
+                "Subject": row["subject"],
+                "HtmlBody": row.get("html_body"),
+                "TextBody": _text(row),
+                "Metadata": {"idempotency_key": row["idempotency_key"]},
+            }
+            if row.get("cc_emails"):
+                message["Cc"] = ",".join(row["cc_emails"])
+            if row.get("bcc_emails"):
+                message["Bcc"] = ",".join(row["bcc_emails"])
+            if row.get("attachments"):
+                message["Attachments"] = [
+                    {"Name": a["filename"], "Content": a["content"], "ContentType": a.get("content_type")}
+                    for a in row["attachments"]
+                ]
+            return message
+
+        response = await client.post(
+            self._url("postmark", "/email/batch"), json=[payload(r) for r in batch],
+            headers={"X-Postmark-Server-Token": api_key, "Accept": "application/json"},
+        )
+        if response.status_code != 200:
+            return [_result(row, _failure_status(response.status_code),
+                            error=f"HTTP {response.status_code}: {response.text[:200]}") for row in batch]
+
+        results = []
+        for row, item in zip(batch, response.json()):
+            if item.get("ErrorCode") == 0:
+                results.append(_result(row, "sent", item.get("MessageID")))
+            else:
+                results.append(_result(row, "failed", error=f"Postmark {item.get('ErrorCode')}: {item.get('Message')}"))
+        return results
+
+    async def _send_sendgrid(self, client: httpx.AsyncClient, api_key: str, row: Dict[str, Any]) -> List[Dict]:
+        personalization = {"to": [{"email": row["to_email"]}]}
+        if row.get("cc_emails"):
+            personalization["cc"] = [{"email": e} for e in row["cc_emails"]]
+        if row.get("bcc_emails"):
+            personalization["bcc"] = [{"email": e} for e in row["bcc_emails"]]
+        message = {
+            "personalizations": [personalization],
+            "from": {"email": row["from_email"], "name": row.get("from_name")},
+            "subject": row["subject"],
+            "content": [{"type": "text/plain", "value": _text(row)}]
+            + ([{"type": "text/html", "value": row["html_body"]}] if row.get("html_body") else []),
+            "custom_args": {"idempotency_key": row["idempotency_key"]},
+        }
+        if row.get("attachments"):
+            message["attachments"] = [
+                {"filename": a["filename"], "content": a["content"], "type": a.get("content_type"),
+                 "disposition": "attachment"}
+                for a in row["attachments"]
+            ]
+
+        response = await client.post(
+            self._url("sendgrid", "/v3/mail/send"), json=message,
+            headers={"Authorization": f"Bearer {api_key}"},
+        )
+        if response.status_code == 202:
+            return [_result(row, "sent", response.headers.get("X-Message-Id"))]
+        return [_result(row, _failure_status(response.status_code),
+                        error=f"HTTP {response.status_code}: {response.text[:200]}")]
+
+    @staticmethod
+    def _send_ses(row: Dict[str, Any]) -> Dict:
+        """boto3 is synchronous - dispatch runs this in a thread."""
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            return _result(row, "failed", error="boto3 not installed")
+
+        ses = boto3.client(
+            'ses',
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("AWS_REGION", "us-east-1")
+        )
+        if row.get("attachments"):
+            return _result(row, "failed", error="SES attachments need send_raw_email, not supported")
+        try:
+            response = ses.send_email(
+                Source=_sender(row),
+                Destination={
+                    "ToAddresses": [row["to_email"]],
+                    "CcAddresses": row.get("cc_emails") or [],
+                    "BccAddresses": row.get("bcc_emails") or [],
+                },
+                Message={
+                    "Subject": {"Data": row["subject"], "Charset": "UTF-8"},
+                    "Body": {
+                        "Html": {"Data": row.get("html_body") or "", "Charset": "UTF-8"},
+                        "Text": {"Data": _text(row), "Charset": "UTF-8"}
+                    }
+                }
+            )
+            return _result(row, "sent", response["MessageId"])
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "")
+            return _result(row, "retry" if code in ("Throttling", "ServiceUnavailable") else "failed", error=str(e))
+
+
+# Singleton
+email_outbox = EmailOutbox()
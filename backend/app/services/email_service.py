@@ -2,22 +2,18 @@
 Email service for sending transactional emails.
 Supports multiple providers: Resend, SendGrid, Postmark, SES.
 
-Set EMAIL_PROVIDER and EMAIL_API_KEY in environment variables.
+Set EMAIL_PROVIDER and EMAIL_API_KEY in environment variables. Emails go
+through the outbox (app/services/email_outbox.py), never inline.
 """
-import os
 import logging
 from typing import Optional
 from datetime import datetime
 from app.core.config import settings
 from app.services.supabase_client import supabase
+from app.services.email_outbox import email_outbox, EMAIL_PROVIDER, _api_key
 
 logger = logging.getLogger(__name__)
 
-EMAIL_PROVIDER = os.getenv("EMAIL_PROVIDER", "resend")  # resend, sendgrid, postmark, ses
-EMAIL_API_KEY = os.getenv("EMAIL_API_KEY", "")
-EMAIL_FROM = os.getenv("EMAIL_FROM", "noreply@habexa.com")
-EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "Habexa")
-
 
 class EmailService:
     """Email service with provider abstraction."""
@@ -27,163 +23,29 @@ class EmailService:
         to: str,
         subject: str,
         html_body: str,
-        text_body: Optional[str] = None
+        text_body: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> bool:
         """
-        Send email using configured provider.
+        Queue email for the configured provider (see email_outbox).
         
-        Returns True if sent successfully, False otherwise.
+        Returns True if queued (or already queued under idempotency_key),
+        False otherwise. Delivery and retries happen in drain_email_outbox.
         """
-        if not EMAIL_API_KEY:
+        if not _api_key(EMAIL_PROVIDER):
             logger.warning("EMAIL_API_KEY not configured. Email not sent.")
             return False
         
         try:
-            if EMAIL_PROVIDER == "resend":
-                return await EmailService._send_resend(to, subject, html_body, text_body)
-            elif EMAIL_PROVIDER == "sendgrid":
-                return await EmailService._send_sendgrid(to, subject, html_body, text_body)
-            elif EMAIL_PROVIDER == "postmark":
-                return await EmailService._send_postmark(to, subject, html_body, text_body)
-            elif EMAIL_PROVIDER == "ses":
-                return await EmailService._send_ses(to, subject, html_body, text_body)
-            else:
-                logger.error(f"Unknown email provider: {EMAIL_PROVIDER}")
-                return False
-        except Exception as e:
-            logger.error(f"Failed to send email to {to}: {e}", exc_info=True)
-            return False
-    
-    @staticmethod
-    async def _send_resend(to: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
-        """Send email via Resend API."""
-        try:
-            import httpx
-            
-            response = httpx.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {EMAIL_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "from": f"{EMAIL_FROM_NAME} <{EMAIL_FROM}>",
-                    "to": [to],
-                    "subject": subject,
-                    "html": html_body,
-                    "text": text_body or html_body.replace("<br>", "\n").replace("</p>", "\n\n")
-                },
-                timeout=10
+            email_outbox.enqueue(
+                to, subject, html_body, text_body,
+                idempotency_key=idempotency_key,
+                user_id=user_id
             )
-            
-            if response.status_code == 200:
-                logger.info(f"Email sent via Resend to {to}")
-                return True
-            else:
-                logger.error(f"Resend API error: {response.status_code} - {response.text}")
-                return False
-        except ImportError:
-            logger.error("httpx not installed. Install with: pip install httpx")
-            return False
-    
-    @staticmethod
-    async def _send_sendgrid(to: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
-        """Send email via SendGrid API."""
-        try:
-            import httpx
-            
-            response = httpx.post(
-                "https://api.sendgrid.com/v3/mail/send",
-                headers={
-                    "Authorization": f"Bearer {EMAIL_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "personalizations": [{"to": [{"email": to}]}],
-                    "from": {"email": EMAIL_FROM, "name": EMAIL_FROM_NAME},
-                    "subject": subject,
-                    "content": [
-                        {"type": "text/html", "value": html_body}
-                    ] + ([{"type": "text/plain", "value": text_body}] if text_body else [])
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 202:
-                logger.info(f"Email sent via SendGrid to {to}")
-                return True
-            else:
-                logger.error(f"SendGrid API error: {response.status_code} - {response.text}")
-                return False
-        except ImportError:
-            logger.error("httpx not installed. Install with: pip install httpx")
-            return False
-    
-    @staticmethod
-    async def _send_postmark(to: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
-        """Send email via Postmark API."""
-        try:
-            import httpx
-            
-            response = httpx.post(
-                "https://api.postmarkapp.com/email",
-                headers={
-                    "X-Postmark-Server-Token": EMAIL_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "From": f"{EMAIL_FROM_NAME} <{EMAIL_FROM}>",
-                    "To": to,
-                    "Subject": subject,
-                    "HtmlBody": html_body,
-                    "TextBody": text_body or html_body.replace("<br>", "\n").replace("</p>", "\n\n")
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"Email sent via Postmark to {to}")
-                return True
-            else:
-                logger.error(f"Postmark API error: {response.status_code} - {response.text}")
-                return False
-        except ImportError:
-            logger.error("httpx not installed. Install with: pip install httpx")
-            return False
-    
-    @staticmethod
-    async def _send_ses(to: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
-        """Send email via AWS SES."""
-        try:
-            import boto3
-            from botocore.exceptions import ClientError
-            
-            ses = boto3.client(
-                'ses',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name=os.getenv("AWS_REGION", "us-east-1")
-            )
-            
-            response = ses.send_email(
-                Source=f"{EMAIL_FROM_NAME} <{EMAIL_FROM}>",
-                Destination={"ToAddresses": [to]},
-                Message={
-                    "Subject": {"Data": subject, "Charset": "UTF-8"},
-                    "Body": {
-                        "Html": {"Data": html_body, "Charset": "UTF-8"},
-                        "Text": {"Data": text_body or html_body.replace("<br>", "\n").replace("</p>", "\n\n"), "Charset": "UTF-8"}
-                    }
-                }
-            )
-            
-            logger.info(f"Email sent via SES to {to}: {response['MessageId']}")
             return True
-        except ImportError:
-            logger.error("boto3 not installed. Install with: pip install boto3")
-            return False
-        except ClientError as e:
-            logger.error(f"SES error: {e}")
+        except Exception as e:
+            logger.error(f"Failed to queue email to {to}: {e}", exc_info=True)
             return False
     
     @staticmethod
@@ -233,7 +95,11 @@ class EmailService:
             </html>
             """
             
-            return await EmailService.send_email(email, subject, html_body)
+            return await EmailService.send_email(
+                email, subject, html_body,
+                idempotency_key=f"trial_ending:{user_id}:{trial_end_date.date().isoformat()}",
+                user_id=user_id
+            )
         except Exception as e:
             logger.error(f"Failed to send trial ending email: {e}", exc_info=True)
             return False
@@ -280,7 +146,11 @@ class EmailService:
             </html>
             """
             
-            return await EmailService.send_email(email, subject, html_body)
+            return await EmailService.send_email(
+                email, subject, html_body,
+                idempotency_key=f"payment_failed:{user_id}:{datetime.utcnow().date().isoformat()}",
+                user_id=user_id
+            )
         except Exception as e:
             logger.error(f"Failed to send payment failed email: {e}", exc_info=True)
             return False
@@ -327,7 +197,11 @@ class EmailService:
             </html>
             """
             
-            return await EmailService.send_email(email, subject, html_body)
+            return await EmailService.send_email(
+                email, subject, html_body,
+                idempotency_key=f"subscription_cancelled:{user_id}:{datetime.utcnow().date().isoformat()}",
+                user_id=user_id
+            )
         except Exception as e:
             logger.error(f"Failed to send cancellation email: {e}", exc_info=True)
             return False
@@ -372,7 +246,11 @@ class EmailService:
             </html>
             """
             
-            return await EmailService.send_email(email, subject, html_body)
+            return await EmailService.send_email(
+                email, subject, html_body,
+                idempotency_key=f"welcome:{user_id}",
+                user_id=user_id
+            )
         except Exception as e:
             logger.error(f"Failed to send welcome email: {e}", exc_info=True)
             return False
@@ -0,0 +1,265 @@
+"""
+Local FBA fee engine.
+
+Computes referral and fulfillment fees from price, category, dimensions and
+weight using the versioned schedules in app/config/fee_schedules.py, so
+BatchAnalyzer only sends SP-API getMyFeesEstimate (0.5 req/s) the items the
+engine isn't sure about.
+
+Calibration: every SP-API fee result for an item we also estimated locally
+is recorded per (schedule version, size tier) in Redis. When a tier drifts
+past DRIFT_TOLERANCE its estimates drop to low confidence, which routes
+those items back to SP-API until the schedule is updated. A small daily
+sample of high-confidence items also goes to SP-API so drift is noticed.
+"""
+import time
+import hashlib
+import logging
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config.fee_schedules import get_fee_schedule
+from app.services.profit_calculator import get_referral_rate, estimate_fba_fee
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_THRESHOLD = 0.7  # Below this, ask SP-API
+CALIBRATION_SAMPLE_RATE = 0.02  # Share of confident items also sent to SP-API
+DRIFT_TOLERANCE = 0.15  # Mean absolute error (USD) per tier before we stop trusting it
+DRIFT_MIN_SAMPLES = 20
+DRIFT_CACHE_SECONDS = 60
+BAND_EDGE_LB = 1 / 32  # Half an ounce - packaging can push an item into the next band
+DIMENSION_EDGE_IN = 0.25
+
+GRAMS_PER_LB = 453.592
+MM_PER_IN = 25.4
+
+
+def item_dimensions(keepa_product: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Weight (lb) and package dimensions (in) from a parsed Keepa product."""
+    def mm_to_in(value):
+        return round(value / MM_PER_IN, 2) if value and value > 0 else None
+
+    weight_g = keepa_product.get("package_weight")
+    return {
+        "weight_lb": round(weight_g / GRAMS_PER_LB, 3) if weight_g and weight_g > 0 else None,
+        "length_in": mm_to_in(keepa_product.get("package_length")),
+        "width_in": mm_to_in(keepa_product.get("package_width")),
+        "height_in": mm_to_in(keepa_product.get("package_height")),
+    }
+
+
+class FBAFeeEngine:
+    """
+    Deterministic fee estimates from a versioned fee schedule.
+    """
+
+    def __init__(self, schedule_version: Optional[str] = None):
+        self.schedule = get_fee_schedule(schedule_version)
+        self.version = self.schedule["version"]
+        self._drift: Dict[str, Dict[str, float]] = {}
+        self._drift_loaded_at = 0.0
+
+    # ==========================================
+    # FEES
+    # ==========================================
+
+    def size_tier(self, weight_lb: float, dims: List[float]) -> Tuple[str, bool]:
+        """(tier name, near_boundary) for unit weight and sorted dims (longest first)."""
+        longest, median, shortest = dims
+        for tier in self.schedule["size_tiers"]:
+            if tier["longest"] is None:
+                return tier["name"], False
+            fits = (
+                longest <= tier["longest"] and median <= tier["median"]
+                and shortest <= tier["shortest"] and weight_lb <= tier["max_weight_lb"]
+            )
+            if fits:
+                near = (
+                    tier["longest"] - longest < DIMENSION_EDGE_IN
+                    or tier["median"] - median < DIMENSION_EDGE_IN
+                    or tier["shortest"] - shortest < DIMENSION_EDGE_IN
+                    or tier["max_weight_lb"] - weight_lb < BAND_EDGE_LB
+                )
+                return tier["name"], near
+        return self.schedule["size_tiers"][-1]["name"], False
+
+    def shipping_weight(self, tier: str, weight_lb: float, dims: List[float]) -> float:
+        if tier not in self.schedule["dimensional_weight_tiers"]:
+            return weight_lb
+        longest, median, shortest = dims
+        if tier != "Small Standard" and tier != "Large Standard":
+            # Bulky tiers use a 2" minimum for width/height in dimensional weight
+            median, shortest = max(median, 2), max(shortest, 2)
+        dimensional = longest * median * shortest / self.schedule["dimensional_weight_divisor"]
+        return max(weight_lb, dimensional)
+
+    def fulfillment_fee(self, tier: str, shipping_weight_lb: float, price: float) -> Tuple[float, bool]:
+        """(fee, near_band_edge)."""
+        table = self.schedule["fulfillment"][tier]
+        bands = table["bands"]
+        near_edge = False
+
+        fee = None
+        for max_weight, band_fee in bands:
+            if shipping_weight_lb <= max_weight:
+                fee = band_fee
+                near_edge = max_weight - shipping_weight_lb < BAND_EDGE_LB
+                break
+        if fee is None:
+            last_weight, last_fee = bands[-1]
+            fee = last_fee + (shipping_weight_lb - last_weight) * table["per_lb_over"]
+
+        for adjustment in self.schedule.get("price_adjustments", []):
+            if "max_price" in adjustment and price < adjustment["max_price"]:
+                fee += adjustment["amount"]
+            elif "min_price" in adjustment and price > adjustment["min_price"]:
+                fee += adjustment["amount"]
+
+        return round(max(fee, 0), 2), near_edge
+
+    def referral_fee(self, price: float, category: Optional[str]) -> Tuple[float, float, bool]:
+        """(fee, rate, category_known)."""
+        referral = self.schedule["referral"]
+        rate = None
+        known = False
+
+        if category:
+            for name, bands in referral["categories"].items():
+                if name.lower() in category.lower():
+                    for up_to, band_rate in bands:
+                        if up_to is None or price <= up_to:
+                            rate = band_rate
+                            break
+                    known = True
+                    break
+
+        if rate is None:
+            rate = get_referral_rate(category) if category else referral["default_rate"]
+
+        fee = max(price * rate, referral["minimum_fee"])
+        return round(fee, 2), rate, known
+
+    def estimate(
+        self,
+        price: float,
+        category: Optional[str] = None,
+        weight_lb: Optional[float] = None,
+        length_in: Optional[float] = None,
+        width_in: Optional[float] = None,
+        height_in: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Local fee estimate with a 0-1 confidence.
+
+        Returns the same keys get_fees_estimate_batch() gives per ASIN
+        (total, referral_fee, fba_fulfillment_fee) plus size_tier,
+        referral_rate, confidence and schedule_version.
+        """
+        referral_fee, referral_rate, category_known = self.referral_fee(price, category)
+        confidence = 1.0
+        tier = None
+
+        if weight_lb and length_in and width_in and height_in:
+            dims = sorted([length_in, width_in, height_in], reverse=True)
+            tier, near_tier_edge = self.size_tier(weight_lb, dims)
+            ship_weight = self.shipping_weight(tier, weight_lb, dims)
+            fba_fee, near_band_edge = self.fulfillment_fee(tier, ship_weight, price)
+            if near_tier_edge or near_band_edge:
+                confidence -= 0.35
+        else:
+            # No dimensions - price-based guess only
+            fba_fee = estimate_fba_fee(price)
+            confidence = 0.3
+
+        if not category_known:
+            # Referral rate is a guess (often no category from Keepa) - always check with SP-API
+            confidence = min(confidence - 0.2, CONFIDENCE_THRESHOLD - 0.1)
+
+        if tier and self._tier_drifted(tier):
+            confidence = min(confidence, 0.5)
+
+        return {
+            "total": round(referral_fee + fba_fee, 2),
+            "referral_fee": referral_fee,
+            "fba_fulfillment_fee": fba_fee,
+            "referral_rate": referral_rate,
+            "size_tier": tier,
+            "confidence": round(max(confidence, 0.0), 2),
+            "schedule_version": self.version,
+        }
+
+    # ==========================================
+    # ROUTING / CALIBRATION
+    # ==========================================
+
+    def needs_sp_api(self, asin: str, estimate: Dict[str, Any]) -> bool:
+        """Low confidence, or picked for today's calibration sample."""
+        return estimate["confidence"] < CONFIDENCE_THRESHOLD or self.in_calibration_sample(asin)
+
+    @staticmethod
+    def in_calibration_sample(asin: str, on: Optional[date] = None) -> bool:
+        # Deterministic per ASIN per day, so the sample rotates daily
+        key = f"{asin}:{(on or date.today()).isoformat()}".encode()
+        bucket = int(hashlib.md5(key).hexdigest()[:8], 16) % 10000
+        return bucket < CALIBRATION_SAMPLE_RATE * 10000
+
+    def record_calibration(self, pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """
+        Record (local_estimate, sp_api_fees) pairs - one Redis round trip.
+        """
+        client = get_redis_client()
+        if not client or not pairs:
+            return
+        try:
+            pipe = client.pipeline()
+            for local, remote in pairs:
+                if not local.get("size_tier") or not remote.get("total"):
+                    continue
+                error = float(local["total"]) - float(remote["total"])
+                key = f"fee_engine:drift:{self.version}:{local['size_tier']}"
+                pipe.hincrby(key, "count", 1)
+                pipe.hincrbyfloat(key, "sum_error", error)
+                pipe.hincrbyfloat(key, "sum_abs_error", abs(error))
+                pipe.expire(key, 30 * 86400)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not record fee calibration: {e}")
+
+    def get_drift(self) -> Dict[str, Dict[str, float]]:
+        """Per size tier: samples, mean error (local - SP-API) and mean absolute error."""
+        if time.time() - self._drift_loaded_at < DRIFT_CACHE_SECONDS:
+            return self._drift
+
+        drift = {}
+        client = get_redis_client()
+        if client:
+            try:
+                for tier in self.schedule["fulfillment"]:
+                    raw = client.hgetall(f"fee_engine:drift:{self.version}:{tier}") or {}
+                    count = int(float(raw.get("count", 0)))
+                    if not count:
+                        continue
+                    drift[tier] = {
+                        "samples": count,
+                        "mean_error": round(float(raw.get("sum_error", 0)) / count, 3),
+                        "mean_abs_error": round(float(raw.get("sum_abs_error", 0)) / count, 3),
+                        "drifted": (
+                            count >= DRIFT_MIN_SAMPLES
+                            and float(raw.get("sum_abs_error", 0)) / count > DRIFT_TOLERANCE
+                        ),
+                    }
+            except Exception as e:
+                logger.warning(f"Could not read fee calibration drift: {e}")
+
+        self._drift = drift
+        self._drift_loaded_at = time.time()
+        return drift
+
+    def _tier_drifted(self, tier: str) -> bool:
+        return bool(self.get_drift().get(tier, {}).get("drifted"))
+
+
+# Singleton - schedule chosen at import; restart workers to pick up a new version
+fba_fee_engine = FBAFeeEngine()
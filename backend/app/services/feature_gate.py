@@ -4,6 +4,7 @@ from fastapi import HTTPException, Depends
 import logging
 
 from app.services.supabase_client import supabase
+from app.services.usage_meter import usage_meter
 from app.api.deps import get_current_user
 from app.config.tiers import TIER_LIMITS, SUPER_ADMIN_EMAILS, is_super_admin, get_tier_limits
 
@@ -117,6 +118,11 @@ class FeatureGate:
     async def _get_usage(user_id: str, feature: str) -> int:
         """Get current usage for a feature."""
         
+        if usage_meter.is_metered(feature):
+            used = usage_meter.get_used(user_id, feature)
+            if used is not None:
+                return used
+        
         if feature == "analyses_per_month":
             result = supabase.table("subscriptions")\
                 .select("analyses_used_this_period")\
@@ -155,6 +161,9 @@ class FeatureGate:
         DOES NOT INCREMENT FOR SUPER ADMINS.
         First checks if allowed, then increments.
         
+        Metered features (usage_meter.METERED_FEATURES) do the check and the
+        increment in one Redis call; Postgres is updated by the flush task.
+        
         Args:
             user: User object with .id and .email attributes
             feature: Feature name
@@ -173,6 +182,11 @@ class FeatureGate:
                 "reason": "super_admin"
             }
         
+        if usage_meter.is_metered(feature):
+            metered = usage_meter.consume(user, feature, amount)
+            if metered is not None:
+                return FeatureGate._metered_result(feature, amount, metered)
+        
         # Check limit first
         user_id = str(user.id)
         check = await FeatureGate.check_limit(user, feature)
@@ -229,9 +243,45 @@ class FeatureGate:
         }
     
     @staticmethod
-    async def decrement_usage(user_id: str, feature: str, amount: int = 1):
-        """Decrement usage (when removing channels, etc.)."""
+    def _metered_result(feature: str, amount: int, metered: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a usage_meter.consume() result like the database path's response."""
+        limit, used = metered["limit"], metered["used"]
+        unlimited = limit == -1
+        
+        if not metered["allowed"]:
+            return {
+                "success": False,
+                "error": "limit_reached",
+                "message": f"You've reached your {feature.replace('_', ' ')} limit. Please upgrade.",
+                "check": {
+                    "allowed": False,
+                    "feature": feature,
+                    "limit": limit,
+                    "used": used,
+                    "remaining": max(0, limit - used),
+                    "unlimited": False,
+                    "upgrade_required": True
+                }
+            }
+        
+        return {
+            "success": True,
+            "feature": feature,
+            "incremented_by": amount,
+            "used": used,
+            "remaining": -1 if unlimited else max(0, limit - used),
+            "skipped": False
+        }
+    
+    @staticmethod
+    async def decrement_usage(user, feature: str, amount: int = 1):
+        """Decrement usage (when removing channels, etc.). Accepts a user object or id."""
+        
+        if usage_meter.is_metered(feature) and hasattr(user, "id"):
+            if usage_meter.consume(user, feature, -amount, enforce_limit=False) is not None:
+                return
         
+        user_id = str(getattr(user, "id", user))
         try:
             supabase.rpc("decrement_usage", {
                 "p_user_id": user_id,
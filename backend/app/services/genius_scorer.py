@@ -11,6 +11,8 @@ from decimal import Decimal
 from datetime import datetime, timedelta
 import statistics
 
+from app.services.sales_velocity_model import sales_velocity_model
+
 logger = logging.getLogger(__name__)
 
 
@@ -374,16 +376,8 @@ class GeniusScorer:
         return None
     
     def _estimate_sales_from_rank(self, sales_rank: int, category: str) -> float:
-        """Estimate sales from sales rank using category-specific formulas."""
-        formulas = {
-            'Grocery & Gourmet Food': lambda r: 50000 / (r ** 0.65) if r > 0 else 0,
-            'Health & Household': lambda r: 45000 / (r ** 0.63) if r > 0 else 0,
-            'Beauty & Personal Care': lambda r: 40000 / (r ** 0.62) if r > 0 else 0,
-            'Home & Kitchen': lambda r: 55000 / (r ** 0.67) if r > 0 else 0,
-        }
-        
-        formula = formulas.get(category, formulas['Grocery & Gourmet Food'])
-        return max(0, formula(sales_rank))
+        """Estimate sales from sales rank using the fitted category curve."""
+        return float(sales_velocity_model.estimate_monthly_units(sales_rank, category) or 0)
     
     def _score_sales_velocity(self, monthly_sales: float) -> float:
         """Score sales velocity (10 points max)."""
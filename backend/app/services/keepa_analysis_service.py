@@ -1,7 +1,13 @@
 """
 Keepa Analysis Service for TOP PRODUCTS stage.
 Runs detailed Keepa API analysis when products reach TOP PRODUCTS stage.
+
+analyze_product() handles one ASIN with two Keepa calls. analyze_batch()
+is the batch mode: one /product request per 100 ASINs (history, 12-month
+stats and offers together), worst-case profit for the whole set in one
+profitability_engine pass, and one upsert into keepa_analysis.
 """
+import time
 import asyncio
 import httpx
 import logging
@@ -9,6 +15,8 @@ import os
 from typing import Dict, Optional, List, Any
 from datetime import datetime, timedelta
 from app.services.supabase_client import supabase
+from app.services.profitability_engine import profitability_engine
+from app.services.keepa_client import get_keepa_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +26,16 @@ KEEPA_API_URL = "https://api.keepa.com"
 # Keepa epoch: January 1, 2011
 KEEPA_EPOCH = datetime(2011, 1, 1)
 
+# Shipping per unit assumed in worst-case profit
+WORST_CASE_SHIPPING_ESTIMATE = 0.50
+
+# keepa_analysis columns written by the batch mode
+ANALYSIS_COLUMNS = (
+    "lowest_fba_price_12m", "lowest_fba_date", "lowest_fba_seller",
+    "current_fba_price", "current_fbm_price", "fba_seller_count", "fbm_seller_count",
+    "current_sales_rank", "avg_sales_rank_90d", "price_range_12m", "price_volatility",
+)
+
 
 class KeepaAnalysisService:
     """
@@ -68,6 +86,132 @@ class KeepaAnalysisService:
         logger.info(f"✅ Keepa analysis complete for {asin}")
         return analysis
     
+    # ==========================================
+    # BATCH MODE
+    # ==========================================
+    
+    async def analyze_batch(self, asins: List[str]) -> Dict[str, Any]:
+        """
+        Keepa analysis for many ASINs, 100 per request.
+        
+        Uses the shared KeepaClient, so requests are paced by its token
+        budget and retried on 429/5xx. Nothing is stored - see store_batch().
+        
+        Returns:
+            {
+                "analyses": {asin: analysis},  # Same shape as analyze_product()
+                "missing": [asins Keepa returned nothing for],
+                "tokens_used": int,
+                "requests": int,
+                "seconds": float
+            }
+        """
+        if not self.api_key:
+            raise ValueError("KEEPA_API_KEY not set")
+        
+        asins = list(dict.fromkeys(a for a in asins if a))
+        started = time.monotonic()
+        analyses = {}
+        tokens_used = 0
+        requests = 0
+        
+        logger.info(f"🔍 Starting batch Keepa analysis for {len(asins)} ASINs")
+        
+        # stats=365 for 12-month lows; the client always asks for history and 20 offers
+        async for chunk in get_keepa_client().iter_products_batches(asins, days=365, return_raw=True):
+            requests += 1
+            tokens_used += (chunk.get("raw_response") or {}).get("tokensConsumed") or 0
+            for product in chunk.get("products") or []:
+                asin = product.get("asin") if product else None
+                if asin:
+                    # One response carries what the basic and offers calls fetch separately
+                    basic = {k: v for k, v in product.items() if k != "offers"}
+                    analyses[asin] = self._parse_analysis(asin, basic, product)
+        
+        seconds = round(time.monotonic() - started, 3)
+        logger.info(f"✅ Batch Keepa analysis: {len(analyses)}/{len(asins)} ASINs, "
+                    f"{requests} requests, {tokens_used} tokens, {seconds:.1f}s")
+        return {
+            "analyses": analyses,
+            "missing": [a for a in asins if a not in analyses],
+            "tokens_used": tokens_used,
+            "requests": requests,
+            "seconds": seconds,
+        }
+    
+    def calculate_worst_case_batch(self, lowest_fba_prices: List[Optional[float]], supplier_costs: List[float], fba_fees: List[float]) -> List[Dict[str, Any]]:
+        """
+        calculate_worst_case_profit() for n products in one profitability_engine
+        pass. Products without a 12-month low get the same empty result.
+        """
+        if not lowest_fba_prices:
+            return []
+        
+        lows = [p if p and p > 0 else 0.0 for p in lowest_fba_prices]
+        fees = [f or 0 for f in fba_fees]
+        result = profitability_engine.compute(
+            sell_price=lows,
+            fees_total=fees,
+            buy_cost=[c or 0 for c in supplier_costs],
+            prep_cost=[0] * len(lows),
+            inbound_shipping=[WORST_CASE_SHIPPING_ESTIMATE] * len(lows),
+            worst_case_price=lows,
+            worst_case_fees=fees,
+        )
+        
+        worst_cases = []
+        for low, calc in zip(lows, profitability_engine.rows(result)):
+            if not low:
+                worst_cases.append({
+                    "worst_case_profit": None,
+                    "worst_case_margin": None,
+                    "still_profitable": False,
+                    "revenue": None,
+                    "total_costs": None
+                })
+                continue
+            worst_cases.append({
+                "worst_case_profit": calc["worst_case_profit"],
+                "worst_case_margin": calc["worst_case_margin"],
+                "still_profitable": calc["worst_case_profit"] > 0,
+                "revenue": calc["worst_case_price"],
+                "total_costs": calc["break_even_price"],
+            })
+        return worst_cases
+    
+    def store_batch(self, analyses: Dict[str, Dict[str, Any]], worst_cases: Optional[Dict[str, Dict[str, Any]]] = None) -> int:
+        """
+        Upsert raw responses, parsed metrics and worst-case profit for every
+        analyzed ASIN into keepa_analysis in one request.
+        """
+        if not analyses:
+            return 0
+        worst_cases = worst_cases or {}
+        now = datetime.utcnow().isoformat()
+        
+        rows = []
+        for asin, analysis in analyses.items():
+            worst_case = worst_cases.get(asin) or {}
+            rows.append({
+                "asin": asin,
+                "raw_basic_response": analysis.get("raw_basic_response"),
+                "raw_offers_response": analysis.get("raw_offers_response"),
+                **{column: analysis.get(column) for column in ANALYSIS_COLUMNS},
+                "worst_case_profit": worst_case.get("worst_case_profit"),
+                "worst_case_margin": worst_case.get("worst_case_margin"),
+                "still_profitable": worst_case.get("still_profitable"),
+                "analyzed_at": now,
+                "updated_at": now,
+            })
+        
+        supabase.table("keepa_analysis").upsert(rows, on_conflict="asin").execute()
+        logger.info(f"💾 Stored Keepa analysis for {len(rows)} ASINs")
+        return len(rows)
+    
+    # ==========================================
+    # KEEPA CALLS (single product)
+    # ==========================================
+    
     async def _get_basic_product_data(self, asin: str, domain: int = 1) -> Dict[str, Any]:
         """API Call 1: Basic product data with history."""
         try:
@@ -302,7 +446,7 @@ class KeepaAnalysisService:
         lowest_fba_price: float,
         supplier_cost: float,
         fba_fees: float,
-        shipping_estimate: float = 0.50
+        shipping_estimate: float = WORST_CASE_SHIPPING_ESTIMATE
     ) -> Dict[str, Any]:
         """
         Calculate worst-case profit if price drops to historical low.
@@ -325,22 +469,28 @@ class KeepaAnalysisService:
                 "total_costs": None
             }
         
-        revenue = lowest_fba_price
-        total_costs = supplier_cost + fba_fees + shipping_estimate
-        worst_case_profit = revenue - total_costs
-        worst_case_margin = (worst_case_profit / revenue) * 100 if revenue > 0 else 0
+        # Fees held at their current amount; no prep in this estimate
+        calc = profitability_engine.compute_one(
+            sell_price=lowest_fba_price,
+            fees_total=fba_fees,
+            buy_cost=supplier_cost,
+            prep_cost=0,
+            inbound_shipping=shipping_estimate,
+            worst_case_price=lowest_fba_price,
+            worst_case_fees=fba_fees,
+        )
         
         return {
-            "worst_case_profit": round(worst_case_profit, 2),
-            "worst_case_margin": round(worst_case_margin, 2),
-            "still_profitable": worst_case_profit > 0,
-            "revenue": round(revenue, 2),
-            "total_costs": round(total_costs, 2),
+            "worst_case_profit": calc["worst_case_profit"],
+            "worst_case_margin": calc["worst_case_margin"],
+            "still_profitable": calc["worst_case_profit"] > 0,
+            "revenue": calc["worst_case_price"],
+            "total_costs": calc["break_even_price"],
             "breakdown": {
-                "revenue": round(revenue, 2),
-                "supplier_cost": round(supplier_cost, 2),
-                "fba_fees": round(fba_fees, 2),
-                "shipping_estimate": round(shipping_estimate, 2),
+                "revenue": calc["worst_case_price"],
+                "supplier_cost": calc["unit_cost"],
+                "fba_fees": calc["fees_total"],
+                "shipping_estimate": calc["inbound_shipping"],
             }
         }
 
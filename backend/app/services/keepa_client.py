@@ -1,20 +1,95 @@
 """Keepa client - FIXED with working batch method."""
 import os
+import time
+import random
+import asyncio
 import httpx
 import logging
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, AsyncIterator, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Keepa accepts at most 100 ASINs per /product request
+KEEPA_MAX_ASINS_PER_REQUEST = 100
+# Requests in flight at once for a single batch call
+KEEPA_MAX_CONCURRENT_REQUESTS = 4
+# Attempts per 100-ASIN chunk before giving up on it
+KEEPA_MAX_CHUNK_ATTEMPTS = 3
+# Upper bound for a single wait on the token bucket
+KEEPA_MAX_TOKEN_WAIT_SECONDS = 60
+
 
 class KeepaError(Exception):
     """Keepa API error."""
     pass
 
 
+class KeepaTokenBudget:
+    """
+    Local view of the Keepa token bucket.
+    
+    Keepa reports `tokensLeft`, `refillIn` (ms until next refill), `refillRate`
+    (tokens per minute) and `tokensConsumed` on every response. We track those
+    so concurrent chunk requests can be paced instead of firing blindly into
+    a 429.
+    """
+    
+    def __init__(self, tokens_per_asin: float = 1.0):
+        self.tokens_left: Optional[float] = None
+        self.refill_in_ms: Optional[int] = None
+        self.refill_rate: Optional[float] = None
+        self.tokens_per_asin = tokens_per_asin
+        self.updated_at = 0.0
+    
+    def update(self, data: Dict, asin_count: int = 0):
+        """Record token metadata from a Keepa response."""
+        if data.get("tokensLeft") is not None:
+            self.tokens_left = float(data["tokensLeft"])
+        if data.get("refillIn") is not None:
+            self.refill_in_ms = int(data["refillIn"])
+        if data.get("refillRate"):
+            self.refill_rate = float(data["refillRate"])
+        consumed = data.get("tokensConsumed")
+        if consumed and asin_count:
+            # Learn the real per-ASIN cost (offers/stats make it > 1)
+            self.tokens_per_asin = max(1.0, consumed / asin_count)
+        self.updated_at = time.monotonic()
+    
+    def estimate_cost(self, asin_count: int) -> float:
+        return asin_count * self.tokens_per_asin
+    
+    def available(self) -> Optional[float]:
+        """Tokens expected to be available now, or None if unknown."""
+        if self.tokens_left is None:
+            return None
+        if not self.refill_rate:
+            return self.tokens_left
+        elapsed_min = (time.monotonic() - self.updated_at) / 60.0
+        return self.tokens_left + elapsed_min * self.refill_rate
+    
+    def wait_seconds(self, cost: float) -> float:
+        """Seconds to wait before `cost` tokens should be available."""
+        available = self.available()
+        if available is None or available >= cost:
+            return 0.0
+        if self.refill_rate:
+            wait = (cost - available) / self.refill_rate * 60.0
+        elif self.refill_in_ms is not None:
+            wait = self.refill_in_ms / 1000.0
+        else:
+            wait = 1.0
+        return min(max(wait, 0.1), KEEPA_MAX_TOKEN_WAIT_SECONDS)
+    
+    def reserve(self, cost: float):
+        """Deduct tokens locally for a request that is about to be sent."""
+        if self.tokens_left is not None:
+            self.tokens_left -= cost
+
+
 class KeepaClient:
     def __init__(self):
         self.api_key = os.getenv("KEEPA_API_KEY")
+        self.token_budget = KeepaTokenBudget()
         if self.api_key:
             logger.info(f"✅ Keepa configured (key length: {len(self.api_key)})")
     
@@ -35,251 +110,382 @@ class KeepaClient:
     
     async def get_products_batch(self, asins: List[str], days: int = 90, domain: int = 1, history: bool = False, return_raw: bool = False) -> Dict[str, Any]:
         """
-        Batch fetch multiple ASINs in one API call.
-        Keepa allows up to 100 ASINs per request.
+        Batch fetch any number of ASINs.
+        
+        Keepa allows up to 100 ASINs per request, so the list is split into
+        100-ASIN chunks that are fetched concurrently within the token budget
+        and merged. Use iter_products_batches() to process chunks as they land.
         """
         if not self.api_key or not asins:
             return {}
         
         results = {}
+        raw_products = []
+        raw_response = {}
         
-        try:
-            # Keepa accepts comma-separated ASINs
-            asin_str = ",".join(asins[:100])
-            
-            params = {
-                "key": self.api_key,
-                "domain": 1,
-                "asin": asin_str,
-                "stats": days,
-                "offers": 20,  # Number of offers to return
-                "history": 1,  # Include price/rank history
-                "update": 0,   # Don't force update
+        async for chunk_result in self.iter_products_batches(asins, days=days, return_raw=return_raw):
+            if return_raw:
+                raw_products.extend(chunk_result.get("products") or [])
+                raw_response = chunk_result.get("raw_response") or raw_response
+            else:
+                results.update(chunk_result)
+        
+        if return_raw:
+            # Present multi-chunk fetches as if they were one response
+            merged_raw = {k: v for k, v in raw_response.items() if k != "products"}
+            merged_raw["products"] = raw_products
+            return {
+                'raw_response': merged_raw,
+                'products': raw_products,
+                'tokens_left': self.token_budget.tokens_left
             }
+        
+        return results
+    
+    async def iter_products_batches(
+        self,
+        asins: List[str],
+        days: int = 90,
+        return_raw: bool = False,
+        max_concurrent: int = KEEPA_MAX_CONCURRENT_REQUESTS
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Fetch ASINs in 100-ASIN chunks and yield each chunk as soon as it completes.
+        
+        Chunks are dispatched concurrently (up to `max_concurrent` in flight),
+        paced by the tokensLeft/refillIn values Keepa returns, and retried on
+        429/5xx/timeouts. Results are yielded in completion order, so callers
+        can process chunk 1 while chunk 5 is still in flight.
+        
+        Yields:
+            {asin: parsed_product} per chunk, or when return_raw is True
+            {'raw_response', 'products', 'tokens_left', 'asins'} per chunk.
+            Chunks that fail after all retries are logged and skipped.
+        """
+        if not self.api_key or not asins:
+            return
+        
+        # Deduplicate while preserving order
+        unique_asins = list(dict.fromkeys(a for a in asins if a))
+        chunks = [
+            unique_asins[i:i + KEEPA_MAX_ASINS_PER_REQUEST]
+            for i in range(0, len(unique_asins), KEEPA_MAX_ASINS_PER_REQUEST)
+        ]
+        
+        logger.info(f"🔍 Keepa batch request: {len(unique_asins)} ASINs in {len(chunks)} chunk(s)")
+        
+        # Created per call: run_async() gives each Celery task its own event loop
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        budget_lock = asyncio.Lock()
+        
+        async with httpx.AsyncClient(timeout=60) as client:
+            async def run_chunk(chunk: List[str]) -> Tuple[List[str], Optional[Dict]]:
+                async with semaphore:
+                    data = await self._fetch_chunk(client, chunk, days, budget_lock)
+                    return chunk, data
             
-            logger.info(f"🔍 Keepa batch request: {len(asins)} ASINs")
-            
-            async with httpx.AsyncClient(timeout=60) as client:
-                resp = await client.get("https://api.keepa.com/product", params=params)
-                
-                if resp.status_code != 200:
-                    logger.error(f"❌ Keepa error: {resp.status_code}")
-                    return {}
-                
-                data = resp.json()
-                products = data.get("products")
-                
-                # Handle None or empty list
-                if products is None:
-                    logger.warning(f"⚠️ Keepa returned products=None (might be null in JSON)")
-                    products = []
-                elif not isinstance(products, list):
-                    logger.warning(f"⚠️ Keepa returned products as {type(products)}, expected list")
-                    products = []
-                
-                logger.info(f"📦 Keepa returned {len(products)} products, tokens left: {data.get('tokensLeft')}")
-                
-                # If return_raw is True, return the full raw response
-                if return_raw:
-                    return {
-                        'raw_response': data,
-                        'products': products,
-                        'tokens_left': data.get('tokensLeft')
-                    }
-                
-                if not products:
-                    logger.warning(f"⚠️ No products in response. Response keys: {list(data.keys())}")
-                    logger.warning(f"⚠️ Full response sample: {str(data)[:500]}")
-                    return {}
-                
-                for p in products:
-                    if not p:
-                        continue
-                    
-                    asin = p.get("asin")
-                    if not asin:
+            tasks = [asyncio.ensure_future(run_chunk(chunk)) for chunk in chunks]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    chunk, data = await next_done
+                    if data is None:
                         continue
                     
-                    stats = p.get("stats") or {}
-                    current = stats.get("current") or []
-                    
-                    # Safe value extraction
-                    def get_price(idx):
-                        if current and len(current) > idx:
-                            v = current[idx]
-                            if v is not None and v >= 0:
-                                return round(v / 100.0, 2)
-                        return None
+                    products = data.get("products")
                     
-                    def get_int(idx):
-                        if current and len(current) > idx:
-                            v = current[idx]
-                            if v is not None and v >= 0:
-                                return int(v)
-                        return None
+                    # Handle None or empty list
+                    if products is None:
+                        logger.warning(f"⚠️ Keepa returned products=None (might be null in JSON)")
+                        products = []
+                    elif not isinstance(products, list):
+                        logger.warning(f"⚠️ Keepa returned products as {type(products)}, expected list")
+                        products = []
                     
-                    # Parse price history (CSV format: [time, price, ...])
-                    price_history = []
-                    csv_data = p.get("csv", [])
-                    if csv_data and len(csv_data) > 0:
-                        # csv[0] is Amazon price history
-                        # Format: [timestamp, price, ...] where price is in cents
-                        amazon_price_csv = csv_data[0] if len(csv_data) > 0 else []
-                        if amazon_price_csv and len(amazon_price_csv) > 1:
-                            for i in range(0, len(amazon_price_csv) - 1, 2):
-                                if i + 1 < len(amazon_price_csv):
-                                    timestamp = amazon_price_csv[i]
-                                    price = amazon_price_csv[i + 1]
-                                    if price is not None and price >= 0:
-                                        price_history.append({
-                                            "timestamp": timestamp,
-                                            "price": round(price / 100.0, 2),
-                                            "date": timestamp  # Keepa timestamp is minutes since epoch
-                                        })
+                    logger.info(f"📦 Keepa returned {len(products)} products, tokens left: {data.get('tokensLeft')}")
                     
-                    # Parse rank history (CSV format: [time, rank, ...])
-                    rank_history = []
-                    if csv_data and len(csv_data) > 3:
-                        # csv[3] is sales rank history
-                        sales_rank_csv = csv_data[3] if len(csv_data) > 3 else []
-                        if sales_rank_csv and len(sales_rank_csv) > 1:
-                            for i in range(0, len(sales_rank_csv) - 1, 2):
-                                if i + 1 < len(sales_rank_csv):
-                                    timestamp = sales_rank_csv[i]
-                                    rank = sales_rank_csv[i + 1]
-                                    if rank is not None and rank >= 0:
-                                        rank_history.append({
-                                            "timestamp": timestamp,
-                                            "rank": rank,
-                                            "date": timestamp
-                                        })
-                    
-                    # Parse offers
-                    offers = []
-                    offers_data = p.get("offers", [])
-                    if offers_data:
-                        for offer in offers_data:
-                            if offer:
-                                offers.append({
-                                    "seller_id": offer.get("sellerId"),
-                                    "seller_name": offer.get("sellerName"),
-                                    "is_amazon": offer.get("isAmazon", False),
-                                    "is_fba": offer.get("isFBA", False),
-                                    "is_buy_box": offer.get("isBuyBoxWinner", False),
-                                    "price": round(offer.get("price", 0) / 100.0, 2) if offer.get("price") else None,
-                                    "shipping": round(offer.get("shipping", 0) / 100.0, 2) if offer.get("shipping") else None,
-                                    "condition": offer.get("condition"),
-                                    "last_seen": offer.get("lastSeen"),
-                                })
-                    
-                    # Parse variations
-                    variations = []
-                    variation_asins = p.get("variationASINs", [])
-                    if variation_asins:
-                        variations = variation_asins
-                    
-                    # Check if Amazon is seller
-                    amazon_is_seller = False
-                    if offers:
-                        amazon_is_seller = any(offer.get("isAmazon", False) for offer in offers)
-                    # Also check in stats
-                    if not amazon_is_seller:
-                        amazon_is_seller = stats.get("isAmazon", False) or False
-                    
-                    # Hazmat info
-                    hazmat = p.get("isHazmat", False)
-                    hazmat_reason = p.get("hazmatReason") if hazmat else None
-                    
-                    # Additional product info
-                    product_group = p.get("productGroup")
-                    category = p.get("category")
-                    model = p.get("model")
-                    part_number = p.get("partNumber")
-                    ean_list = p.get("eanList", [])
-                    upc_list = p.get("upcList", [])
-                    images_csv = p.get("imagesCSV", [])
-                    image_url = images_csv[0] if images_csv else None
-                    
-                    # Parent ASIN (if this is a variation)
-                    parent_asin = p.get("parentAsin")
-                    
-                    # Dimensions and weight
-                    package_dimensions = p.get("packageDimensions")
-                    package_weight = p.get("packageWeight")
+                    if return_raw:
+                        yield {
+                            'raw_response': data,
+                            'products': products,
+                            'tokens_left': data.get('tokensLeft'),
+                            'asins': chunk
+                        }
+                        continue
                     
-                    # Review data
-                    reviews_total = stats.get("reviewsTotal") or 0
-                    rating = stats.get("rating") or None
-                    if rating:
-                        rating = round(rating / 10.0, 1)  # Keepa stores rating as 0-100, convert to 0-10
+                    if not products:
+                        logger.warning(f"⚠️ No products in response. Response keys: {list(data.keys())}")
+                        logger.warning(f"⚠️ Full response sample: {str(data)[:500]}")
+                        continue
                     
-                    results[asin] = {
-                        "asin": asin,
-                        "title": p.get("title"),
-                        "brand": p.get("brand"),
-                        "manufacturer": p.get("manufacturer"),
-                        "model": model,
-                        "part_number": part_number,
-                        "product_group": product_group,
-                        "category": category,
-                        "image_url": image_url,
-                        "ean_list": ean_list,
-                        "upc_list": upc_list,
-                        "parent_asin": parent_asin,
-                        "is_variation": bool(parent_asin),
-                        "variations": variations,
-                        "hazmat": hazmat,
-                        "hazmat_reason": hazmat_reason,
-                        "package_dimensions": package_dimensions,
-                        "package_weight": package_weight,
-                        "current": {
-                            "amazon_price": get_price(0),
-                            "new_price": get_price(1),
-                            "used_price": get_price(2),
-                            "buy_box_price": get_price(18),
-                            "fba_price": get_price(10),
-                            "fbm_price": get_price(11),
-                            "sales_rank": get_int(3),
-                            "fba_sellers": stats.get("offerCountFBA") or 0,
-                            "fbm_sellers": stats.get("offerCountFBM") or 0,
-                            "total_sellers": (stats.get("offerCountFBA") or 0) + (stats.get("offerCountFBM") or 0),
-                            "amazon_is_seller": amazon_is_seller,
-                            "rating": rating,
-                            "reviews_total": reviews_total,
-                        },
-                        "stats": {
-                            "drops_30": stats.get("salesRankDrops30") or 0,
-                            "drops_90": stats.get("salesRankDrops90") or 0,
-                            "drops_180": stats.get("salesRankDrops180") or 0,
-                            "avg_price_30": round(stats.get("avg30", 0) / 100.0, 2) if stats.get("avg30") else None,
-                            "avg_price_90": round(stats.get("avg90", 0) / 100.0, 2) if stats.get("avg90") else None,
-                            "avg_price_180": round(stats.get("avg180", 0) / 100.0, 2) if stats.get("avg180") else None,
-                            "avg_price_365": round(stats.get("avg365", 0) / 100.0, 2) if stats.get("avg365") else None,
-                            "min_price_30": round(stats.get("min30", 0) / 100.0, 2) if stats.get("min30") else None,
-                            "min_price_90": round(stats.get("min90", 0) / 100.0, 2) if stats.get("min90") else None,
-                            "max_price_30": round(stats.get("max30", 0) / 100.0, 2) if stats.get("max30") else None,
-                            "max_price_90": round(stats.get("max90", 0) / 100.0, 2) if stats.get("max90") else None,
-                        },
-                        "averages": {
-                            "avg_price_90": get_price(0),
-                            "avg_rank_90": get_int(3),
-                            "drops_90": stats.get("salesRankDrops90") or 0,
-                        },
-                        "price_history": price_history,
-                        "rank_history": rank_history,
-                        "offers": offers,
-                    }
+                    parsed = {}
+                    for p in products:
+                        if not p:
+                            continue
+                        asin = p.get("asin")
+                        if not asin:
+                            continue
+                        try:
+                            parsed[asin] = self._parse_product(p)
+                            logger.info(f"✅ Parsed {asin}: rank={parsed[asin]['current']['sales_rank']}")
+                        except Exception as e:
+                            logger.error(f"❌ Keepa parse error for {asin}: {e}")
                     
-                    logger.info(f"✅ Parsed {asin}: rank={results[asin]['current']['sales_rank']}")
+                    yield parsed
+            finally:
+                # Consumer stopped early (or errored) - don't leave requests running
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+    
+    async def _fetch_chunk(
+        self,
+        client: httpx.AsyncClient,
+        chunk: List[str],
+        days: int,
+        budget_lock: asyncio.Lock
+    ) -> Optional[Dict]:
+        """Fetch one <=100 ASIN chunk, pacing on the token budget and retrying failures."""
+        params = {
+            "key": self.api_key,
+            "domain": 1,
+            "asin": ",".join(chunk),
+            "stats": days,
+            "offers": 20,  # Number of offers to return
+            "history": 1,  # Include price/rank history
+            "update": 0,   # Don't force update
+        }
         
-        except Exception as e:
-            logger.error(f"❌ Keepa batch error: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        for attempt in range(KEEPA_MAX_CHUNK_ATTEMPTS):
+            # Wait until the bucket can cover this chunk, then reserve it so
+            # concurrent chunks don't all spend the same tokens
+            async with budget_lock:
+                cost = self.token_budget.estimate_cost(len(chunk))
+                wait = self.token_budget.wait_seconds(cost)
+                if wait > 0:
+                    logger.info(f"⏳ Keepa token budget low ({self.token_budget.available():.0f} left) - waiting {wait:.1f}s")
+                    await asyncio.sleep(wait)
+                self.token_budget.reserve(cost)
+            
+            try:
+                resp = await client.get("https://api.keepa.com/product", params=params)
+            except httpx.TimeoutException:
+                logger.warning(f"⏳ Keepa timeout for {len(chunk)} ASINs (attempt {attempt + 1}/{KEEPA_MAX_CHUNK_ATTEMPTS})")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            except Exception as e:
+                logger.error(f"❌ Keepa batch error: {e}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            
+            try:
+                data = resp.json()
+            except Exception:
+                data = {}
+            
+            if isinstance(data, dict):
+                self.token_budget.update(data, len(chunk) if resp.status_code == 200 else 0)
+            
+            if resp.status_code == 200:
+                return data
+            
+            if resp.status_code == 429:
+                # Out of tokens - Keepa tells us when the next refill lands
+                refill_in = (data or {}).get("refillIn") if isinstance(data, dict) else None
+                wait = (refill_in / 1000.0) if refill_in else 2 ** (attempt + 1)
+                wait = min(wait, KEEPA_MAX_TOKEN_WAIT_SECONDS) * random.uniform(1.0, 1.2)
+                logger.warning(f"⏳ Keepa 429 - waiting {wait:.1f}s (attempt {attempt + 1}/{KEEPA_MAX_CHUNK_ATTEMPTS})")
+                await asyncio.sleep(wait)
+                continue
+            
+            if resp.status_code >= 500:
+                logger.warning(f"⏳ Keepa {resp.status_code} - retrying (attempt {attempt + 1}/{KEEPA_MAX_CHUNK_ATTEMPTS})")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            
+            # 4xx other than 429 won't get better on retry
+            logger.error(f"❌ Keepa error: {resp.status_code}")
+            return None
         
-        return results
+        logger.error(f"❌ Keepa chunk of {len(chunk)} ASINs failed after {KEEPA_MAX_CHUNK_ATTEMPTS} attempts")
+        return None
+    
+    def _parse_product(self, p: Dict) -> Dict[str, Any]:
+        """Parse one raw Keepa product into the client's normalized shape."""
+        asin = p.get("asin")
+        stats = p.get("stats") or {}
+        current = stats.get("current") or []
+
+        # Safe value extraction
+        def get_price(idx):
+            if current and len(current) > idx:
+                v = current[idx]
+                if v is not None and v >= 0:
+                    return round(v / 100.0, 2)
+            return None
+
+        def get_int(idx):
+            if current and len(current) > idx:
+                v = current[idx]
+                if v is not None and v >= 0:
+                    return int(v)
+            return None
+
+        # Parse price history (CSV format: [time, price, ...])
+        price_history = []
+        csv_data = p.get("csv", [])
+        if csv_data and len(csv_data) > 0:
+            # csv[0] is Amazon price history
+            # Format: [timestamp, price, ...] where price is in cents
+            amazon_price_csv = csv_data[0] if len(csv_data) > 0 else []
+            if amazon_price_csv and len(amazon_price_csv) > 1:
+                for i in range(0, len(amazon_price_csv) - 1, 2):
+                    if i + 1 < len(amazon_price_csv):
+                        timestamp = amazon_price_csv[i]
+                        price = amazon_price_csv[i + 1]
+                        if price is not None and price >= 0:
+                            price_history.append({
+                                "timestamp": timestamp,
+                                "price": round(price / 100.0, 2),
+                                "date": timestamp  # Keepa timestamp is minutes since epoch
+                            })
+
+        # Parse rank history (CSV format: [time, rank, ...])
+        rank_history = []
+        if csv_data and len(csv_data) > 3:
+            # csv[3] is sales rank history
+            sales_rank_csv = csv_data[3] if len(csv_data) > 3 else []
+            if sales_rank_csv and len(sales_rank_csv) > 1:
+                for i in range(0, len(sales_rank_csv) - 1, 2):
+                    if i + 1 < len(sales_rank_csv):
+                        timestamp = sales_rank_csv[i]
+                        rank = sales_rank_csv[i + 1]
+                        if rank is not None and rank >= 0:
+                            rank_history.append({
+                                "timestamp": timestamp,
+                                "rank": rank,
+                                "date": timestamp
+                            })
+
+        # Parse offers
+        offers = []
+        offers_data = p.get("offers", [])
+        if offers_data:
+            for offer in offers_data:
+                if offer:
+                    offers.append({
+                        "seller_id": offer.get("sellerId"),
+                        "seller_name": offer.get("sellerName"),
+                        "is_amazon": offer.get("isAmazon", False),
+                        "is_fba": offer.get("isFBA", False),
+                        "is_buy_box": offer.get("isBuyBoxWinner", False),
+                        "price": round(offer.get("price", 0) / 100.0, 2) if offer.get("price") else None,
+                        "shipping": round(offer.get("shipping", 0) / 100.0, 2) if offer.get("shipping") else None,
+                        "condition": offer.get("condition"),
+                        "last_seen": offer.get("lastSeen"),
+                    })
+
+        # Parse variations
+        variations = []
+        variation_asins = p.get("variationASINs", [])
+        if variation_asins:
+            variations = variation_asins
+
+        # Check if Amazon is seller
+        amazon_is_seller = False
+        if offers:
+            amazon_is_seller = any(offer.get("isAmazon", False) for offer in offers)
+        # Also check in stats
+        if not amazon_is_seller:
+            amazon_is_seller = stats.get("isAmazon", False) or False
+
+        # Hazmat info
+        hazmat = p.get("isHazmat", False)
+        hazmat_reason = p.get("hazmatReason") if hazmat else None
+
+        # Additional product info
+        product_group = p.get("productGroup")
+        category = p.get("category")
+        model = p.get("model")
+        part_number = p.get("partNumber")
+        ean_list = p.get("eanList", [])
+        upc_list = p.get("upcList", [])
+        images_csv = p.get("imagesCSV", [])
+        image_url = images_csv[0] if images_csv else None
+
+        # Parent ASIN (if this is a variation)
+        parent_asin = p.get("parentAsin")
+
+        # Dimensions and weight
+        package_dimensions = p.get("packageDimensions")
+        package_weight = p.get("packageWeight")
+
+        # Review data
+        reviews_total = stats.get("reviewsTotal") or 0
+        rating = stats.get("rating") or None
+        if rating:
+            rating = round(rating / 10.0, 1)  # Keepa stores rating as 0-100, convert to 0-10
+
+        return {
+            "asin": asin,
+            "title": p.get("title"),
+            "brand": p.get("brand"),
+            "manufacturer": p.get("manufacturer"),
+            "model": model,
+            "part_number": part_number,
+            "product_group": product_group,
+            "category": category,
+            "image_url": image_url,
+            "ean_list": ean_list,
+            "upc_list": upc_list,
+            "parent_asin": parent_asin,
+            "is_variation": bool(parent_asin),
+            "variations": variations,
+            "hazmat": hazmat,
+            "hazmat_reason": hazmat_reason,
+            "package_dimensions": package_dimensions,
+            "package_weight": package_weight,
+            "package_length": p.get("packageLength"),
+            "package_width": p.get("packageWidth"),
+            "package_height": p.get("packageHeight"),
+            "current": {
+                "amazon_price": get_price(0),
+                "new_price": get_price(1),
+                "used_price": get_price(2),
+                "buy_box_price": get_price(18),
+                "fba_price": get_price(10),
+                "fbm_price": get_price(11),
+                "sales_rank": get_int(3),
+                "fba_sellers": stats.get("offerCountFBA") or 0,
+                "fbm_sellers": stats.get("offerCountFBM") or 0,
+                "total_sellers": (stats.get("offerCountFBA") or 0) + (stats.get("offerCountFBM") or 0),
+                "amazon_is_seller": amazon_is_seller,
+                "rating": rating,
+                "reviews_total": reviews_total,
+            },
+            "stats": {
+                "drops_30": stats.get("salesRankDrops30") or 0,
+                "drops_90": stats.get("salesRankDrops90") or 0,
+                "drops_180": stats.get("salesRankDrops180") or 0,
+                "avg_price_30": round(stats.get("avg30", 0) / 100.0, 2) if stats.get("avg30") else None,
+                "avg_price_90": round(stats.get("avg90", 0) / 100.0, 2) if stats.get("avg90") else None,
+                "avg_price_180": round(stats.get("avg180", 0) / 100.0, 2) if stats.get("avg180") else None,
+                "avg_price_365": round(stats.get("avg365", 0) / 100.0, 2) if stats.get("avg365") else None,
+                "min_price_30": round(stats.get("min30", 0) / 100.0, 2) if stats.get("min30") else None,
+                "min_price_90": round(stats.get("min90", 0) / 100.0, 2) if stats.get("min90") else None,
+                "max_price_30": round(stats.get("max30", 0) / 100.0, 2) if stats.get("max30") else None,
+                "max_price_90": round(stats.get("max90", 0) / 100.0, 2) if stats.get("max90") else None,
+            },
+            "averages": {
+                "avg_price_90": get_price(0),
+                "avg_rank_90": get_int(3),
+                "drops_90": stats.get("salesRankDrops90") or 0,
+            },
+            "price_history": price_history,
+            "rank_history": rank_history,
+            "offers": offers,
+        }
     
-    async def get_products_raw(self, asins: List[str], days: int = 90) -> Dict:
+    async def get_products_raw(self, asins: List[str], days: int = 90, domain: int = 1) -> Dict:
         """Get raw Keepa product data (for deep analysis).
         
         This is a compatibility method - returns the same as get_products_batch
@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional, Any
 import logging
 
+from app.services.profitability_engine import profitability_engine
+
 logger = logging.getLogger(__name__)
 
 # Keepa epoch: January 1, 2011
@@ -229,20 +231,20 @@ def calculate_worst_case_profit(
     if not worst_price or worst_price <= 0:
         return {"worst_case_profit": None, "still_profitable_at_worst": None}
     
-    # Estimate fees at worst price (fees scale roughly with price)
-    if current_sell_price and current_sell_price > 0 and fees_total and fees_total > 0:
-        fee_ratio = fees_total / current_sell_price
-        worst_fees = worst_price * fee_ratio
-    else:
-        # Estimate 30% fees if we don't have actuals
-        worst_fees = worst_price * 0.30
-    
-    worst_profit = worst_price - worst_fees - buy_cost
+    # Fees scale with price (fees_total / current price, or 30% without actuals)
+    calc = profitability_engine.compute_one(
+        sell_price=current_sell_price or 0,
+        fees_total=fees_total or 0,
+        buy_cost=buy_cost,
+        prep_cost=0,
+        inbound_shipping=0,
+        worst_case_price=worst_price,
+    )
     
     return {
-        "worst_case_price": round(worst_price, 2),
-        "worst_case_fees": round(worst_fees, 2),
-        "worst_case_profit": round(worst_profit, 2),
-        "still_profitable_at_worst": worst_profit > 0,
+        "worst_case_price": calc["worst_case_price"],
+        "worst_case_fees": calc["worst_case_fees"],
+        "worst_case_profit": calc["worst_case_profit"],
+        "still_profitable_at_worst": calc["worst_case_profit"] > 0,
     }
 
@@ -0,0 +1,185 @@
+"""
+Market intelligence for an ASIN, served from stored Keepa data.
+
+Read-through: Redis entry per ASIN -> the stored products row -> live Keepa
+(only when the stored data is older than MAX_DATA_AGE_HOURS, via
+fetch_and_store_keepa_data, which also writes the fresh data back).
+
+A cache entry records when its Keepa data was fetched and which sales
+velocity model version estimated it. It expires when that data turns stale
+and is ignored once a newer model is published. The response only holds
+public Keepa market data, so entries are shared by every user.
+"""
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import orjson
+
+from app.services.supabase_client import supabase
+from app.services.redis_client import get_redis_client
+from app.services.api_storage_service import fetch_and_store_keepa_data
+from app.services.sales_velocity_model import sales_velocity_model
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "market_intel:{asin}"
+MAX_DATA_AGE_HOURS = 24  # Same freshness rule as should_refresh_keepa_data
+MIN_CACHE_SECONDS = 60
+
+STORED_COLUMNS = (
+    "asin, brand, category, current_sales_rank, bsr, "
+    "sales_rank_drops_30_day, sales_rank_drops_90_day, review_count, rating_average, keepa_last_fetched, "
+    "keepa_drops_30:keepa_raw_response->products->0->stats->salesRankDrops30, "
+    "keepa_drops_90:keepa_raw_response->products->0->stats->salesRankDrops90"
+)
+
+
+def _fetched_epoch(value: Optional[str]) -> Optional[float]:
+    """keepa_last_fetched (ISO, UTC) as a Unix timestamp."""
+    if not value:
+        return None
+    try:
+        fetched = datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+        return (fetched - datetime(1970, 1, 1)).total_seconds()
+    except ValueError:
+        return None
+
+
+def _keepa_stat(row: Dict[str, Any], alias: str, stat: str) -> Optional[int]:
+    """A Keepa stats value from the stored-row alias or a full raw response."""
+    if row.get(alias) is not None:
+        return row[alias]
+    raw = row.get("keepa_raw_response") or {}
+    products = raw.get("products") if isinstance(raw, dict) else None
+    if products:
+        return (products[0].get("stats") or {}).get(stat)
+    return None
+
+
+class MarketIntelligenceService:
+    """Sales rank, velocity estimate and trend per ASIN."""
+
+    async def get(self, asin: str, user_id: str) -> Dict[str, Any]:
+        entry = self._cache_get(asin)
+        if entry:
+            return self._response(entry, "cache")
+
+        row = self._stored_row(asin, user_id)
+        source = "stored"
+        fetched_at = _fetched_epoch(row.get("keepa_last_fetched")) if row else None
+        if fetched_at is None or time.time() - fetched_at > MAX_DATA_AGE_HOURS * 3600:
+            fresh = await fetch_and_store_keepa_data(asin, user_id, force_refresh=True)
+            if fresh:
+                row, source = fresh, "keepa"
+            elif row:
+                logger.warning(f"⚠️ Keepa refresh failed for {asin}, serving stored data")
+
+        if not row:
+            return {"asin": asin, "error": "No data available"}
+
+        entry = {
+            "data": self.build(asin, row),
+            "fetched_at": _fetched_epoch(row.get("keepa_last_fetched")) or time.time(),
+            "model_version": sales_velocity_model.version,
+        }
+        self._cache_set(asin, entry)
+        return self._response(entry, source)
+
+    @staticmethod
+    def build(asin: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Insights from a products row (or freshly extracted Keepa fields)."""
+        sales_rank = row.get("current_sales_rank") or row.get("bsr")
+        drops_30 = _keepa_stat(row, "keepa_drops_30", "salesRankDrops30")
+        if drops_30 is None:
+            drops_30 = row.get("sales_rank_drops_30_day") or 0
+        drops_90 = _keepa_stat(row, "keepa_drops_90", "salesRankDrops90")
+        if drops_90 is None:
+            drops_90 = row.get("sales_rank_drops_90_day") or 0
+
+        # Sales trend
+        sales_trend = "stable"
+        if drops_30 and drops_90:
+            avg_monthly = drops_90 / 3
+            if drops_30 > avg_monthly * 1.2:
+                sales_trend = "increasing"
+            elif drops_30 < avg_monthly * 0.8:
+                sales_trend = "decreasing"
+
+        return {
+            "asin": asin,
+            "sales_rank": sales_rank,
+            "est_monthly_sales": sales_velocity_model.estimate_monthly_units(sales_rank, row.get("category")),
+            "sales_trend": sales_trend,
+            "drops_30": drops_30,
+            "drops_90": drops_90,
+            "review_count": row.get("review_count"),
+            "rating": row.get("rating_average"),
+            "brand": row.get("brand"),
+            "category": row.get("category"),
+        }
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    @staticmethod
+    def _response(entry: Dict[str, Any], source: str) -> Dict[str, Any]:
+        return {
+            **entry["data"],
+            "data_age_hours": round((time.time() - entry["fetched_at"]) / 3600, 1),
+            "model_version": entry["model_version"],
+            "source": source,
+        }
+
+    @staticmethod
+    def _stored_row(asin: str, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            result = supabase.table("products")\
+                .select(STORED_COLUMNS)\
+                .eq("user_id", user_id)\
+                .eq("asin", asin)\
+                .order("keepa_last_fetched", desc=True)\
+                .limit(1)\
+                .execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.warning(f"Could not read stored Keepa data for {asin}: {e}")
+            return None
+
+    @staticmethod
+    def _cache_get(asin: str) -> Optional[Dict[str, Any]]:
+        client = get_redis_client()
+        if not client:
+            return None
+        try:
+            raw = client.get(CACHE_KEY.format(asin=asin))
+        except Exception:
+            return None
+        if not raw:
+            return None
+        entry = orjson.loads(raw)
+        if entry.get("model_version") != sales_velocity_model.version:
+            return None
+        if time.time() - entry.get("fetched_at", 0) > MAX_DATA_AGE_HOURS * 3600:
+            return None
+        return entry
+
+    @staticmethod
+    def _cache_set(asin: str, entry: Dict[str, Any]):
+        # Live only as long as the underlying Keepa data is fresh
+        ttl = int(MAX_DATA_AGE_HOURS * 3600 - (time.time() - entry["fetched_at"]))
+        if ttl < MIN_CACHE_SECONDS:
+            return
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            client.set(CACHE_KEY.format(asin=asin), orjson.dumps(entry).decode(), ex=ttl)
+        except Exception as e:
+            logger.debug(f"Could not cache market intelligence for {asin}: {e}")
+
+
+# Singleton
+market_intelligence_service = MarketIntelligenceService()
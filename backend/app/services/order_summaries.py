@@ -0,0 +1,104 @@
+"""
+Order list read model with keyset pagination.
+
+Pages come from the list_order_summaries RPC over the order_summaries view:
+one row per order with supplier name, item count, units and subtotals
+aggregated in SQL, newest first, seeking past the (created_at, id) of the
+previous page's last row. Item and product detail is left to GET
+/orders/{id}.
+
+See database/migrations/ADD_ORDER_SUMMARIES.sql.
+"""
+import json
+import base64
+import logging
+from typing import Dict, Any, Optional, Tuple
+
+from app.services.supabase_client import supabase
+from app.services.deal_listing import InvalidCursor
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 1000  # list_order_summaries returns at most this plus one
+
+SUPPLIER_FIELDS = {
+    "supplier_name": "name",
+    "supplier_contact_name": "contact_name",
+    "supplier_contact_email": "contact_email",
+}
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    payload = {"c": row.get("created_at"), "id": row.get("id")}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(created_at, id) of the order the previous page ended on."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at, order_id = payload["c"], payload["id"]
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if not created_at or not order_id:
+        raise InvalidCursor("Malformed cursor")
+    return created_at, order_id
+
+
+class OrderSummaries:
+    """
+    Keyset-paginated order summaries for one user.
+    """
+
+    def page(
+        self,
+        user_id: str,
+        status: Optional[str] = None,
+        supplier_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        One page of order summaries, newest first.
+
+        Args:
+            user_id: Owner of the orders
+            status / supplier_id: Optional filters
+            cursor: next_cursor from the previous page
+            limit: Page size (clamped to 1..MAX_PAGE_SIZE)
+
+        Returns:
+            {"orders": [...], "next_cursor": str or None, "has_more": bool}
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        params = {
+            "p_user_id": user_id,
+            "p_status": status,
+            "p_supplier_id": supplier_id,
+            # One extra row tells us whether another page exists
+            "p_limit": limit + 1,
+        }
+        if cursor:
+            params["p_after_created_at"], params["p_after_id"] = decode_cursor(cursor)
+
+        result = supabase.rpc("list_order_summaries", params).execute()
+        rows = result.data or []
+        has_more = len(rows) > limit
+        orders = [self._shape(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(orders[-1]) if has_more else None
+        return {"orders": orders, "next_cursor": next_cursor, "has_more": has_more}
+
+    @staticmethod
+    def _shape(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Nest supplier fields like the old embedded suppliers(...) join."""
+        order = {k: v for k, v in row.items() if k not in SUPPLIER_FIELDS}
+        order["supplier"] = {
+            "id": row.get("supplier_id"),
+            **{field: row.get(column) for column, field in SUPPLIER_FIELDS.items()},
+        } if row.get("supplier_id") else None
+        return order
+
+
+# Singleton
+order_summaries = OrderSummaries()
@@ -1,39 +1,23 @@
 """
 Purchase Order Email Service
 
-Generates PO PDFs and sends emails to suppliers via SendGrid.
+Generates PO PDFs and queues emails to suppliers via SendGrid (through the
+email outbox).
 """
 import logging
 from typing import Dict, Optional, List, Any
 from datetime import datetime
 import re
 import os
+import base64
+import asyncio
 
 from app.services.supabase_client import supabase
+from app.services.po_pdf_renderer import po_renderer, po_pdf_store, REPORTLAB_AVAILABLE
+from app.services.email_outbox import email_outbox
 
 logger = logging.getLogger(__name__)
 
-try:
-    import sendgrid
-    from sendgrid.helpers.mail import Mail, Email, To, Attachment, FileContent, FileName, FileType, Disposition
-    from sendgrid import SendGridAPIClient
-    SENDGRID_AVAILABLE = True
-except ImportError:
-    logger.warning("SendGrid not installed. PO emails will not work.")
-    SENDGRID_AVAILABLE = False
-
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib import colors
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    logger.warning("ReportLab not installed. PO PDF generation will not work.")
-    REPORTLAB_AVAILABLE = False
-
 
 class POEmailService:
     """Generate PO PDFs and send emails."""
@@ -41,7 +25,7 @@ class POEmailService:
     def __init__(self, user_id: str):
         self.user_id = user_id
         self.sendgrid_api_key = os.getenv('SENDGRID_API_KEY')
-        self.sendgrid_enabled = SENDGRID_AVAILABLE and bool(self.sendgrid_api_key)
+        self.sendgrid_enabled = bool(self.sendgrid_api_key)
     
     async def generate_po_number(self) -> str:
         """Generate unique PO number: PO-YYYY-MM-#####"""
@@ -79,125 +63,76 @@ class POEmailService:
         supplier_order_id: str,
         po_number: str
     ) -> Optional[bytes]:
-        """Generate PO PDF."""
+        """Generate PO PDF (rendered in a worker thread) and keep it in the PDF store."""
         if not REPORTLAB_AVAILABLE:
             logger.error("ReportLab not available, cannot generate PDF")
             return None
         
         try:
-            # Get order data
-            order_result = supabase.table('supplier_orders').select(
-                '''
-                *,
-                supplier:suppliers(*),
-                items:supplier_order_items(
-                    *,
-                    product:products(*)
-                )
-                '''
-            ).eq('id', supplier_order_id).limit(1).execute()
-            
-            if not order_result.data:
+            order = po_renderer.load_orders(self.user_id, [supplier_order_id]).get(supplier_order_id)
+            if not order:
                 raise ValueError("Order not found")
             
-            order = order_result.data[0]
-            supplier = order.get('supplier', {})
-            items = order.get('items', [])
-            
-            # Create PDF in memory
-            from io import BytesIO
-            buffer = BytesIO()
-            
-            doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                textColor=colors.HexColor('#1a1a1a'),
-                alignment=TA_CENTER,
-                spaceAfter=30
-            )
-            story.append(Paragraph("PURCHASE ORDER", title_style))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # PO Number
-            po_style = ParagraphStyle(
-                'PONumber',
-                parent=styles['Normal'],
-                fontSize=14,
-                alignment=TA_RIGHT
-            )
-            story.append(Paragraph(f"PO Number: <b>{po_number}</b>", po_style))
-            story.append(Paragraph(f"Date: {datetime.utcnow().strftime('%B %d, %Y')}", po_style))
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Supplier Info
-            supplier_data = [
-                ['Supplier:', supplier.get('name', '')],
-                ['Contact:', supplier.get('contact_email', '')],
-                ['Phone:', supplier.get('contact_phone', '')],
-                ['Address:', supplier.get('address', '')]
-            ]
-            
-            supplier_table = Table(supplier_data, colWidths=[1.5*inch, 4.5*inch])
-            supplier_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            story.append(supplier_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Line Items
-            table_data = [['SKU', 'Description', 'Qty', 'Unit Price', 'Total']]
-            
-            total = 0
-            for item in items:
-                product = item.get('product', {})
-                qty = item.get('quantity', 0)
-                unit_price = float(item.get('unit_cost', 0))
-                item_total = qty * unit_price
-                total += item_total
-                
-                table_data.append([
-                    item.get('supplier_sku', product.get('asin', '')),
-                    product.get('title', '')[:50],  # Truncate long titles
-                    str(qty),
-                    f"${unit_price:.2f}",
-                    f"${item_total:.2f}"
-                ])
-            
-            # Total row
-            table_data.append(['', '', '', 'TOTAL:', f"${total:.2f}"])
-            
-            items_table = Table(table_data, colWidths=[1*inch, 3*inch, 0.8*inch, 1*inch, 1*inch])
-            items_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (-1, -1), (-1, -1), 'Helvetica-Bold'),
-                ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),
-            ]))
-            story.append(items_table)
-            
-            # Build PDF
-            doc.build(story)
-            buffer.seek(0)
-            return buffer.read()
+            pdf_bytes = await asyncio.to_thread(po_renderer.render, order, po_number)
+            po_pdf_store.put(self.user_id, po_number, pdf_bytes)
+            return pdf_bytes
         
         except Exception as e:
             logger.error(f"Failed to generate PO PDF: {e}", exc_info=True)
             return None
     
+    async def get_po_document(
+        self,
+        supplier_order_id: str,
+        not_before: Optional[str] = None,
+        regenerate: bool = False
+    ) -> Optional[Dict]:
+        """
+        PO for an order: the latest PO generation (from the PDF store, or
+        re-rendered under the same number if the file is gone) unless
+        regenerate is set or the order changed after it (not_before);
+        otherwise a new PO number, PDF and generation record.
+        
+        Returns {'po_number', 'po_generation_id', 'pdf_bytes', 'reused'} or None.
+        """
+        if not regenerate:
+            query = supabase.table('po_generations').select('id, po_number, created_at').eq(
+                'supplier_order_id', supplier_order_id
+            ).eq('user_id', self.user_id)
+            if not_before:
+                query = query.gte('created_at', not_before)
+            latest = query.order('created_at', desc=True).limit(1).execute()
+            
+            if latest.data:
+                generation = latest.data[0]
+                po_number = generation['po_number']
+                pdf_bytes = po_pdf_store.get(self.user_id, po_number) \
+                    or await self.generate_po_pdf(supplier_order_id, po_number)
+                if pdf_bytes:
+                    return {
+                        'po_number': po_number,
+                        'po_generation_id': generation['id'],
+                        'pdf_bytes': pdf_bytes,
+                        'reused': True
+                    }
+        
+        po_number = await self.generate_po_number()
+        pdf_bytes = await self.generate_po_pdf(supplier_order_id, po_number)
+        if not pdf_bytes:
+            return None
+        
+        po_gen_result = await self.create_po_generation(
+            supplier_order_id=supplier_order_id,
+            pdf_filename=f"{po_number}.pdf",
+            po_number=po_number
+        )
+        return {
+            'po_number': po_number,
+            'po_generation_id': po_gen_result['po_generation_id'],
+            'pdf_bytes': pdf_bytes,
+            'reused': False
+        }
+    
     def render_email_template(
         self,
         template: Dict,
@@ -226,9 +161,15 @@ class POEmailService:
         supplier_order_id: str,
         po_number: str,
         template_id: Optional[str] = None,
-        pdf_bytes: Optional[bytes] = None
+        pdf_bytes: Optional[bytes] = None,
+        po_generation_id: Optional[str] = None
     ) -> Dict:
-        """Send PO email to supplier."""
+        """
+        Queue PO email to supplier.
+        
+        The outbox drain sends it; its completion marks the tracking row,
+        the PO generation and the draft order as sent.
+        """
         if not self.sendgrid_enabled:
             raise ValueError("SendGrid not configured")
         
@@ -287,67 +228,62 @@ class POEmailService:
             if not recipient_email:
                 raise ValueError("Supplier has no email address")
             
-            # Send via SendGrid
-            sg = SendGridAPIClient(self.sendgrid_api_key)
-            
-            from_email = Email(os.getenv('SENDGRID_FROM_EMAIL', 'orders@habexa.com'))
-            to_email = To(recipient_email)
-            
-            message = Mail(
-                from_email=from_email,
-                to_emails=to_email,
-                subject=subject,
-                plain_text_content=body_text,
-                html_content=body_html
-            )
-            
-            # Add CC/BCC
-            for cc in template.get('cc_emails', []):
-                message.add_cc(Email(cc))
-            
-            for bcc in template.get('bcc_emails', []):
-                message.add_bcc(Email(bcc))
+            cc_emails = list(template.get('cc_emails') or [])
+            bcc_emails = list(template.get('bcc_emails') or [])
             
             # Add BCC to user
             user_result = supabase.table('profiles').select('email').eq('id', self.user_id).limit(1).execute()
             if user_result.data and user_result.data[0].get('email'):
-                message.add_bcc(Email(user_result.data[0]['email']))
+                bcc_emails.append(user_result.data[0]['email'])
             
             # Attach PDF if provided
+            attachments = None
             if pdf_bytes:
-                import base64
-                encoded_pdf = base64.b64encode(pdf_bytes).decode()
-                attachment = Attachment()
-                attachment.file_content = FileContent(encoded_pdf)
-                attachment.file_type = FileType('application/pdf')
-                attachment.file_name = FileName(f"{po_number}.pdf")
-                attachment.disposition = Disposition('attachment')
-                message.attachment = attachment
-            
-            # Send
-            response = sg.send(message)
-            
-            # Store email tracking
-            email_id = response.headers.get('X-Message-Id')
+                attachments = [{
+                    'filename': f"{po_number}.pdf",
+                    'content': base64.b64encode(pdf_bytes).decode(),
+                    'content_type': 'application/pdf'
+                }]
             
+            # Store email tracking (completed by the outbox)
             tracking_data = {
                 'user_id': self.user_id,
-                'po_generation_id': None,  # Will be set after creating po_generation
-                'email_id': email_id,
+                'po_generation_id': po_generation_id,
+                'email_id': None,
                 'recipient': recipient_email,
                 'subject': subject,
-                'status': 'sent',
-                'sent_at': datetime.utcnow().isoformat()
+                'status': 'pending'
             }
             
             tracking_result = supabase.table('email_tracking').insert(tracking_data).execute()
             tracking_id = tracking_result.data[0]['id'] if tracking_result.data else None
             
+            outbox_id = email_outbox.enqueue(
+                recipient_email,
+                subject,
+                body_html,
+                body_text,
+                provider="sendgrid",
+                from_email=os.getenv('SENDGRID_FROM_EMAIL', 'orders@habexa.com'),
+                from_name="",
+                cc=cc_emails,
+                bcc=bcc_emails,
+                attachments=attachments,
+                idempotency_key=f"po:{self.user_id}:{po_number}:{tracking_id}",
+                user_id=self.user_id,
+                context={
+                    'tracking_id': tracking_id,
+                    'po_generation_id': po_generation_id,
+                    'supplier_order_id': supplier_order_id
+                }
+            )
+            
             return {
                 'success': True,
-                'email_id': email_id,
-                'tracking_id': tracking_id,
-                'status_code': response.status_code
+                'queued': True,
+                'outbox_id': outbox_id,
+                'email_id': None,
+                'tracking_id': tracking_id
             }
         
         except Exception as e:
@@ -358,28 +294,24 @@ class POEmailService:
         self,
         supplier_order_id: str,
         pdf_bytes: Optional[bytes] = None,
-        pdf_filename: Optional[str] = None
+        pdf_filename: Optional[str] = None,
+        po_number: Optional[str] = None
     ) -> Dict:
-        """Create PO generation record and optionally send email."""
-        import base64
-        
+        """Create PO generation record (pass po_number when the PDF already carries one)."""
         try:
-            # Generate PO number
-            po_number = await self.generate_po_number()
+            if not po_number:
+                po_number = await self.generate_po_number()
             
-            # TODO: Upload PDF to S3/storage and get URL
-            pdf_url = None
+            # PDFs live in the local PO store, not base64 in the row
             if pdf_bytes:
-                # For now, store as base64 in database (not ideal for production)
-                # In production, upload to S3 and store URL
-                pdf_url = f"data:application/pdf;base64,{base64.b64encode(pdf_bytes).decode()}"
+                po_pdf_store.put(self.user_id, po_number, pdf_bytes)
             
             # Create PO generation record
             po_data = {
                 'user_id': self.user_id,
                 'supplier_order_id': supplier_order_id,
                 'po_number': po_number,
-                'pdf_url': pdf_url,
+                'pdf_url': None,
                 'pdf_filename': pdf_filename or f"{po_number}.pdf",
                 'status': 'draft'
             }
@@ -396,4 +328,3 @@ class POEmailService:
         except Exception as e:
             logger.error(f"Failed to create PO generation: {e}", exc_info=True)
             raise
-
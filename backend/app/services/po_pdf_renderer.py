@@ -0,0 +1,210 @@
+"""
+Purchase order PDF rendering.
+
+Rendering is plain CPU work, so it lives here as synchronous code that
+callers run off the event loop (asyncio.to_thread in the API, Celery in
+render_purchase_orders). Paragraph and table styles are built once per
+process, orders are loaded with only the columns the document prints,
+and rendered PDFs are kept in a local file store keyed by PO number so a
+resend reads the file instead of rendering again.
+"""
+import os
+import logging
+import tempfile
+from io import BytesIO
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+try:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    logger.warning("ReportLab not installed. PO PDF generation will not work.")
+    REPORTLAB_AVAILABLE = False
+
+PO_PDF_STORE_DIR = os.getenv("PO_PDF_STORE_DIR", os.path.join(tempfile.gettempdir(), "po_pdfs"))
+ORDER_CHUNK_SIZE = 50  # Orders per query; each carries all of its line items
+TITLE_MAX_LENGTH = 50
+
+# Only what the document prints
+ORDER_COLUMNS = """
+    id,
+    user_id,
+    supplier:suppliers(*),
+    items:supplier_order_items(
+        quantity,
+        unit_cost,
+        product:products(asin, title)
+    )
+"""
+
+
+@lru_cache(maxsize=1)
+def _templates() -> Dict[str, Any]:
+    """Paragraph and table styles, built once per process."""
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1a1a1a'),
+            alignment=TA_CENTER,
+            spaceAfter=30
+        ),
+        "po_number": ParagraphStyle(
+            'PONumber',
+            parent=styles['Normal'],
+            fontSize=14,
+            alignment=TA_RIGHT
+        ),
+        "supplier_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        "items_table": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTNAME', (-1, -1), (-1, -1), 'Helvetica-Bold'),
+            ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),
+        ]),
+        "supplier_widths": [1.5 * inch, 4.5 * inch],
+        "items_widths": [1 * inch, 3 * inch, 0.8 * inch, 1 * inch, 1 * inch],
+    }
+
+
+def _one(value) -> Dict[str, Any]:
+    """Embedded to-one relations can come back as a list."""
+    if isinstance(value, list):
+        return value[0] if value else {}
+    return value or {}
+
+
+class POPdfStore:
+    """
+    Rendered PO PDFs on local disk: {PO_PDF_STORE_DIR}/{user_id}/{po_number}.pdf
+    """
+
+    def __init__(self, root: str = PO_PDF_STORE_DIR):
+        self.root = root
+
+    def path(self, user_id: str, po_number: str) -> str:
+        return os.path.join(self.root, user_id, f"{po_number}.pdf")
+
+    def get(self, user_id: str, po_number: str) -> Optional[bytes]:
+        try:
+            with open(self.path(user_id, po_number), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Could not read stored PO {po_number}: {e}")
+            return None
+
+    def put(self, user_id: str, po_number: str, pdf_bytes: bytes) -> Optional[str]:
+        """Write atomically (temp file + rename); returns the path or None."""
+        path = self.path(user_id, po_number)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, path)
+            return path
+        except OSError as e:
+            logger.warning(f"Could not store PO {po_number}: {e}")
+            return None
+
+
+class PORenderer:
+    """
+    Loads supplier orders and renders them as purchase order PDFs.
+    """
+
+    def load_orders(self, user_id: str, supplier_order_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """supplier_order_id -> order with supplier and line items, in chunked queries."""
+        orders = {}
+        for i in range(0, len(supplier_order_ids), ORDER_CHUNK_SIZE):
+            chunk = supplier_order_ids[i:i + ORDER_CHUNK_SIZE]
+            result = supabase.table('supplier_orders')\
+                .select(ORDER_COLUMNS)\
+                .eq('user_id', user_id)\
+                .in_('id', chunk)\
+                .execute()
+            orders.update({o['id']: o for o in result.data or []})
+        return orders
+
+    def render(self, order: Dict[str, Any], po_number: str, po_date: Optional[datetime] = None) -> bytes:
+        """One order as PO PDF bytes. CPU-bound - keep it off the event loop."""
+        if not REPORTLAB_AVAILABLE:
+            raise RuntimeError("ReportLab not available, cannot generate PDF")
+
+        templates = _templates()
+        supplier = _one(order.get('supplier'))
+        po_date = po_date or datetime.utcnow()
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch)
+        story = [
+            Paragraph("PURCHASE ORDER", templates["title"]),
+            Spacer(1, 0.2 * inch),
+            Paragraph(f"PO Number: <b>{po_number}</b>", templates["po_number"]),
+            Paragraph(f"Date: {po_date.strftime('%B %d, %Y')}", templates["po_number"]),
+            Spacer(1, 0.3 * inch),
+        ]
+
+        supplier_table = Table([
+            ['Supplier:', supplier.get('name') or ''],
+            ['Contact:', supplier.get('contact_email') or supplier.get('email') or ''],
+            ['Phone:', supplier.get('contact_phone') or supplier.get('phone') or ''],
+            ['Address:', supplier.get('address') or '']
+        ], colWidths=templates["supplier_widths"])
+        supplier_table.setStyle(templates["supplier_table"])
+        story.append(supplier_table)
+        story.append(Spacer(1, 0.3 * inch))
+
+        table_data = [['SKU', 'Description', 'Qty', 'Unit Price', 'Total']]
+        total = 0
+        for item in order.get('items') or []:
+            product = _one(item.get('product'))
+            qty = item.get('quantity') or 0
+            unit_price = float(item.get('unit_cost') or 0)
+            item_total = qty * unit_price
+            total += item_total
+            table_data.append([
+                product.get('asin') or '',
+                (product.get('title') or '')[:TITLE_MAX_LENGTH],
+                str(qty),
+                f"${unit_price:.2f}",
+                f"${item_total:.2f}"
+            ])
+        table_data.append(['', '', '', 'TOTAL:', f"${total:.2f}"])
+
+        items_table = Table(table_data, colWidths=templates["items_widths"])
+        items_table.setStyle(templates["items_table"])
+        story.append(items_table)
+
+        doc.build(story)
+        return buffer.getvalue()
+
+
+# Singletons
+po_pdf_store = POPdfStore()
+po_renderer = PORenderer()
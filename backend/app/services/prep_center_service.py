@@ -5,7 +5,9 @@ Handles prep center management, fee calculation, product assignment, and cost br
 import logging
 from typing import Dict, Any, List, Optional
 from decimal import Decimal
+from datetime import datetime
 from app.services.supabase_client import supabase
+from app.services.prep_fee_matrix import prep_fee_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -291,77 +293,83 @@ class PrepCenterService:
         Returns assignment data or None.
         """
         try:
-            # Get all active prep centers for user
-            centers_res = supabase.table("prep_centers")\
-                .select("*")\
-                .eq("user_id", user_id)\
-                .eq("status", "active")\
-                .execute()
-            
-            centers = centers_res.data or []
-            
-            if not centers:
-                return None
-            
-            # Determine required services
-            required_services = PrepCenterService.determine_required_services(product)
-            
-            # Find matching fees for each service at each center
-            best_center = None
-            best_cost = None
-            
-            for center in centers:
-                center_id = center["id"]
-                
-                # Check if center has required capabilities
-                if not PrepCenterService._center_has_capabilities(center, product, required_services):
-                    continue
-                
-                # Match services to fees
-                matched_services = []
-                for service in required_services:
-                    service_code = service.get("service_code")
-                    fee = PrepCenterService.find_matching_fees(center_id, service_code, product)
-                    
-                    if fee:
-                        matched_services.append({
-                            "service_code": service_code,
-                            "service_name": service.get("service_name"),
-                            "fee_id": fee["id"]
-                        })
-                
-                if not matched_services:
-                    continue  # Center doesn't offer required services
-                
-                # Calculate total cost
-                cost_result = PrepCenterService.calculate_prep_cost(
-                    product, center_id, matched_services, quantity=1
-                )
-                
-                total_cost = cost_result.get("unit_cost", float('inf'))
-                
-                if best_cost is None or total_cost < best_cost:
-                    best_cost = total_cost
-                    best_center = center
-                    best_services = matched_services
-                    best_breakdown = cost_result
-            
-            if not best_center:
-                return None
-            
-            return {
-                "prep_center_id": best_center["id"],
-                "prep_center_name": best_center["company_name"],
-                "required_services": best_services,
-                "total_prep_cost_per_unit": best_breakdown.get("unit_cost", 0),
-                "breakdown": best_breakdown.get("breakdown", {}),
-                "assignment_reason": f"auto_{strategy}"
-            }
+            return prep_fee_matrix.assign(user_id, [product], strategy)[0]
             
         except Exception as e:
             logger.error(f"Error auto-assigning prep center: {e}", exc_info=True)
             return None
     
+    @staticmethod
+    def auto_assign_prep_centers(
+        products: List[Dict[str, Any]],
+        user_id: str,
+        strategy: str = "cheapest"
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Auto-assign a batch of products in one pass over the user's cached
+        fee matrix. Returns assignments aligned with products (None where no
+        center fits).
+        """
+        try:
+            return prep_fee_matrix.assign(user_id, products, strategy)
+            
+        except Exception as e:
+            logger.error(f"Error auto-assigning prep centers: {e}", exc_info=True)
+            return [None] * len(products)
+    
+    @staticmethod
+    def save_assignments(
+        user_id: str,
+        assignments: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """
+        Persist product_id -> assignment: one deactivate, one bulk insert,
+        and one products update per distinct (center, cost).
+        """
+        if not assignments:
+            return
+        
+        product_ids = list(assignments)
+        now = datetime.utcnow().isoformat()
+        
+        supabase.table("product_prep_assignments")\
+            .update({"is_active": False})\
+            .in_("product_id", product_ids)\
+            .eq("user_id", user_id)\
+            .execute()
+        
+        supabase.table("product_prep_assignments").insert([
+            {
+                "product_id": product_id,
+                "prep_center_id": a["prep_center_id"],
+                "user_id": user_id,
+                "assignment_reason": a["assignment_reason"],
+                "required_services": a["required_services"],
+                "total_prep_cost_per_unit": a["total_prep_cost_per_unit"],
+                "breakdown": a["breakdown"],
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now
+            }
+            for product_id, a in assignments.items()
+        ]).execute()
+        
+        # Products with the same services share a cost, so this is a handful of updates
+        groups: Dict[tuple, List[str]] = {}
+        for product_id, a in assignments.items():
+            groups.setdefault((a["prep_center_id"], a["total_prep_cost_per_unit"]), []).append(product_id)
+        
+        for (prep_center_id, cost), ids in groups.items():
+            supabase.table("products")\
+                .update({
+                    "prep_cost_per_unit": cost,
+                    "prep_center_id": prep_center_id,
+                    "updated_at": now
+                })\
+                .in_("id", ids)\
+                .eq("user_id", user_id)\
+                .execute()
+    
     @staticmethod
     def _center_has_capabilities(
         center: Dict[str, Any],
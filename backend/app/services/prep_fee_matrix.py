@@ -0,0 +1,337 @@
+"""
+In-memory prep center fee matrix.
+
+Loads a user's active prep centers and all their active fees in two queries
+and keeps them per process, so assigning a batch of products costs no
+Supabase round trips per product or per center.
+
+For a batch, the fees are laid out as center x service coefficient arrays
+(tiers resolved for the batch quantity) and every product's unit cost at
+every center is computed in one numpy pass. Fee writers call
+invalidate(user_id), which bumps a Redis version so every process reloads
+that user's schedule on its next lookup.
+"""
+import re
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from app.services.supabase_client import supabase
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "prep_fees:version:{user_id}"
+SCHEDULE_MAX_AGE_SECONDS = 600  # Reload even without a version bump (e.g. rows edited in SQL)
+VERSION_CHECK_SECONDS = 5  # At most one Redis GET per user per this interval
+LOAD_PAGE_SIZE = 1000
+
+
+def _like_pattern(service_code: str) -> "re.Pattern":
+    """service_name ILIKE '%code%' as a regex (_ and % keep their SQL meaning)."""
+    parts = [".*" if c == "%" else "." if c == "_" else re.escape(c) for c in service_code]
+    return re.compile("".join(parts), re.IGNORECASE)
+
+
+def _tier_cost(fee: Dict[str, Any], quantity: int) -> float:
+    """Per-unit cost of a per_unit fee at a quantity, same tier rule as PrepCenterService."""
+    base_cost = float(fee.get("base_cost") or 0)
+    tiered = fee.get("tiered_pricing")
+    if tiered and isinstance(tiered, list):
+        for tier in tiered:
+            min_qty = tier.get("min_qty", 0)
+            max_qty = tier.get("max_qty")
+            if quantity >= min_qty and (max_qty is None or quantity <= max_qty):
+                return float(tier.get("cost", base_cost))
+    return base_cost
+
+
+class PrepFeeSchedule:
+    """
+    One user's active centers and fees, with fee lookup by service code.
+    """
+
+    def __init__(self, centers: List[Dict[str, Any]], fees: List[Dict[str, Any]]):
+        self.centers = centers
+        self._fees: Dict[str, List[Dict[str, Any]]] = {}
+        for fee in fees:
+            self._fees.setdefault(fee.get("prep_center_id"), []).append(fee)
+        self._matches: Dict[tuple, Optional[Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(f) for f in self._fees.values())
+
+    def fee_for(self, center_id: str, service_code: str) -> Optional[Dict[str, Any]]:
+        """
+        Fee a center charges for a service: exact service_code first, then a
+        service_name containing the code (like find_matching_fees).
+        """
+        key = (center_id, service_code)
+        if key not in self._matches:
+            fees = self._fees.get(center_id, [])
+            pattern = _like_pattern(service_code)
+            self._matches[key] = next((f for f in fees if f.get("service_code") == service_code), None) \
+                or next((f for f in fees if pattern.search(f.get("service_name") or "")), None)
+        return self._matches[key]
+
+    def assign(
+        self,
+        products: List[Dict[str, Any]],
+        strategy: str = "cheapest",
+        quantity: int = 1
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Best center for every product, aligned with products (None where no
+        active center offers the product's services).
+
+        Strategies:
+        - "cheapest": Lowest unit cost
+        - "fastest": Shortest capabilities.turnaround_days, then cheapest
+          (centers without a tracked turnaround rank last)
+        - "capability": Most required services offered, then cheapest
+        """
+        from app.services.prep_center_service import PrepCenterService
+
+        if not products or not self.centers:
+            return [None] * len(products)
+
+        quantity = max(int(quantity or 1), 1)
+        required = [PrepCenterService.determine_required_services(p) for p in products]
+        codes = sorted({s["service_code"] for services in required for s in services})
+        code_index = {code: i for i, code in enumerate(codes)}
+
+        # Product x service requirements and the product attributes fees scale with
+        needs = np.zeros((len(products), len(codes)), dtype=bool)
+        for p, services in enumerate(required):
+            needs[p, [code_index[s["service_code"]] for s in services]] = True
+        weight = np.array([float(p.get("item_weight") or 0) for p in products])
+        wholesale = np.array([float(p.get("wholesale_cost") or 0) for p in products])
+
+        fees = [[self.fee_for(c["id"], code) for code in codes] for c in self.centers]
+        coefficients = self._coefficients(fees, quantity)
+        offered = coefficients["offered"]
+
+        # products x centers x services unit costs
+        cost = coefficients["fixed"][None] \
+            + coefficients["per_pound"][None] * weight[:, None, None] \
+            + np.clip(coefficients["rate"][None] * wholesale[:, None, None] * quantity,
+                      coefficients["minimum"][None], coefficients["maximum"][None]) / quantity
+        charged = needs[:, None, :] & offered[None]
+        cost = np.where(charged, cost, 0.0)
+        unit_cost = cost.sum(axis=2)
+        matched = charged.sum(axis=2)
+
+        eligible = (matched > 0) & self._capable(products, needs, codes)
+        if strategy == "fastest":
+            primary = np.broadcast_to(self._turnaround()[None], unit_cost.shape)
+        elif strategy == "capability":
+            primary = -matched
+        else:
+            primary = np.zeros(unit_cost.shape)
+        best = self._pick(primary, unit_cost, eligible)
+
+        assignments: List[Optional[Dict[str, Any]]] = []
+        for p, c in enumerate(best):
+            if c < 0:
+                assignments.append(None)
+                continue
+            center = self.centers[c]
+            services, breakdown = [], {}
+            for service in required[p]:
+                s = code_index[service["service_code"]]
+                fee = fees[c][s]
+                if not fee:
+                    continue
+                services.append({
+                    "service_code": service["service_code"],
+                    "service_name": service.get("service_name"),
+                    "fee_id": fee["id"]
+                })
+                if cost[p, c, s]:
+                    breakdown[service["service_code"]] = round(float(cost[p, c, s]), 4)
+            assignments.append({
+                "prep_center_id": center["id"],
+                "prep_center_name": center.get("company_name"),
+                "required_services": services,
+                "total_prep_cost_per_unit": round(float(unit_cost[p, c]), 4),
+                "breakdown": breakdown,
+                "assignment_reason": f"auto_{strategy}"
+            })
+        return assignments
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    @staticmethod
+    def _coefficients(fees: List[List[Optional[Dict[str, Any]]]], quantity: int) -> Dict[str, np.ndarray]:
+        """
+        center x service arrays so that a product's unit cost for a fee is
+        fixed + per_pound * weight + clip(rate * wholesale * qty, minimum, maximum) / qty.
+        """
+        shape = (len(fees), len(fees[0]) if fees else 0)
+        arrays = {name: np.zeros(shape) for name in ("fixed", "per_pound", "rate", "minimum")}
+        arrays["maximum"] = np.full(shape, np.inf)
+        arrays["offered"] = np.zeros(shape, dtype=bool)
+
+        for c, row in enumerate(fees):
+            for s, fee in enumerate(row):
+                if not fee:
+                    continue
+                arrays["offered"][c, s] = True
+                fee_type = fee.get("fee_type")
+                base_cost = float(fee.get("base_cost") or 0)
+                if fee_type == "per_unit":
+                    arrays["fixed"][c, s] = _tier_cost(fee, quantity)
+                elif fee_type == "per_pound":
+                    arrays["per_pound"][c, s] = base_cost
+                elif fee_type == "per_day":
+                    arrays["fixed"][c, s] = base_cost * float(fee.get("days") or 30)
+                elif fee_type == "percentage":
+                    arrays["rate"][c, s] = float(fee.get("percentage_rate") or 0) / 100
+                    arrays["minimum"][c, s] = float(fee.get("minimum_charge") or 0)
+                    if fee.get("maximum_charge"):
+                        arrays["maximum"][c, s] = float(fee["maximum_charge"])
+                else:
+                    # per_pallet / flat / unknown: one charge spread over the quantity
+                    arrays["fixed"][c, s] = base_cost / quantity
+        return arrays
+
+    def _capable(self, products: List[Dict[str, Any]], needs: np.ndarray, codes: List[str]) -> np.ndarray:
+        """products x centers mask, same rules as PrepCenterService._center_has_capabilities."""
+        polybag_cols = [i for i, code in enumerate(codes) if "POLYBAG" in code]
+        hazmat_cols = [i for i, code in enumerate(codes) if "HAZMAT" in code]
+        need_polybag = needs[:, polybag_cols].any(axis=1)
+        need_hazmat = needs[:, hazmat_cols].any(axis=1) | np.array([bool(p.get("is_hazmat")) for p in products])
+
+        capabilities = [c.get("capabilities") or {} for c in self.centers]
+        has_polybag = np.array([bool(c.get("polybagging", False)) for c in capabilities])
+        has_hazmat = np.array([bool(c.get("hazmat", False)) for c in capabilities])
+        return ~(need_polybag[:, None] & ~has_polybag[None]) & ~(need_hazmat[:, None] & ~has_hazmat[None])
+
+    def _turnaround(self) -> np.ndarray:
+        days = [(c.get("capabilities") or {}).get("turnaround_days") for c in self.centers]
+        return np.array([float(d) if d is not None else np.inf for d in days])
+
+    @staticmethod
+    def _pick(primary: np.ndarray, unit_cost: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        """Per product: lowest primary key among eligible centers, ties by cost, -1 if none."""
+        keyed = np.where(eligible, primary, np.inf)
+        best_primary = keyed.min(axis=1, initial=np.inf)
+        candidates = eligible & (keyed == best_primary[:, None])
+        best = np.where(candidates, unit_cost, np.inf).argmin(axis=1)
+        return np.where(eligible.any(axis=1), best, -1)
+
+
+class PrepFeeMatrix:
+    """
+    Process-wide cache of PrepFeeSchedules, one per user.
+
+    Lookups compare the user's Redis version counter (at most one GET every
+    VERSION_CHECK_SECONDS) and reload when another process has changed that
+    user's centers or fees.
+    """
+
+    def __init__(self):
+        self._schedules: Dict[str, PrepFeeSchedule] = {}
+        self._versions: Dict[str, Optional[str]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def schedule(self, user_id: str) -> PrepFeeSchedule:
+        self._ensure_fresh(user_id)
+        if user_id not in self._schedules:
+            centers = self._load_all(
+                lambda: supabase.table("prep_centers")
+                .select("id, company_name, capabilities, free_storage_days")
+                .eq("user_id", user_id)
+                .eq("status", "active")
+                .order("created_at,id")
+            )
+            fees = self._load_all(
+                lambda: supabase.table("prep_center_fees")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("is_active", True)
+                .order("display_order,id")
+            ) if centers else []
+            self._schedules[user_id] = PrepFeeSchedule(centers, fees)
+            self._loaded_at[user_id] = time.time()
+            logger.info(f"📦 Loaded {len(centers)} prep centers / {len(fees)} fees for user {user_id}")
+        return self._schedules[user_id]
+
+    def assign(
+        self,
+        user_id: str,
+        products: List[Dict[str, Any]],
+        strategy: str = "cheapest",
+        quantity: int = 1
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Best center for each product (see PrepFeeSchedule.assign)."""
+        return self.schedule(user_id).assign(products, strategy, quantity)
+
+    def invalidate(self, user_id: str):
+        """Call after writing a user's prep_centers or prep_center_fees."""
+        self._schedules.pop(user_id, None)
+        client = get_redis_client()
+        if client:
+            try:
+                client.incr(VERSION_KEY.format(user_id=user_id))
+            except Exception as e:
+                logger.warning(f"Could not bump prep fee version for user {user_id}: {e}")
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _ensure_fresh(self, user_id: str):
+        now = time.time()
+        if user_id in self._schedules and now - self._checked_at.get(user_id, 0) < VERSION_CHECK_SECONDS:
+            return
+        self._checked_at[user_id] = now
+
+        version = None
+        client = get_redis_client()
+        if client:
+            try:
+                version = client.get(VERSION_KEY.format(user_id=user_id))
+            except Exception:
+                pass
+
+        if version != self._versions.get(user_id) \
+                or now - self._loaded_at.get(user_id, 0) > SCHEDULE_MAX_AGE_SECONDS:
+            self._schedules.pop(user_id, None)
+            self._versions[user_id] = version
+
+    def _load_all(self, build_query) -> List[Dict]:
+        """
+        Every row of the query, page by page. The query must order by a
+        unique key (one order param - PostgREST ignores repeats) so pages are
+        stable. Raises if any page fails, so a partial schedule is never
+        cached (missing fees would price prep too cheap). postgrest-py < 0.14
+        (pinned via supabase 2.0.3) treats range()'s end as exclusive.
+        """
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            try:
+                result = build_query().range(start, start + LOAD_PAGE_SIZE).execute()
+            except Exception as e:
+                logger.error(f"Failed to load prep center rows: {e}")
+                raise
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                break
+            start += LOAD_PAGE_SIZE
+        return rows
+
+
+# Singleton - shared by API handlers and upload tasks in the process
+prep_fee_matrix = PrepFeeMatrix()
@@ -1,5 +1,7 @@
 from typing import Dict, Any, Optional
 
+from app.services.profitability_engine import profitability_engine
+
 
 def calculate_profit(
     buy_cost: float,
@@ -10,7 +12,7 @@ def calculate_profit(
     inbound_shipping: float = 0.50,
     category: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Calculate profitability metrics for a product."""
+    """Calculate profitability metrics for a product (adapter over ProfitabilityEngine)."""
     
     # Estimate referral fee if not provided
     if referral_fee is None:
@@ -21,30 +23,29 @@ def calculate_profit(
     if fba_fee is None:
         fba_fee = estimate_fba_fee(sell_price)
     
-    # Calculate totals
-    total_cost = buy_cost + prep_cost + inbound_shipping
     total_amazon_fees = fba_fee + referral_fee
-    net_payout = sell_price - total_amazon_fees
-    net_profit = net_payout - total_cost
-    
-    # ROI and margin
-    roi = (net_profit / total_cost * 100) if total_cost > 0 else 0
-    margin = (net_profit / sell_price * 100) if sell_price > 0 else 0
+    calc = profitability_engine.compute_one(
+        sell_price=sell_price,
+        fees_total=total_amazon_fees,
+        buy_cost=buy_cost,
+        prep_cost=prep_cost,
+        inbound_shipping=inbound_shipping,
+    )
     
     return {
-        "buy_cost": round(buy_cost, 2),
-        "prep_cost": round(prep_cost, 2),
-        "inbound_shipping": round(inbound_shipping, 2),
-        "total_cost": round(total_cost, 2),
-        "sell_price": round(sell_price, 2),
+        "buy_cost": calc["unit_cost"],
+        "prep_cost": calc["prep_cost"],
+        "inbound_shipping": calc["inbound_shipping"],
+        "total_cost": calc["landed_cost"],
+        "sell_price": calc["sell_price"],
         "fba_fee": round(fba_fee, 2),
         "referral_fee": round(referral_fee, 2),
-        "total_amazon_fees": round(total_amazon_fees, 2),
-        "net_payout": round(net_payout, 2),
-        "net_profit": round(net_profit, 2),
-        "roi": round(roi, 2),
-        "margin": round(margin, 2),
-        "is_profitable": net_profit > 0,
+        "total_amazon_fees": calc["fees_total"],
+        "net_payout": round(calc["sell_price"] - calc["fees_total"], 2),
+        "net_profit": calc["net_profit"],
+        "roi": calc["roi"],
+        "margin": calc["margin"],
+        "is_profitable": calc["net_profit"] > 0,
     }
 
 
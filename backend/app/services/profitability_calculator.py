@@ -3,43 +3,43 @@ Profitability Calculator Service
 
 Calculates profit, ROI, margin, break-even, and classifies products into tiers.
 Used by analyzer dashboard and auto-calculated after file upload.
+
+Maps product/product_source records onto ProfitabilityEngine columns; the
+arithmetic, tiers and risk levels live in the engine.
 """
 import logging
 from typing import Dict, Any, Optional, List
-from decimal import Decimal, ROUND_HALF_UP
+
+from app.services.profitability_engine import (
+    profitability_engine,
+    ProfitabilityEngine,
+    DEFAULT_PREP_COST,
+    DEFAULT_INBOUND_RATE,
+)
+from app.services.sales_velocity_model import sales_velocity_model
 
 logger = logging.getLogger(__name__)
 
+GRAMS_PER_LB = 453.592
+
 
 class ProfitabilityCalculator:
     """
     Calculates profitability metrics for Amazon products.
     
-    Formulas:
+    Formulas (see ProfitabilityEngine):
     - Profit = sell_price - (buy_cost + prep_cost + inbound_shipping + fba_fee + referral_fee)
-    - ROI = (profit / total_cost) * 100
+    - ROI = (profit / landed_cost) * 100, landed_cost = buy_cost + prep_cost + inbound_shipping
     - Margin = (profit / sell_price) * 100
     - Break-even = buy_cost + prep_cost + inbound_shipping + fba_fee + referral_fee
     """
     
-    # Default cost assumptions (can be overridden per user)
-    DEFAULT_PREP_COST = Decimal('0.10')  # $0.10 per unit
-    DEFAULT_INBOUND_SHIPPING_PER_LB = Decimal('0.35')  # $0.35 per pound
     DEFAULT_PACK_SIZE = 1
     
-    # Profit tier thresholds
-    EXCELLENT_ROI_THRESHOLD = 50.0  # 50%+ ROI
-    GOOD_ROI_THRESHOLD = 30.0  # 30-50% ROI
-    MARGINAL_ROI_THRESHOLD = 15.0  # 15-30% ROI
-    
-    # Risk level thresholds
-    LOW_RISK_MARGIN = 40.0  # Margin > 40%
-    LOW_RISK_SELLERS = 10  # Seller count < 10
-    LOW_RISK_BSR = 10000  # BSR < 10,000
-    
-    HIGH_RISK_MARGIN = 20.0  # Margin < 20%
-    HIGH_RISK_SELLERS = 50  # Seller count > 50
-    HIGH_RISK_BSR = 100000  # BSR > 100,000
+    # Thresholds are shared with the engine
+    EXCELLENT_ROI_THRESHOLD = ProfitabilityEngine.EXCELLENT_ROI_THRESHOLD
+    GOOD_ROI_THRESHOLD = ProfitabilityEngine.GOOD_ROI_THRESHOLD
+    MARGINAL_ROI_THRESHOLD = ProfitabilityEngine.MARGINAL_ROI_THRESHOLD
     
     @classmethod
     def calculate(
@@ -69,154 +69,109 @@ class ProfitabilityCalculator:
                 'est_monthly_sales': 48
             }
         """
-        try:
-            # Extract values with defaults
-            sell_price = cls._safe_decimal(product_data.get('sell_price') or product_data.get('amazon_price_current'))
-            buy_cost = cls._safe_decimal(product_source_data.get('buy_cost') or product_source_data.get('wholesale_cost'))
-            pack_size = product_source_data.get('pack_size', cls.DEFAULT_PACK_SIZE) or cls.DEFAULT_PACK_SIZE
-            
-            # If wholesale_cost is for entire pack, calculate per-unit cost
-            if product_source_data.get('wholesale_cost') and pack_size > 1:
-                buy_cost = cls._safe_decimal(product_source_data.get('wholesale_cost')) / Decimal(pack_size)
-            
-            # Fees (from product data or defaults)
-            fba_fee = cls._safe_decimal(product_data.get('fba_fees') or product_data.get('fba_fee') or 0)
-            referral_fee = cls._safe_decimal(product_data.get('referral_fee') or 0)
-            total_fees = cls._safe_decimal(product_data.get('fees_total') or 0)
-            
-            # If total_fees exists, use it; otherwise sum individual fees
-            if total_fees == 0:
-                total_fees = fba_fee + referral_fee
-            
-            # Prep cost (from prep assignment or user settings or default)
-            prep_cost = cls._get_prep_cost(product_data, user_settings)
-            
-            # Inbound shipping (estimate based on weight if available)
-            item_weight = product_data.get('item_weight') or product_data.get('package_weight')
-            if item_weight:
-                # Convert to pounds (assuming grams if > 100, otherwise already pounds)
-                weight_lbs = Decimal(item_weight) if item_weight < 100 else Decimal(item_weight) / Decimal('453.592')
-                inbound_shipping = weight_lbs * cls._safe_decimal(
-                    (user_settings or {}).get('inbound_shipping_per_lb') or cls.DEFAULT_INBOUND_SHIPPING_PER_LB
-                )
-            else:
-                # Default estimate: $0.35 for average product
-                inbound_shipping = cls.DEFAULT_INBOUND_SHIPPING_PER_LB
-            
-            # Validate we have required data
-            if not sell_price or sell_price <= 0:
-                logger.warning(f"Missing sell_price for product {product_data.get('id')}")
-                return cls._empty_result()
-            
-            if not buy_cost or buy_cost <= 0:
-                logger.warning(f"Missing buy_cost for product {product_data.get('id')}")
-                return cls._empty_result()
-            
-            # ===== CALCULATE PROFIT =====
-            total_cost = buy_cost + prep_cost + inbound_shipping + total_fees
-            profit_amount = sell_price - total_cost
-            
-            # ===== CALCULATE ROI =====
-            if total_cost > 0:
-                roi_percentage = (profit_amount / total_cost) * Decimal('100')
-            else:
-                roi_percentage = Decimal('0')
-            
-            # ===== CALCULATE MARGIN =====
-            if sell_price > 0:
-                margin_percentage = (profit_amount / sell_price) * Decimal('100')
-            else:
-                margin_percentage = Decimal('0')
-            
-            # ===== BREAK-EVEN PRICE =====
-            break_even_price = total_cost
-            
-            # ===== IS PROFITABLE =====
-            is_profitable = profit_amount > 0 and roi_percentage >= Decimal(str(cls.MARGINAL_ROI_THRESHOLD))
-            
-            # ===== PROFIT TIER =====
-            roi_float = float(roi_percentage)
-            if roi_float >= cls.EXCELLENT_ROI_THRESHOLD:
-                profit_tier = 'excellent'
-            elif roi_float >= cls.GOOD_ROI_THRESHOLD:
-                profit_tier = 'good'
-            elif roi_float >= cls.MARGINAL_ROI_THRESHOLD:
-                profit_tier = 'marginal'
-            else:
-                profit_tier = 'unprofitable'
+        product = dict(product_data)
+        product.setdefault('id', None)
+        source = dict(product_source_data or {}, product_id=product['id'])
+        result = cls.calculate_batch([product], [source], user_settings)[0]
+        result.pop('product_id', None)
+        return result
+    
+    @classmethod
+    def calculate_batch(
+        cls,
+        products: List[Dict[str, Any]],
+        product_sources: List[Dict[str, Any]],
+        user_settings: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Calculate profitability for multiple products at once.
+        
+        Builds one column per input and runs ProfitabilityEngine once for
+        the whole batch.
+        
+        Args:
+            products: List of product records
+            product_sources: List of product_source records (matched by product_id)
+            user_settings: Optional user-specific cost settings
             
-            # ===== RISK LEVEL =====
-            margin_float = float(margin_percentage)
-            seller_count = product_data.get('seller_count') or product_data.get('fba_seller_count') or 0
-            bsr = product_data.get('bsr') or product_data.get('current_sales_rank') or 999999
+        Returns:
+            List of calculated metrics dictionaries
+        """
+        if not products:
+            return []
+        
+        # Create lookup for product_sources by product_id
+        sources_by_product = {ps.get('product_id'): ps for ps in product_sources}
+        settings = user_settings or {}
+        default_prep = settings.get('prep_cost') or DEFAULT_PREP_COST
+        inbound_rate = settings.get('inbound_shipping_per_lb') or DEFAULT_INBOUND_RATE
+        
+        columns = {
+            'sell_price': [], 'fees_total': [], 'buy_cost': [], 'pack_size': [],
+            'prep_cost': [], 'weight_lb': [], 'seller_count': [], 'bsr': [],
+        }
+        for product in products:
+            source = sources_by_product.get(product.get('id'), {})
+            pack_size = source.get('pack_size') or cls.DEFAULT_PACK_SIZE
             
-            if (margin_float > cls.LOW_RISK_MARGIN and 
-                seller_count < cls.LOW_RISK_SELLERS and 
-                bsr < cls.LOW_RISK_BSR):
-                risk_level = 'low'
-            elif (margin_float < cls.HIGH_RISK_MARGIN or 
-                  seller_count > cls.HIGH_RISK_SELLERS or 
-                  bsr > cls.HIGH_RISK_BSR):
-                risk_level = 'high'
+            # wholesale_cost is for the entire pack; buy_cost is already per unit
+            if source.get('wholesale_cost') and pack_size > 1:
+                columns['buy_cost'].append(source.get('wholesale_cost'))
+                columns['pack_size'].append(pack_size)
             else:
-                risk_level = 'medium'
+                columns['buy_cost'].append(source.get('buy_cost') or source.get('wholesale_cost'))
+                columns['pack_size'].append(1)
             
-            # ===== ESTIMATED MONTHLY SALES =====
-            est_monthly_sales = cls._estimate_monthly_sales(
-                bsr=bsr,
-                category=product_data.get('category'),
-                sales_rank_30d=product_data.get('sales_rank_30_day_avg') or bsr
+            # fees_total if present, otherwise the individual fees
+            fees_total = product.get('fees_total') or (
+                (product.get('fba_fees') or product.get('fba_fee') or 0) + (product.get('referral_fee') or 0)
             )
+            columns['fees_total'].append(fees_total)
+            columns['sell_price'].append(product.get('sell_price') or product.get('amazon_price_current'))
             
-            # Round all decimals to 2 places
-            return {
-                'profit_amount': float(profit_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'roi_percentage': float(roi_percentage.quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)),
-                'margin_percentage': float(margin_percentage.quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)),
-                'break_even_price': float(break_even_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)),
-                'is_profitable': is_profitable,
-                'profit_tier': profit_tier,
-                'risk_level': risk_level,
-                'est_monthly_sales': est_monthly_sales
-            }
+            # Prep cost: prep center assignment, then user settings, then default
+            columns['prep_cost'].append(product.get('prep_cost_per_unit') or default_prep)
             
+            # Weight in pounds (grams if > 100)
+            item_weight = product.get('item_weight') or product.get('package_weight')
+            columns['weight_lb'].append(
+                (item_weight if item_weight < 100 else item_weight / GRAMS_PER_LB) if item_weight else None
+            )
+            columns['seller_count'].append(product.get('seller_count') or product.get('fba_seller_count'))
+            columns['bsr'].append(product.get('bsr') or product.get('current_sales_rank'))
+        
+        try:
+            calc = profitability_engine.compute(inbound_rate=inbound_rate, **columns)
         except Exception as e:
             logger.error(f"Error calculating profitability: {e}", exc_info=True)
-            return cls._empty_result()
-    
-    @staticmethod
-    def _get_prep_cost(product_data: Dict[str, Any], user_settings: Optional[Dict[str, Any]] = None) -> Decimal:
-        """
-        Get prep cost from prep assignment, user settings, or default.
+            return [{'product_id': p.get('id'), **cls._empty_result()} for p in products]
         
-        Priority:
-        1. prep_cost_per_unit from product (if assigned to prep center)
-        2. User settings prep_cost
-        3. Default prep cost
-        """
-        # Check if product has prep cost from assignment
-        prep_cost_per_unit = product_data.get('prep_cost_per_unit')
-        if prep_cost_per_unit:
-            return cls._safe_decimal(prep_cost_per_unit)
-        
-        # Check user settings
-        if user_settings and user_settings.get('prep_cost'):
-            return cls._safe_decimal(user_settings.get('prep_cost'))
+        results = []
+        for i, (product, row) in enumerate(zip(products, profitability_engine.rows(calc))):
+            product_id = product.get('id')
+            if not row['valid']:
+                logger.warning(f"Missing sell_price or buy_cost for product {product_id}")
+                results.append({'product_id': product_id, **cls._empty_result()})
+                continue
+            
+            bsr = columns['bsr'][i] or 999999
+            results.append({
+                'product_id': product_id,
+                'profit_amount': row['net_profit'],
+                'roi_percentage': round(row['roi'], 1),
+                'margin_percentage': round(row['margin'], 1),
+                'break_even_price': row['break_even_price'],
+                'is_profitable': row['is_profitable'],
+                'profit_tier': row['profit_tier'],
+                'risk_level': row['risk_level'],
+                'est_monthly_sales': cls._estimate_monthly_sales(
+                    bsr=bsr,
+                    category=product.get('category'),
+                    sales_rank_30d=product.get('sales_rank_30_day_avg') or bsr
+                )
+            })
         
-        # Default
-        return cls.DEFAULT_PREP_COST
-    
-    @staticmethod
-    def _safe_decimal(value: Any) -> Decimal:
-        """Convert value to Decimal safely."""
-        if value is None:
-            return Decimal('0')
-        if isinstance(value, Decimal):
-            return value
-        try:
-            return Decimal(str(value))
-        except (ValueError, TypeError):
-            return Decimal('0')
+        return results
     
     @staticmethod
     def _empty_result() -> Dict[str, Any]:
@@ -239,73 +194,12 @@ class ProfitabilityCalculator:
         sales_rank_30d: Optional[int] = None
     ) -> Optional[int]:
         """
-        Estimate monthly sales based on BSR and category.
-        
-        Uses rough estimates based on Amazon BSR ranges:
-        - BSR 1-1,000: ~500-1000 units/month
-        - BSR 1,000-10,000: ~100-500 units/month
-        - BSR 10,000-50,000: ~50-100 units/month
-        - BSR 50,000-100,000: ~20-50 units/month
-        - BSR 100,000-500,000: ~5-20 units/month
-        - BSR 500,000+: ~1-5 units/month
-        
-        This is a rough estimate - actual sales vary by category and season.
+        Estimate monthly sales from BSR and category with the fitted sales
+        velocity model (see SalesVelocityModel).
         """
         if not bsr or bsr <= 0:
             return None
         
         # Use 30-day average if available (more accurate)
         rank = sales_rank_30d or bsr
-        
-        if rank <= 1000:
-            return 750  # High volume
-        elif rank <= 10000:
-            return 300  # Good volume
-        elif rank <= 50000:
-            return 75  # Moderate volume
-        elif rank <= 100000:
-            return 35  # Low-moderate volume
-        elif rank <= 500000:
-            return 12  # Low volume
-        else:
-            return 3  # Very low volume
-    
-    @classmethod
-    def calculate_batch(
-        cls,
-        products: List[Dict[str, Any]],
-        product_sources: List[Dict[str, Any]],
-        user_settings: Optional[Dict[str, Any]] = None
-    ) -> List[Dict[str, Any]]:
-        """
-        Calculate profitability for multiple products at once.
-        
-        Args:
-            products: List of product records
-            product_sources: List of product_source records (matched by product_id)
-            user_settings: Optional user-specific cost settings
-            
-        Returns:
-            List of calculated metrics dictionaries
-        """
-        # Create lookup for product_sources by product_id
-        sources_by_product = {ps.get('product_id'): ps for ps in product_sources}
-        
-        results = []
-        for product in products:
-            product_id = product.get('id')
-            source_data = sources_by_product.get(product_id, {})
-            
-            calculated = cls.calculate(
-                product_data=product,
-                product_source_data=source_data,
-                user_settings=user_settings
-            )
-            
-            results.append({
-                'product_id': product_id,
-                **calculated
-            })
-        
-        return results
-
+        return sales_velocity_model.estimate_monthly_units(rank, category)
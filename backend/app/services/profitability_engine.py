@@ -0,0 +1,215 @@
+"""
+Profitability Engine
+
+One place that turns sell price, fees and costs into profit, ROI, margin,
+break-even, profit tier and risk level. profit_calculator.calculate_profit,
+ProfitabilityCalculator, cost_calculator, the worst-case helpers and
+BatchAnalyzer's Stage 2 are thin adapters over it, so they agree.
+
+The API is columnar: every input is an array (or a scalar broadcast to all
+rows) and every output is a numpy array, computed in one vectorized pass.
+Money is converted to integer cents on the way in and all sums happen in
+cents, so there is no float drift between call sites.
+
+Definitions:
+- unit_cost = buy_cost / pack_size
+- inbound_shipping = weight_lb * rate (0.5 lb if weight unknown; 0 if the
+  supplier ships direct)
+- landed_cost = unit_cost + prep_cost + inbound_shipping
+- net_profit = sell_price - fees_total - landed_cost
+- roi = net_profit / landed_cost * 100
+- margin = net_profit / sell_price * 100
+- break_even_price = landed_cost + fees_total
+"""
+import logging
+from typing import Dict, Any, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHT_LB = 0.5  # Assumed when Keepa has no weight
+DEFAULT_INBOUND_RATE = 0.35  # USD per lb
+DEFAULT_PREP_COST = 0.10
+DEFAULT_WORST_CASE_FEE_RATIO = 0.30  # Fee share of price when fees are unknown
+
+_EPSILON = 1e-6  # Keeps 0.175 (stored as 0.17499999...) rounding half-up to 18 cents
+
+
+def to_cents(values) -> np.ndarray:
+    """Dollars (float array) -> int64 cents, rounding half-up."""
+    return np.floor(np.asarray(values, dtype=float) * 100 + 0.5 + _EPSILON).astype(np.int64)
+
+
+def to_dollars(cents) -> np.ndarray:
+    return np.asarray(cents, dtype=np.int64) / 100
+
+
+class ProfitabilityEngine:
+    """
+    Vectorized profitability over columns of products.
+    """
+
+    # Profit tier thresholds (ROI %)
+    EXCELLENT_ROI_THRESHOLD = 50.0
+    GOOD_ROI_THRESHOLD = 30.0
+    MARGINAL_ROI_THRESHOLD = 15.0
+
+    # Risk level thresholds
+    LOW_RISK_MARGIN = 40.0
+    LOW_RISK_SELLERS = 10
+    LOW_RISK_BSR = 10000
+    HIGH_RISK_MARGIN = 20.0
+    HIGH_RISK_SELLERS = 50
+    HIGH_RISK_BSR = 100000
+
+    @staticmethod
+    def _column(values, n: int, default: float) -> np.ndarray:
+        """Float column of length n; None/NaN entries become `default`."""
+        if values is None:
+            return np.full(n, default, dtype=float)
+        column = np.asarray(values, dtype=float)
+        if column.ndim == 0:
+            column = np.full(n, float(column) if not np.isnan(column) else default)
+        return np.where(np.isnan(column), default, column)
+
+    def compute(
+        self,
+        sell_price,
+        fees_total=None,
+        buy_cost=None,
+        pack_size=None,
+        prep_cost=None,
+        inbound_shipping=None,
+        weight_lb=None,
+        inbound_rate=None,
+        supplier_ships_direct=None,
+        seller_count=None,
+        bsr=None,
+        worst_case_price=None,
+        worst_case_fees=None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Every metric for n products in one pass.
+
+        Pass inbound_shipping to use known per-unit shipping; otherwise it is
+        computed from weight_lb, inbound_rate and supplier_ships_direct.
+        worst_case_fees defaults to fees_total scaled by worst_case_price /
+        sell_price (30% of price when there are no fees).
+
+        Returns arrays keyed by metric. Money columns end in _cents (int64).
+        Rows without a positive sell price and buy cost have valid=False and
+        should be treated as "no data" by callers.
+        """
+        sell = np.asarray(sell_price, dtype=float)
+        n = sell.size if sell.ndim else 1
+        sell = self._column(sell_price, n, 0.0)
+
+        sell_c = to_cents(sell)
+        fees_c = to_cents(self._column(fees_total, n, 0.0))
+        pack = np.maximum(self._column(pack_size, n, 1.0), 1.0)
+        buy = self._column(buy_cost, n, 0.0)
+        unit_cost_c = to_cents(buy / pack)
+        prep_c = to_cents(self._column(prep_cost, n, DEFAULT_PREP_COST))
+
+        if inbound_shipping is not None:
+            inbound_c = to_cents(self._column(inbound_shipping, n, 0.0))
+        else:
+            weight = self._column(weight_lb, n, DEFAULT_WEIGHT_LB)
+            weight = np.where(weight > 0, weight, DEFAULT_WEIGHT_LB)
+            rate = self._column(inbound_rate, n, DEFAULT_INBOUND_RATE)
+            inbound_c = to_cents(weight * rate)
+            direct = self._column(supplier_ships_direct, n, 0.0).astype(bool)
+            inbound_c = np.where(direct, 0, inbound_c)
+
+        landed_c = unit_cost_c + prep_c + inbound_c
+        profit_c = sell_c - fees_c - landed_c
+        break_even_c = landed_c + fees_c
+        valid = (sell_c > 0) & (buy > 0)
+
+        roi = np.round(np.divide(
+            profit_c * 100.0, landed_c, out=np.zeros(n), where=landed_c > 0
+        ), 2)
+        margin = np.round(np.divide(
+            profit_c * 100.0, sell_c, out=np.zeros(n), where=sell_c > 0
+        ), 2)
+
+        profit_tier = np.select(
+            [roi >= self.EXCELLENT_ROI_THRESHOLD, roi >= self.GOOD_ROI_THRESHOLD, roi >= self.MARGINAL_ROI_THRESHOLD],
+            ["excellent", "good", "marginal"],
+            default="unprofitable",
+        )
+        profit_tier = np.where(valid, profit_tier, "unprofitable")
+
+        sellers = self._column(seller_count, n, 0.0)
+        rank = self._column(bsr, n, 999999.0)
+        rank = np.where(rank > 0, rank, 999999.0)
+        low_risk = (margin > self.LOW_RISK_MARGIN) & (sellers < self.LOW_RISK_SELLERS) & (rank < self.LOW_RISK_BSR)
+        high_risk = (margin < self.HIGH_RISK_MARGIN) | (sellers > self.HIGH_RISK_SELLERS) | (rank > self.HIGH_RISK_BSR)
+        risk_level = np.select([low_risk, high_risk], ["low", "high"], default="medium")
+        risk_level = np.where(valid, risk_level, "high")
+
+        result = {
+            "valid": valid,
+            "sell_price_cents": sell_c,
+            "fees_total_cents": fees_c,
+            "unit_cost_cents": unit_cost_c,
+            "prep_cost_cents": prep_c,
+            "inbound_shipping_cents": inbound_c,
+            "landed_cost_cents": landed_c,
+            "net_profit_cents": profit_c,
+            "break_even_price_cents": break_even_c,
+            "roi": roi,
+            "margin": margin,
+            "is_profitable": valid & (profit_c > 0) & (roi >= self.MARGINAL_ROI_THRESHOLD),
+            "profit_tier": profit_tier,
+            "risk_level": risk_level,
+        }
+
+        if worst_case_price is not None:
+            worst = self._column(worst_case_price, n, 0.0)
+            worst_c = to_cents(worst)
+            if worst_case_fees is not None:
+                worst_fees_c = to_cents(self._column(worst_case_fees, n, 0.0))
+            else:
+                ratio = np.divide(
+                    fees_c.astype(float), sell_c, out=np.full(n, DEFAULT_WORST_CASE_FEE_RATIO),
+                    where=(sell_c > 0) & (fees_c > 0),
+                )
+                worst_fees_c = to_cents(worst * ratio)
+            worst_profit_c = worst_c - worst_fees_c - landed_c
+            result.update({
+                "worst_case_valid": worst_c > 0,
+                "worst_case_price_cents": worst_c,
+                "worst_case_fees_cents": worst_fees_c,
+                "worst_case_profit_cents": worst_profit_c,
+                "worst_case_margin": np.round(np.divide(
+                    worst_profit_c * 100.0, worst_c, out=np.zeros(n), where=worst_c > 0
+                ), 2),
+            })
+
+        return result
+
+    def compute_one(self, **kwargs) -> Dict[str, Any]:
+        """
+        Scalar convenience for per-product call sites: compute() for one row,
+        with money in dollars (keys without the _cents suffix).
+        """
+        result = self.compute(**{k: [v] for k, v in kwargs.items() if v is not None})
+        return self.rows(result)[0]
+
+    @staticmethod
+    def rows(result: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """Columns -> list of per-row dicts with Python types and dollars."""
+        columns = {}
+        for key, values in result.items():
+            if key.endswith("_cents"):
+                columns[key[:-len("_cents")]] = (values / 100).tolist()
+            else:
+                columns[key] = values.tolist()
+        keys = list(columns)
+        return [dict(zip(keys, row)) for row in zip(*(columns[k] for k in keys))]
+
+
+# Singleton
+profitability_engine = ProfitabilityEngine()
@@ -4,6 +4,7 @@ Implements the same algorithm SP-API uses, shared across ALL Celery workers.
 """
 import redis
 import time
+import asyncio
 import os
 import logging
 from typing import Optional
@@ -20,19 +21,25 @@ class TokenBucketRateLimiter:
     Shared across ALL Celery workers.
     """
     
-    def __init__(self, name: str, rate: float, burst: int):
+    def __init__(self, name: str, rate: float, burst: int, operation: Optional[str] = None):
         """
         Args:
             name: Unique identifier for this limiter
             rate: Tokens added per second
             burst: Maximum bucket size
+            operation: The one SP-API operation this bucket paces. Only then is
+                its x-amzn-RateLimit-Limit header adopted - a bucket shared by
+                several operations would take on whichever rate came back last.
         """
         self.redis = redis.from_url(REDIS_URL, decode_responses=True)
         self.name = name
+        self.base_rate = rate  # configured rate, used when no observed rate is stored
         self.rate = rate  # tokens per second
         self.burst = burst  # max tokens
+        self.operation = operation
         self.key_tokens = f"ratelimit:{name}:tokens"
         self.key_last_update = f"ratelimit:{name}:last_update"
+        self.key_rate = f"ratelimit:{name}:rate"
     
     def _refill(self) -> float:
         """Refill tokens based on time elapsed. Returns current token count."""
@@ -42,7 +49,11 @@ class TokenBucketRateLimiter:
         pipe = self.redis.pipeline()
         pipe.get(self.key_tokens)
         pipe.get(self.key_last_update)
-        tokens_raw, last_update_raw = pipe.execute()
+        pipe.get(self.key_rate)
+        tokens_raw, last_update_raw, rate_raw = pipe.execute()
+        
+        # Rate observed from x-amzn-RateLimit-Limit by any worker wins until it expires
+        self.rate = float(rate_raw) if rate_raw else self.base_rate
         
         tokens = float(tokens_raw) if tokens_raw else self.burst
         last_update = float(last_update_raw) if last_update_raw else now
@@ -62,6 +73,34 @@ class TokenBucketRateLimiter:
         
         return new_tokens
     
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Try to take tokens from the bucket once.
+        
+        Returns:
+            0 if tokens were acquired, otherwise seconds to wait before retrying
+        """
+        # Refill and get current tokens
+        current_tokens = self._refill()
+        
+        if current_tokens >= tokens:
+            # Try to consume tokens atomically
+            new_tokens = self.redis.incrbyfloat(self.key_tokens, -tokens)
+            
+            if new_tokens >= 0:
+                logger.debug(f"[{self.name}] Acquired {tokens} token(s), {new_tokens:.2f} remaining")
+                return 0
+            else:
+                # Race condition - restore and retry
+                self.redis.incrbyfloat(self.key_tokens, tokens)
+        
+        # Calculate wait time until next token
+        wait_time = (tokens - current_tokens) / self.rate if current_tokens < tokens else 0.1
+        wait_time = min(max(wait_time, 0.01), 2.0)  # Cap at 2 seconds
+        
+        logger.debug(f"[{self.name}] Waiting {wait_time:.2f}s for tokens ({current_tokens:.2f}/{self.burst})")
+        return wait_time
+    
     def acquire(self, tokens: int = 1, timeout: float = 120) -> bool:
         """
         Acquire tokens from the bucket. Blocks until available or timeout.
@@ -76,30 +115,60 @@ class TokenBucketRateLimiter:
         start = time.time()
         
         while time.time() - start < timeout:
-            # Refill and get current tokens
-            current_tokens = self._refill()
-            
-            if current_tokens >= tokens:
-                # Try to consume tokens atomically
-                new_tokens = self.redis.incrbyfloat(self.key_tokens, -tokens)
-                
-                if new_tokens >= 0:
-                    logger.debug(f"[{self.name}] Acquired {tokens} token(s), {new_tokens:.2f} remaining")
-                    return True
-                else:
-                    # Race condition - restore and retry
-                    self.redis.incrbyfloat(self.key_tokens, tokens)
-            
-            # Calculate wait time until next token
-            wait_time = (tokens - current_tokens) / self.rate if current_tokens < tokens else 0.1
-            wait_time = min(wait_time, 2.0)  # Cap at 2 seconds
-            
-            logger.debug(f"[{self.name}] Waiting {wait_time:.2f}s for tokens ({current_tokens:.2f}/{self.burst})")
+            wait_time = self._try_acquire(tokens)
+            if wait_time == 0:
+                return True
             time.sleep(wait_time)
         
         logger.warning(f"[{self.name}] Timeout waiting for {tokens} tokens")
         return False
     
+    async def acquire_async(self, tokens: int = 1, timeout: float = 120) -> bool:
+        """
+        Async version of acquire() - waits with asyncio.sleep so other
+        requests on the same event loop keep running while we wait.
+        """
+        start = time.time()
+        
+        while time.time() - start < timeout:
+            wait_time = self._try_acquire(tokens)
+            if wait_time == 0:
+                return True
+            await asyncio.sleep(wait_time)
+        
+        logger.warning(f"[{self.name}] Timeout waiting for {tokens} tokens")
+        return False
+    
+    def observe_rate_limit(self, limit: float):
+        """
+        Adopt the rate SP-API reports in the x-amzn-RateLimit-Limit header.
+        
+        Stored in Redis for an hour so every worker sharing this bucket paces
+        to the same rate; Amazon may grant more or less than the documented
+        default. Ignored unless the bucket belongs to a single operation.
+        """
+        if not self.operation or not limit or limit <= 0 or abs(limit - self.rate) < 1e-6:
+            return
+        logger.info(f"[{self.name}] Rate limit {self.rate} -> {limit} req/s (from x-amzn-RateLimit-Limit)")
+        self.rate = limit
+        try:
+            self.redis.set(self.key_rate, limit, ex=3600)
+        except Exception as e:
+            logger.warning(f"[{self.name}] Could not store observed rate: {e}")
+    
+    def penalize(self):
+        """
+        Empty the bucket after a 429 so all workers back off together
+        instead of each one retrying into the same throttle.
+        """
+        try:
+            pipe = self.redis.pipeline()
+            pipe.set(self.key_tokens, 0, ex=300)
+            pipe.set(self.key_last_update, time.time(), ex=300)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[{self.name}] Could not drain bucket: {e}")
+    
     def get_status(self) -> dict:
         """Get current bucket status."""
         tokens = self._refill()
@@ -166,13 +235,17 @@ class KeepaTokenLimiter:
 # Per-endpoint rate limiters (matching SP-API limits)
 rate_limiters = {
     "competitive_pricing": TokenBucketRateLimiter("sp_competitive_pricing", rate=0.5, burst=1),
-    "item_offers": TokenBucketRateLimiter("sp_item_offers", rate=0.5, burst=1),
+    "item_offers": TokenBucketRateLimiter("sp_item_offers", rate=0.5, burst=1, operation="getItemOffers"),
     "fees_estimate": TokenBucketRateLimiter("sp_fees_estimate", rate=0.5, burst=1),
     "catalog": TokenBucketRateLimiter("sp_catalog", rate=2.0, burst=2),
+    "listings_restrictions": TokenBucketRateLimiter(
+        "sp_listings_restrictions", rate=5.0, burst=10, operation="getListingsRestrictions"
+    ),
+    "orders": TokenBucketRateLimiter("sp_orders", rate=0.0167, burst=20, operation="getOrders"),
 }
 
 # Global rate limiters - shared across all workers
-sp_api_pricing_limiter = TokenBucketRateLimiter("sp_pricing", rate=0.5, burst=1)
+sp_api_pricing_limiter = TokenBucketRateLimiter("sp_pricing", rate=0.5, burst=1, operation="getCompetitivePricing")
 sp_api_fees_limiter = TokenBucketRateLimiter("sp_fees", rate=0.5, burst=1)
 keepa_limiter = KeepaTokenLimiter(tokens_per_minute=10)  # Adjust based on your plan
 
@@ -230,7 +303,7 @@ class KeepaTokenLimiter:
 
 
 # Global rate limiters - shared across all workers
-sp_api_pricing_limiter = TokenBucketRateLimiter("sp_pricing", rate=0.5, burst=1)
+sp_api_pricing_limiter = TokenBucketRateLimiter("sp_pricing", rate=0.5, burst=1, operation="getCompetitivePricing")
 sp_api_fees_limiter = TokenBucketRateLimiter("sp_fees", rate=0.5, burst=1)
 keepa_limiter = KeepaTokenLimiter(tokens_per_minute=10)  # Adjust based on your plan
 
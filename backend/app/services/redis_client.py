@@ -4,8 +4,6 @@ Redis client for caching and performance optimization.
 import redis
 import json
 from typing import Optional, Any, Union
-from functools import wraps
-import hashlib
 from app.core.config import settings
 import logging
 
@@ -45,69 +43,6 @@ def get_redis_client() -> Optional[redis.Redis]:
         return None
 
 
-def cache_key(prefix: str, *args, **kwargs) -> str:
-    """Generate a cache key from prefix and arguments."""
-    key_parts = [prefix]
-    if args:
-        key_parts.extend(str(arg) for arg in args)
-    if kwargs:
-        key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
-    key_string = ":".join(key_parts)
-    # Hash if too long
-    if len(key_string) > 200:
-        key_string = prefix + ":" + hashlib.md5(key_string.encode()).hexdigest()
-    return key_string
-
-
-def cached(ttl: int = 300, key_prefix: str = None):
-    """
-    Decorator to cache function results in Redis.
-    
-    Args:
-        ttl: Time to live in seconds (default 5 minutes)
-        key_prefix: Prefix for cache key (defaults to function name)
-    """
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            client = get_redis_client()
-            if not client:
-                # Redis not available, just call function
-                return await func(*args, **kwargs)
-            
-            # Generate cache key
-            prefix = key_prefix or f"{func.__module__}.{func.__name__}"
-            cache_key_str = cache_key(prefix, *args, **kwargs)
-            
-            try:
-                # Try to get from cache
-                cached_value = client.get(cache_key_str)
-                if cached_value is not None:
-                    logger.debug(f"Cache HIT: {cache_key_str}")
-                    return json.loads(cached_value)
-                
-                # Cache miss, call function
-                logger.debug(f"Cache MISS: {cache_key_str}")
-                result = await func(*args, **kwargs)
-                
-                # Store in cache
-                if result is not None:
-                    client.setex(
-                        cache_key_str,
-                        ttl,
-                        json.dumps(result, default=str)
-                    )
-                
-                return result
-            except Exception as e:
-                logger.warning(f"Cache error for {cache_key_str}: {e}")
-                # On cache error, just call function
-                return await func(*args, **kwargs)
-        
-        return wrapper
-    return decorator
-
-
 class CacheService:
     """Service for Redis caching operations."""
     
@@ -182,6 +117,7 @@ class CacheService:
         CacheService.delete_pattern(f"subscription:{user_id}:*")
         CacheService.delete_pattern(f"tier:{user_id}:*")
         CacheService.delete_pattern(f"limits:{user_id}:*")
+        CacheService.delete_pattern(f"meter_limit:{user_id}:*")
 
 
 # Singleton instance
@@ -0,0 +1,364 @@
+"""
+Repricing Service
+
+Recomputes the derived profitability columns of stored analyses (landed
+cost, net profit, ROI, margin, promo and worst case) from the market data
+already on the row - sell price, fees, weight, FBA 365-day low - when only
+costs changed. No Keepa or SP-API calls.
+
+What changes what:
+- inbound_rate_per_lb: products without an inbound_rate_override whose
+  supplier doesn't ship direct
+- default_prep_cost: products without a prep_cost_override or prep center
+  assignment
+- product_sources costs / overrides, prep center assignment: that product
+
+recompute() writes the rows whose numbers actually moved, in bulk
+(reprice_analyses RPC). what_if() runs the same math for hypothetical
+settings and returns the aggregate ROI shift without writing anything.
+"""
+import logging
+from typing import Dict, Any, List, Optional, Iterable
+
+import numpy as np
+
+from app.services.supabase_client import supabase
+from app.services.profitability_engine import profitability_engine
+from app.services.cost_calculator import calculate_prep_cost
+from app.tasks.analysis_context import fetch_source_map
+
+logger = logging.getLogger(__name__)
+
+# product_sources fields that feed profitability; other edits (notes, stage, ...) don't reprice
+COST_FIELDS = {
+    "buy_cost",
+    "promo_buy_cost",
+    "wholesale_cost",
+    "pack_size",
+    "supplier_ships_direct",
+    "inbound_rate_override",
+    "prep_cost_override",
+}
+
+# Cost settings -> which products depend on them
+SETTING_DEPENDENCIES = {
+    "inbound_rate_per_lb": lambda row: row["inbound_rate_override"] is None and not row["supplier_ships_direct"],
+    "default_prep_cost": lambda row: row["prep_cost_override"] is None and row["assigned_prep_cost"] is None,
+}
+
+# Pricing mode -> products column with the sell price it uses ("current" = analyses.sell_price)
+PRICING_MODE_COLUMNS = {
+    "current": None,
+    "30d_avg": "buy_box_price_30d_avg",
+    "90d_avg": "buy_box_price_90d_avg",
+    "365d_avg": "buy_box_price_365d_avg",
+}
+
+# Same Stage 2 filter as BatchAnalyzer
+STAGE2_MIN_ROI = 30
+STAGE2_MIN_PROFIT = 3
+
+# Derived columns written back; compared to decide whether a row changed
+DERIVED_COLUMNS = (
+    "inbound_shipping", "prep_cost", "total_landed_cost", "net_profit", "roi",
+    "profit_margin", "promo_landed_cost", "promo_net_profit", "promo_roi", "worst_case_profit",
+)
+
+FETCH_BATCH_SIZE = 100  # Keep .in_() URLs short
+PAGE_SIZE = 1000
+WRITE_CHUNK_SIZE = 500
+
+
+class RepricingService:
+    """
+    Bulk, API-free re-pricing of stored analyses.
+    """
+
+    # ==========================================
+    # LOADING
+    # ==========================================
+
+    def load_rows(self, user_id: str, product_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        One row per analyzed product: stored market data and current derived
+        values from analyses, plus cost inputs from product_sources and the
+        product's prep assignment.
+        """
+        products = self._load_products(user_id, product_ids)
+        if not products:
+            return []
+
+        analyses = self._load_analyses(user_id, [p["analysis_id"] for p in products])
+        sources = fetch_source_map([p["id"] for p in products])
+
+        rows = []
+        for product in products:
+            analysis = analyses.get(product["analysis_id"])
+            source = sources.get(product["id"])
+            if not analysis or not source:
+                continue
+            rows.append({
+                "product_id": product["id"],
+                "analysis_id": product["analysis_id"],
+                "buy_cost": source.get("buy_cost"),
+                "promo_buy_cost": source.get("promo_buy_cost"),
+                "supplier_ships_direct": bool(source.get("supplier_ships_direct")),
+                "inbound_rate_override": source.get("inbound_rate_override"),
+                "prep_cost_override": source.get("prep_cost_override"),
+                "assigned_prep_cost": product.get("prep_cost_per_unit"),
+                "prices": {mode: product.get(column) for mode, column in PRICING_MODE_COLUMNS.items() if column},
+                "analysis": analysis,
+            })
+        return rows
+
+    def _load_products(self, user_id: str, product_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+        columns = "id, analysis_id, prep_cost_per_unit, " + ", ".join(c for c in PRICING_MODE_COLUMNS.values() if c)
+        products = []
+
+        if product_ids is not None:
+            for i in range(0, len(product_ids), FETCH_BATCH_SIZE):
+                result = supabase.table("products")\
+                    .select(columns)\
+                    .eq("user_id", user_id)\
+                    .in_("id", product_ids[i:i + FETCH_BATCH_SIZE])\
+                    .not_.is_("analysis_id", "null")\
+                    .execute()
+                products.extend(result.data or [])
+            return products
+
+        offset = 0
+        while True:
+            # postgrest-py < 0.14 (pinned via supabase 2.0.3) treats range()'s end as exclusive
+            result = supabase.table("products")\
+                .select(columns)\
+                .eq("user_id", user_id)\
+                .not_.is_("analysis_id", "null")\
+                .order("id")\
+                .range(offset, offset + PAGE_SIZE)\
+                .execute()
+            page = result.data or []
+            products.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+        return products
+
+    def _load_analyses(self, user_id: str, analysis_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        analyses = {}
+        for i in range(0, len(analysis_ids), FETCH_BATCH_SIZE):
+            result = supabase.table("analyses")\
+                .select(
+                    "id, sell_price, fees_total, item_weight_lb, worst_case_price, bsr, fba_seller_count, "
+                    + ", ".join(DERIVED_COLUMNS)
+                )\
+                .eq("user_id", user_id)\
+                .in_("id", analysis_ids[i:i + FETCH_BATCH_SIZE])\
+                .execute()
+            for row in (result.data or []):
+                analyses[row["id"]] = row
+        return analyses
+
+    @staticmethod
+    def affected(rows: List[Dict[str, Any]], changed_settings: Iterable[str]) -> List[Dict[str, Any]]:
+        """Rows whose numbers depend on any of the changed cost settings."""
+        checks = [SETTING_DEPENDENCIES[s] for s in changed_settings if s in SETTING_DEPENDENCIES]
+        return [row for row in rows if any(check(row) for check in checks)]
+
+    # ==========================================
+    # MATH
+    # ==========================================
+
+    def compute(self, rows: List[Dict[str, Any]], cost_settings: dict, pricing_mode: str = "current") -> List[Dict[str, Any]]:
+        """
+        Derived columns for each row in one engine pass (plus one for promo
+        costs). Rows without a sell price or buy cost come back as None.
+        """
+        if not rows:
+            return []
+
+        inbound_rate = cost_settings.get("inbound_rate_per_lb", 0.35)
+        default_prep = cost_settings.get("default_prep_cost", 0.10)
+
+        stored_sell = np.array([r["analysis"].get("sell_price") or 0 for r in rows], dtype=float)
+        stored_fees = np.array([r["analysis"].get("fees_total") or 0 for r in rows], dtype=float)
+        sell = stored_sell
+        fees = stored_fees
+        if PRICING_MODE_COLUMNS.get(pricing_mode):
+            # Average price where we have one; fees scale with price like the worst case does
+            average = np.array([r["prices"].get(pricing_mode) or np.nan for r in rows], dtype=float)
+            sell = np.where(np.isnan(average), stored_sell, average)
+            fees = np.divide(stored_fees * sell, stored_sell, out=stored_fees.copy(), where=stored_sell > 0)
+
+        columns = {
+            "sell_price": sell,
+            "fees_total": fees,
+            "prep_cost": [
+                calculate_prep_cost(default_prep, r["prep_cost_override"], r["assigned_prep_cost"]) for r in rows
+            ],
+            "weight_lb": [r["analysis"].get("item_weight_lb") for r in rows],
+            "inbound_rate": [
+                inbound_rate if r["inbound_rate_override"] is None else r["inbound_rate_override"] for r in rows
+            ],
+            "supplier_ships_direct": [r["supplier_ships_direct"] for r in rows],
+            "seller_count": [r["analysis"].get("fba_seller_count") for r in rows],
+            "bsr": [r["analysis"].get("bsr") for r in rows],
+        }
+        calc = profitability_engine.rows(profitability_engine.compute(
+            buy_cost=[r["buy_cost"] for r in rows],
+            worst_case_price=[r["analysis"].get("worst_case_price") for r in rows],
+            **columns
+        ))
+
+        promo_index = [i for i, r in enumerate(rows) if (r["promo_buy_cost"] or 0) > 0]
+        promo_calc = {}
+        if promo_index:
+            promo_columns = {k: [v[i] for i in promo_index] for k, v in columns.items()}
+            promo_rows = profitability_engine.rows(profitability_engine.compute(
+                buy_cost=[rows[i]["promo_buy_cost"] for i in promo_index], **promo_columns
+            ))
+            promo_calc = dict(zip(promo_index, promo_rows))
+
+        computed = []
+        for i, (row, result) in enumerate(zip(rows, calc)):
+            if not result["valid"]:
+                computed.append(None)
+                continue
+            derived = {
+                "id": row["analysis_id"],
+                "buy_cost": row["buy_cost"],
+                "inbound_shipping": result["inbound_shipping"],
+                "prep_cost": result["prep_cost"],
+                "total_landed_cost": result["landed_cost"],
+                "net_profit": result["net_profit"],
+                "roi": result["roi"],
+                "profit_margin": result["margin"],
+                "passed_stage2": result["roi"] >= STAGE2_MIN_ROI and result["net_profit"] >= STAGE2_MIN_PROFIT,
+                "promo_buy_cost": None,
+                "promo_landed_cost": None,
+                "promo_net_profit": None,
+                "promo_roi": None,
+                "worst_case_fees": None,
+                "worst_case_profit": None,
+                "still_profitable_at_worst": None,
+            }
+            promo = promo_calc.get(i)
+            if promo:
+                derived.update({
+                    "promo_buy_cost": row["promo_buy_cost"],
+                    "promo_landed_cost": promo["landed_cost"],
+                    "promo_net_profit": promo["net_profit"],
+                    "promo_roi": promo["roi"],
+                })
+            if result["worst_case_valid"]:
+                derived.update({
+                    "worst_case_fees": result["worst_case_fees"],
+                    "worst_case_profit": result["worst_case_profit"],
+                    "still_profitable_at_worst": result["worst_case_profit"] > 0,
+                })
+            computed.append(derived)
+        return computed
+
+    @staticmethod
+    def _changed(analysis: Dict[str, Any], derived: Dict[str, Any]) -> bool:
+        for column in DERIVED_COLUMNS:
+            old, new = analysis.get(column), derived.get(column)
+            if old is None or new is None:
+                if (old is None) != (new is None):
+                    return True
+                continue
+            if round(float(old), 2) != round(float(new), 2):
+                return True
+        return False
+
+    # ==========================================
+    # ENTRY POINTS
+    # ==========================================
+
+    def recompute(
+        self,
+        user_id: str,
+        cost_settings: dict,
+        product_ids: Optional[List[str]] = None,
+        changed_settings: Optional[List[str]] = None,
+    ) -> Dict[str, int]:
+        """
+        Re-price stored analyses and write the ones that moved.
+
+        product_ids limits the scope to those products; changed_settings
+        limits it to products that depend on those cost settings.
+        """
+        rows = self.load_rows(user_id, product_ids)
+        if changed_settings:
+            rows = self.affected(rows, changed_settings)
+
+        updates = [
+            derived for row, derived in zip(rows, self.compute(rows, cost_settings))
+            if derived and self._changed(row["analysis"], derived)
+        ]
+        written = self._write(user_id, updates)
+
+        logger.info(f"💲 Repriced {written}/{len(rows)} analyses for user {user_id} (no API calls)")
+        return {"checked": len(rows), "updated": written}
+
+    def what_if(
+        self,
+        user_id: str,
+        current_settings: dict,
+        proposed_settings: dict,
+        pricing_mode: str = "current",
+        product_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Dry run: aggregate ROI shift if proposed_settings (and pricing_mode)
+        replaced the current ones. Nothing is written.
+        """
+        rows = self.load_rows(user_id, product_ids)
+        before = self.compute(rows, current_settings)
+        after = self.compute(rows, {**current_settings, **proposed_settings}, pricing_mode)
+        pairs = [(b, a) for b, a in zip(before, after) if b and a]
+
+        if not pairs:
+            return {"products": 0, "before": None, "after": None, "avg_roi_shift": 0.0}
+
+        def summary(results):
+            roi = np.array([r["roi"] for r in results])
+            return {
+                "avg_roi": round(float(roi.mean()), 2),
+                "median_roi": round(float(np.median(roi)), 2),
+                "total_net_profit": round(sum(r["net_profit"] for r in results), 2),
+                "passing_stage2": sum(1 for r in results if r["passed_stage2"]),
+            }
+
+        old, new = summary([b for b, _ in pairs]), summary([a for _, a in pairs])
+        return {
+            "products": len(pairs),
+            "before": old,
+            "after": new,
+            "avg_roi_shift": round(new["avg_roi"] - old["avg_roi"], 2),
+            "newly_passing": sum(1 for b, a in pairs if a["passed_stage2"] and not b["passed_stage2"]),
+            "newly_failing": sum(1 for b, a in pairs if b["passed_stage2"] and not a["passed_stage2"]),
+        }
+
+    def _write(self, user_id: str, updates: List[Dict[str, Any]]) -> int:
+        written = 0
+        for i in range(0, len(updates), WRITE_CHUNK_SIZE):
+            chunk = updates[i:i + WRITE_CHUNK_SIZE]
+            try:
+                result = supabase.rpc("reprice_analyses", {"p_user_id": user_id, "p_rows": chunk}).execute()
+                written += result.data if isinstance(result.data, int) else len(chunk)
+            except Exception as e:
+                # RPC not deployed yet - fall back to row-by-row updates
+                logger.warning(f"reprice_analyses RPC failed, updating {len(chunk)} rows individually: {e}")
+                for update in chunk:
+                    values = {
+                        k: v for k, v in update.items()
+                        if k != "id" and not (k.startswith(("worst_case", "still_profitable")) and v is None)
+                    }
+                    values["stage2_roi"] = values["roi"]
+                    supabase.table("analyses").update(values).eq("id", update["id"]).eq("user_id", user_id).execute()
+                    written += 1
+        return written
+
+
+# Singleton
+repricing_service = RepricingService()
@@ -0,0 +1,243 @@
+"""
+Tag-invalidated response cache with stale-while-revalidate.
+
+Endpoints declare the tags their response depends on:
+
+    @cached(ttl=10, tags=("deals:{user_id}",))
+
+Tags are formatted from the endpoint's arguments plus user_id (taken from
+current_user). Each tag has a version counter in Redis; an entry records the
+versions it was built from and is treated as a miss once any of them has
+moved on. Writers never delete entries - they bump tags:
+
+    invalidate_tags(f"deals:{user_id}")
+
+API writes are covered by CacheInvalidationMiddleware; Celery writers call
+invalidate_user() / invalidate_tags() themselves.
+
+An entry past its TTL but inside the stale window is still served, and one
+background refresh (guarded by a short Redis lock) rebuilds it. Entries are
+serialized with orjson. Hit/miss/stale/error counters are kept per endpoint.
+"""
+import time
+import asyncio
+import hashlib
+import inspect
+import logging
+from functools import wraps
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Set
+
+import orjson
+
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+ENTRY_KEY = "rcache:{prefix}:{digest}"
+TAG_KEY = "rcache:tag:{tag}"
+LOCK_KEY = "rcache:refresh:{prefix}:{digest}"
+STATS_KEY = "rcache:stats"  # hash "{endpoint}:{outcome}" -> count
+
+TAG_VERSION_TTL = 86400  # Far longer than any entry lives
+REFRESH_LOCK_TTL = 30
+OUTCOMES = ("hit", "stale", "miss", "error")
+
+# Tags API writes and job updates bump for a user
+USER_TAGS = ("deals:{user_id}",)
+
+_KEY_TYPES = (str, int, float, bool, type(None))
+
+# The event loop only keeps weak references to tasks; hold running
+# background refreshes here so they aren't garbage-collected mid-flight
+_refresh_tasks: Set[asyncio.Task] = set()
+
+
+def _dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _bind(func, args, kwargs) -> Dict[str, Any]:
+    """
+    Endpoint arguments that identify the response: current_user becomes
+    user_id, and objects that aren't plain values (Request, BackgroundTasks)
+    are left out.
+    """
+    try:
+        bound = inspect.signature(func).bind_partial(*args, **kwargs)
+        arguments = dict(bound.arguments)
+    except TypeError:
+        arguments = dict(kwargs)
+
+    params = {}
+    for name, value in arguments.items():
+        if name == "current_user":
+            user_id = getattr(value, "id", None) or (value.get("id") if isinstance(value, dict) else None)
+            if user_id is not None:
+                params["user_id"] = str(user_id)
+        elif isinstance(value, _KEY_TYPES):
+            params[name] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, _KEY_TYPES) for v in value):
+            params[name] = list(value)
+    return params
+
+
+def _format_tags(templates: Sequence[str], params: Dict[str, Any]) -> List[str]:
+    tags = []
+    for template in templates:
+        try:
+            tags.append(template.format(**params))
+        except (KeyError, IndexError):
+            logger.warning(f"Cache tag {template!r} has no value for its fields - skipped")
+    return tags
+
+
+def _tag_versions(client, tags: List[str]) -> Dict[str, str]:
+    if not tags:
+        return {}
+    versions = client.mget([TAG_KEY.format(tag=tag) for tag in tags])
+    return {tag: version or "0" for tag, version in zip(tags, versions)}
+
+
+def _count(client, endpoint: str, outcome: str):
+    try:
+        client.hincrby(STATS_KEY, f"{endpoint}:{outcome}", 1)
+    except Exception:
+        pass
+
+
+def invalidate_tags(*tags: str):
+    """Bump tag versions; every entry built from the old versions is dropped."""
+    tags = [tag for tag in tags if tag]
+    client = get_redis_client()
+    if not client or not tags:
+        return
+    try:
+        pipe = client.pipeline()
+        for tag in tags:
+            pipe.incr(TAG_KEY.format(tag=tag))
+            pipe.expire(TAG_KEY.format(tag=tag), TAG_VERSION_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not invalidate cache tags {tags}: {e}")
+
+
+def invalidate_user(user_id: Optional[str], extra_tags: Iterable[str] = ()):
+    """Bump the user's deal tags (after writing products, product_sources or jobs)."""
+    if not user_id:
+        return
+    invalidate_tags(*(template.format(user_id=user_id) for template in USER_TAGS), *extra_tags)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """{endpoint: {"hit": n, "stale": n, "miss": n, "error": n, "hit_rate": pct}}"""
+    client = get_redis_client()
+    if not client:
+        return {}
+    try:
+        raw = client.hgetall(STATS_KEY) or {}
+    except Exception as e:
+        logger.warning(f"Could not read cache stats: {e}")
+        return {}
+
+    stats: Dict[str, Dict[str, Any]] = {}
+    for field, count in raw.items():
+        endpoint, _, outcome = field.rpartition(":")
+        stats.setdefault(endpoint, {o: 0 for o in OUTCOMES})[outcome] = int(count)
+    for counts in stats.values():
+        served = counts["hit"] + counts["stale"]
+        total = served + counts["miss"]
+        counts["hit_rate"] = round(served / total * 100, 2) if total else None
+    return stats
+
+
+def cached(ttl: int = 300, key_prefix: str = None, tags: Sequence[str] = (), stale_ttl: Optional[int] = None):
+    """
+    Cache an async endpoint's result in Redis.
+
+    Args:
+        ttl: Seconds an entry is fresh
+        key_prefix: Prefix for cache key (defaults to function name)
+        tags: Tag templates, formatted with the endpoint's arguments and
+            user_id; bumping any of them invalidates the entry
+        stale_ttl: Seconds past ttl an entry may still be served while it is
+            refreshed in the background (defaults to ttl)
+    """
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+
+    def decorator(func):
+        prefix = key_prefix or f"{func.__module__}.{func.__name__}"
+        endpoint = key_prefix or func.__name__
+
+        def _store(client, key: str, versions: Dict[str, str], result: Any):
+            if result is None:
+                return
+            entry = {"v": result, "t": versions, "f": time.time() + ttl}
+            client.set(key, _dumps(entry), ex=ttl + stale_ttl)
+
+        async def _refresh(key: str, lock_key: str, tag_names: List[str], args, kwargs):
+            client = get_redis_client()
+            try:
+                versions = _tag_versions(client, tag_names)
+                _store(client, key, versions, await func(*args, **kwargs))
+            except Exception as e:
+                logger.warning(f"Background refresh failed for {key}: {e}")
+            finally:
+                try:
+                    client.delete(lock_key)
+                except Exception:
+                    pass
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            client = get_redis_client()
+            if not client:
+                # Redis not available, just call function
+                return await func(*args, **kwargs)
+
+            params = _bind(func, args, kwargs)
+            digest = hashlib.md5(_dumps(sorted(params.items()))).hexdigest()
+            key = ENTRY_KEY.format(prefix=prefix, digest=digest)
+            tag_names = _format_tags(tags, params)
+
+            try:
+                pipe = client.pipeline()
+                pipe.get(key)
+                if tag_names:
+                    pipe.mget([TAG_KEY.format(tag=tag) for tag in tag_names])
+                raw, *rest = pipe.execute()
+                versions = {tag: v or "0" for tag, v in zip(tag_names, rest[0] if rest else [])}
+                entry = orjson.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f"Cache error for {key}: {e}")
+                _count(client, endpoint, "error")
+                return await func(*args, **kwargs)
+
+            if entry is not None and entry.get("t") == versions:
+                if time.time() < entry["f"]:
+                    _count(client, endpoint, "hit")
+                    return entry["v"]
+
+                # Expired but within the stale window: serve it, refresh once
+                _count(client, endpoint, "stale")
+                lock_key = LOCK_KEY.format(prefix=prefix, digest=digest)
+                try:
+                    if client.set(lock_key, 1, nx=True, ex=REFRESH_LOCK_TTL):
+                        task = asyncio.create_task(_refresh(key, lock_key, tag_names, args, kwargs))
+                        _refresh_tasks.add(task)
+                        task.add_done_callback(_refresh_tasks.discard)
+                except Exception as e:
+                    logger.warning(f"Could not schedule refresh for {key}: {e}")
+                return entry["v"]
+
+            # Miss (or a tag moved on). Versions were read before computing, so a
+            # write that lands meanwhile leaves this entry already invalid.
+            _count(client, endpoint, "miss")
+            result = await func(*args, **kwargs)
+            try:
+                _store(client, key, versions, result)
+            except Exception as e:
+                logger.warning(f"Cache store error for {key}: {e}")
+            return result
+
+        return wrapper
+    return decorator
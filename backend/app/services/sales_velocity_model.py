@@ -0,0 +1,264 @@
+"""
+Offline sales velocity model: BSR -> estimated monthly units.
+
+Fits one power curve per category,
+
+    units_per_month = exp(intercept) * sales_rank ** slope
+
+by least squares in log space over the Keepa history we already store
+(sales_velocity_training: sales rank and 30-day sales rank drops per ASIN
+from products and keepa_analysis). Each refit writes a new version to
+sales_velocity_models and bumps a Redis counter; every process keeps the
+active curves in memory, so an estimate is a dict lookup and a pow() - no
+Keepa or database call.
+
+Lookup order: fitted category curve -> fitted all-category curve ('*') ->
+prior curve for the category -> default prior. The priors are the curves
+GeniusScorer used before the model existed, so estimates stay sensible
+until enough history has been collected.
+"""
+import math
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.supabase_client import supabase
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "sales_velocity:version"
+MODEL_MAX_AGE_SECONDS = 3600  # Reload even without a version bump
+VERSION_CHECK_SECONDS = 30  # At most one Redis GET per this interval, not per estimate
+LOAD_PAGE_SIZE = 1000
+MIN_SAMPLES = 30  # Observations needed before a category gets its own curve
+ALL_CATEGORIES = "*"
+
+# Keepa's sales rank drops undercount sales for fast movers (several sales
+# between two rank samples); same factor market intelligence used before
+UNITS_PER_DROP = 1.5
+
+# (intercept, slope) in log space - 50000 / rank^0.65 == exp(ln 50000) * rank^-0.65
+DEFAULT_CATEGORY = "grocery & gourmet food"
+PRIOR_CURVES: Dict[str, Tuple[float, float]] = {
+    "grocery & gourmet food": (math.log(50000), -0.65),
+    "health & household": (math.log(45000), -0.63),
+    "beauty & personal care": (math.log(40000), -0.62),
+    "home & kitchen": (math.log(55000), -0.67),
+}
+
+Curve = Tuple[float, float]
+
+
+def normalize_category(category: Optional[str]) -> str:
+    """Curve key for a category name ('' when unknown)."""
+    return (category or "").strip().lower()
+
+
+def fit_curves(rows: Iterable[Dict[str, Any]], min_samples: int = MIN_SAMPLES) -> Dict[str, Dict[str, Any]]:
+    """
+    Fit log(units) = intercept + slope * log(rank) per category and across
+    all categories.
+
+    Args:
+        rows: Observations with sales_rank, drops_30 and category
+        min_samples: Minimum observations per curve
+
+    Returns:
+        {category_key: {intercept, slope, samples, r_squared, rank_min, rank_max}}
+    """
+    groups: Dict[str, Tuple[List[float], List[float]]] = defaultdict(lambda: ([], []))
+    for row in rows:
+        rank = row.get("sales_rank") or 0
+        drops = row.get("drops_30") or 0
+        # Zero drops carry no level information in log space
+        if rank <= 0 or drops <= 0:
+            continue
+        for key in (ALL_CATEGORIES, normalize_category(row.get("category"))):
+            if not key:
+                continue
+            ranks, units = groups[key]
+            ranks.append(rank)
+            units.append(drops * UNITS_PER_DROP)
+
+    curves = {}
+    for key, (ranks, units) in groups.items():
+        if len(ranks) < min_samples:
+            continue
+        x = np.log(np.asarray(ranks, dtype=float))
+        y = np.log(np.asarray(units, dtype=float))
+        if np.ptp(x) == 0:
+            continue
+        slope, intercept = np.polyfit(x, y, 1)
+        if slope >= 0:
+            # Better rank must mean more sales; a flat/inverted fit is noise
+            logger.warning(f"Skipping sales velocity curve for '{key}': slope {slope:.3f}")
+            continue
+        residual = y - (intercept + slope * x)
+        total = float(((y - y.mean()) ** 2).sum())
+        curves[key] = {
+            "intercept": float(intercept),
+            "slope": float(slope),
+            "samples": len(ranks),
+            "r_squared": round(1 - float((residual ** 2).sum()) / total, 4) if total else None,
+            "rank_min": int(min(ranks)),
+            "rank_max": int(max(ranks)),
+        }
+    return curves
+
+
+class SalesVelocityModel:
+    """
+    Process-wide cache of the active fitted curves.
+
+    Estimates compare a Redis version counter (at most one GET every
+    VERSION_CHECK_SECONDS) and reload when a refit has published a new
+    version.
+    """
+
+    def __init__(self):
+        self._curves: Optional[Dict[str, Curve]] = None
+        self._version = 0
+        self._published: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    # ==========================================
+    # ESTIMATION
+    # ==========================================
+
+    @property
+    def version(self) -> int:
+        """Active model version (0 = priors only, nothing fitted yet)."""
+        self._ensure_loaded()
+        return self._version
+
+    def estimate_monthly_units(self, sales_rank: Optional[float], category: Optional[str] = None) -> Optional[int]:
+        """Estimated units sold per month at a sales rank, or None without a rank."""
+        if not sales_rank or sales_rank <= 0:
+            return None
+        intercept, slope = self.curve_for(category)
+        return max(0, int(round(math.exp(intercept) * float(sales_rank) ** slope)))
+
+    def curve_for(self, category: Optional[str]) -> Curve:
+        """(intercept, slope) used for a category."""
+        self._ensure_loaded()
+        key = normalize_category(category)
+        curve = self._curves.get(key) or self._curves.get(ALL_CATEGORIES)
+        if curve:
+            return curve
+        return PRIOR_CURVES.get(key) or PRIOR_CURVES[DEFAULT_CATEGORY]
+
+    # ==========================================
+    # FITTING
+    # ==========================================
+
+    def refit(self) -> Dict[str, Any]:
+        """
+        Fit curves from the stored Keepa history and publish them as a new
+        version. Nothing is published when no curve has enough samples.
+        """
+        rows = self._load_training_rows()
+        curves = fit_curves(rows)
+        summary = {"observations": len(rows), "categories": len(curves), "version": None}
+        if not curves:
+            logger.warning(f"📉 Sales velocity refit: no curve with {MIN_SAMPLES}+ samples in {len(rows)} observations")
+            return summary
+
+        version = self._latest_version() + 1
+        fitted_at = datetime.utcnow().isoformat()
+        supabase.table("sales_velocity_models").insert([
+            {"version": version, "category": key, "fitted_at": fitted_at, **params}
+            for key, params in curves.items()
+        ]).execute()
+
+        client = get_redis_client()
+        if client:
+            try:
+                client.set(VERSION_KEY, version)
+            except Exception as e:
+                logger.warning(f"Could not publish sales velocity version: {e}")
+        self._curves = None
+
+        overall = curves.get(ALL_CATEGORIES) or {}
+        logger.info(
+            f"📈 Sales velocity model v{version}: {len(curves)} curves from {len(rows)} observations "
+            f"(all categories r²={overall.get('r_squared')})"
+        )
+        summary["version"] = version
+        return summary
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _ensure_loaded(self):
+        now = time.time()
+        if self._curves is not None and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return
+        self._checked_at = now
+
+        published = None
+        client = get_redis_client()
+        if client:
+            try:
+                published = client.get(VERSION_KEY)
+            except Exception:
+                pass
+
+        if self._curves is None or published != self._published or now - self._loaded_at > MODEL_MAX_AGE_SECONDS:
+            self._published = published
+            self._load()
+
+    def _load(self):
+        self._loaded_at = time.time()
+        self._curves = {}
+        self._version = 0
+        try:
+            version = self._latest_version()
+            if not version:
+                return
+            result = supabase.table("sales_velocity_models")\
+                .select("category, intercept, slope")\
+                .eq("version", version)\
+                .execute()
+            self._curves = {r["category"]: (r["intercept"], r["slope"]) for r in result.data or []}
+            self._version = version
+            logger.info(f"📈 Loaded sales velocity model v{version} ({len(self._curves)} curves)")
+        except Exception as e:
+            # Estimates fall back to the priors until the next reload
+            logger.warning(f"Could not load sales velocity model: {e}")
+
+    def _latest_version(self) -> int:
+        result = supabase.table("sales_velocity_models")\
+            .select("version")\
+            .order("version", desc=True)\
+            .limit(1)\
+            .execute()
+        return result.data[0]["version"] if result.data else 0
+
+    def _load_training_rows(self) -> List[Dict]:
+        rows: List[Dict] = []
+        start = 0
+        while True:
+            # Pages are only stable under a total order - the view has one row per ASIN.
+            # postgrest-py < 0.14 (pinned via supabase 2.0.3) treats range()'s end as exclusive.
+            result = supabase.table("sales_velocity_training")\
+                .select("category, sales_rank, drops_30")\
+                .order("asin")\
+                .range(start, start + LOAD_PAGE_SIZE)\
+                .execute()
+            page = result.data or []
+            rows.extend(page)
+            if len(page) < LOAD_PAGE_SIZE:
+                break
+            start += LOAD_PAGE_SIZE
+        return rows
+
+
+# Singleton
+sales_velocity_model = SalesVelocityModel()
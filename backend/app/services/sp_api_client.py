@@ -10,10 +10,12 @@ import asyncio
 import random
 import time
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Tuple
 from datetime import datetime, timedelta
 from app.services.supabase_client import supabase
 from app.core.config import settings
+from app.core.encryption import decrypt_token
+from app.services.sp_api_token_broker import token_broker
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,9 @@ except ImportError:
     USE_DISTRIBUTED_LIMITER = False
     sp_api_limiter = None
 
+# Catalog requests kept in flight by iter_catalog_items (rate comes from the token bucket)
+CATALOG_FETCH_CONCURRENCY = 5
+
 # Simple rate limiter for local use
 _last_request = 0
 _min_interval = 0.4  # ~2.5 requests/sec
@@ -49,6 +54,29 @@ def _rate_limit():
     _last_request = time.time()
 
 
+def _is_token_rejected(response) -> bool:
+    """
+    True when SP-API rejected the access token itself: any 401, or a 403
+    whose error code is Unauthorized or mentions an expired/invalid token.
+    Other 403s (missing role, marketplace not allowed) won't be fixed by a
+    new token, so they don't invalidate the shared one.
+    """
+    if response.status_code == 401:
+        return True
+    if response.status_code != 403:
+        return False
+    try:
+        errors = response.json().get("errors") or []
+    except Exception:
+        return False
+    for error in errors:
+        code = (error.get("code") or "").lower()
+        message = (error.get("message") or "").lower()
+        if code == "unauthorized" or "token" in code or "expired" in message or "access token" in message:
+            return True
+    return False
+
+
 class SPAPIError(Exception):
     """Custom exception for SP-API errors."""
     pass
@@ -67,10 +95,6 @@ class SPAPIClient:
         self.app_lwa_secret = os.getenv("SP_API_LWA_CLIENT_SECRET") or settings.SP_API_LWA_CLIENT_SECRET or settings.SPAPI_LWA_CLIENT_SECRET
         self.app_refresh_token = os.getenv("SP_API_REFRESH_TOKEN") or settings.SP_API_REFRESH_TOKEN or settings.SPAPI_REFRESH_TOKEN
         
-        # Cached app token
-        self._app_access_token = None
-        self._app_token_expires = None
-        
         # Check if app credentials configured
         self.app_configured = all([
             self.app_lwa_id,
@@ -114,46 +138,38 @@ class SPAPIClient:
     # ==========================================
     
     async def _get_app_access_token(self) -> Optional[str]:
-        """Get access token using APP credentials."""
+        """
+        Get access token using APP credentials.
+        Cached in Redis via the token broker so all workers share one token.
+        """
         if not self.app_configured:
             return None
         
-        # Return cached if valid
-        if self._app_access_token and self._app_token_expires:
-            if datetime.utcnow() < self._app_token_expires - timedelta(minutes=5):
-                return self._app_access_token
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.amazon.com/auth/o2/token",
-                    data={
-                        "grant_type": "refresh_token",
-                        "refresh_token": self.app_refresh_token,
-                        "client_id": self.app_lwa_id,
-                        "client_secret": self.app_lwa_secret
-                    },
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"App LWA token error: {response.status_code} - {response.text[:200]}")
-                    return None
-                
-                data = response.json()
-                self._app_access_token = data.get("access_token")
-                expires_in = data.get("expires_in", 3600)
-                self._app_token_expires = datetime.utcnow() + timedelta(seconds=expires_in)
-                
-                logger.info("✅ SP-API app token refreshed")
-                return self._app_access_token
-                
-        except Exception as e:
-            logger.error(f"Error getting app token: {e}")
-            return None
+        return await token_broker.get_token(
+            token_broker.app_key(self.app_lwa_id),
+            lambda: self._refresh_lwa_token(self.app_refresh_token, "App"),
+            kind="app"
+        )
     
     async def _get_user_access_token(self, user_id: str, marketplace_id: str) -> Optional[str]:
-        """Get access token using USER credentials (if connected)."""
+        """
+        Get access token using USER credentials (if connected).
+        Cached per user + marketplace, so Supabase and LWA are only hit on refresh.
+        """
+        async def refresh():
+            refresh_token = self._load_user_refresh_token(user_id, marketplace_id)
+            if not refresh_token:
+                return None
+            return await self._refresh_lwa_token(refresh_token, "User")
+        
+        return await token_broker.get_token(
+            token_broker.user_key(user_id, marketplace_id),
+            refresh,
+            kind="user"
+        )
+    
+    def _load_user_refresh_token(self, user_id: str, marketplace_id: str) -> Optional[str]:
+        """Read and decrypt the user's stored refresh token."""
         try:
             # Get user's connection
             result = supabase.table("amazon_connections")\
@@ -171,11 +187,19 @@ class SPAPIClient:
             if not encrypted_token:
                 return None
             
-            # Decrypt token (if encryption is used)
-            # For now, assume it's stored plain (should be encrypted in production)
-            refresh_token = encrypted_token
-            
-            # Get access token
+            # OAuth flow stores tokens encrypted; older rows may be plain text
+            try:
+                return decrypt_token(encrypted_token)
+            except Exception:
+                return encrypted_token
+                
+        except Exception as e:
+            logger.error(f"Error loading user refresh token: {e}")
+            return None
+    
+    async def _refresh_lwa_token(self, refresh_token: str, label: str) -> Optional[tuple]:
+        """Exchange a refresh token for (access_token, expires_in)."""
+        try:
             async with httpx.AsyncClient() as client:
                 response = await client.post(
                     "https://api.amazon.com/auth/o2/token",
@@ -189,13 +213,14 @@ class SPAPIClient:
                 )
                 
                 if response.status_code != 200:
-                    logger.error(f"User LWA token error: {response.status_code}")
+                    logger.error(f"{label} LWA token error: {response.status_code} - {response.text[:200]}")
                     return None
                 
-                return response.json().get("access_token")
+                data = response.json()
+                return data.get("access_token"), data.get("expires_in", 3600)
                 
         except Exception as e:
-            logger.error(f"Error getting user token: {e}")
+            logger.error(f"Error getting {label.lower()} token: {e}")
             return None
     
     async def _request(
@@ -248,7 +273,7 @@ class SPAPIClient:
         for attempt in range(max_retries):
             # Apply token bucket rate limiting (blocks until token available)
             if limiter:
-                if not limiter.acquire(tokens=1, timeout=120):
+                if not await limiter.acquire_async(tokens=1, timeout=120):
                     logger.error(f"Rate limit timeout for {path}")
                     return None
             elif USE_DISTRIBUTED_LIMITER and sp_api_limiter:
@@ -272,18 +297,41 @@ class SPAPIClient:
                         timeout=30
                     )
                     
+                    # Pace to the rate Amazon actually grants this operation (single-operation buckets only)
+                    rate_header = response.headers.get("x-amzn-RateLimit-Limit")
+                    if rate_header and limiter:
+                        try:
+                            limiter.observe_rate_limit(float(rate_header))
+                        except (ValueError, AttributeError):
+                            pass
+                    
                     if response.status_code == 200:
                         result = response.json()
                         logger.info(f"✅ SP-API SUCCESS: {method} {path} | Status: 200")
                         return result
                     
                     elif response.status_code == 429:
+                        # Drain the shared bucket so other workers back off too
+                        if limiter:
+                            limiter.penalize()
                         # Exponential backoff: 2, 4, 8, 16, 32 sec
                         wait = min(2 ** (attempt + 1), 32) * random.uniform(0.8, 1.2)
                         logger.warning(f"⏳ 429 on {path} - waiting {wait:.1f}s (attempt {attempt + 1}/{max_retries})")
                         await asyncio.sleep(wait)
                         continue
                     
+                    elif attempt == 0 and _is_token_rejected(response):
+                        # Cached token may have expired or been revoked - drop it and retry once with a fresh one
+                        token_key = token_broker.user_key(user_id, marketplace_id) if (use_user_token and user_id) else token_broker.app_key(self.app_lwa_id)
+                        token_broker.invalidate(token_key)
+                        fresh_token = await (self._get_user_access_token(user_id, marketplace_id) if (use_user_token and user_id) else self._get_app_access_token())
+                        if not fresh_token:
+                            logger.error(f"SP-API {path}: {response.status_code} and token refresh failed")
+                            return None
+                        headers["x-amz-access-token"] = fresh_token
+                        logger.warning(f"🔑 {response.status_code} on {path} - retrying with refreshed token")
+                        continue
+                    
                     elif response.status_code == 503:
                         wait = 2 ** attempt
                         logger.warning(f"⏳ 503 on {path} - waiting {wait}s (attempt {attempt + 1}/{max_retries})")
@@ -506,15 +554,19 @@ class SPAPIClient:
         self,
         identifiers: List[str],
         identifiers_type: str = "UPC",
-        marketplace_id: str = "ATVPDKIKX0DER"
+        marketplace_id: str = "ATVPDKIKX0DER",
+        included_data: List[str] = None,
+        page_size: Optional[int] = None
     ) -> Optional[dict]:
         """
-        Search catalog items by UPC/EAN/GTIN identifiers.
+        Search catalog items by UPC/EAN/GTIN/ASIN identifiers (up to 20 per call).
         
         Args:
-            identifiers: List of UPC/EAN/GTIN codes
-            identifiers_type: Type of identifier (UPC, EAN, GTIN)
+            identifiers: List of UPC/EAN/GTIN codes or ASINs
+            identifiers_type: Type of identifier (UPC, EAN, GTIN, ASIN)
             marketplace_id: Amazon marketplace ID
+            included_data: Data sets to include (default: summaries)
+            page_size: Results per page (SP-API default 10, max 20)
             
         Returns:
             Catalog search results with items containing ASINs
@@ -525,18 +577,22 @@ class SPAPIClient:
         if not identifiers:
             return None
         
+        params = {
+            "marketplaceIds": marketplace_id,
+            "identifiers": ",".join(identifiers),
+            "identifiersType": identifiers_type,
+            "includedData": ",".join(included_data or ["summaries"])
+        }
+        if page_size:
+            params["pageSize"] = page_size
+        
         # SP-API catalog search endpoint
         data = await self._request(
             "GET",
             "/catalog/2022-04-01/items",
             marketplace_id,
             limiter_name="catalog",
-            params={
-                "marketplaceIds": marketplace_id,
-                "identifiers": ",".join(identifiers),
-                "identifiersType": identifiers_type,
-                "includedData": "summaries"
-            }
+            params=params
         )
         
         if not data:
@@ -647,9 +703,10 @@ class SPAPIClient:
         try:
             # Use catalog API to get variation info
             response = await self.get_catalog_item(asin, marketplace_id)
+            processed = (response or {}).get('processed') or {}
             
-            if response and response.get('parentAsin'):
-                return response['parentAsin']
+            if processed.get('parentAsin'):
+                return processed['parentAsin']
             
             return None
             
@@ -674,8 +731,9 @@ class SPAPIClient:
             # Get catalog data
             catalog = await self.get_catalog_item(asin, marketplace_id)
             if catalog:
-                indicators['bsr'] = catalog.get('sales_rank')
-                indicators['has_prime'] = catalog.get('isPrimeEligible', False)
+                processed = catalog.get('processed') or {}
+                indicators['bsr'] = processed.get('sales_rank')
+                indicators['has_prime'] = processed.get('isPrimeEligible', False)
             
             # Get pricing (check buybox)
             try:
@@ -760,7 +818,7 @@ class SPAPIClient:
             "GET",
             "/listings/2021-08-01/restrictions",
             marketplace_id,
-            limiter_name="competitive_pricing",  # Use default limiter
+            limiter_name="listings_restrictions",
             params={
                 "asin": asin,
                 "sellerId": settings.SELLER_ID or "ATVPDKIKX0DER",  # Use app seller ID
@@ -894,7 +952,7 @@ class SPAPIClient:
             "GET",
             "/orders/v0/orders",
             marketplace_id,
-            limiter_name="competitive_pricing",  # Use default limiter for seller endpoints
+            limiter_name="orders",
             params={
                 "MarketplaceIds": marketplace_id,
                 "CreatedAfter": created_after
@@ -1164,59 +1222,93 @@ class SPAPIClient:
         
         return results
     
-    async def get_catalog_items(
+    async def iter_catalog_items(
         self,
         asins: List[str],
         marketplace_id: str = "ATVPDKIKX0DER",
         included_data: List[str] = None,
-        rate_limit: int = 5  # SP-API limit: 5 req/sec
-    ) -> Dict[str, dict]:
+        concurrency: int = CATALOG_FETCH_CONCURRENCY
+    ) -> AsyncIterator[Tuple[str, Optional[dict]]]:
         """
-        Get catalog items for multiple ASINs with rate limiting.
-        Returns dict mapping ASIN -> {processed, raw}
-        Note: SP-API catalog doesn't support batching, so we parallelize with semaphore.
+        Fetch catalog items for any number of ASINs, yielding (asin, {processed, raw})
+        in completion order. Catalog is None for ASINs that failed.
+        
+        getCatalogItem has no batch form, so pacing comes from the shared
+        "catalog" token bucket (2 req/s, burst 2 by default, adapted from the
+        x-amzn-RateLimit-Limit header). `concurrency` only bounds requests in
+        flight so network latency overlaps with the bucket refill.
+        Cache hits don't consume tokens.
         """
         if not self.app_configured or not asins:
-            return {}
+            return
         
-        included_data = included_data or ['summaries', 'images', 'attributes', 'salesRanks']
-        asin_list = asins[:20]  # Limit to 20 for reasonable parallelization
-        results = {}
+        # Deduplicate while preserving order
+        asin_list = list(dict.fromkeys(a for a in asins if a))
+        pending = asyncio.Queue()
+        for asin in asin_list:
+            pending.put_nowait(asin)
+        completed = asyncio.Queue()
         
-        # IMPROVEMENT 6: Use semaphore to respect rate limits (5 req/sec for SP-API)
-        sem = asyncio.Semaphore(rate_limit)
-        
-        async def get_catalog_with_semaphore(asin: str):
-            async with sem:
-                # 200ms delay between requests (5 req/sec)
-                await asyncio.sleep(0.2)
+        async def worker():
+            while True:
+                try:
+                    asin = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
                 try:
                     catalog = await self.get_catalog_item(asin, marketplace_id, included_data)
-                    return asin, catalog
                 except Exception as e:
                     logger.error(f"Failed to fetch catalog for {asin}: {e}")
-                    return asin, None
+                    catalog = None
+                await completed.put((asin, catalog))
         
-        tasks = [get_catalog_with_semaphore(asin) for asin in asin_list]
-        catalog_results = await asyncio.gather(*tasks, return_exceptions=True)
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(max(1, min(concurrency, len(asin_list))))
+        ]
+        try:
+            for _ in range(len(asin_list)):
+                yield await completed.get()
+        finally:
+            for task in workers:
+                if not task.done():
+                    task.cancel()
+    
+    async def get_catalog_items(
+        self,
+        asins: List[str],
+        marketplace_id: str = "ATVPDKIKX0DER",
+        included_data: List[str] = None,
+        rate_limit: int = CATALOG_FETCH_CONCURRENCY
+    ) -> Dict[str, dict]:
+        """
+        Get catalog items for any number of ASINs with rate limiting.
+        Returns dict mapping ASIN -> {processed, raw}
+        Note: SP-API catalog doesn't support batching - see iter_catalog_items().
         
-        for result in catalog_results:
-            if isinstance(result, Exception):
-                continue
-            asin, catalog = result
+        Args:
+            rate_limit: Max requests in flight (the token bucket sets the actual rate)
+        """
+        if not self.app_configured or not asins:
+            return {}
+        
+        included_data = included_data or ['summaries', 'images', 'attributes', 'salesRanks']
+        results = {}
+        requested = 0
+        
+        async for asin, catalog in self.iter_catalog_items(asins, marketplace_id, included_data, concurrency=rate_limit):
+            requested += 1
             if catalog:
                 results[asin] = catalog
         
-        logger.info(f"✅ Fetched {len(results)} catalog items (rate-limited)")
-        
-        logger.info(f"✅ Batch catalog: {len(results)}/{len(asin_list)} ASINs")
+        logger.info(f"✅ Batch catalog: {len(results)}/{requested} ASINs")
         return results
     
     async def get_catalog_items_batch(
         self,
         asins: List[str],
         marketplace_id: str = "ATVPDKIKX0DER",
-        rate_limit: int = 5  # SP-API limit: 5 req/sec
+        rate_limit: int = CATALOG_FETCH_CONCURRENCY
     ) -> Dict[str, dict]:
         """
         DEPRECATED: Use get_catalog_items instead.
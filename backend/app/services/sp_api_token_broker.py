@@ -0,0 +1,265 @@
+"""
+Shared LWA access-token cache for SP-API.
+
+App tokens and per-user (per-marketplace) tokens are cached in Redis until
+shortly before expiry, encrypted at rest with app/core/encryption.py, so every
+Celery worker and API process reuses the same token instead of refreshing its
+own. Refreshes are single-flight: one process takes a Redis lock and refreshes,
+the rest wait for the result.
+
+invalidate() bumps a Redis generation counter; every process checks it (at
+most every GENERATION_CHECK_SECONDS) and drops its in-memory tokens when it
+moves, so a disconnected or rejected token isn't served from another
+process's memory until it expires.
+"""
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+from app.core.encryption import encrypt_token, decrypt_token
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Refresh this long before LWA expiry (tokens live 3600s)
+REFRESH_MARGIN_SECONDS = 300
+# How long a refresher may hold the single-flight lock
+REFRESH_LOCK_TTL_SECONDS = 30
+# How long a waiter polls for another worker's refresh before doing its own
+REFRESH_WAIT_SECONDS = 10
+# Bumped by invalidate(); processes drop their in-memory tokens when it moves
+GENERATION_KEY = "lwa:generation"
+GENERATION_CHECK_SECONDS = 5  # At most one Redis GET per this interval
+
+# Returns (access_token, expires_in_seconds) or None on failure
+RefreshFn = Callable[[], Awaitable[Optional[Tuple[str, int]]]]
+
+
+class SPAPITokenBroker:
+    """
+    Caches LWA access tokens in-process and in Redis.
+
+    Lookup order: process memory -> Redis (decrypt) -> single-flight refresh.
+    Works without Redis (process-local cache only).
+    """
+
+    def __init__(self):
+        self._local: Dict[str, Tuple[str, float]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._generation: Optional[str] = None
+        self._generation_checked_at = 0.0
+
+    # ==========================================
+    # KEYS
+    # ==========================================
+
+    @staticmethod
+    def app_key(client_id: str, marketplace_id: str = "global") -> str:
+        # App tokens aren't marketplace-scoped by LWA, but keep the slot so
+        # region-specific app credentials can't collide
+        digest = hashlib.sha256((client_id or "").encode()).hexdigest()[:16]
+        return f"lwa:app:{digest}:{marketplace_id}"
+
+    @staticmethod
+    def user_key(user_id: str, marketplace_id: str) -> str:
+        return f"lwa:user:{user_id}:{marketplace_id}"
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    async def get_token(self, key: str, refresh: RefreshFn, kind: str = "app") -> Optional[str]:
+        """
+        Return a valid access token for `key`, refreshing via `refresh` only
+        when no unexpired token is cached anywhere.
+
+        Args:
+            key: Cache key from app_key() / user_key()
+            refresh: Coroutine fn returning (access_token, expires_in) or None
+            kind: Stats bucket ("app" or "user")
+        """
+        token = self._get_local(key)
+        if token:
+            self._record(kind, "local_hits")
+            return token
+
+        token = self._get_shared(key)
+        if token:
+            self._record(kind, "redis_hits")
+            return token
+
+        return await self._refresh_single_flight(key, refresh, kind)
+
+    def invalidate(self, key: str):
+        """
+        Drop a token everywhere (after SP-API rejects it with a 401, or the
+        user connects or disconnects a seller account).
+        """
+        self._local.pop(key, None)
+        client = get_redis_client()
+        if client:
+            try:
+                pipe = client.pipeline()
+                pipe.delete(key)
+                pipe.incr(GENERATION_KEY)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"LWA token invalidate failed for {key}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Refresh counts and latency, for this process and across all workers.
+        """
+        stats: Dict[str, Any] = {"process": {}, "shared": {}}
+
+        for kind, counters in self._stats.items():
+            refreshes = counters.get("refreshes", 0)
+            stats["process"][kind] = {
+                **{k: v for k, v in counters.items() if k != "refresh_ms_total"},
+                "avg_refresh_ms": round(counters.get("refresh_ms_total", 0) / refreshes, 1) if refreshes else None,
+            }
+
+        client = get_redis_client()
+        if client:
+            try:
+                for kind in ("app", "user"):
+                    raw = client.hgetall(f"lwa:stats:{kind}") or {}
+                    refreshes = int(float(raw.get("refreshes", 0)))
+                    total_ms = float(raw.get("refresh_ms_total", 0))
+                    stats["shared"][kind] = {
+                        "refreshes": refreshes,
+                        "refresh_failures": int(float(raw.get("refresh_failures", 0))),
+                        "avg_refresh_ms": round(total_ms / refreshes, 1) if refreshes else None,
+                    }
+            except Exception as e:
+                logger.warning(f"Could not read shared LWA token stats: {e}")
+
+        return stats
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _check_generation(self):
+        now = time.time()
+        if now - self._generation_checked_at < GENERATION_CHECK_SECONDS:
+            return
+        self._generation_checked_at = now
+
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            generation = client.get(GENERATION_KEY)
+        except Exception:
+            return
+        if generation != self._generation:
+            # Some token was invalidated - re-read them all from Redis
+            self._local.clear()
+            self._generation = generation
+
+    def _get_local(self, key: str) -> Optional[str]:
+        self._check_generation()
+        cached = self._local.get(key)
+        if cached and time.time() < cached[1] - REFRESH_MARGIN_SECONDS:
+            return cached[0]
+        return None
+
+    def _get_shared(self, key: str) -> Optional[str]:
+        client = get_redis_client()
+        if not client:
+            return None
+        try:
+            encrypted = client.get(key)
+            if not encrypted:
+                return None
+            entry = json.loads(decrypt_token(encrypted))
+            expires_at = float(entry["expires_at"])
+            if time.time() >= expires_at - REFRESH_MARGIN_SECONDS:
+                return None
+            self._local[key] = (entry["access_token"], expires_at)
+            return entry["access_token"]
+        except Exception as e:
+            logger.warning(f"LWA token cache read failed for {key}: {e}")
+            return None
+
+    def _store(self, key: str, token: str, expires_in: int):
+        expires_at = time.time() + expires_in
+        self._local[key] = (token, expires_at)
+
+        client = get_redis_client()
+        if not client:
+            return
+        ttl = max(1, int(expires_in - REFRESH_MARGIN_SECONDS))
+        try:
+            payload = json.dumps({"access_token": token, "expires_at": expires_at})
+            client.setex(key, ttl, encrypt_token(payload))
+        except Exception as e:
+            logger.warning(f"LWA token cache write failed for {key}: {e}")
+
+    async def _refresh_single_flight(self, key: str, refresh: RefreshFn, kind: str) -> Optional[str]:
+        client = get_redis_client()
+        lock_key = f"{key}:lock"
+        owner = uuid.uuid4().hex
+        have_lock = True
+
+        if client:
+            try:
+                have_lock = bool(client.set(lock_key, owner, nx=True, ex=REFRESH_LOCK_TTL_SECONDS))
+            except Exception as e:
+                logger.warning(f"LWA refresh lock failed for {key}: {e}")
+
+        if not have_lock:
+            # Another worker is refreshing - wait for its token
+            deadline = time.time() + REFRESH_WAIT_SECONDS
+            while time.time() < deadline:
+                await asyncio.sleep(0.1)
+                token = self._get_shared(key)
+                if token:
+                    self._record(kind, "waited_for_refresh")
+                    return token
+            logger.warning(f"Timed out waiting for LWA refresh of {key}, refreshing locally")
+
+        try:
+            started = time.perf_counter()
+            result = await refresh()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            if not result or not result[0]:
+                self._record(kind, "refresh_failures", shared=True)
+                return None
+
+            token, expires_in = result
+            self._store(key, token, expires_in or 3600)
+            self._record(kind, "refreshes", shared=True)
+            self._record(kind, "refresh_ms_total", elapsed_ms, shared=True)
+            logger.info(f"🔑 LWA {kind} token refreshed in {elapsed_ms:.0f}ms ({key})")
+            return token
+        finally:
+            if client and have_lock:
+                try:
+                    # Only release our own lock
+                    if client.get(lock_key) == owner:
+                        client.delete(lock_key)
+                except Exception:
+                    pass
+
+    def _record(self, kind: str, counter: str, amount: float = 1, shared: bool = False):
+        counters = self._stats.setdefault(kind, {})
+        counters[counter] = counters.get(counter, 0) + amount
+
+        if shared:
+            client = get_redis_client()
+            if client:
+                try:
+                    client.hincrbyfloat(f"lwa:stats:{kind}", counter, amount)
+                except Exception:
+                    pass
+
+
+# Singleton - shared by every SPAPIClient in the process
+token_broker = SPAPITokenBroker()
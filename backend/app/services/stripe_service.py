@@ -349,6 +349,9 @@ class StripeService:
                 })\
                 .eq("user_id", user_id)\
                 .execute()
+
+            from app.services.usage_meter import usage_meter
+            usage_meter.invalidate_limits(user_id)
             
             return {
                 "status": "canceled",
@@ -527,6 +530,10 @@ class StripeWebhookHandler:
             "trial_end": datetime.fromtimestamp(subscription["trial_end"]).isoformat() if subscription.get("trial_end") else None,
             "had_free_trial": had_free_trial,  # Track that user had a trial
         }, on_conflict="user_id").execute()
+
+        # New plan - the usage meter re-reads the limit on the next metered action
+        from app.services.usage_meter import usage_meter
+        usage_meter.invalidate_limits(user_id)
     
     @staticmethod
     async def handle_subscription_updated(subscription: Dict[str, Any]):
@@ -581,10 +588,15 @@ class StripeWebhookHandler:
         if had_free_trial:
             update_data["had_free_trial"] = True
         
-        supabase.table("subscriptions")\
+        updated = supabase.table("subscriptions")\
             .update(update_data)\
             .eq("stripe_subscription_id", subscription_id)\
             .execute()
+
+        # Tier or status may have changed - re-read the metered limits on next use
+        from app.services.usage_meter import usage_meter
+        for row in updated.data or []:
+            usage_meter.invalidate_limits(row["user_id"])
         
         # ✅ Log tier change for debugging (frontend will refresh on next /auth/me call)
         if old_tier and old_tier != tier and user_id:
@@ -617,8 +629,12 @@ class StripeWebhookHandler:
             .eq("stripe_subscription_id", subscription_id)\
             .execute()
         
-        # Send cancellation email
         if user_id:
+            # Back to free-tier limits
+            from app.services.usage_meter import usage_meter
+            usage_meter.invalidate_limits(user_id)
+
+            # Send cancellation email
             try:
                 from app.services.email_service import EmailService
                 await EmailService.send_subscription_cancelled_email(user_id)
@@ -672,6 +688,10 @@ class StripeWebhookHandler:
             })\
             .eq("user_id", user_id)\
             .execute()
+        
+        # New period - next metered action re-seeds the Redis counter from Postgres
+        from app.services.usage_meter import usage_meter
+        usage_meter.reset(user_id, "analyses_per_month")
     
     @staticmethod
     async def handle_invoice_payment_failed(invoice: Dict[str, Any]):
@@ -693,6 +713,10 @@ class StripeWebhookHandler:
             .update({"status": "past_due"})\
             .eq("stripe_customer_id", customer_id)\
             .execute()
+
+        # past_due drops the user to free-tier limits
+        from app.services.usage_meter import usage_meter
+        usage_meter.invalidate_limits(user_id)
         
         # Send payment failed email
         try:
@@ -0,0 +1,154 @@
+"""
+Set-based promotion of Telegram deals to products.
+
+promote() turns any number of deals into linked products for analysis with
+one promote_telegram_deals call: existing products are resolved for all the
+deals' ASINs at once, missing ones are inserted in one statement, and the
+deals are linked and marked 'analyzing' in one update. If the RPC isn't
+deployed, the same steps run as chunked PostgREST queries.
+
+See database/migrations/CREATE_PROMOTE_TELEGRAM_DEALS_RPC.sql.
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+ID_CHUNK_SIZE = 200  # IDs / ASINs per in.() filter (keeps the URL short)
+PAGE_SIZE = 1000  # PostgREST max rows per response
+
+
+class TelegramDealPromoter:
+    """Promote Telegram deals to products in bulk."""
+
+    def promote(
+        self,
+        user_id: str,
+        deal_ids: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Promote the given deals (any status), or the user's pending deals
+        oldest first when deal_ids is None.
+
+        Returns:
+            {"deal_to_product": {deal_id: product_id}, "product_ids": [...],
+             "created": number of products inserted}
+        """
+        try:
+            result = supabase.rpc("promote_telegram_deals", {
+                "p_user_id": user_id,
+                "p_deal_ids": deal_ids,
+                "p_limit": limit
+            }).execute()
+            rows = result.data or []
+        except Exception as e:
+            logger.warning(f"promote_telegram_deals failed ({e}), promoting with chunked queries")
+            rows = self._promote_chunked(user_id, deal_ids, limit)
+
+        deal_to_product = {row["deal_id"]: row["product_id"] for row in rows}
+        promotion = {
+            "deal_to_product": deal_to_product,
+            "product_ids": list(dict.fromkeys(deal_to_product.values())),
+            "created": len({row["product_id"] for row in rows if row.get("created")}),
+        }
+        logger.info(f"📦 Promoted {len(deal_to_product)} Telegram deals to {len(promotion['product_ids'])} products "
+                    f"({promotion['created']} new) for user {user_id}")
+        return promotion
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _promote_chunked(
+        self,
+        user_id: str,
+        deal_ids: Optional[List[str]],
+        limit: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        deals = [d for d in self._load_deals(user_id, deal_ids, limit) if d.get("asin")]
+        if not deals:
+            return []
+
+        asins = list({d["asin"] for d in deals})
+        products = self._load_products(user_id, asins)
+
+        created = set()
+        missing = [asin for asin in asins if asin not in products]
+        if missing:
+            inserted = supabase.table("products").insert([
+                {"user_id": user_id, "asin": asin, "status": "pending"} for asin in missing
+            ]).execute()
+            for product in inserted.data or []:
+                products[product["asin"]] = product["id"]
+                created.add(product["id"])
+
+        linked = [d for d in deals if d["asin"] in products]
+        if linked:
+            # Upsert on id updates only the columns given - one statement for every deal
+            supabase.table("telegram_deals").upsert([
+                {
+                    "id": d["id"],
+                    "user_id": user_id,
+                    "asin": d["asin"],
+                    "product_id": products[d["asin"]],
+                    "status": "analyzing"
+                }
+                for d in linked
+            ], on_conflict="id").execute()
+
+        return [
+            {"deal_id": d["id"], "product_id": products[d["asin"]], "created": products[d["asin"]] in created}
+            for d in linked
+        ]
+
+    @staticmethod
+    def _load_deals(user_id: str, deal_ids: Optional[List[str]], limit: Optional[int]) -> List[Dict[str, Any]]:
+        if deal_ids is not None:
+            deals = []
+            for i in range(0, len(deal_ids), ID_CHUNK_SIZE):
+                response = supabase.table("telegram_deals")\
+                    .select("id, asin")\
+                    .eq("user_id", user_id)\
+                    .in_("id", deal_ids[i:i + ID_CHUNK_SIZE])\
+                    .execute()
+                deals.extend(response.data or [])
+            return deals[:limit] if limit else deals
+
+        deals = []
+        while limit is None or len(deals) < limit:
+            page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - len(deals))
+            # postgrest-py < 0.14 (pinned via supabase 2.0.3) treats range()'s end as exclusive
+            response = supabase.table("telegram_deals")\
+                .select("id, asin")\
+                .eq("user_id", user_id)\
+                .eq("status", "pending")\
+                .order("extracted_at,id")\
+                .range(len(deals), len(deals) + page_size)\
+                .execute()
+            page = response.data or []
+            deals.extend(page)
+            if len(page) < page_size:
+                break
+        return deals
+
+    @staticmethod
+    def _load_products(user_id: str, asins: List[str]) -> Dict[str, str]:
+        """ASIN -> product id; the first product returned wins if an ASIN has several."""
+        products = {}
+        for i in range(0, len(asins), ID_CHUNK_SIZE):
+            response = supabase.table("products")\
+                .select("id, asin")\
+                .eq("user_id", user_id)\
+                .in_("asin", asins[i:i + ID_CHUNK_SIZE])\
+                .order("created_at")\
+                .execute()
+            for product in response.data or []:
+                products.setdefault(product["asin"], product["id"])
+        return products
+
+
+# Singleton
+telegram_deal_promoter = TelegramDealPromoter()
@@ -0,0 +1,113 @@
+"""
+Telegram deal stats from the trigger-maintained telegram_deal_stats table.
+
+Counts (status, profitable, ROI histogram) are updated by triggers whenever
+a deal is inserted or its status or analysis changes, so GET /deals/stats
+is one read of the user's few bucket rows instead of a scan of every deal.
+reconcile() recounts from telegram_deals to correct drift.
+
+See database/migrations/ADD_TELEGRAM_DEAL_STATS.sql.
+"""
+import logging
+from typing import Dict, Any, Optional
+
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEYS = ("pending", "analyzed", "error")
+ROI_BUCKETS = ("lt_0", "0_15", "15_30", "30_50", "50_100", "100_plus")
+PROFITABLE_ROI = 30
+
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        "total": 0,
+        "pending": 0,
+        "analyzed": 0,
+        "profitable": 0,
+        "error": 0,
+        "roi_buckets": {bucket: 0 for bucket in ROI_BUCKETS},
+    }
+
+
+class TelegramDealStats:
+    """Read and reconcile per-user Telegram deal counters."""
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        {"total", "pending", "analyzed", "profitable", "error", "roi_buckets"},
+        or None if the stats table isn't available.
+        """
+        try:
+            result = supabase.table("telegram_deal_stats")\
+                .select("bucket_type, bucket, count")\
+                .eq("user_id", user_id)\
+                .execute()
+        except Exception as e:
+            logger.warning(f"Telegram deal stats unavailable: {e}")
+            return None
+
+        stats = empty_stats()
+        for row in result.data or []:
+            bucket_type, bucket, count = row["bucket_type"], row["bucket"], row["count"]
+            if bucket_type == "all":
+                stats["total"] = count
+            elif bucket_type == "status" and bucket in STATUS_KEYS:
+                stats[bucket] = count
+            elif bucket_type == "profitable":
+                stats["profitable"] = count
+            elif bucket_type == "roi" and bucket in stats["roi_buckets"]:
+                stats["roi_buckets"][bucket] = count
+        return stats
+
+    def count_from_deals(self, user_id: str) -> Dict[str, Any]:
+        """Fallback when the stats table is missing: count the user's deals."""
+        result = supabase.table("telegram_deals")\
+            .select("status, analysis_id, analyses!telegram_deals_analysis_id_fkey(roi)")\
+            .eq("user_id", user_id)\
+            .execute()
+
+        stats = empty_stats()
+        for deal in result.data or []:
+            stats["total"] += 1
+            status = (deal.get("status") or "pending").lower()
+            if status in STATUS_KEYS:
+                stats[status] += 1
+
+            # Supabase returns the joined analysis as dict or list
+            analysis = deal.get("analyses")
+            if isinstance(analysis, list):
+                analysis = analysis[0] if analysis else None
+            if status != "analyzed" or not analysis:
+                continue
+
+            roi = analysis.get("roi") or 0
+            stats["roi_buckets"][roi_bucket(roi)] += 1
+            if roi >= PROFITABLE_ROI:
+                stats["profitable"] += 1
+        return stats
+
+    def reconcile(self, user_id: Optional[str] = None) -> int:
+        """Recount from telegram_deals (all users by default); returns rows corrected."""
+        result = supabase.rpc("reconcile_telegram_deal_stats", {"p_user_id": user_id}).execute()
+        return result.data or 0
+
+
+def roi_bucket(roi: float) -> str:
+    """Same edges as telegram_deal_buckets() in the migration."""
+    if roi < 0:
+        return "lt_0"
+    if roi < 15:
+        return "0_15"
+    if roi < 30:
+        return "15_30"
+    if roi < 50:
+        return "30_50"
+    if roi < 100:
+        return "50_100"
+    return "100_plus"
+
+
+# Singleton
+telegram_deal_stats = TelegramDealStats()
@@ -0,0 +1,322 @@
+"""
+Redis-backed usage metering for FeatureGate.
+
+Per-user, per-feature, per-period counters live in Redis. A Lua script
+checks the limit, increments the counter and queues the usage_records row
+atomically, so metering an action is one Redis round trip instead of the
+tier/usage queries, increment RPC and usage_records insert it used to cost.
+
+Postgres stays the system of record:
+- flush() (app.tasks.usage_metering, every 30s) writes changed counters to
+  subscriptions.analyses_used_this_period and bulk-inserts queued
+  usage_records.
+- Counters are seeded from Postgres on first use, and reconcile() re-seeds
+  every counter after a Redis restart (detected by a new server run_id),
+  keeping the larger of the Redis and Postgres values.
+
+Limits: the tier limit is cached next to the counter. Everything that
+changes a subscription's tier or status (Stripe webhooks, billing endpoints)
+calls invalidate_limits(), so the next metered action re-reads it; LIMIT_TTL
+only bounds how long a change made outside the app goes unnoticed.
+
+Periods: each counter remembers the subscription's last_usage_reset it was
+seeded with. The invoice-paid webhook resets Postgres and calls reset();
+flushes from the old period no longer match and are ignored.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from app.services.supabase_client import supabase
+from app.services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Metered feature -> subscriptions column it is flushed to. Other features
+# (channels, suppliers, seats) are counts of real rows and stay in FeatureGate.
+METERED_FEATURES = {
+    "analyses_per_month": "analyses_used_this_period",
+}
+
+COUNTER_KEY = "meter:{user_id}:{feature}"  # hash: used, period
+LIMIT_KEY = "meter_limit:{user_id}:{feature}"  # tier limit, -1 = unlimited
+DIRTY_KEY = "meter:dirty"  # set of "user_id:feature" changed since last flush
+RECORDS_KEY = "meter:records"  # list of queued usage_records rows (JSON)
+RUN_ID_KEY = "meter:run_id"  # Redis run_id the counters were reconciled against
+
+LIMIT_TTL = 86400  # Backstop only - plan changes call invalidate_limits()
+FLUSH_MAX_USERS = 1000
+FLUSH_MAX_RECORDS = 5000
+INSERT_CHUNK_SIZE = 500
+
+# KEYS: counter, limit, dirty set, records list
+# ARGV: amount, dirty member, usage record JSON, enforce limit (1/0)
+# Returns {status, used, limit}; status 1 = counted, 0 = over limit, -1 = not seeded
+_CONSUME_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return {-1, 0, 0} end
+local limit = redis.call('GET', KEYS[2])
+if not limit then return {-1, 0, 0} end
+limit = tonumber(limit)
+local amount = tonumber(ARGV[1])
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '0')
+if ARGV[4] == '1' and amount > 0 and limit >= 0 and used + amount > limit then
+    return {0, used, limit}
+end
+used = redis.call('HINCRBY', KEYS[1], 'used', amount)
+if used < 0 then
+    redis.call('HSET', KEYS[1], 'used', 0)
+    used = 0
+end
+redis.call('SADD', KEYS[3], ARGV[2])
+if amount > 0 then redis.call('RPUSH', KEYS[4], ARGV[3]) end
+return {1, used, limit}
+"""
+
+# KEYS: counter. ARGV: used from Postgres, period.
+# Creates the counter, raises it to the Postgres value if Redis lost increments,
+# or replaces it if Postgres has moved on to a new period.
+_SEED_LUA = """
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '-1')
+local period = redis.call('HGET', KEYS[1], 'period')
+local seeded = tonumber(ARGV[1])
+if used < seeded or period ~= ARGV[2] then
+    redis.call('HSET', KEYS[1], 'used', seeded, 'period', ARGV[2])
+end
+return redis.call('HGET', KEYS[1], 'used')
+"""
+
+
+class UsageMeter:
+    """
+    Atomic usage counters in Redis, flushed to Postgres in batches.
+    """
+
+    def __init__(self):
+        self._consume_script = None
+        self._seed_script = None
+
+    def _client(self):
+        client = get_redis_client()
+        if client and self._consume_script is None:
+            self._consume_script = client.register_script(_CONSUME_LUA)
+            self._seed_script = client.register_script(_SEED_LUA)
+        return client
+
+    @staticmethod
+    def is_metered(feature: str) -> bool:
+        return feature in METERED_FEATURES
+
+    # ==========================================
+    # REQUEST PATH
+    # ==========================================
+
+    def consume(self, user, feature: str, amount: int = 1, enforce_limit: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Check the limit and add `amount` (negative to give usage back).
+
+        Returns {"allowed", "used", "limit"}, or None if Redis is unavailable
+        and the caller should fall back to the database path.
+        """
+        client = self._client()
+        if not client:
+            return None
+
+        user_id = str(user.id)
+        keys = [
+            COUNTER_KEY.format(user_id=user_id, feature=feature),
+            LIMIT_KEY.format(user_id=user_id, feature=feature),
+            DIRTY_KEY,
+            RECORDS_KEY,
+        ]
+        record = json.dumps({
+            "user_id": user_id,
+            "feature": feature,
+            "quantity": amount,
+            "created_at": datetime.utcnow().isoformat(),
+        })
+        args = [amount, f"{user_id}:{feature}", record, 1 if enforce_limit else 0]
+
+        try:
+            status, used, limit = self._consume_script(keys=keys, args=args)
+            if status == -1:
+                # First use since the period reset or a Redis restart
+                self._prime(client, user, feature)
+                status, used, limit = self._consume_script(keys=keys, args=args)
+        except Exception as e:
+            logger.warning(f"Usage meter unavailable for {feature}: {e}")
+            return None
+
+        if status == -1:
+            return None
+        return {"allowed": status == 1, "used": int(used), "limit": int(limit)}
+
+    def get_used(self, user_id: str, feature: str) -> Optional[int]:
+        """Current period usage, seeding from Postgres on a miss. None if Redis is unavailable."""
+        client = self._client()
+        if not client:
+            return None
+        try:
+            used = client.hget(COUNTER_KEY.format(user_id=user_id, feature=feature), "used")
+            if used is None:
+                used = self._seed(client, user_id, feature)
+            return int(used)
+        except Exception as e:
+            logger.warning(f"Usage meter read failed for {feature}: {e}")
+            return None
+
+    def reset(self, user_id: str, feature: str = "analyses_per_month"):
+        """Drop the counter after Postgres was reset for a new billing period."""
+        client = self._client()
+        if not client:
+            return
+        try:
+            client.delete(COUNTER_KEY.format(user_id=user_id, feature=feature))
+        except Exception as e:
+            logger.warning(f"Could not reset usage meter for {user_id}: {e}")
+
+    def invalidate_limits(self, user_id: str):
+        """Drop the cached tier limits after the user's plan changed."""
+        client = self._client()
+        if not client:
+            return
+        try:
+            client.delete(*(LIMIT_KEY.format(user_id=user_id, feature=f) for f in METERED_FEATURES))
+        except Exception as e:
+            logger.warning(f"Could not invalidate usage limits for {user_id}: {e}")
+
+    def _prime(self, client, user, feature: str):
+        from app.services.permissions_service import PermissionsService
+
+        user_id = str(user.id)
+        self._seed(client, user_id, feature)
+        limits = PermissionsService.get_effective_limits(user)
+        limit = -1 if limits.get("unlimited") else int(limits.get(feature, 0))
+        client.set(LIMIT_KEY.format(user_id=user_id, feature=feature), limit, ex=LIMIT_TTL)
+
+    def _seed(self, client, user_id: str, feature: str) -> int:
+        column = METERED_FEATURES[feature]
+        result = supabase.table("subscriptions")\
+            .select(f"{column}, last_usage_reset")\
+            .eq("user_id", user_id)\
+            .execute()
+        row = result.data[0] if result.data else {}
+        used = self._seed_script(
+            keys=[COUNTER_KEY.format(user_id=user_id, feature=feature)],
+            args=[row.get(column) or 0, row.get("last_usage_reset") or ""],
+        )
+        return int(used)
+
+    # ==========================================
+    # BACKGROUND (app.tasks.usage_metering)
+    # ==========================================
+
+    def flush(self) -> Dict[str, int]:
+        """
+        Write changed counters to subscriptions and queued usage_records to
+        Postgres. Failed writes go back on the queue for the next flush.
+        """
+        client = self._client()
+        if not client:
+            return {"counters": 0, "records": 0}
+
+        return {
+            "counters": self._flush_counters(client),
+            "records": self._flush_records(client),
+        }
+
+    def _flush_counters(self, client) -> int:
+        members = client.spop(DIRTY_KEY, FLUSH_MAX_USERS) or []
+        failed = []
+        written = 0
+
+        for member in members:
+            user_id, feature = member.split(":", 1)
+            column = METERED_FEATURES.get(feature)
+            if not column:
+                continue
+            state = client.hgetall(COUNTER_KEY.format(user_id=user_id, feature=feature))
+            if not state:
+                continue  # Reset since it was counted
+
+            query = supabase.table("subscriptions")\
+                .update({column: int(state["used"])})\
+                .eq("user_id", user_id)
+            # Only write into the period the counter was seeded from
+            if state.get("period"):
+                query = query.eq("last_usage_reset", state["period"])
+            else:
+                query = query.is_("last_usage_reset", "null")
+
+            try:
+                query.execute()
+                written += 1
+            except Exception as e:
+                logger.warning(f"Usage flush failed for {member}: {e}")
+                failed.append(member)
+
+        if failed:
+            client.sadd(DIRTY_KEY, *failed)
+        return written
+
+    def _flush_records(self, client) -> int:
+        pipe = client.pipeline()
+        pipe.lrange(RECORDS_KEY, 0, FLUSH_MAX_RECORDS - 1)
+        pipe.ltrim(RECORDS_KEY, FLUSH_MAX_RECORDS, -1)
+        raw, _ = pipe.execute()
+        if not raw:
+            return 0
+
+        inserted = 0
+        for i in range(0, len(raw), INSERT_CHUNK_SIZE):
+            chunk = raw[i:i + INSERT_CHUNK_SIZE]
+            try:
+                supabase.table("usage_records").insert([json.loads(r) for r in chunk]).execute()
+                inserted += len(chunk)
+            except Exception as e:
+                logger.warning(f"usage_records insert failed ({len(chunk)} rows): {e}")
+                client.rpush(RECORDS_KEY, *chunk)
+        return inserted
+
+    def reconcile(self, force: bool = False) -> int:
+        """
+        Re-seed counters from Postgres if Redis restarted since the last
+        reconcile. Returns the number of subscriptions checked.
+        """
+        client = self._client()
+        if not client:
+            return 0
+
+        run_id = client.info("server").get("run_id")
+        if not force and client.get(RUN_ID_KEY) == run_id:
+            return 0
+
+        checked = 0
+        for feature, column in METERED_FEATURES.items():
+            offset = 0
+            while True:
+                # postgrest-py < 0.14 (pinned via supabase 2.0.3) treats range()'s end as exclusive
+                result = supabase.table("subscriptions")\
+                    .select(f"user_id, {column}, last_usage_reset")\
+                    .gt(column, 0)\
+                    .order("user_id")\
+                    .range(offset, offset + 1000)\
+                    .execute()
+                rows = result.data or []
+                for row in rows:
+                    self._seed_script(
+                        keys=[COUNTER_KEY.format(user_id=row["user_id"], feature=feature)],
+                        args=[row.get(column) or 0, row.get("last_usage_reset") or ""],
+                    )
+                checked += len(rows)
+                if len(rows) < 1000:
+                    break
+                offset += 1000
+
+        client.set(RUN_ID_KEY, run_id)
+        logger.info(f"🔄 Usage meters reconciled from Postgres ({checked} subscriptions)")
+        return checked
+
+
+# Singleton
+usage_meter = UsageMeter()
@@ -4,8 +4,9 @@ Uses batch_analyzer for ALL analysis - NO individual SP-API catalog/offers calls
 """
 import asyncio
 import logging
+import time
 from typing import List, Dict
-from celery import chord
+from celery import chord, group
 from app.core.celery_app import celery_app
 from app.services.supabase_client import supabase
 
@@ -55,6 +56,8 @@ async def get_user_cost_settings(user_id: str) -> dict:
 from app.services.batch_analyzer import batch_analyzer
 from app.tasks.base import JobManager, run_async
 from app.tasks.progress import AtomicJobProgress
+from app.tasks.analysis_context import AnalysisContext, build_analysis_context
+from app.tasks.work_queue import JobWorkQueue
 from app.core.config import settings
 from datetime import datetime
 
@@ -64,6 +67,21 @@ WORKERS = settings.CELERY_WORKERS  # Number of parallel chunks
 PROCESS_BATCH_SIZE = settings.CELERY_PROCESS_BATCH_SIZE  # Batch size for processing
 
 
+def mark_sources_reviewed(product_ids: List[str]):
+    """Set product_sources stage to "reviewed" for analyzed products - one UPDATE per 100 products."""
+    for i in range(0, len(product_ids), 100):
+        try:
+            supabase.table("product_sources")\
+                .update({
+                    "stage": "reviewed",
+                    "updated_at": datetime.utcnow().isoformat()
+                })\
+                .in_("product_id", product_ids[i:i + 100])\
+                .execute()
+        except Exception as e:
+            logger.warning(f"Could not update product_sources stage for {len(product_ids[i:i + 100])} products: {e}")
+
+
 @celery_app.task(bind=True, max_retries=3, name="app.tasks.analysis.analyze_single_product", queue="analysis")
 def analyze_single_product(self, job_id: str, user_id: str, product_id: str, asin: str, buy_cost: float = None):
     """
@@ -334,7 +352,8 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
         for batch_start in range(0, len(product_ids), BATCH_FETCH_SIZE):
             batch_ids = product_ids[batch_start:batch_start + BATCH_FETCH_SIZE]
             result = supabase.table("products")\
-                .select("id, asin, asin_status, upc")\
+                .select("id, asin, asin_status, upc, status")\
+                .eq("user_id", user_id)\
                 .in_("id", batch_ids)\
                 .execute()
             
@@ -366,26 +385,8 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
             job.complete({"message": "No products with valid ASINs to analyze"}, 0, 0)
             return {"success": 0, "error": 0}
         
-        for i in range(0, len(product_ids), BATCH_FETCH_SIZE):
-            batch_ids = product_ids[i:i + BATCH_FETCH_SIZE]
-            try:
-                products_result = supabase.table("products")\
-                    .select("id, asin, status")\
-                    .eq("user_id", user_id)\
-                    .in_("id", batch_ids)\
-                    .execute()
-                
-                if products_result.data:
-                    products.extend(products_result.data)
-            except Exception as e:
-                logger.warning(f"Failed to fetch product batch {i}-{i+len(batch_ids)}: {e}")
-        
         total = len(products)
         
-        if not total:
-            job.complete({"message": "No products"}, 0, 0)
-            return {"success": 0, "error": 0}
-        
         # Log status breakdown
         status_counts = {}
         for p in products:
@@ -399,19 +400,10 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
         logger.info(f"📊 Using batch_analyzer - NO individual SP-API catalog/offers calls")
         logger.info(f"📋 Product IDs: {[p['id'] for p in products[:10]]}{'...' if total > 10 else ''}")
         
-        # Get marketplace_id
-        marketplace_id = "ATVPDKIKX0DER"  # Default to US
-        try:
-            connection_result = supabase.table("amazon_connections")\
-                .select("marketplace_id")\
-                .eq("user_id", user_id)\
-                .eq("is_connected", True)\
-                .limit(1)\
-                .execute()
-            if connection_result.data and connection_result.data[0].get("marketplace_id"):
-                marketplace_id = connection_result.data[0]["marketplace_id"]
-        except:
-            pass
+        # Marketplace, cost settings and product_sources - queried once for the whole job
+        context = build_analysis_context(user_id, [p["id"] for p in products])
+        marketplace_id = context.marketplace_id
+        user_settings = context.user_settings
         
         processed = 0
         success_count = 0
@@ -432,51 +424,8 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
             
             logger.info(f"📦 Processing batch {batch_num}/{total_batches} ({len(batch)} products)")
             
-            # Build buy_costs, promo_costs, and source_data dicts from product_sources
-            buy_costs = {}
-            promo_costs = {}
-            source_data = {}
-            try:
-                product_ids_batch = [p["id"] for p in batch]
-                sources_result = supabase.table("product_sources")\
-                    .select("product_id, buy_cost, promo_buy_cost, supplier_ships_direct, inbound_rate_override, prep_cost_override")\
-                    .in_("product_id", product_ids_batch)\
-                    .execute()
-                
-                # Create mapping: product_id -> buy_cost, promo_buy_cost, and shipping overrides
-                product_id_to_buy_cost = {}
-                product_id_to_promo_cost = {}
-                product_id_to_source = {}
-                for source in (sources_result.data or []):
-                    pid = source.get("product_id")
-                    cost = source.get("buy_cost")
-                    promo_cost = source.get("promo_buy_cost")
-                    if pid and cost:
-                        product_id_to_buy_cost[pid] = float(cost)
-                    if pid and promo_cost:
-                        product_id_to_promo_cost[pid] = float(promo_cost)
-                    if pid:
-                        product_id_to_source[pid] = {
-                            "supplier_ships_direct": source.get("supplier_ships_direct", False),
-                            "inbound_rate_override": source.get("inbound_rate_override"),
-                            "prep_cost_override": source.get("prep_cost_override"),
-                        }
-                
-                # Map to ASINs
-                for product in batch:
-                    asin = product["asin"]
-                    product_id = product["id"]
-                    if product_id in product_id_to_buy_cost:
-                        buy_costs[asin] = product_id_to_buy_cost[product_id]
-                    if product_id in product_id_to_promo_cost:
-                        promo_costs[asin] = product_id_to_promo_cost[product_id]
-                    if product_id in product_id_to_source:
-                        source_data[asin] = product_id_to_source[product_id]
-            except Exception as e:
-                logger.warning(f"Could not fetch buy_costs for batch: {e}")
-            
-            # Get user cost settings
-            user_settings = run_async(get_user_cost_settings(user_id))
+            buy_costs, promo_costs, source_data = context.for_products(batch)
+            reviewed_product_ids = []
             
             # =====================================================
             # USE BATCH ANALYZER - This uses:
@@ -502,19 +451,9 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
                 
                 try:
                     if result.get("success"):
-                        # Get supplier_id from product_sources (required for unique constraint)
-                        supplier_id = None
-                        try:
-                            sources = supabase.table("product_sources")\
-                                .select("supplier_id")\
-                                .eq("product_id", product_id)\
-                                .limit(1)\
-                                .execute()
-                            if sources.data and sources.data[0].get("supplier_id"):
-                                supplier_id = sources.data[0]["supplier_id"]
-                        except Exception as e:
-                            logger.warning(f"Could not get supplier_id for product {product_id}: {e}")
-                        
+                        # supplier_id from the prefetched context (required for unique constraint)
+                        supplier_id = context.supplier_id_for(product_id)
+
                         # Save analysis - include ALL fields
                         analysis_data = {
                             "user_id": user_id,
@@ -670,22 +609,7 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
                             "updated_at": datetime.utcnow().isoformat()
                         }).eq("id", product_id).execute()
                         
-                        # Update product_sources stage to "reviewed" when analysis completes
-                        sources_result = supabase.table("product_sources")\
-                            .select("id")\
-                            .eq("product_id", product_id)\
-                            .execute()
-                        
-                        if sources_result.data:
-                            source_ids = [s["id"] for s in sources_result.data]
-                            supabase.table("product_sources")\
-                                .update({
-                                    "stage": "reviewed",
-                                    "updated_at": datetime.utcnow().isoformat()
-                                })\
-                                .in_("id", source_ids)\
-                                .execute()
-                        
+                        reviewed_product_ids.append(product_id)
                         success_count += 1
                     else:
                         # Mark as error
@@ -703,6 +627,9 @@ def batch_analyze_products(self, job_id: str, user_id: str, product_ids: List[st
                 
                 processed += 1
             
+            # Update product_sources stage to "reviewed" - one statement per batch
+            mark_sources_reviewed(reviewed_product_ids)
+            
             # Update job progress
             job.update_progress(processed, total, success_count, error_count, error_list[-10:])
             logger.info(f"📊 Progress: {processed}/{total} ({success_count} ok, {error_count} errors)")
@@ -767,8 +694,7 @@ def analyze_all_pending_for_user(user_id: str):
 # ==========================================
 
 
-@celery_app.task(bind=True, name="app.tasks.analysis.analyze_chunk", queue="analysis")
-def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], chunk_index: int):
+def process_chunk(job_id: str, user_id: str, product_chunk: List[Dict], chunk_index: int) -> dict:
     """
     Analyze a chunk using BATCH analyzer only.
     
@@ -794,65 +720,16 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
         if not asins:
             return {"success": 0, "error": 0, "chunk_index": chunk_index}
         
-        # Get marketplace_id
-        marketplace_id = "ATVPDKIKX0DER"  # Default
-        try:
-            connection_result = supabase.table("amazon_connections")\
-                .select("marketplace_id")\
-                .eq("user_id", user_id)\
-                .eq("is_connected", True)\
-                .limit(1)\
-                .execute()
-            if connection_result.data and connection_result.data[0].get("marketplace_id"):
-                marketplace_id = connection_result.data[0]["marketplace_id"]
-        except:
-            pass
-        
-        # Build buy_costs, promo_costs, and source_data dicts from product_sources
-        buy_costs = {}
-        promo_costs = {}
-        source_data = {}
-        try:
-            product_ids_chunk = [p["id"] for p in product_chunk]
-            sources_result = supabase.table("product_sources")\
-                .select("product_id, buy_cost, promo_buy_cost, supplier_ships_direct, inbound_rate_override, prep_cost_override")\
-                .in_("product_id", product_ids_chunk)\
-                .execute()
-            
-            # Create mapping: product_id -> buy_cost, promo_buy_cost, and shipping overrides
-            product_id_to_buy_cost = {}
-            product_id_to_promo_cost = {}
-            product_id_to_source = {}
-            for source in (sources_result.data or []):
-                pid = source.get("product_id")
-                cost = source.get("buy_cost")
-                promo_cost = source.get("promo_buy_cost")
-                if pid and cost:
-                    product_id_to_buy_cost[pid] = float(cost)
-                if pid and promo_cost:
-                    product_id_to_promo_cost[pid] = float(promo_cost)
-                if pid:
-                    product_id_to_source[pid] = {
-                        "supplier_ships_direct": source.get("supplier_ships_direct", False),
-                        "inbound_rate_override": source.get("inbound_rate_override"),
-                        "prep_cost_override": source.get("prep_cost_override"),
-                    }
-            
-            # Map to ASINs
-            for product in product_chunk:
-                asin = product["asin"]
-                product_id = product["id"]
-                if product_id in product_id_to_buy_cost:
-                    buy_costs[asin] = product_id_to_buy_cost[product_id]
-                if product_id in product_id_to_promo_cost:
-                    promo_costs[asin] = product_id_to_promo_cost[product_id]
-                if product_id in product_id_to_source:
-                    source_data[asin] = product_id_to_source[product_id]
-        except Exception as e:
-            logger.warning(f"Could not fetch buy_costs for chunk: {e}")
+        # Marketplace, cost settings and product_sources were prefetched by
+        # batch_analyze_parallel - one Redis GET instead of per-chunk queries
+        context = AnalysisContext.load(job_id)
+        if context is None:
+            logger.warning(f"⚠️ Chunk {chunk_index}: no analysis context for job {job_id}, querying Supabase")
+            context = build_analysis_context(user_id, [p["id"] for p in product_chunk])
         
-        # Get user cost settings
-        user_settings = run_async(get_user_cost_settings(user_id))
+        marketplace_id = context.marketplace_id
+        user_settings = context.user_settings
+        buy_costs, promo_costs, source_data = context.for_products(product_chunk)
         
         # =====================================================
         # USE BATCH ANALYZER - This uses:
@@ -873,6 +750,7 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
         
         success_count = 0
         error_count = 0
+        reviewed_product_ids = []
         
         for asin, result in results.items():
             product_id = asin_to_id.get(asin)
@@ -883,19 +761,9 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
                 # Save ALL products, even if they don't have pricing
                 # Products without pricing will have pricing_status = 'no_pricing' and needs_review = True
                 if result.get("success") or result.get("pricing_status") == "no_pricing" or result.get("title") or result.get("brand"):
-                    # Get supplier_id from product_sources if available
-                    supplier_id = None
-                    try:
-                        sources = supabase.table("product_sources")\
-                            .select("supplier_id")\
-                            .eq("product_id", product_id)\
-                            .limit(1)\
-                            .execute()
-                        if sources.data and sources.data[0].get("supplier_id"):
-                            supplier_id = sources.data[0]["supplier_id"]
-                    except Exception as e:
-                        logger.warning(f"Could not get supplier_id for product {product_id}: {e}")
-                    
+                    # supplier_id from the prefetched context, if available
+                    supplier_id = context.supplier_id_for(product_id)
+
                     # Save analysis - include ALL fields (same format as single product)
                     analysis_data_chunk = {
                         "user_id": user_id,
@@ -1032,22 +900,7 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
                         "updated_at": datetime.utcnow().isoformat()
                     }).eq("id", product_id).execute()
                     
-                    # Update product_sources stage
-                    sources_result = supabase.table("product_sources")\
-                        .select("id")\
-                        .eq("product_id", product_id)\
-                        .execute()
-                    
-                    if sources_result.data:
-                        source_ids = [s["id"] for s in sources_result.data]
-                        supabase.table("product_sources")\
-                            .update({
-                                "stage": "reviewed",
-                                "updated_at": datetime.utcnow().isoformat()
-                            })\
-                            .in_("id", source_ids)\
-                            .execute()
-                    
+                    reviewed_product_ids.append(product_id)
                     success_count += 1
                     progress.increment_success()
                 else:
@@ -1064,6 +917,9 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
                 error_count += 1
                 progress.increment_error(f"{asin}: {str(e)[:50]}")
         
+        # Update product_sources stage for the whole chunk in one statement
+        mark_sources_reviewed(reviewed_product_ids)
+        
         # Sync progress
         progress.sync_to_db()
         
@@ -1077,11 +933,100 @@ def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], ch
         raise
 
 
+@celery_app.task(bind=True, name="app.tasks.analysis.analyze_chunk", queue="analysis")
+def analyze_chunk(self, job_id: str, user_id: str, product_chunk: List[Dict], chunk_index: int):
+    """Fixed-chunk task for the chord fallback (used when the Redis work queue is unavailable)."""
+    return process_chunk(job_id, user_id, product_chunk, chunk_index)
+
+
+@celery_app.task(bind=True, name="app.tasks.analysis.analysis_worker", queue="analysis")
+def analysis_worker(self, job_id: str, user_id: str, worker_index: int):
+    """
+    Pull micro-batches from the job's work queue until it's drained.
+    
+    Pull size adapts to observed latency, so a worker stuck behind 429s takes
+    less work while the others keep draining the queue. The worker that
+    finishes the last product fires finalize_batch.
+    
+    worker_index is only used in logs (-1 for workers started by
+    sweep_work_queues).
+    """
+    queue = JobWorkQueue(job_id)
+    progress = AtomicJobProgress(job_id)
+    pulls = 0
+    products_done = 0
+    
+    while True:
+        chunk_index, products = queue.pull()
+        if not products:
+            break
+        
+        started = time.monotonic()
+        try:
+            # Renewed while it runs, so a slow pull isn't requeued and counted twice
+            with queue.keep_leased(chunk_index):
+                process_chunk(job_id, user_id, products, chunk_index)
+        except Exception as e:
+            # process_chunk only raises before saving anything - count the whole pull as errors
+            for product in products:
+                progress.increment_error(f"{product.get('asin')}: {str(e)[:50]}")
+        queue.record_latency(len(products), time.monotonic() - started)
+        
+        pulls += 1
+        products_done += len(products)
+        
+        if queue.complete(chunk_index, len(products)) <= 0 and queue.claim_finalize():
+            finalize_batch.delay(None, job_id)
+    
+    logger.info(f"🧵 Worker {worker_index}: {products_done} products in {pulls} pulls for job {job_id}")
+    return {"worker_index": worker_index, "pulls": pulls, "products": products_done}
+
+
+@celery_app.task(name="app.tasks.analysis.sweep_work_queues", queue="analysis")
+def sweep_work_queues():
+    """
+    Watchdog for work-queue jobs (runs every minute via Celery Beat).
+    
+    - Requeues pulls whose lease expired (the worker died mid-pull) and
+      starts a worker for them if nobody is left to pull.
+    - Fires finalize_batch if every product is done but the finalize was
+      never claimed (the last worker died between complete and claim).
+    """
+    swept = 0
+    for job_id, user_id in JobWorkQueue.active_jobs().items():
+        try:
+            queue = JobWorkQueue(job_id)
+            requeued = queue.requeue_expired()
+            status = queue.status()
+            if status is None:
+                # Keys expired without cleanup
+                queue.cleanup()
+                continue
+            
+            if status["remaining"] <= 0:
+                if queue.claim_finalize():
+                    logger.warning(f"🐕 Job {job_id}: all products done but never finalized - finalizing")
+                    finalize_batch.delay(None, job_id)
+            elif requeued or (status["queued_batches"] and not status["leases"]):
+                # Work waiting and no pull in flight - a spare worker only drains faster
+                analysis_worker.delay(job_id, user_id, -1)
+                swept += 1
+        except Exception as e:
+            logger.warning(f"Work queue sweep failed for job {job_id}: {e}")
+    
+    return {"workers_started": swept}
+
+
 @celery_app.task
 def finalize_batch(results, job_id: str):
-    """Called after all chunks complete."""
+    """Called once after all products are processed."""
     progress = AtomicJobProgress(job_id)
     progress.complete()
+    AnalysisContext.delete(job_id)
+    try:
+        JobWorkQueue(job_id).cleanup()
+    except Exception as e:
+        logger.warning(f"Work queue cleanup failed for job {job_id}: {e}")
     logger.info(f"🏁 Batch job {job_id} fully complete")
     return {"job_id": job_id, "results": results}
 
@@ -1089,8 +1034,10 @@ def finalize_batch(results, job_id: str):
 @celery_app.task(bind=True, name="app.tasks.analysis.batch_analyze_parallel", queue="analysis")
 def batch_analyze_parallel(self, job_id: str, user_id: str, product_ids: List[str]):
     """
-    Main entry point: Split into chunks and process in parallel.
+    Main entry point: queue products and start WORKERS queue workers.
     All chunks use batch_analyzer - NO individual SP-API calls.
+    
+    Falls back to WORKERS fixed chunks in a chord if Redis is unavailable.
     """
     try:
         # Get products - batch to avoid URL length limits
@@ -1129,6 +1076,26 @@ def batch_analyze_parallel(self, job_id: str, user_id: str, product_ids: List[st
         progress = AtomicJobProgress(job_id)
         progress.init(total)
         
+        # Query marketplace, cost settings and product_sources once; chunks read it from Redis
+        context = build_analysis_context(user_id, [p["id"] for p in products])
+        context.save(job_id)
+
+        # Work queue: workers pull adaptively-sized micro-batches until drained
+        try:
+            queue = JobWorkQueue(job_id, workers=WORKERS)
+            micro_batches = queue.enqueue(products, user_id)
+            worker_count = min(WORKERS, micro_batches)
+            
+            group(
+                analysis_worker.s(job_id, user_id, i)
+                for i in range(worker_count)
+            ).apply_async()
+            
+            logger.info(f"Queued {micro_batches} micro-batches for {worker_count} workers")
+            return {"job_id": job_id, "micro_batches": micro_batches, "workers": worker_count, "total": total}
+        except Exception as e:
+            logger.warning(f"Work queue unavailable ({e}), falling back to fixed chunks")
+        
         # Split into chunks
         chunk_size = max(1, (total + WORKERS - 1) // WORKERS)  # Ceiling division
         chunks = []
@@ -0,0 +1,242 @@
+"""
+Prefetched, read-only analysis context shared by every chunk of a batch job.
+
+Built once per job (marketplace, user cost settings, per-product
+buy cost / promo cost / supplier / shipping overrides from product_sources,
+and prep center assignment costs),
+stored in Redis under the job ID, and read by each chunk with a single GET
+instead of each chunk re-querying Supabase.
+"""
+import redis
+import os
+import json
+import logging
+from types import MappingProxyType
+from typing import List, Dict, Optional, Tuple
+from app.services.supabase_client import supabase
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+DEFAULT_MARKETPLACE_ID = "ATVPDKIKX0DER"
+CONTEXT_TTL_SECONDS = 7200  # Same lifetime as AtomicJobProgress keys
+SOURCE_FETCH_BATCH_SIZE = 100  # Keep .in_() URLs short
+
+
+def _context_key(job_id: str) -> str:
+    return f"job:{job_id}:analysis_context"
+
+
+class AnalysisContext:
+    """
+    Immutable snapshot of everything analysis needs besides market data.
+
+    sources maps product_id -> {buy_cost, promo_buy_cost, supplier_id,
+    supplier_ships_direct, inbound_rate_override, prep_cost_override,
+    assigned_prep_cost}.
+    """
+
+    __slots__ = ("_user_id", "_marketplace_id", "_user_settings", "_sources")
+
+    def __init__(self, user_id: str, marketplace_id: str, user_settings: dict, sources: Dict[str, dict]):
+        object.__setattr__(self, "_user_id", user_id)
+        object.__setattr__(self, "_marketplace_id", marketplace_id or DEFAULT_MARKETPLACE_ID)
+        object.__setattr__(self, "_user_settings", MappingProxyType(dict(user_settings or {})))
+        object.__setattr__(self, "_sources", MappingProxyType({
+            pid: MappingProxyType(dict(src)) for pid, src in (sources or {}).items()
+        }))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AnalysisContext is immutable")
+
+    @property
+    def user_id(self) -> str:
+        return self._user_id
+
+    @property
+    def marketplace_id(self) -> str:
+        return self._marketplace_id
+
+    @property
+    def user_settings(self) -> dict:
+        # Copy so callers can't mutate the shared snapshot
+        return dict(self._user_settings)
+
+    def source_for(self, product_id: str) -> dict:
+        return dict(self._sources.get(product_id) or {})
+
+    def supplier_id_for(self, product_id: str) -> Optional[str]:
+        return (self._sources.get(product_id) or {}).get("supplier_id")
+
+    def for_products(self, products: List[Dict]) -> Tuple[Dict[str, float], Dict[str, float], Dict[str, dict]]:
+        """
+        Build the ASIN-keyed buy_costs, promo_costs and source_data dicts
+        batch_analyzer.analyze_products() expects.
+        """
+        buy_costs = {}
+        promo_costs = {}
+        source_data = {}
+
+        for product in products:
+            asin = product["asin"]
+            source = self._sources.get(product["id"])
+            if not source:
+                continue
+            if source.get("buy_cost"):
+                buy_costs[asin] = float(source["buy_cost"])
+            if source.get("promo_buy_cost"):
+                promo_costs[asin] = float(source["promo_buy_cost"])
+            source_data[asin] = {
+                "supplier_ships_direct": source.get("supplier_ships_direct", False),
+                "inbound_rate_override": source.get("inbound_rate_override"),
+                "prep_cost_override": source.get("prep_cost_override"),
+                "assigned_prep_cost": source.get("assigned_prep_cost"),
+            }
+
+        return buy_costs, promo_costs, source_data
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self._user_id,
+            "marketplace_id": self._marketplace_id,
+            "user_settings": dict(self._user_settings),
+            "sources": {pid: dict(src) for pid, src in self._sources.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnalysisContext":
+        return cls(
+            data.get("user_id"),
+            data.get("marketplace_id"),
+            data.get("user_settings"),
+            data.get("sources"),
+        )
+
+    # ==========================================
+    # REDIS STORAGE
+    # ==========================================
+
+    def save(self, job_id: str) -> bool:
+        """Store under the job ID for chunks to read."""
+        try:
+            client = redis.from_url(REDIS_URL, decode_responses=True)
+            client.set(_context_key(job_id), json.dumps(self.to_dict(), default=str), ex=CONTEXT_TTL_SECONDS)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not store analysis context for job {job_id}: {e}")
+            return False
+
+    @classmethod
+    def load(cls, job_id: str) -> Optional["AnalysisContext"]:
+        """One Redis GET. Returns None if missing/expired/Redis unavailable."""
+        try:
+            client = redis.from_url(REDIS_URL, decode_responses=True)
+            raw = client.get(_context_key(job_id))
+            return cls.from_dict(json.loads(raw)) if raw else None
+        except Exception as e:
+            logger.warning(f"Could not load analysis context for job {job_id}: {e}")
+            return None
+
+    @staticmethod
+    def delete(job_id: str):
+        try:
+            client = redis.from_url(REDIS_URL, decode_responses=True)
+            client.delete(_context_key(job_id))
+        except Exception as e:
+            logger.warning(f"Could not delete analysis context for job {job_id}: {e}")
+
+
+def get_user_marketplace(user_id: str) -> str:
+    """Marketplace from the user's Amazon connection, defaulting to US."""
+    try:
+        connection_result = supabase.table("amazon_connections")\
+            .select("marketplace_id")\
+            .eq("user_id", user_id)\
+            .eq("is_connected", True)\
+            .limit(1)\
+            .execute()
+        if connection_result.data and connection_result.data[0].get("marketplace_id"):
+            return connection_result.data[0]["marketplace_id"]
+    except Exception:
+        pass
+    return DEFAULT_MARKETPLACE_ID
+
+
+def fetch_source_map(product_ids: List[str]) -> Dict[str, dict]:
+    """
+    product_id -> cost/supplier/shipping fields from product_sources, in batched queries.
+
+    A product with several sources uses its oldest one (created_at, then id),
+    like the per-product .limit(1) lookups this replaced - all fields come
+    from that one row, never mixed across suppliers.
+    """
+    sources: Dict[str, dict] = {}
+
+    for i in range(0, len(product_ids), SOURCE_FETCH_BATCH_SIZE):
+        batch_ids = product_ids[i:i + SOURCE_FETCH_BATCH_SIZE]
+        try:
+            result = supabase.table("product_sources")\
+                .select("product_id, supplier_id, buy_cost, promo_buy_cost, supplier_ships_direct, inbound_rate_override, prep_cost_override")\
+                .in_("product_id", batch_ids)\
+                .order("created_at,id")\
+                .execute()
+        except Exception as e:
+            logger.warning(f"Could not fetch product_sources batch {i}-{i + len(batch_ids)}: {e}")
+            continue
+
+        for source in (result.data or []):
+            pid = source.get("product_id")
+            if not pid or pid in sources:
+                continue
+            sources[pid] = {
+                "buy_cost": source.get("buy_cost"),
+                "promo_buy_cost": source.get("promo_buy_cost"),
+                "supplier_id": source.get("supplier_id"),
+                "supplier_ships_direct": bool(source.get("supplier_ships_direct")),
+                "inbound_rate_override": source.get("inbound_rate_override"),
+                "prep_cost_override": source.get("prep_cost_override"),
+            }
+
+    return sources
+
+
+def fetch_assigned_prep_costs(product_ids: List[str]) -> Dict[str, float]:
+    """product_id -> products.prep_cost_per_unit (set by prep center assignment), in batched queries."""
+    costs: Dict[str, float] = {}
+
+    for i in range(0, len(product_ids), SOURCE_FETCH_BATCH_SIZE):
+        batch_ids = product_ids[i:i + SOURCE_FETCH_BATCH_SIZE]
+        try:
+            result = supabase.table("products")\
+                .select("id, prep_cost_per_unit")\
+                .in_("id", batch_ids)\
+                .not_.is_("prep_cost_per_unit", "null")\
+                .execute()
+        except Exception as e:
+            logger.warning(f"Could not fetch prep assignments batch {i}-{i + len(batch_ids)}: {e}")
+            continue
+
+        for row in (result.data or []):
+            costs[row["id"]] = row["prep_cost_per_unit"]
+
+    return costs
+
+
+def build_analysis_context(user_id: str, product_ids: List[str]) -> AnalysisContext:
+    """
+    Query everything once: 1 marketplace lookup, 1-2 cost-settings lookups,
+    and ceil(len(product_ids) / 100) product_sources and products lookups.
+    """
+    from app.tasks.analysis import get_user_cost_settings
+    from app.tasks.base import run_async
+
+    marketplace_id = get_user_marketplace(user_id)
+    user_settings = run_async(get_user_cost_settings(user_id))
+    sources = fetch_source_map(product_ids)
+    for pid, prep_cost in fetch_assigned_prep_costs(product_ids).items():
+        if pid in sources:
+            sources[pid]["assigned_prep_cost"] = prep_cost
+
+    logger.info(f"🧭 Analysis context: {len(sources)}/{len(product_ids)} products with sources, marketplace {marketplace_id}")
+    return AnalysisContext(user_id, marketplace_id, user_settings, sources)
@@ -1,13 +1,23 @@
 """
 ASIN Lookup Tasks
 Background processing for UPC to ASIN conversion with caching.
+
+Lookups are event driven: products are enqueued on the Redis stream in
+app.services.asin_lookup_queue when they're created, and
+consume_asin_lookup_stream resolves them. The beat task is a reconciliation
+sweep for anything that fell through.
 """
 from app.core.celery_app import celery_app
 from app.services.supabase_client import supabase
 from app.services.upc_converter import upc_converter
+from app.services.asin_lookup_queue import asin_lookup_queue, READ_BATCH_SIZE
+from app.services.response_cache import invalidate_user
 from app.tasks.base import run_async
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from collections import defaultdict
+from uuid import uuid4
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -82,305 +92,351 @@ def cache_upc_asin(upc: str, asin: Optional[str]):
 
 
 # ============================================================================
-# ASIN LOOKUP TASK
+# LOOKUP RESULTS
 # ============================================================================
 
-@celery_app.task(bind=True, max_retries=2)
-def process_pending_asin_lookups(self, batch_size: int = 100):
+MAX_LOOKUP_ATTEMPTS = 3
+PRODUCT_LOOKUP_FIELDS = "id, upc, asin, asin_status, lookup_status, lookup_attempts, user_id"
+
+
+def _apply_lookup_results(products: List[Dict], results: Dict[str, Optional[str]], triggered_by: str) -> Dict[str, int]:
     """
-    Process products that need ASIN lookup.
+    Write lookup results to products and queue analysis for found ASINs.
     
-    This task:
-    1. Gets products with PENDING_ ASINs or lookup_status='pending'
-    2. Checks UPC cache first
-    3. Looks up uncached UPCs via SP-API
-    4. Updates products with ASINs
-    5. Queues analysis for found ASINs
-    6. Caches results
-    
-    Args:
-        batch_size: Number of products to process per run
+    Not-found products under MAX_LOOKUP_ATTEMPTS go to retry_pending and are
+    scheduled on the retry sorted set with exponential delay.
     """
-    try:
-        # Get products needing lookup
-        # Priority: lookup_status='pending' or 'retry_pending', then PENDING_ ASINs
-        # CRITICAL: Only get products with UPCs (can't lookup without UPC)
-        # FIX: Supabase doesn't support .or_() - use separate queries and combine
-        try:
-            # Get products with pending lookup_status (two separate queries)
-            products_pending = supabase.table("products")\
-                .select("id, upc, asin, asin_status, lookup_status, lookup_attempts, user_id")\
-                .eq("lookup_status", "pending")\
-                .not_.is_("upc", "null")\
-                .neq("upc", "")\
-                .limit(batch_size)\
-                .execute()
+    found_count = 0
+    not_found_count = 0
+    products_to_analyze = []
+    
+    # Products resolved since they were queued (duplicate message) are skipped
+    products = [p for p in products if p.get("upc") and p.get("lookup_status") not in ("found", "duplicate_asin")]
+    
+    # One duplicate check per user for every ASIN found, instead of one per product
+    found_by_user = defaultdict(set)
+    for product in products:
+        asin = results.get(product["upc"])
+        if asin and product.get("user_id"):
+            found_by_user[product["user_id"]].add(asin)
+    
+    taken = {}  # (user_id, asin) -> product_id already holding it
+    for user_id, asins in found_by_user.items():
+        existing = supabase.table("products")\
+            .select("id, asin")\
+            .eq("user_id", user_id)\
+            .in_("asin", list(asins))\
+            .execute()
+        for row in existing.data or []:
+            taken[(user_id, row["asin"])] = row["id"]
+    
+    for product in products:
+        upc = product["upc"]
+        product_id = product["id"]
+        user_id = product.get("user_id")
+        attempts = (product.get("lookup_attempts", 0) or 0) + 1
+        asin = results.get(upc)
+        now = datetime.utcnow().isoformat()
+        
+        if asin:
+            holder = taken.get((user_id, asin))
+            if holder and holder != product_id:
+                logger.warning(f"⚠️ Duplicate ASIN {asin} for product {product_id} - ASIN already exists for product {holder}")
+                supabase.table("products")\
+                    .update({
+                        "asin_status": "not_found",  # Constraint only allows: 'found', 'not_found', 'multiple_found', 'manual'
+                        "lookup_status": "duplicate_asin",
+                        "lookup_attempts": attempts,
+                        "status": "pending",
+                        "updated_at": now
+                    })\
+                    .eq("id", product_id)\
+                    .execute()
+                not_found_count += 1
+                continue
             
-            products_retry = supabase.table("products")\
-                .select("id, upc, asin, asin_status, lookup_status, lookup_attempts, user_id")\
-                .eq("lookup_status", "retry_pending")\
-                .not_.is_("upc", "null")\
-                .neq("upc", "")\
-                .limit(batch_size)\
-                .execute()
+            try:
+                supabase.table("products")\
+                    .update({
+                        "asin": asin,
+                        "asin_status": "found",
+                        "lookup_status": "found",
+                        "lookup_attempts": attempts,
+                        "asin_found_at": now,
+                        "status": "pending",  # Ready for analysis
+                        "updated_at": now
+                    })\
+                    .eq("id", product_id)\
+                    .execute()
+            except Exception as update_error:
+                error_str = str(update_error)
+                # Handle duplicate key constraint violation (race condition)
+                if 'duplicate key' not in error_str.lower() and '23505' not in error_str:
+                    raise
+                logger.warning(f"⚠️ Duplicate ASIN {asin} detected during update (race condition) for product {product_id}")
+                supabase.table("products")\
+                    .update({
+                        "asin_status": "not_found",
+                        "lookup_status": "duplicate_asin",
+                        "lookup_attempts": attempts,
+                        "status": "pending",
+                        "updated_at": now
+                    })\
+                    .eq("id", product_id)\
+                    .execute()
+                not_found_count += 1
+                continue
             
-            # Combine and deduplicate
-            products = []
-            seen_ids = set()
-            for p in (products_pending.data or []):
-                if p["id"] not in seen_ids:
-                    products.append(p)
-                    seen_ids.add(p["id"])
+            taken[(user_id, asin)] = product_id
+            found_count += 1
+            if user_id:
+                products_to_analyze.append((product_id, user_id))
+        
+        elif attempts >= MAX_LOOKUP_ATTEMPTS:
+            supabase.table("products")\
+                .update({
+                    "asin_status": "not_found",
+                    "lookup_status": "failed",
+                    "lookup_attempts": attempts,
+                    "status": "pending",  # Keep as pending for manual entry
+                    "updated_at": now
+                })\
+                .eq("id", product_id)\
+                .execute()
+            not_found_count += 1
+            logger.warning(f"❌ ASIN lookup failed after {MAX_LOOKUP_ATTEMPTS} attempts for product {product_id} (UPC: {upc})")
+        
+        else:
+            supabase.table("products")\
+                .update({
+                    "lookup_status": "retry_pending",
+                    "lookup_attempts": attempts,
+                    "updated_at": now
+                })\
+                .eq("id", product_id)\
+                .execute()
+            asin_lookup_queue.schedule_retry(product_id, upc, attempts)
+            logger.info(f"⏳ Retry for product {product_id} in {asin_lookup_queue.retry_delay(attempts)}s "
+                        f"(attempt {attempts}/{MAX_LOOKUP_ATTEMPTS})")
+    
+    # Lookup results change the owners' deal lists and ASIN status counts
+    for user_id in {p.get("user_id") for p in products if p.get("user_id")}:
+        invalidate_user(user_id)
+    
+    # Queue analysis for products with found ASINs
+    if products_to_analyze:
+        try:
+            from app.tasks.analysis import batch_analyze_products
             
-            for p in (products_retry.data or []):
-                if p["id"] not in seen_ids:
-                    products.append(p)
-                    seen_ids.add(p["id"])
+            user_products = defaultdict(list)
+            for product_id, user_id in products_to_analyze:
+                user_products[user_id].append(product_id)
             
-            # If not enough products, also get ones with PENDING_ ASINs but no lookup_status set
-            if len(products) < batch_size:
-                pending_asin_result = supabase.table("products")\
-                    .select("id, upc, asin, asin_status, lookup_status, lookup_attempts, user_id")\
-                    .like("asin", "PENDING_%")\
-                    .is_("lookup_status", "null")\
-                    .not_.is_("upc", "null")\
-                    .neq("upc", "")\
-                    .limit(batch_size - len(products))\
-                    .execute()
-                
-                additional = pending_asin_result.data or []
+            for user_id, product_ids in user_products.items():
+                analysis_job_id = str(uuid4())
+                supabase.table("jobs").insert({
+                    "id": analysis_job_id,
+                    "user_id": user_id,
+                    "type": "batch_analyze",
+                    "status": "pending",
+                    "total_items": len(product_ids),
+                    "metadata": {
+                        "triggered_by": triggered_by,
+                        "product_ids": product_ids
+                    }
+                }).execute()
                 
-                # Deduplicate by ID
-                for p in additional:
-                    if p["id"] not in seen_ids:
-                        products.append(p)
-                        seen_ids.add(p["id"])
-                
-                # Update these products to have lookup_status='pending'
-                if additional:
-                    # Get IDs of products we just added (those that were PENDING_ but had null lookup_status)
-                    product_ids_to_update = [p['id'] for p in additional if p.get('lookup_status') is None]
-                    supabase.table("products")\
-                        .update({"lookup_status": "pending", "lookup_attempts": 0})\
-                        .in_("id", product_ids_to_update)\
-                        .execute()
-                    logger.info(f"✅ Updated {len(product_ids_to_update)} products with PENDING_ ASINs to lookup_status='pending'")
+                batch_analyze_products.delay(analysis_job_id, user_id, product_ids)
+                logger.info(f"📊 Queued analysis for {len(product_ids)} products (user: {user_id})")
         except Exception as e:
-            logger.error(f"Error querying products: {e}", exc_info=True)
-            # Fallback to simple query
-            products_result = supabase.table("products")\
-                .select("id, upc, asin, asin_status, lookup_status, lookup_attempts, user_id")\
-                .like("asin", "PENDING_%")\
-                .not_.is_("upc", "null")\
-                .neq("upc", "")\
-                .limit(batch_size)\
-                .execute()
-            products = products_result.data or []
-        
-        products = products_result.data or []
-        
-        if not products:
-            logger.info("No products pending ASIN lookup")
-            return {"processed": 0, "found": 0, "not_found": 0}
-        
-        logger.info(f"Processing {len(products)} products for ASIN lookup")
-        
-        # Extract unique UPCs
-        upcs = list(set(p["upc"] for p in products if p.get("upc")))
-        
-        # Check cache first
-        cached = get_cached_upcs(upcs)
-        uncached_upcs = [u for u in upcs if u not in cached]
-        
-        logger.info(f"Found {len(cached)} in cache, {len(uncached_upcs)} need lookup")
-        
-        # Lookup uncached UPCs via SP-API (with rate limiting)
-        lookups = {}
-        if uncached_upcs:
+            logger.error(f"Failed to queue analysis: {e}", exc_info=True)
+    
+    return {"processed": len(products), "found": found_count, "not_found": not_found_count}
+
+
+def _resolve_messages(messages: List[Tuple[str, str]]) -> Dict[str, int]:
+    """
+    Resolve one batch of stream messages (up to 20 UPCs - one SP-API call)
+    and ack them. If the lookup raises, the messages stay unacked and the
+    reconciliation sweep claims them back.
+    """
+    upcs = list(dict.fromkeys(upc for _, upc in messages if upc))
+    
+    # Only found ASINs are trusted from the cache - not-found UPCs are looked up again
+    cached = {upc: asin for upc, asin in get_cached_upcs(upcs).items() if asin}
+    uncached_upcs = [u for u in upcs if u not in cached]
+    
+    lookups = {}
+    if uncached_upcs:
+        lookups = run_async(upc_converter.upcs_to_asins_batch(uncached_upcs)) or {}
+        for upc, asin in lookups.items():
+            if asin:
+                cache_upc_asin(upc, asin)
+    
+    product_ids = [pid for upc in upcs for pid in asin_lookup_queue.take_products(upc)]
+    products = []
+    for i in range(0, len(product_ids), 200):
+        result = supabase.table("products")\
+            .select(PRODUCT_LOOKUP_FIELDS)\
+            .in_("id", product_ids[i:i + 200])\
+            .execute()
+        products.extend(result.data or [])
+    
+    counts = _apply_lookup_results(products, {**lookups, **cached}, triggered_by="asin_lookup_job")
+    asin_lookup_queue.ack([msg_id for msg_id, _ in messages])
+    
+    counts.update({"upcs": len(upcs), "cached": len(cached), "looked_up": len(uncached_upcs)})
+    return counts
+
+
+def queue_asin_lookups(products: List[Dict]) -> Optional[int]:
+    """
+    Enqueue products (dicts with id and upc) for ASIN lookup and start the
+    stream consumer if none is running.
+    
+    Returns:
+        Number of UPCs newly queued, or None if Redis is unavailable (callers
+        fall back to lookup_product_asins)
+    """
+    queued = asin_lookup_queue.enqueue((p.get("upc"), p.get("id")) for p in products)
+    if queued is None:
+        return None
+    
+    if not asin_lookup_queue.has_consumer():
+        consume_asin_lookup_stream.delay()
+    return queued
+
+
+# ============================================================================
+# STREAM CONSUMER
+# ============================================================================
+
+CONSUMER_RUN_SECONDS = 55  # Short runs so one worker slot isn't held indefinitely
+
+
+@celery_app.task(bind=True)
+def consume_asin_lookup_stream(self):
+    """
+    Resolve queued UPCs 20 at a time until the stream is drained.
+    
+    One consumer runs at a time (Redis lease), so SP-API calls go out back to
+    back at the catalog rate limit enforced in sp_api_client. The task runs
+    for up to CONSUMER_RUN_SECONDS and then re-queues itself if work remains;
+    when only delayed retries are left it schedules itself for the next one.
+    """
+    consumer = f"consumer-{self.request.id or uuid4()}"
+    if not asin_lookup_queue.acquire_lease(consumer):
+        return {"skipped": "consumer already running"}
+    
+    totals = defaultdict(int)
+    deadline = time.monotonic() + CONSUMER_RUN_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            asin_lookup_queue.renew_lease(consumer)
+            asin_lookup_queue.promote_due_retries()
+            
+            messages = asin_lookup_queue.read(consumer)
+            if not messages:
+                break
+            
             try:
-                # Batch lookup (20 at a time)
-                batch_size_api = 20
-                for i in range(0, len(uncached_upcs), batch_size_api):
-                    batch = uncached_upcs[i:i + batch_size_api]
-                    logger.info(f"Looking up batch {i//batch_size_api + 1}: {len(batch)} UPCs")
-                    
-                    # Use run_async to call the async method
-                    batch_results = run_async(upc_converter.upcs_to_asins_batch(batch))
-                    lookups.update(batch_results)
-                    
-                    # Small delay between batches to respect rate limits
-                    if i + batch_size_api < len(uncached_upcs):
-                        import time
-                        time.sleep(1)
-                
-                # Cache all results
-                for upc, asin in lookups.items():
-                    cache_upc_asin(upc, asin)
-                
-                logger.info(f"Looked up {len(lookups)} UPCs, found {sum(1 for a in lookups.values() if a)} ASINs")
-                
+                for key, value in _resolve_messages(messages).items():
+                    totals[key] += value
             except Exception as e:
-                logger.error(f"Error during UPC lookup: {e}", exc_info=True)
-                # Continue with cached results only
-        
-        # Combine cached and newly looked up
-        all_results = {**cached, **lookups}
+                logger.error(f"❌ ASIN lookup batch failed, left for reconciliation: {e}", exc_info=True)
+                break
+    finally:
+        asin_lookup_queue.release_lease(consumer)
+    
+    # Hand over to the next run
+    if time.monotonic() >= deadline:
+        consume_asin_lookup_stream.delay()
+    else:
+        next_retry = asin_lookup_queue.next_retry_in()
+        if next_retry is not None:
+            consume_asin_lookup_stream.apply_async(countdown=next_retry)
+    
+    if totals:
+        logger.info(f"ASIN lookup stream: {dict(totals)}")
+    return dict(totals)
+
+
+# ============================================================================
+# RECONCILIATION SWEEP
+# ============================================================================
+
+@celery_app.task(bind=True, max_retries=2)
+def process_pending_asin_lookups(self, batch_size: int = 500):
+    """
+    Reconciliation sweep (beat). Lookups are event driven - this only catches
+    what fell through:
+    1. Stream messages a dead consumer never acked
+    2. Products still pending in the database but not queued (Redis restart,
+       products created by paths that don't enqueue, PENDING_ ASINs)
+    and then makes sure a consumer is running.
+    
+    Args:
+        batch_size: Products per page while scanning
+    """
+    try:
+        # A Redis restart or flush drops the consumer group along with the stream
+        asin_lookup_queue.ensure_group()
+        consumer = f"sweep-{self.request.id or uuid4()}"
+        reclaimed = asin_lookup_queue.claim_stale(consumer)
+        for i in range(0, len(reclaimed), READ_BATCH_SIZE):
+            try:
+                _resolve_messages(reclaimed[i:i + READ_BATCH_SIZE])
+            except Exception as e:
+                logger.error(f"Error resolving reclaimed ASIN lookups: {e}", exc_info=True)
         
-        # Update products with ASINs
-        found_count = 0
-        not_found_count = 0
-        products_to_analyze = []
+        # PENDING_ ASINs from older paths never had a lookup_status
+        legacy = supabase.table("products")\
+            .select("id")\
+            .like("asin", "PENDING_%")\
+            .is_("lookup_status", "null")\
+            .execute()
+        legacy_ids = [p["id"] for p in legacy.data or []]
+        for i in range(0, len(legacy_ids), 200):
+            supabase.table("products")\
+                .update({"lookup_status": "pending", "lookup_attempts": 0})\
+                .in_("id", legacy_ids[i:i + 200])\
+                .execute()
         
-        for product in products:
-            upc = product.get("upc")
-            product_id = product.get("id")
-            user_id = product.get("user_id")
-            current_attempts = product.get("lookup_attempts", 0) or 0
-            
-            if not upc:
-                continue
-            
-            # Update status to "looking_up"
-            supabase.table("products").update({
-                "lookup_status": "looking_up",
-                "lookup_attempts": current_attempts + 1
-            }).eq("id", product_id).execute()
+        # Keyset pages over everything still waiting on a lookup
+        requeued = 0
+        last_id = None
+        while True:
+            query = supabase.table("products")\
+                .select("id, upc")\
+                .in_("lookup_status", ["pending", "retry_pending"])\
+                .not_.is_("upc", "null")\
+                .neq("upc", "")\
+                .order("id")\
+                .limit(batch_size)
+            if last_id:
+                query = query.gt("id", last_id)
+            page = query.execute().data or []
+            if not page:
+                break
+            last_id = page[-1]["id"]
             
-            asin = all_results.get(upc)
+            scheduled = asin_lookup_queue.scheduled_for_retry([p["id"] for p in page])
+            unscheduled = [p for p in page if p["id"] not in scheduled]
+            requeued += asin_lookup_queue.enqueue((p["upc"], p["id"]) for p in unscheduled) or 0
             
-            if asin:
-                # Found ASIN - check for duplicates before updating
-                try:
-                    # Check if ASIN already exists for this user
-                    existing_check = supabase.table("products")\
-                        .select("id")\
-                        .eq("user_id", user_id)\
-                        .eq("asin", asin)\
-                        .neq("id", product_id)\
-                        .limit(1)\
-                        .execute()
-                    
-                    if existing_check.data:
-                        # ASIN already exists - mark as duplicate (use 'not_found' since constraint doesn't allow 'duplicate_found')
-                        logger.warning(f"⚠️ Duplicate ASIN {asin} for product {product_id} - ASIN already exists for product {existing_check.data[0]['id']}")
-                        supabase.table("products")\
-                            .update({
-                                "asin_status": "not_found",  # Constraint only allows: 'found', 'not_found', 'multiple_found', 'manual'
-                                "lookup_status": "duplicate_asin",
-                                "status": "pending",
-                                "updated_at": datetime.utcnow().isoformat()
-                            })\
-                            .eq("id", product_id)\
-                            .execute()
-                        not_found_count += 1  # Count as failed
-                        continue
-                    
-                    # No duplicate - update product with ASIN
-                    supabase.table("products")\
-                        .update({
-                            "asin": asin,
-                            "asin_status": "found",
-                            "lookup_status": "found",
-                            "asin_found_at": datetime.utcnow().isoformat(),
-                            "status": "pending",  # Ready for analysis
-                            "updated_at": datetime.utcnow().isoformat()
-                        })\
-                        .eq("id", product_id)\
-                        .execute()
-                    found_count += 1
-                    
-                    # Queue for analysis
-                    if user_id:
-                        products_to_analyze.append((product_id, user_id))
-                        
-                except Exception as update_error:
-                    error_str = str(update_error)
-                    # Handle duplicate key constraint violation (race condition)
-                    if 'duplicate key' in error_str.lower() or '23505' in error_str:
-                        logger.warning(f"⚠️ Duplicate ASIN {asin} detected during update (race condition) for product {product_id}")
-                        supabase.table("products")\
-                            .update({
-                                "asin_status": "duplicate_found",
-                                "lookup_status": "failed",
-                                "status": "pending",
-                                "updated_at": datetime.utcnow().isoformat()
-                            })\
-                            .eq("id", product_id)\
-                            .execute()
-                        not_found_count += 1
-                    else:
-                        logger.error(f"❌ Failed to update product {product_id} with ASIN {asin}: {update_error}", exc_info=True)
-                        raise
-            else:
-                # Not found - check retry count
-                new_attempts = current_attempts + 1
-                
-                if new_attempts >= 3:
-                    # Max retries reached
-                    supabase.table("products")\
-                        .update({
-                            "asin_status": "not_found",
-                            "lookup_status": "failed",
-                            "status": "pending",  # Keep as pending for manual entry
-                            "updated_at": datetime.utcnow().isoformat()
-                        })\
-                        .eq("id", product_id)\
-                        .execute()
-                    not_found_count += 1
-                    logger.warning(f"❌ ASIN lookup failed after 3 attempts for product {product_id} (UPC: {upc})")
-                else:
-                    # Will retry next run
-                    supabase.table("products")\
-                        .update({
-                            "lookup_status": "retry_pending",
-                            "updated_at": datetime.utcnow().isoformat()
-                        })\
-                        .eq("id", product_id)\
-                        .execute()
-                    logger.info(f"⏳ Will retry ASIN lookup for product {product_id} (attempt {new_attempts}/3)")
+            if len(page) < batch_size:
+                break
         
-        # Queue analysis for products with found ASINs
-        if products_to_analyze:
-            try:
-                from app.tasks.analysis import batch_analyze_products
-                from uuid import uuid4
-                
-                # Group by user_id
-                from collections import defaultdict
-                user_products = defaultdict(list)
-                for product_id, user_id in products_to_analyze:
-                    user_products[user_id].append(product_id)
-                
-                # Queue analysis for each user
-                for user_id, product_ids in user_products.items():
-                    analysis_job_id = str(uuid4())
-                    supabase.table("jobs").insert({
-                        "id": analysis_job_id,
-                        "user_id": user_id,
-                        "type": "batch_analyze",
-                        "status": "pending",
-                        "total_items": len(product_ids),
-                        "metadata": {
-                            "triggered_by": "asin_lookup_job",
-                            "product_ids": product_ids
-                        }
-                    }).execute()
-                    
-                    # Queue analysis
-                    batch_analyze_products.delay(analysis_job_id, user_id, product_ids)
-                    logger.info(f"📊 Queued analysis for {len(product_ids)} products (user: {user_id})")
-            except Exception as e:
-                logger.error(f"Failed to queue analysis: {e}", exc_info=True)
+        if asin_lookup_queue.has_work() and not asin_lookup_queue.has_consumer():
+            consume_asin_lookup_stream.delay()
         
         result = {
-            "processed": len(products),
-            "found": found_count,
-            "not_found": not_found_count,
-            "cached": len(cached),
-            "looked_up": len(lookups)
+            "reclaimed": len(reclaimed),
+            "legacy_pending": len(legacy_ids),
+            "requeued_upcs": requeued,
+            "queue": asin_lookup_queue.metrics()
         }
-        
-        logger.info(f"ASIN lookup complete: {result}")
+        logger.info(f"ASIN lookup reconciliation: {result}")
         return result
         
     except Exception as e:
@@ -3,6 +3,7 @@ Base utilities for Celery tasks.
 Shared JobManager, RateLimiter, and run_async helper.
 """
 from app.services.supabase_client import supabase
+from app.services.response_cache import invalidate_user
 from typing import List, Optional
 import time
 import logging
@@ -28,6 +29,11 @@ class JobManager:
     def __init__(self, job_id: str):
         self.job_id = job_id
     
+    def _touched(self, result):
+        """Jobs write products and deals as they go - drop the owner's cached lists."""
+        if result and result.data:
+            invalidate_user(result.data[0].get("user_id"))
+    
     def start(self, total_items: int = 0):
         """Mark job as started."""
         from datetime import datetime
@@ -42,10 +48,11 @@ class JobManager:
     def set_status(self, status: str):
         """Update job status only."""
         from datetime import datetime
-        supabase.table("jobs").update({
+        result = supabase.table("jobs").update({
             "status": status,
             "updated_at": datetime.utcnow().isoformat()
         }).eq("id", self.job_id).execute()
+        self._touched(result)
     
     def update_progress(self, processed: int, total: int, success: int = 0, errors: int = 0, error_list: list = None, status: str = None):
         """Update job progress."""
@@ -69,7 +76,8 @@ class JobManager:
             # Keep last 100 errors
             update_data["errors"] = error_list[-100:] if len(error_list) > 100 else error_list
         
-        supabase.table("jobs").update(update_data).eq("id", self.job_id).execute()
+        result = supabase.table("jobs").update(update_data).eq("id", self.job_id).execute()
+        self._touched(result)
     
     def complete(self, result: dict = None, success: int = 0, errors: int = 0, error_list: list = None):
         """Mark job as completed."""
@@ -90,18 +98,20 @@ class JobManager:
         if result:
             update_data["result"] = result
         
-        supabase.table("jobs").update(update_data).eq("id", self.job_id).execute()
+        result = supabase.table("jobs").update(update_data).eq("id", self.job_id).execute()
+        self._touched(result)
     
     def fail(self, error: str):
         """Mark job as failed."""
         from datetime import datetime
         now = datetime.utcnow().isoformat()
-        supabase.table("jobs").update({
+        result = supabase.table("jobs").update({
             "status": "failed",
             "errors": [error],
             "completed_at": now,
             "updated_at": now
         }).eq("id", self.job_id).execute()
+        self._touched(result)
     
     def is_cancelled(self) -> bool:
         """Check if job was cancelled."""
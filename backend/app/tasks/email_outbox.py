@@ -0,0 +1,24 @@
+"""
+Email outbox background tasks.
+- Drain due emails to the providers (nudged on enqueue, and every minute via beat)
+"""
+import logging
+
+from app.core.celery_app import celery_app
+from app.services.email_outbox import email_outbox
+from app.tasks.base import run_async
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+def drain_email_outbox():
+    """
+    Send everything due. Concurrent drains are safe - claim_email_outbox
+    hands each row to one worker.
+    """
+    try:
+        return run_async(email_outbox.drain())
+    except Exception as e:
+        logger.error(f"Email outbox drain failed: {e}", exc_info=True)
+        return {"error": str(e)}
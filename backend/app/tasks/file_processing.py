@@ -13,6 +13,7 @@ from app.core.celery_app import celery_app
 from app.services.supabase_client import supabase
 from app.tasks.base import JobManager
 from app.services.brand_restriction_detector import BrandRestrictionDetector
+from app.services.prep_center_service import PrepCenterService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -350,6 +351,47 @@ def parse_notes(row: dict) -> Optional[str]:
     return notes if notes else None
 
 
+def flag_brand_restrictions(user_id: str, products: List[Dict], supplier_id: Optional[str], results: Dict):
+    """
+    Check brand restrictions for a batch of created products in memory and
+    write product_brand_flags with a bulk upsert.
+    """
+    logger.info(f"🔍 Checking brand restrictions for {len(products)} products...")
+    try:
+        detector = BrandRestrictionDetector(user_id)
+        detections = detector.flag_products(products, supplier_id=supplier_id)
+    except Exception as brand_error:
+        logger.warning(f"   Failed to check brand restrictions for batch: {brand_error}")
+        return
+
+    for product in products:
+        detection_result = detections.get(product.get('id'))
+        if detection_result and detection_result.get('brand_status') in ['globally_restricted', 'supplier_restricted']:
+            brand_name = product.get('brand') or product.get('brand_name')
+            logger.info(f"   ⚠️ Brand restricted: {brand_name} (status: {detection_result['brand_status']})")
+            results.setdefault('restricted_brands', 0)
+            results['restricted_brands'] += 1
+
+
+def assign_prep_centers(user_id: str, products: List[Dict], results: Dict):
+    """
+    Auto-assign a batch of created products to the user's cheapest prep
+    center from the cached fee matrix, so their analyses include prep cost.
+    """
+    try:
+        assignments = PrepCenterService.auto_assign_prep_centers(products, user_id)
+        chosen = {p["id"]: a for p, a in zip(products, assignments) if a}
+        PrepCenterService.save_assignments(user_id, chosen)
+    except Exception as prep_error:
+        logger.warning(f"   Failed to assign prep centers for batch: {prep_error}")
+        return
+
+    if chosen:
+        logger.info(f"   📦 Assigned {len(chosen)}/{len(products)} products to prep centers")
+        results.setdefault('prep_assigned', 0)
+        results['prep_assigned'] += len(chosen)
+
+
 @celery_app.task(bind=True, max_retries=2)
 def process_file_upload(self, job_id: str, user_id: str, supplier_id: str, file_contents_b64: str, filename: str):
     """
@@ -901,27 +943,8 @@ def process_file_upload(self, job_id: str, user_id: str, supplier_id: str, file_
                             # 🔍 AUTO-DETECT BRAND RESTRICTIONS
                             # ================================================================================
                             if created.data:
-                                logger.info(f"🔍 Checking brand restrictions for {len(created.data)} products...")
-                                detector = BrandRestrictionDetector(user_id)
-                                for p in created.data:
-                                    brand_name = p.get('brand') or p.get('brand_name')
-                                    if brand_name:
-                                        try:
-                                            # Run async detection
-                                            from app.tasks.base import run_async
-                                            detection_result = run_async(
-                                                detector.detect_and_flag(
-                                                    product_id=p['id'],
-                                                    brand_name=brand_name,
-                                                    supplier_id=supplier_id
-                                                )
-                                            )
-                                            if detection_result.get('brand_status') in ['globally_restricted', 'supplier_restricted']:
-                                                logger.info(f"   ⚠️ Brand restricted: {brand_name} (status: {detection_result['brand_status']})")
-                                                results.setdefault('restricted_brands', 0)
-                                                results['restricted_brands'] += 1
-                                        except Exception as brand_error:
-                                            logger.warning(f"   Failed to check brand restriction for {brand_name}: {brand_error}")
+                                flag_brand_restrictions(user_id, created.data, supplier_id, results)
+                                assign_prep_centers(user_id, created.data, results)
                             
                             for p in (created.data or []):
                                 product_cache[p["asin"]] = p["id"]
@@ -1176,27 +1199,7 @@ def process_file_upload(self, job_id: str, user_id: str, supplier_id: str, file_
                         # 🔍 AUTO-DETECT BRAND RESTRICTIONS
                         # ================================================================================
                         if created_no_asin.data:
-                            logger.info(f"🔍 Checking brand restrictions for {len(created_no_asin.data)} products...")
-                            detector = BrandRestrictionDetector(user_id)
-                            for p in created_no_asin.data:
-                                brand_name = p.get('brand') or p.get('brand_name')
-                                if brand_name:
-                                    try:
-                                        # Run async detection
-                                        from app.tasks.base import run_async
-                                        detection_result = run_async(
-                                            detector.detect_and_flag(
-                                                product_id=p['id'],
-                                                brand_name=brand_name,
-                                                supplier_id=supplier_id
-                                            )
-                                        )
-                                        if detection_result.get('brand_status') in ['globally_restricted', 'supplier_restricted']:
-                                            logger.info(f"   ⚠️ Brand restricted: {brand_name} (status: {detection_result['brand_status']})")
-                                            results.setdefault('restricted_brands', 0)
-                                            results['restricted_brands'] += 1
-                                    except Exception as brand_error:
-                                        logger.warning(f"   Failed to check brand restriction for {brand_name}: {brand_error}")
+                            flag_brand_restrictions(user_id, created_no_asin.data, supplier_id, results)
                         
                         for p in (created_no_asin.data or []):
                             # Use a special key format for products without ASIN: "upc:{upc}"
@@ -10,14 +10,15 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from decimal import Decimal
 
-from app.celery_app import celery
-from app.core.database import supabase
-from app.services.sp_api_client import SPAPIClient
+from app.core.celery_app import celery_app
+from app.services.supabase_client import supabase
+from app.services.sp_api_client import sp_api_client
+from app.tasks.base import run_async
 
 logger = logging.getLogger(__name__)
 
 
-@celery.task(name="inventory.daily_snapshot")
+@celery_app.task(name="inventory.daily_snapshot")
 def daily_inventory_snapshot(user_id: str = None):
     """
     Daily task to snapshot FBA inventory levels for all products.
@@ -52,8 +53,7 @@ def daily_inventory_snapshot(user_id: str = None):
         # Process each user's products
         for uid, user_prods in user_products.items():
             try:
-                sp_api_client = SPAPIClient(user_id=uid)
-                
+                # Shared client - the user's LWA token is cached by the token broker
                 # Batch fetch inventory (SP-API can handle multiple ASINs)
                 asins = [p['asin'] for p in user_prods if p.get('asin') and not p['asin'].startswith('PENDING_')]
                 
@@ -68,7 +68,7 @@ def daily_inventory_snapshot(user_id: str = None):
                     try:
                         # Get inventory summaries from SP-API (requires user connection)
                         # Note: This will return zeros if user not connected
-                        inventory_data = await sp_api_client.get_inventory_summaries(batch_asins, user_id=uid)
+                        inventory_data = run_async(sp_api_client.get_inventory_summaries(batch_asins, user_id=uid))
                         
                         # Create snapshots for each product
                         for product in user_prods:
@@ -129,7 +129,7 @@ def daily_inventory_snapshot(user_id: str = None):
         raise
 
 
-@celery.task(name="inventory.calculate_forecasts")
+@celery_app.task(name="inventory.calculate_forecasts")
 def calculate_inventory_forecasts(user_id: str = None):
     """
     Calculate sales velocity, reorder points, and inventory status for all products.
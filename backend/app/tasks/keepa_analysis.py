@@ -2,10 +2,9 @@
 Celery tasks for Keepa analysis when products reach TOP PRODUCTS stage.
 Supports both single product and batch processing.
 """
-import asyncio
 import logging
 from celery import Task
-from typing import List, Dict, Any
+from typing import List
 from app.core.celery_app import celery_app
 from app.services.supabase_client import supabase
 from app.services.keepa_analysis_service import keepa_analysis_service
@@ -101,7 +100,9 @@ def analyze_top_product(self: Task, product_source_id: str, asin: str, user_id:
 def batch_analyze_top_products(self: Task, product_source_ids: List[str], user_id: str):
     """
     Batch Keepa analysis for multiple products in TOP PRODUCTS stage.
-    More efficient than individual tasks - processes multiple products together.
+    
+    One Keepa request per 100 ASINs, worst-case profit for every deal in one
+    pass, then one upsert into keepa_analysis and one product_sources update.
     
     Args:
         product_source_ids: List of product_source IDs
@@ -128,80 +129,73 @@ def batch_analyze_top_products(self: Task, product_source_ids: List[str], user_i
             "errors": []
         }
         
-        # Process each product
+        deals = []
         for deal_data in deals_result.data:
-            try:
-                product = deal_data.get("products", {})
-                if not isinstance(product, dict):
-                    results["failed"] += 1
-                    results["errors"].append(f"Invalid product data for deal {deal_data.get('id')}")
-                    continue
-                
-                asin = product.get("asin")
-                product_source_id = deal_data.get("id")
-                
-                if not asin:
-                    results["failed"] += 1
-                    results["errors"].append(f"No ASIN for deal {product_source_id}")
-                    continue
-                
-                logger.info(f"🔍 Analyzing {asin} (deal: {product_source_id})")
-                
-                # Run Keepa analysis
-                analysis = run_async(keepa_analysis_service.analyze_product(asin))
-                
-                if not analysis:
-                    results["failed"] += 1
-                    results["errors"].append(f"Keepa analysis returned no data for {asin}")
-                    continue
-                
-                # Calculate worst-case profit
-                lowest_fba = analysis.get("lowest_fba_price_12m")
-                supplier_cost = deal_data.get("buy_cost", 0) or 0
-                fba_fees = product.get("fees_total", 0) or 0
-                
-                if lowest_fba:
-                    worst_case = keepa_analysis_service.calculate_worst_case_profit(
-                        lowest_fba_price=lowest_fba,
-                        supplier_cost=supplier_cost,
-                        fba_fees=fba_fees
-                    )
-                    analysis["worst_case_analysis"] = worst_case
-                    
-                    # Update keepa_analysis table
-                    supabase.table("keepa_analysis")\
-                        .update({
-                            "worst_case_profit": worst_case.get("worst_case_profit"),
-                            "worst_case_margin": worst_case.get("worst_case_margin"),
-                            "still_profitable": worst_case.get("still_profitable"),
-                            "updated_at": datetime.utcnow().isoformat()
-                        })\
-                        .eq("asin", asin)\
-                        .execute()
-                
-                # Link analysis to product_source
-                supabase.table("product_sources")\
-                    .update({
-                        "keepa_analyzed_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
-                    })\
-                    .eq("id", product_source_id)\
-                    .execute()
-                
-                results["successful"] += 1
-                logger.info(f"✅ Keepa analysis complete for {asin}")
-                
-            except Exception as e:
+            product = deal_data.get("products", {})
+            if not isinstance(product, dict):
+                results["failed"] += 1
+                results["errors"].append(f"Invalid product data for deal {deal_data.get('id')}")
+            elif not product.get("asin"):
                 results["failed"] += 1
-                error_msg = f"Error analyzing {deal_data.get('id', 'unknown')}: {str(e)}"
-                results["errors"].append(error_msg)
-                logger.error(error_msg, exc_info=True)
-                # Continue with next product instead of failing entire batch
+                results["errors"].append(f"No ASIN for deal {deal_data.get('id')}")
+            else:
+                deals.append((deal_data, product))
+        
+        if not deals:
+            return results
         
-        logger.info(f"✅ Batch Keepa analysis complete: {results['successful']}/{results['total']} successful")
+        # Keepa: 100 ASINs per request
+        batch = run_async(keepa_analysis_service.analyze_batch([product["asin"] for _, product in deals]))
+        analyses = batch["analyses"]
+        
+        analyzed = [(deal_data, product) for deal_data, product in deals if product["asin"] in analyses]
+        for deal_data, product in deals:
+            if product["asin"] not in analyses:
+                results["failed"] += 1
+                results["errors"].append(f"Keepa analysis returned no data for {product['asin']}")
+        
+        # Worst-case profit for every deal at once
+        worst_cases = keepa_analysis_service.calculate_worst_case_batch(
+            lowest_fba_prices=[analyses[product["asin"]].get("lowest_fba_price_12m") for _, product in analyzed],
+            supplier_costs=[deal_data.get("buy_cost", 0) or 0 for deal_data, _ in analyzed],
+            fba_fees=[product.get("fees_total", 0) or 0 for _, product in analyzed]
+        )
+        
+        # keepa_analysis is keyed by ASIN - when several deals share one, keep
+        # the most pessimistic worst case
+        worst_by_asin = {}
+        for (deal_data, product), worst_case in zip(analyzed, worst_cases):
+            asin = product["asin"]
+            current = worst_by_asin.get(asin)
+            if current is None or (worst_case["worst_case_profit"] is not None and (
+                    current["worst_case_profit"] is None or worst_case["worst_case_profit"] < current["worst_case_profit"])):
+                worst_by_asin[asin] = worst_case
+        
+        keepa_analysis_service.store_batch(analyses, worst_by_asin)
+        
+        # Link analysis to product_sources
+        analyzed_ids = [deal_data["id"] for deal_data, _ in analyzed]
+        if analyzed_ids:
+            now = datetime.utcnow().isoformat()
+            supabase.table("product_sources")\
+                .update({
+                    "keepa_analyzed_at": now,
+                    "updated_at": now
+                })\
+                .in_("id", analyzed_ids)\
+                .execute()
+        
+        results["successful"] = len(analyzed)
+        results["keepa_tokens_used"] = batch["tokens_used"]
+        results["keepa_requests"] = batch["requests"]
+        results["duration_seconds"] = batch["seconds"]
+        if analyzed:
+            results["seconds_per_100"] = round(batch["seconds"] / len(analyses) * 100, 2)
+        
+        logger.info(f"✅ Batch Keepa analysis complete: {results['successful']}/{results['total']} successful, "
+                    f"{batch['tokens_used']} tokens in {batch['requests']} requests")
         return results
         
     except Exception as e:
         logger.error(f"Error in batch Keepa analysis: {e}", exc_info=True)
         raise self.retry(exc=e, countdown=60)
-
@@ -0,0 +1,95 @@
+"""
+Purchase order document tasks.
+- Render the POs for many supplier orders in one job (e.g. every order
+  created from a buy list), so sending them later reads stored PDFs
+"""
+import time
+import logging
+from typing import Dict, List
+
+from app.core.celery_app import celery_app
+from app.services.supabase_client import supabase
+from app.services.po_email_service import POEmailService
+from app.services.po_pdf_renderer import po_renderer, po_pdf_store
+from app.tasks.base import run_async
+
+logger = logging.getLogger(__name__)
+
+
+PO_NUMBER_ATTEMPTS = 3
+
+
+def _reserve_generation(po_service: POEmailService, user_id: str, order_id: str) -> Dict:
+    """
+    Insert the order's po_generations row before rendering, so the next
+    generate_po_number() (MAX + 1 over po_generations) sees this number.
+    Retried with a fresh number if a concurrent request took it.
+    """
+    for attempt in range(PO_NUMBER_ATTEMPTS):
+        po_number = run_async(po_service.generate_po_number())
+        try:
+            result = supabase.table('po_generations').insert({
+                'user_id': user_id,
+                'supplier_order_id': order_id,
+                'po_number': po_number,
+                'pdf_url': None,
+                'pdf_filename': f"{po_number}.pdf",
+                'status': 'draft'
+            }).execute()
+            return result.data[0]
+        except Exception as e:
+            if attempt == PO_NUMBER_ATTEMPTS - 1:
+                raise
+            logger.warning(f"PO number {po_number} taken, retrying: {e}")
+
+
+@celery_app.task
+def render_purchase_orders(user_id: str, supplier_order_ids: List[str]):
+    """
+    Render a PO for every order that has none yet: one query for all the
+    orders' lines, one for their existing PO generations, then per order a
+    generation row (reserving its PO number) and the rendered PDF.
+    """
+    start = time.monotonic()
+    try:
+        orders = po_renderer.load_orders(user_id, supplier_order_ids)
+        has_po = set()
+        if orders:
+            existing = supabase.table('po_generations')\
+                .select('supplier_order_id')\
+                .eq('user_id', user_id)\
+                .in_('supplier_order_id', list(orders))\
+                .execute()
+            has_po = {g['supplier_order_id'] for g in existing.data or []}
+
+        po_service = POEmailService(user_id)
+        rendered, failed = 0, []
+        for order_id, order in orders.items():
+            if order_id in has_po:
+                continue
+            generation = None
+            try:
+                generation = _reserve_generation(po_service, user_id, order_id)
+                pdf_bytes = po_renderer.render(order, generation['po_number'])
+                po_pdf_store.put(user_id, generation['po_number'], pdf_bytes)
+                rendered += 1
+            except Exception as e:
+                logger.error(f"PO rendering failed for order {order_id}: {e}", exc_info=True)
+                failed.append(order_id)
+                if generation:
+                    # No PDF behind this number - release it
+                    supabase.table('po_generations').delete().eq('id', generation['id']).execute()
+
+        elapsed = time.monotonic() - start
+        logger.info(f"📄 Rendered {rendered} POs for user {user_id} in {elapsed:.2f}s "
+                    f"({len(has_po)} already had one, {len(failed)} failed)")
+        return {
+            "rendered": rendered,
+            "skipped": len(has_po),
+            "failed": failed,
+            "not_found": len(set(supplier_order_ids) - set(orders)),
+            "duration_seconds": round(elapsed, 2),
+        }
+    except Exception as e:
+        logger.error(f"PO rendering failed for user {user_id}: {e}", exc_info=True)
+        return {"error": str(e)}
@@ -8,6 +8,7 @@ import json
 import logging
 from datetime import datetime
 from app.services.supabase_client import supabase
+from app.services.response_cache import invalidate_user
 
 logger = logging.getLogger(__name__)
 
@@ -137,7 +138,7 @@ class AtomicJobProgress:
         progress = self.get_progress()
         
         try:
-            supabase.table("jobs").update({
+            result = supabase.table("jobs").update({
                 "processed_items": progress["processed"],
                 "total_items": progress["total"],
                 "progress": progress["progress"],
@@ -146,6 +147,8 @@ class AtomicJobProgress:
                 "errors": progress["error_list"][-50:] if progress["error_list"] else [],
                 "updated_at": datetime.utcnow().isoformat()
             }).eq("id", self.job_id).execute()
+            if result.data:
+                invalidate_user(result.data[0].get("user_id"))
             
             logger.info(f"📊 Job {self.job_id}: {progress['processed']}/{progress['total']} ({progress['progress']}%) - {progress['success']} success, {progress['errors']} errors")
         except Exception as e:
@@ -156,7 +159,7 @@ class AtomicJobProgress:
         progress = self.get_progress()
         
         try:
-            supabase.table("jobs").update({
+            result = supabase.table("jobs").update({
                 "status": "completed",
                 "processed_items": progress["total"],
                 "total_items": progress["total"],
@@ -172,6 +175,8 @@ class AtomicJobProgress:
                 "completed_at": datetime.utcnow().isoformat(),
                 "updated_at": datetime.utcnow().isoformat()
             }).eq("id", self.job_id).execute()
+            if result.data:
+                invalidate_user(result.data[0].get("user_id"))
             
             # Cleanup Redis
             if self.redis:
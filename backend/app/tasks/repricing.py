@@ -0,0 +1,35 @@
+"""
+Re-pricing background tasks.
+- Recompute stored ROI/profit after cost settings, product_sources costs or
+  prep center assignments change, without re-analyzing (no API calls)
+"""
+import logging
+from typing import List, Optional
+
+from app.core.celery_app import celery_app
+from app.services.repricing_service import repricing_service
+from app.tasks.analysis import get_user_cost_settings
+from app.tasks.base import run_async
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=30)
+def reprice_user_analyses(self, user_id: str, product_ids: Optional[List[str]] = None, changed_settings: Optional[List[str]] = None):
+    """
+    Re-price the user's stored analyses.
+    
+    product_ids: only these products (product_sources edit, prep assignment)
+    changed_settings: only products depending on these cost settings
+    """
+    try:
+        cost_settings = run_async(get_user_cost_settings(user_id))
+        return repricing_service.recompute(
+            user_id,
+            cost_settings,
+            product_ids=product_ids,
+            changed_settings=changed_settings,
+        )
+    except Exception as e:
+        logger.error(f"Repricing failed for user {user_id}: {e}", exc_info=True)
+        raise self.retry(exc=e)
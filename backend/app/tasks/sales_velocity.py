@@ -0,0 +1,23 @@
+"""
+Sales velocity model background tasks.
+- Refit the BSR -> monthly units curves from stored Keepa history
+"""
+import logging
+
+from app.core.celery_app import celery_app
+from app.services.sales_velocity_model import sales_velocity_model
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+def refit_sales_velocity_model():
+    """
+    Daily refit (via beat). Publishes a new model version when there is
+    enough history; estimates keep using the previous version otherwise.
+    """
+    try:
+        return sales_velocity_model.refit()
+    except Exception as e:
+        logger.error(f"Sales velocity refit failed: {e}", exc_info=True)
+        return {"error": str(e)}
@@ -8,6 +8,7 @@ from app.core.celery_app import celery_app
 from app.services.supabase_client import supabase
 from app.tasks.base import JobManager, run_async
 from app.services.telegram_service import telegram_service
+from app.services.telegram_deal_stats import telegram_deal_stats
 import logging
 
 logger = logging.getLogger(__name__)
@@ -78,6 +79,22 @@ def check_all_channels():
         logger.error(f"Error in check_all_channels: {e}", exc_info=True)
 
 
+@celery_app.task
+def reconcile_telegram_deal_stats():
+    """
+    Periodic task: recount telegram_deal_stats from telegram_deals.
+    Triggers keep the counters current; this only corrects drift.
+    """
+    try:
+        corrected = telegram_deal_stats.reconcile()
+        if corrected:
+            logger.warning(f"📊 Telegram deal stats drifted: corrected {corrected} counters")
+        return {"corrected": corrected}
+    except Exception as e:
+        logger.error(f"Telegram deal stats reconcile failed: {e}", exc_info=True)
+        return {"error": str(e)}
+
+
 @celery_app.task(bind=True, max_retries=3)
 def check_channel_messages(self, user_id: str, channel_id: str, channel_name: str):
     """Check a single Telegram channel for new messages."""
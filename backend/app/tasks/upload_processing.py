@@ -122,8 +122,9 @@ def process_upload_chunk(self, job_id: str, chunk_id: str):
                     "data": {}
                 })
         
-        # Create products (without ASIN lookup for now - will do lazy lookup)
+        # Create products (ASINs are resolved by the lookup stream)
         created_count = 0
+        lookup_queue = []
         for mapped in mapped_rows:
             try:
                 # Create product
@@ -132,6 +133,8 @@ def process_upload_chunk(self, job_id: str, chunk_id: str):
                     "user_id": job["user_id"],
                     "asin": None,  # Will be looked up later
                     "asin_status": "pending_lookup",
+                    "lookup_status": "pending",
+                    "lookup_attempts": 0,
                     "upc": mapped.get("upc"),
                     "title": mapped.get("title"),
                     "brand": mapped.get("brand"),
@@ -163,6 +166,7 @@ def process_upload_chunk(self, job_id: str, chunk_id: str):
                     
                     supabase.table("product_sources").insert(source_data).execute()
                     created_count += 1
+                    lookup_queue.append({"id": product_id, "upc": product_data["upc"]})
                     
             except Exception as e:
                 errors.append({
@@ -171,6 +175,15 @@ def process_upload_chunk(self, job_id: str, chunk_id: str):
                     "data": mapped
                 })
         
+        # Queue this chunk's UPCs on the ASIN lookup stream
+        if lookup_queue:
+            try:
+                from app.tasks.asin_lookup import queue_asin_lookups, lookup_product_asins
+                if queue_asin_lookups(lookup_queue) is None:
+                    lookup_product_asins.delay([p["id"] for p in lookup_queue])
+            except Exception as e:
+                logger.warning(f"Failed to queue ASIN lookup: {e}")
+        
         # Update chunk status
         supabase.table("upload_chunks")\
             .update({
@@ -255,15 +268,6 @@ def update_job_progress(job_id: str):
     if completed == job.get("total_chunks", 0):
         update_data["status"] = "complete"
         update_data["completed_at"] = datetime.utcnow().isoformat()
-        
-        # Queue ASIN lookup for products created in this upload
-        try:
-            from app.tasks.asin_lookup import process_pending_asin_lookups
-            # Trigger ASIN lookup (will process pending_lookup products)
-            process_pending_asin_lookups.delay(100)
-            logger.info(f"Queued ASIN lookup after upload job {job_id} completion")
-        except Exception as e:
-            logger.warning(f"Failed to queue ASIN lookup: {e}")
     else:
         update_data["status"] = "processing"
     
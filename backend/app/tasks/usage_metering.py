@@ -0,0 +1,28 @@
+"""
+Usage metering background tasks.
+- Reconcile Redis usage counters from Postgres after a Redis restart
+- Flush counters and queued usage_records to Postgres in batches
+"""
+import logging
+
+from app.core.celery_app import celery_app
+from app.services.usage_meter import usage_meter
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+def flush_usage_meters():
+    """
+    Periodic flush of Redis usage counters (every 30 seconds via beat).
+    """
+    try:
+        # Cheap no-op unless Redis restarted since the last run
+        usage_meter.reconcile()
+    except Exception as e:
+        logger.error(f"Usage meter reconcile failed: {e}", exc_info=True)
+    
+    result = usage_meter.flush()
+    if result["counters"] or result["records"]:
+        logger.info(f"📊 Flushed usage: {result['counters']} counters, {result['records']} usage records")
+    return result
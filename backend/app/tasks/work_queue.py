@@ -0,0 +1,298 @@
+"""
+Redis work queue for parallel batch analysis.
+
+Products are enqueued as 20-product micro-batches (the SP-API pricing/fees
+batch size). Workers pull 1-5 micro-batches at a time, so a pull is never more
+than one 100-ASIN Keepa request and every SP-API batch is full. Pull size
+adapts to the observed seconds-per-product so a slow (throttled) worker takes
+less work and idle workers drain the rest. Whoever completes the last product
+fires the finalize step.
+
+Each pull is leased: its micro-batches stay in the job's in-flight hash until
+complete() is called for that pull. The worker renews the lease while it
+processes the pull (keep_leased), so only a worker that dies mid-pull leaves
+an expired lease, which the next pull (or the sweep_work_queues watchdog)
+puts back on the queue, so remaining still reaches 0 and the job finalizes.
+A slow but live worker is never raced by a second run of its products.
+"""
+import redis
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+MICRO_BATCH_SIZE = settings.SP_API_BATCH_SIZE  # 20 - SP-API pricing/fees batch
+MAX_PULL_SIZE = settings.KEEPA_BATCH_SIZE  # 100 - one Keepa request
+TARGET_PULL_SECONDS = settings.CELERY_TARGET_PULL_SECONDS
+LATENCY_SMOOTHING = 0.3  # Weight of the newest observation in the moving average
+QUEUE_TTL_SECONDS = 7200  # Same lifetime as AtomicJobProgress keys
+PULL_LEASE_SECONDS = 600  # A pull not completed or renewed by then is requeued
+LEASE_RENEW_SECONDS = PULL_LEASE_SECONDS / 3  # Heartbeat interval while a pull is processed
+ACTIVE_JOBS_KEY = "work_queue:jobs"  # hash: job_id -> user_id, for the watchdog
+
+# KEYS: queue, pulls, in-flight hash, leases zset
+# ARGV: micro-batches to take, lease deadline, key TTL
+# Returns {pull_number, micro-batch...}, or {} when the queue is empty
+_PULL_LUA = """
+local batches = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #batches == 0 then return {} end
+redis.call('LTRIM', KEYS[1], #batches, -1)
+local pull = redis.call('INCR', KEYS[2])
+redis.call('HSET', KEYS[3], pull, table.concat(batches, '\\n'))
+redis.call('ZADD', KEYS[4], ARGV[2], pull)
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+redis.call('EXPIRE', KEYS[4], ARGV[3])
+table.insert(batches, 1, pull)
+return batches
+"""
+
+# KEYS: leases zset, in-flight hash, remaining. ARGV: pull_number, products.
+# Counts the pull only if it still holds its lease (it wasn't requeued).
+# Returns {counted (1/0), remaining}
+_COMPLETE_LUA = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return {0, tonumber(redis.call('GET', KEYS[3]) or '0')}
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+return {1, redis.call('DECRBY', KEYS[3], ARGV[2])}
+"""
+
+# KEYS: leases zset, in-flight hash, queue. ARGV: now, key TTL.
+# Moves every expired pull's micro-batches back to the front of the queue.
+# Returns the requeued payloads (micro-batches joined by newlines)
+_REQUEUE_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local requeued = {}
+for _, pull in ipairs(expired) do
+    local payload = redis.call('HGET', KEYS[2], pull)
+    redis.call('ZREM', KEYS[1], pull)
+    redis.call('HDEL', KEYS[2], pull)
+    if payload then
+        local batches = {}
+        for batch in string.gmatch(payload, '[^\\n]+') do table.insert(batches, batch) end
+        for i = #batches, 1, -1 do redis.call('LPUSH', KEYS[3], batches[i]) end
+        table.insert(requeued, payload)
+    end
+end
+if #requeued > 0 then redis.call('EXPIRE', KEYS[3], ARGV[2]) end
+return requeued
+"""
+
+
+def adaptive_pull_size(
+    seconds_per_product: Optional[float],
+    queued_products: int,
+    workers: int,
+    target_seconds: float = TARGET_PULL_SECONDS,
+) -> int:
+    """
+    How many products the next pull should take (a multiple of MICRO_BATCH_SIZE).
+
+    - Sized so the pull takes about target_seconds at the observed latency.
+      Until there's an observation, start with one micro-batch so an early
+      slow pull can't take a large share of the job.
+    - Capped at an even share of what's left, so the tail is spread across
+      workers instead of landing on one.
+    """
+    if seconds_per_product and seconds_per_product > 0:
+        size = int(target_seconds / seconds_per_product)
+    else:
+        size = MICRO_BATCH_SIZE
+
+    if workers > 0 and queued_products > 0:
+        fair_share = -(-queued_products // workers)  # Ceiling division
+        size = min(size, fair_share)
+
+    # Round up to whole micro-batches, clamp to one Keepa group
+    size = -(-size // MICRO_BATCH_SIZE) * MICRO_BATCH_SIZE
+    return max(MICRO_BATCH_SIZE, min(MAX_PULL_SIZE, size))
+
+
+class JobWorkQueue:
+    """
+    Per-job queue of product micro-batches shared by every analysis worker.
+    """
+
+    def __init__(self, job_id: str, workers: int = None):
+        self.job_id = job_id
+        self.workers = workers or settings.CELERY_WORKERS
+        self.redis = redis.from_url(REDIS_URL, decode_responses=True)
+
+        self.key_queue = f"job:{job_id}:queue"
+        self.key_queued = f"job:{job_id}:queued"  # Products still in the list
+        self.key_remaining = f"job:{job_id}:remaining"  # Products not yet finished
+        self.key_latency = f"job:{job_id}:sec_per_product"
+        self.key_pulls = f"job:{job_id}:pulls"
+        self.key_finalized = f"job:{job_id}:finalized"
+        self.key_inflight = f"job:{job_id}:inflight"  # pull_number -> micro-batches
+        self.key_leases = f"job:{job_id}:leases"  # pull_number scored by lease deadline
+
+        self._pull_script = self.redis.register_script(_PULL_LUA)
+        self._complete_script = self.redis.register_script(_COMPLETE_LUA)
+        self._requeue_script = self.redis.register_script(_REQUEUE_LUA)
+
+    @property
+    def _keys(self) -> List[str]:
+        return [
+            self.key_queue, self.key_queued, self.key_remaining, self.key_latency,
+            self.key_pulls, self.key_finalized, self.key_inflight, self.key_leases,
+        ]
+
+    @staticmethod
+    def active_jobs() -> Dict[str, str]:
+        """job_id -> user_id for every job with a queue that hasn't been cleaned up."""
+        return redis.from_url(REDIS_URL, decode_responses=True).hgetall(ACTIVE_JOBS_KEY)
+
+    def enqueue(self, products: List[Dict], user_id: str) -> int:
+        """Push products as micro-batches. Returns the number of micro-batches."""
+        micro_batches = [
+            json.dumps(products[i:i + MICRO_BATCH_SIZE])
+            for i in range(0, len(products), MICRO_BATCH_SIZE)
+        ]
+
+        pipe = self.redis.pipeline()
+        pipe.delete(*self._keys)
+        if micro_batches:
+            pipe.rpush(self.key_queue, *micro_batches)
+        pipe.set(self.key_queued, len(products))
+        pipe.set(self.key_remaining, len(products))
+        for key in self._keys:
+            pipe.expire(key, QUEUE_TTL_SECONDS)
+        pipe.hset(ACTIVE_JOBS_KEY, self.job_id, user_id)
+        pipe.execute()
+
+        logger.info(f"📥 Job {self.job_id}: queued {len(products)} products as {len(micro_batches)} micro-batches")
+        return len(micro_batches)
+
+    def pull(self) -> Tuple[Optional[int], List[Dict]]:
+        """
+        Lease the next adaptively-sized slice of work (expired leases first).
+
+        Returns (pull_number, products); products is empty once the queue is
+        drained. Pass pull_number to complete() when the products are done.
+        """
+        self.requeue_expired()
+
+        latency, queued = self.redis.mget(self.key_latency, self.key_queued)
+        size = adaptive_pull_size(
+            float(latency) if latency else None,
+            int(queued or 0),
+            self.workers,
+        )
+        count = size // MICRO_BATCH_SIZE
+
+        # Take the micro-batches and record the lease in one script so two
+        # workers never get the same micro-batch and none is lost in between
+        result = self._pull_script(
+            keys=[self.key_queue, self.key_pulls, self.key_inflight, self.key_leases],
+            args=[count, time.time() + PULL_LEASE_SECONDS, QUEUE_TTL_SECONDS],
+        )
+        if not result:
+            return None, []
+
+        pull_number, raw_batches = int(result[0]), result[1:]
+        products = []
+        for raw in raw_batches:
+            products.extend(json.loads(raw))
+
+        self.redis.decrby(self.key_queued, len(products))
+        return pull_number, products
+
+    def renew(self, pull_number: int) -> bool:
+        """Push a pull's lease deadline out. False if it already expired and was requeued."""
+        return bool(self.redis.zadd(
+            self.key_leases, {str(pull_number): time.time() + PULL_LEASE_SECONDS}, xx=True, ch=True
+        ))
+
+    @contextmanager
+    def keep_leased(self, pull_number: int) -> Iterator[None]:
+        """Renew the pull's lease in a background thread until the block exits."""
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(LEASE_RENEW_SECONDS):
+                try:
+                    if not self.renew(pull_number):
+                        logger.warning(f"Job {self.job_id}: pull {pull_number} lost its lease while processing")
+                        return
+                except Exception as e:
+                    logger.warning(f"Could not renew lease for job {self.job_id} pull {pull_number}: {e}")
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-{self.job_id}-{pull_number}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def record_latency(self, product_count: int, elapsed_seconds: float):
+        """Fold a pull's seconds-per-product into the job's moving average."""
+        if product_count <= 0:
+            return
+        observed = elapsed_seconds / product_count
+        try:
+            previous = self.redis.get(self.key_latency)
+            smoothed = observed if previous is None else (
+                LATENCY_SMOOTHING * observed + (1 - LATENCY_SMOOTHING) * float(previous)
+            )
+            self.redis.set(self.key_latency, smoothed, ex=QUEUE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not record latency for job {self.job_id}: {e}")
+
+    def complete(self, pull_number: int, product_count: int) -> int:
+        """
+        Mark a pull's products finished. Returns how many are still outstanding.
+
+        A pull whose lease expired was requeued and is counted when its new
+        pull completes, so completing it late changes nothing.
+        """
+        counted, remaining = self._complete_script(
+            keys=[self.key_leases, self.key_inflight, self.key_remaining],
+            args=[pull_number, product_count],
+        )
+        if not counted:
+            logger.warning(f"Job {self.job_id}: pull {pull_number} finished after its lease expired")
+        return int(remaining)
+
+    def requeue_expired(self, now: Optional[float] = None) -> int:
+        """Put pulls whose lease expired back on the queue. Returns products requeued."""
+        payloads = self._requeue_script(
+            keys=[self.key_leases, self.key_inflight, self.key_queue],
+            args=[now if now is not None else time.time(), QUEUE_TTL_SECONDS],
+        )
+        products = sum(len(json.loads(raw)) for payload in payloads for raw in payload.split("\n"))
+        if products:
+            self.redis.incrby(self.key_queued, products)
+            logger.warning(f"♻️ Job {self.job_id}: requeued {products} products from {len(payloads)} expired pulls")
+        return products
+
+    def status(self) -> Optional[Dict[str, int]]:
+        """{"remaining", "queued_batches", "leases"}, or None once the job's keys are gone."""
+        pipe = self.redis.pipeline()
+        pipe.get(self.key_remaining)
+        pipe.llen(self.key_queue)
+        pipe.zcard(self.key_leases)
+        remaining, queued_batches, leases = pipe.execute()
+        if remaining is None:
+            return None
+        return {"remaining": int(remaining), "queued_batches": queued_batches, "leases": leases}
+
+    def claim_finalize(self) -> bool:
+        """True for exactly one caller once the job is finished."""
+        return bool(self.redis.set(self.key_finalized, 1, nx=True, ex=QUEUE_TTL_SECONDS))
+
+    def cleanup(self):
+        try:
+            self.redis.delete(*[key for key in self._keys if key != self.key_finalized])
+            self.redis.hdel(ACTIVE_JOBS_KEY, self.job_id)
+        except Exception as e:
+            logger.warning(f"Could not clean up work queue for job {self.job_id}: {e}")
@@ -0,0 +1,91 @@
+"""
+Tests for the prefetched AnalysisContext shared by analyze_chunk workers.
+"""
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+from app.tasks.analysis_context import AnalysisContext, fetch_source_map
+
+
+def _context():
+    return AnalysisContext(
+        "user-1",
+        None,
+        {"inbound_rate_per_lb": 0.5, "default_prep_cost": 0.2},
+        {
+            "p1": {"buy_cost": "4.50", "promo_buy_cost": None, "supplier_id": "s1",
+                   "supplier_ships_direct": True, "inbound_rate_override": 0, "prep_cost_override": None},
+        },
+    )
+
+
+def test_for_products_maps_sources_to_asins():
+    context = _context()
+    products = [{"id": "p1", "asin": "B000000001"}, {"id": "p2", "asin": "B000000002"}]
+
+    buy_costs, promo_costs, source_data = context.for_products(products)
+
+    assert buy_costs == {"B000000001": 4.5}
+    assert promo_costs == {}
+    assert source_data["B000000001"]["supplier_ships_direct"] is True
+    assert "B000000002" not in source_data
+    assert context.marketplace_id == "ATVPDKIKX0DER"
+    assert context.supplier_id_for("p1") == "s1"
+
+
+def test_context_is_immutable():
+    context = _context()
+
+    with pytest.raises(AttributeError):
+        context.marketplace_id = "A1F83G8C2ARO7P"
+
+    context.user_settings["default_prep_cost"] = 99
+    assert context.user_settings["default_prep_cost"] == 0.2
+
+
+def test_save_and_load_round_trip_with_one_get():
+    store = {}
+    client = MagicMock()
+    client.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+    client.get.side_effect = lambda key: store.get(key)
+
+    with patch("app.tasks.analysis_context.redis.from_url", return_value=client):
+        assert _context().save("job-1")
+        loaded = AnalysisContext.load("job-1")
+
+    assert client.get.call_count == 1
+    assert loaded.to_dict() == json.loads(json.dumps(_context().to_dict()))
+
+
+def test_fetch_source_map_batches_queries():
+    """250 products = 3 product_sources queries, not one per product."""
+    query = MagicMock()
+    query.select.return_value = query
+    query.in_.return_value = query
+    query.order.return_value = query
+    query.execute.return_value = MagicMock(data=[])
+
+    with patch("app.tasks.analysis_context.supabase") as mock_supabase:
+        mock_supabase.table.return_value = query
+        fetch_source_map([f"p{i}" for i in range(250)])
+
+    assert mock_supabase.table.call_count == 3
+
+
+def test_fetch_source_map_takes_every_field_from_the_oldest_source():
+    rows = [  # As returned: ordered by created_at, id
+        {"product_id": "p1", "supplier_id": "sup-old", "buy_cost": None, "promo_buy_cost": None,
+         "supplier_ships_direct": False, "inbound_rate_override": None, "prep_cost_override": 0.5},
+        {"product_id": "p1", "supplier_id": "sup-new", "buy_cost": 9.99, "promo_buy_cost": 8.5,
+         "supplier_ships_direct": True, "inbound_rate_override": 0.3, "prep_cost_override": None},
+    ]
+    with patch("app.tasks.analysis_context.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value.in_.return_value
+        query.order.return_value.execute.return_value = MagicMock(data=rows)
+        sources = fetch_source_map(["p1"])
+
+    query.order.assert_called_once_with("created_at,id")  # One param - PostgREST applies only one
+    assert sources == {"p1": {
+        "buy_cost": None, "promo_buy_cost": None, "supplier_id": "sup-old",
+        "supplier_ships_direct": False, "inbound_rate_override": None, "prep_cost_override": 0.5,
+    }}
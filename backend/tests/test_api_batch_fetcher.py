@@ -0,0 +1,103 @@
+"""
+Tests for the pipelined SP-API + Keepa batch fetcher.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.api_batch_fetcher import APIBatchFetcher
+
+
+ASINS = ["B000000001", "B000000002", "B000000003"]
+
+
+def _catalog_stream(failed=()):
+    async def iter_catalog_items(asins, **kwargs):
+        for asin in asins:
+            yield asin, None if asin in failed else {"processed": {}, "raw": {"asin": asin}}
+    return iter_catalog_items
+
+
+def _keepa_client(returned):
+    client = MagicMock()
+    client.is_configured.return_value = True
+
+    async def iter_products_batches(asins, **kwargs):
+        products = [{"asin": asin} for asin in returned]
+        yield {"raw_response": {"tokensLeft": 50, "products": products}, "products": products, "asins": asins}
+    client.iter_products_batches = iter_products_batches
+    return client
+
+
+@pytest.mark.asyncio
+async def test_fetch_writes_merged_rows_in_one_bulk_call():
+    progress = []
+    with patch("app.services.api_batch_fetcher.sp_api_client") as sp, \
+            patch("app.services.api_batch_fetcher.get_keepa_client", return_value=_keepa_client(ASINS[:2])), \
+            patch("app.services.api_batch_fetcher.SPAPIExtractor.extract_all", return_value={"title": "T"}), \
+            patch("app.services.api_batch_fetcher.KeepaExtractor.extract_all", return_value={"bsr": 100}), \
+            patch("app.services.api_batch_fetcher.supabase") as mock_supabase:
+        sp.iter_catalog_items = _catalog_stream(failed={ASINS[2]})
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=ASINS[:2])
+
+        results = await APIBatchFetcher.fetch_and_store(ASINS, "user-1", progress_callback=progress.append)
+
+    mock_supabase.rpc.assert_called_once()
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "bulk_update_product_api_data" and params["p_user_id"] == "user-1"
+    rows = {row["asin"]: row for row in params["p_rows"]}
+    assert set(rows) == set(ASINS[:2])
+    row = rows[ASINS[0]]
+    assert row["title"] == "T" and row["bsr"] == 100
+    # Each product keeps only its own Keepa product in the stored response
+    assert row["keepa_raw_response"] == {"tokensLeft": 50, "products": [{"asin": ASINS[0]}]}
+    mock_supabase.table.assert_not_called()
+
+    assert results["sp_api_success"] == 2 and results["sp_api_failed"] == 1
+    assert results["keepa_success"] == 2 and results["keepa_failed"] == 1
+    assert results["updated"] == 2 and results["write_batches"] == 1
+    assert set(results["timings"]) == {"sp_api_seconds", "keepa_seconds", "extract_seconds", "write_seconds"}
+    assert progress[-1]["stage"] == "complete" and progress[-1]["written"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rows_are_flushed_every_write_batch():
+    with patch("app.services.api_batch_fetcher.sp_api_client") as sp, \
+            patch("app.services.api_batch_fetcher.get_keepa_client", return_value=None), \
+            patch("app.services.api_batch_fetcher.SPAPIExtractor.extract_all", return_value={"title": "T"}), \
+            patch("app.services.api_batch_fetcher.supabase") as mock_supabase, \
+            patch.object(APIBatchFetcher, "WRITE_BATCH_SIZE", 2):
+        sp.iter_catalog_items = _catalog_stream()
+        mock_supabase.rpc.return_value.execute.side_effect = [MagicMock(data=ASINS[:2]), MagicMock(data=ASINS[2:])]
+
+        results = await APIBatchFetcher.fetch_and_store(ASINS, "user-1")
+
+    assert [len(c.args[1]["p_rows"]) for c in mock_supabase.rpc.call_args_list] == [2, 1]
+    assert results["updated"] == 3 and results["write_batches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_per_product_updates_without_the_rpc():
+    with patch("app.services.api_batch_fetcher.sp_api_client") as sp, \
+            patch("app.services.api_batch_fetcher.get_keepa_client", return_value=None), \
+            patch("app.services.api_batch_fetcher.SPAPIExtractor.extract_all", return_value={"title": "T"}), \
+            patch("app.services.api_batch_fetcher.supabase") as mock_supabase:
+        sp.iter_catalog_items = _catalog_stream()
+        mock_supabase.rpc.side_effect = Exception("function bulk_update_product_api_data does not exist")
+        update = mock_supabase.table.return_value.update
+        update.return_value.eq.return_value.eq.return_value.execute.return_value = MagicMock(data=[{"id": "p"}])
+
+        results = await APIBatchFetcher.fetch_and_store(ASINS, "user-1")
+
+    assert update.call_count == 3
+    assert "asin" not in update.call_args.args[0]
+    assert results["updated"] == 3
+
+
+def test_api_data_columns_match_the_rpc_allowlist():
+    import re
+    from pathlib import Path
+    from app.services.api_batch_fetcher import API_DATA_COLUMNS
+
+    sql = (Path(__file__).parents[2] / "database" / "migrations" / "CREATE_BULK_UPDATE_PRODUCT_API_DATA_RPC.sql").read_text()
+    allowlist = sql.split("v_api_columns TEXT[] := ARRAY[", 1)[1].split("];", 1)[0]
+    assert set(re.findall(r"'([a-z0-9_]+)'", allowlist)) == API_DATA_COLUMNS
+    assert "TO authenticated" not in sql and "SET search_path = public" in sql
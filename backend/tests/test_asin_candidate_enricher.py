@@ -0,0 +1,98 @@
+"""
+Tests for batched ASIN-candidate enrichment of multi-match UPCs.
+"""
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.services.asin_candidate_enricher import AsinCandidateEnricher, CACHE_TTL, DEGRADED_CACHE_TTL
+from app.services.asin_ranking_service import AsinRankingService
+
+CANDIDATES = [
+    {"asin": "B0CHILD001", "title": "Widget - Red"},
+    {"asin": "B0PARENT01", "title": "Widget"},
+]
+
+CATALOG = {"items": [
+    {
+        "asin": "B0CHILD001",
+        "summaries": [{"itemName": "Widget, Red", "brandName": "Acme"}],
+        "relationships": [{"relationships": [{"type": "VARIATION", "parentAsins": ["B0PARENT01"]}]}],
+        "salesRanks": [{"displayGroupRanks": [{"rank": 120000}]}],
+    },
+    {
+        "asin": "B0PARENT01",
+        "summaries": [{"itemName": "Widget", "brandName": "Acme"}],
+        "salesRanks": [{"displayGroupRanks": [{"rank": 900}]}],
+    },
+]}
+
+KEEPA = {
+    "B0PARENT01": {"current": {"reviews_total": 2500, "rating": 4.6, "fba_sellers": 3, "buy_box_price": 19.99}},
+}
+
+
+@pytest.mark.asyncio
+async def test_enrich_fetches_all_candidates_in_one_catalog_and_keepa_call():
+    with patch("app.services.asin_candidate_enricher.sp_api_client") as sp, \
+            patch("app.services.asin_candidate_enricher.keepa_client") as keepa, \
+            patch("app.services.asin_candidate_enricher.cache") as cache:
+        cache.get.return_value = None
+        sp.search_catalog_items = AsyncMock(return_value=CATALOG)
+        keepa.get_products_batch = AsyncMock(return_value=KEEPA)
+
+        enriched = await AsinCandidateEnricher().enrich("012345678905", CANDIDATES)
+
+    sp.search_catalog_items.assert_awaited_once()
+    args, kwargs = sp.search_catalog_items.call_args
+    assert args[0] == ["B0CHILD001", "B0PARENT01"]
+    assert kwargs["identifiers_type"] == "ASIN"
+    assert {"relationships", "salesRanks"} <= set(kwargs["included_data"])
+    keepa.get_products_batch.assert_awaited_once_with(["B0CHILD001", "B0PARENT01"])
+
+    child, parent = enriched
+    assert child["parent_asin"] == "B0PARENT01" and not child["is_parent"]
+    assert "variation" in child["warning"]
+    assert child["quality_indicators"]["review_count"] == 0  # No Keepa data
+    assert parent["is_parent"] and parent["quality_indicators"]["bsr"] == 900
+    assert parent["quality_indicators"]["has_prime"] and parent["quality_indicators"]["is_buybox_winner"]
+    cache.set.assert_called_once()
+    assert cache.set.call_args.args[0] == "asin_candidates:ATVPDKIKX0DER:012345678905"
+    assert cache.set.call_args.kwargs["ttl"] == CACHE_TTL
+
+    ranked = AsinRankingService().rank_asins(enriched)
+    assert ranked[0]["asin"] == "B0PARENT01"
+
+
+@pytest.mark.asyncio
+async def test_enrich_serves_repeat_upc_from_cache():
+    cached = [{"asin": "B0PARENT01", "is_parent": True, "quality_indicators": {}}]
+    with patch("app.services.asin_candidate_enricher.sp_api_client") as sp, \
+            patch("app.services.asin_candidate_enricher.keepa_client") as keepa, \
+            patch("app.services.asin_candidate_enricher.cache") as cache:
+        cache.get.return_value = cached
+        sp.search_catalog_items = AsyncMock()
+        keepa.get_products_batch = AsyncMock()
+
+        assert await AsinCandidateEnricher().enrich("012345678905", CANDIDATES) == cached
+
+    sp.search_catalog_items.assert_not_awaited()
+    keepa.get_products_batch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_sources_are_not_cached_for_a_day():
+    with patch("app.services.asin_candidate_enricher.sp_api_client") as sp, \
+            patch("app.services.asin_candidate_enricher.keepa_client") as keepa, \
+            patch("app.services.asin_candidate_enricher.cache") as cache:
+        cache.get.return_value = None
+        sp.search_catalog_items = AsyncMock(side_effect=Exception("QuotaExceeded"))
+        keepa.get_products_batch = AsyncMock(side_effect=Exception("timeout"))
+
+        enriched = await AsinCandidateEnricher().enrich("012345678905", CANDIDATES)
+        assert [c["asin"] for c in enriched] == ["B0CHILD001", "B0PARENT01"]
+        cache.set.assert_not_called()
+
+        # Keepa back, catalog still down -> cached briefly
+        keepa.get_products_batch = AsyncMock(return_value=KEEPA)
+        await AsinCandidateEnricher().enrich("012345678905", CANDIDATES)
+
+    assert cache.set.call_args.kwargs["ttl"] == DEGRADED_CACHE_TTL
@@ -0,0 +1,97 @@
+"""
+Tests for the event-driven ASIN lookup queue.
+"""
+import fakeredis
+from unittest.mock import patch, MagicMock
+from app.services.asin_lookup_queue import AsinLookupQueue, STREAM_KEY, RETRY_KEY
+
+
+REDIS = "app.services.asin_lookup_queue.get_redis_client"
+
+
+def _queue():
+    queue = AsinLookupQueue()
+    queue._group_ready = True  # Skip XGROUP CREATE
+    return queue
+
+
+def test_enqueue_adds_each_upc_to_the_stream_once():
+    client = MagicMock()
+    first, second = MagicMock(), MagicMock()
+    client.pipeline.side_effect = [first, second]
+    # SADD waiting, SADD queued per item: UPC "111" is new, "222" already queued
+    first.execute.return_value = [1, 1, 1, 0, 1, 0]
+    with patch(REDIS, return_value=client):
+        queued = _queue().enqueue([("111", "p1"), ("222", "p2"), ("111", "p3")])
+
+    assert queued == 1
+    second.xadd.assert_called_once_with(STREAM_KEY, {"upc": "111"})
+    waiting = [c.args for c in first.sadd.call_args_list if c.args[0].startswith("asin_lookup:waiting:")]
+    assert waiting == [("asin_lookup:waiting:111", "p1"), ("asin_lookup:waiting:222", "p2"), ("asin_lookup:waiting:111", "p3")]
+
+
+def test_enqueue_without_redis_returns_none():
+    with patch(REDIS, return_value=None):
+        assert _queue().enqueue([("111", "p1")]) is None
+
+
+def test_retry_delay_is_exponential_and_capped():
+    assert [AsinLookupQueue.retry_delay(n) for n in (1, 2, 3)] == [60, 120, 240]
+    assert AsinLookupQueue.retry_delay(20) == 3600
+
+
+def test_promote_due_retries_requeues_only_claimed_products():
+    client = MagicMock()
+    client.zrangebyscore.return_value = ["p1", "p2"]
+    claim = MagicMock()
+    # p1: ZREM claimed it; p2: another worker got there first
+    claim.execute.return_value = [1, "111", 1, 0, "222", 0]
+    client.pipeline.return_value = claim
+    queue = _queue()
+    with patch(REDIS, return_value=client), patch.object(queue, "enqueue") as enqueue:
+        promoted = queue.promote_due_retries()
+
+    assert promoted == 1
+    enqueue.assert_called_once_with([("111", "p1")])
+    claim.zrem.assert_any_call(RETRY_KEY, "p1")
+
+
+def test_metrics_report_depth_lag_and_throughput():
+    client = MagicMock()
+    pipe = MagicMock()
+    client.pipeline.return_value = pipe
+    pipe.execute.return_value = [
+        42,  # XLEN
+        [("1700000040000-0", {"upc": "111"})],  # Oldest message
+        {"pending": 20},
+        5, 2, 1,
+        [None] * 55 + ["10", "20", "30", "40", "50"],
+    ]
+    with patch(REDIS, return_value=client), \
+            patch("app.services.asin_lookup_queue.time.time", return_value=1_700_000_100.0):
+        metrics = _queue().metrics()
+
+    assert metrics["depth"] == 42
+    assert metrics["in_flight"] == 20
+    assert metrics["lag_seconds"] == 60.0
+    assert metrics["retry_scheduled"] == 5 and metrics["retry_due"] == 2
+    assert metrics["consumer_running"] is True
+    assert metrics["throughput"] == {"current_minute": 50, "last_5_minutes": 150, "last_hour": 150}
+
+
+def test_group_lost_in_a_redis_flush_is_recreated():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    queue = AsinLookupQueue()
+    with patch(REDIS, return_value=client):
+        queue.enqueue([("111", "p1")])
+        client.flushall()
+        # XADD recreates the stream, but not the group
+        queue.enqueue([("222", "p2")])
+
+        assert [upc for _, upc in queue.read("consumer-1", block_ms=None)] == ["222"]
+        assert queue.claim_stale("sweep-1") == []
+        assert queue.metrics()["in_flight"] == 1
+
+        client.flushall()
+        queue.ensure_group()
+        assert client.xinfo_groups(STREAM_KEY)[0]["name"] == "asin_lookup_workers"
@@ -0,0 +1,68 @@
+"""
+Tests for the in-memory brand restriction index and bulk flagging.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.brand_restriction_index import BrandMatcher, BrandRestrictionIndex, LOAD_PAGE_SIZE
+from app.services.brand_restriction_detector import BrandRestrictionDetector
+
+RESTRICTIONS = [
+    {"id": "r1", "brand_name": "Procter & Gamble", "brand_name_normalized": "procter & gamble", "restriction_type": "globally_gated"},
+    {"id": "r2", "brand_name": "Nike", "brand_name_normalized": "nike", "restriction_type": "globally_gated"},
+    {"id": "r3", "brand_name": "Burt's Bees", "brand_name_normalized": "burt's bees", "restriction_type": "seller_specific"},
+]
+
+
+def test_exact_alias_and_fuzzy_matches():
+    matcher = BrandMatcher(RESTRICTIONS)
+
+    assert matcher.match("NIKE")["id"] == "r2"
+    assert matcher.match("Procter and Gamble Co.")["id"] == "r1"
+    assert matcher.match("burts bees")["id"] == "r3"
+    assert matcher.match("Burt's Beees")["id"] == "r3"  # Typo -> fuzzy
+    assert matcher.match("Nikon") is None
+    assert matcher.match("Generic") is None
+
+
+def test_flag_products_evaluates_in_memory_and_bulk_upserts():
+    products = [
+        {"id": f"p{i}", "brand": brand}
+        for i, brand in enumerate(["Nike", "Generic", None, "Burts Bees"] * 50)
+    ]
+
+    index = MagicMock()
+    matcher = BrandMatcher(RESTRICTIONS)
+    index.lookup.side_effect = lambda brand, supplier_id=None: (matcher.match(brand), None)
+
+    with patch("app.services.brand_restriction_detector.brand_restriction_index", index), \
+         patch("app.services.brand_restriction_detector.supabase") as mock_supabase:
+        results = BrandRestrictionDetector("user-1").flag_products(products)
+
+    # 150 products with a brand, one upsert call, no per-product reads
+    assert len(results) == 150
+    assert mock_supabase.table.call_count == 1
+    rows = mock_supabase.table.return_value.upsert.call_args[0][0]
+    assert len(rows) == 150
+    assert results["p0"]["brand_status"] == "globally_restricted"
+    assert results["p1"]["brand_status"] == "unknown"
+    assert results["p3"]["brand_status"] == "requires_approval"
+
+
+def test_failed_page_raises_and_leaves_index_unloaded():
+    full_page = [dict(RESTRICTIONS[1], id=f"r{i}") for i in range(LOAD_PAGE_SIZE)]
+    index = BrandRestrictionIndex()
+
+    with patch("app.services.brand_restriction_index.get_redis_client", return_value=None), \
+         patch("app.services.brand_restriction_index.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value.order.return_value.range.return_value
+        query.execute.side_effect = [MagicMock(data=full_page), Exception("statement timeout")]
+        with pytest.raises(Exception, match="statement timeout"):
+            index.lookup("Nike")
+        assert index._restrictions is None
+        page_range = mock_supabase.table.return_value.select.return_value.order.return_value.range
+        assert [c.args for c in page_range.call_args_list] == [(0, LOAD_PAGE_SIZE), (LOAD_PAGE_SIZE, 2 * LOAD_PAGE_SIZE)]
+
+        # Next lookup reloads instead of serving the partial first page
+        query.execute.side_effect = [MagicMock(data=RESTRICTIONS)]
+        restriction, _ = index.lookup("Procter and Gamble")
+    assert restriction["id"] == "r1"
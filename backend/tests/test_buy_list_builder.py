@@ -0,0 +1,88 @@
+"""
+Tests for set-based buy list construction.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.buy_list_builder import BuyListBuilder
+
+
+def _product(product_id, sources, profit=4.0, sell_price=20.0):
+    return {
+        "id": product_id,
+        "sell_price": sell_price,
+        "profit_amount": profit,
+        "roi_percentage": 50.0,
+        "margin_percentage": 20.0,
+        "sources": sources,
+    }
+
+
+PRODUCTS = [
+    _product("p1", [
+        {"id": "s1", "buy_cost": 9.0, "moq": 12, "is_active": True},
+        {"id": "s2", "wholesale_cost": 8.0, "moq": 6, "is_active": True},
+        {"id": "s3", "buy_cost": 1.0, "moq": 1, "is_active": False},
+    ]),
+    _product("p2", [{"id": "s4", "buy_cost": 0, "moq": None, "is_active": True}], profit=None),
+    _product("p3", [{"id": "s5", "buy_cost": 5.0, "is_active": False}]),
+]
+
+
+def _select(mock_supabase):
+    return mock_supabase.table.return_value.select.return_value.eq.return_value.in_
+
+
+def test_plan_resolves_sources_in_one_query_and_projects_totals():
+    with patch("app.services.buy_list_builder.supabase") as mock_supabase:
+        _select(mock_supabase).return_value.execute.return_value = MagicMock(data=PRODUCTS)
+        plan = BuyListBuilder().plan("user-1", [{"product_id": p} for p in ("p1", "p2", "p3", "missing")])
+
+    assert _select(mock_supabase).call_count == 1
+    items = {i["product_id"]: i for i in plan["items"]}
+    # Cheapest active source at its MOQ
+    assert items["p1"]["product_source_id"] == "s2" and items["p1"]["quantity"] == 6
+    assert items["p1"]["total_cost"] == 48.0 and items["p1"]["expected_profit"] == 24.0
+    assert items["p2"]["quantity"] == 1 and items["p2"]["expected_profit"] is None
+    assert plan["not_found"] == ["missing"]
+    assert plan["errors"] == ["No active product source for product p3", "Product missing not found"]
+
+    assert plan["projection"] == {
+        "total_products": 2,
+        "total_units": 7,
+        "total_cost": 48.0,
+        "expected_revenue": 140.0,
+        "expected_profit": 24.0,
+        "expected_roi": 50.0,
+    }
+    mock_supabase.table.return_value.upsert.assert_not_called()
+
+
+def test_write_upserts_all_planned_items_in_one_statement():
+    with patch("app.services.buy_list_builder.supabase") as mock_supabase:
+        _select(mock_supabase).return_value.execute.return_value = MagicMock(data=PRODUCTS[:2])
+        upsert = mock_supabase.table.return_value.upsert
+        upsert.return_value.execute.return_value = MagicMock(data=[{"id": "i1"}, {"id": "i2"}])
+
+        builder = BuyListBuilder()
+        plan = builder.plan("user-1", [
+            {"product_id": "p1", "product_source_id": "s1", "quantity": 3, "notes": "promo"},
+            {"product_id": "p2"},
+        ])
+        written = builder.write("list-1", plan["items"])
+
+    upsert.assert_called_once()
+    rows = upsert.call_args.args[0]
+    assert upsert.call_args.kwargs == {"on_conflict": "buy_list_id,product_id,product_source_id"}
+    assert [r["buy_list_id"] for r in rows] == ["list-1", "list-1"]
+    assert rows[0]["product_source_id"] == "s1" and rows[0]["quantity"] == 3 and rows[0]["notes"] == "promo"
+    assert set(rows[0]) == set(rows[1])  # Same columns on every row for the bulk upsert
+    assert len(written) == 2
+
+
+def test_products_are_loaded_in_chunks():
+    with patch("app.services.buy_list_builder.supabase") as mock_supabase, \
+            patch("app.services.buy_list_builder.PRODUCT_CHUNK_SIZE", 2):
+        _select(mock_supabase).return_value.execute.return_value = MagicMock(data=[])
+        BuyListBuilder().plan("user-1", [{"product_id": f"p{i}"} for i in range(5)])
+
+    assert [len(c.args[1]) for c in _select(mock_supabase).call_args_list] == [2, 2, 1]
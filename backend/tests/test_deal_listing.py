@@ -0,0 +1,131 @@
+"""
+Tests for keyset-paginated deal listing and materialized filter counts.
+"""
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.deal_listing import DealListing, InvalidCursor, encode_cursor, decode_cursor
+
+
+def _rows(n, start=0):
+    return [{"deal_id": f"d{i}", "sort_value": f"2025-01-{i + 1:02d}", "asin": f"B0{i}"} for i in range(start, start + n)]
+
+
+def test_page_fetches_one_extra_row_and_returns_cursor_for_the_last_row():
+    with patch("app.services.deal_listing.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=_rows(3))
+        page = DealListing().page("user-1", {"stage": "new", "search": None}, limit=2)
+
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "list_product_deals"
+    assert params["p_limit"] == 3
+    assert params["p_stage"] == "new" and "p_search" not in params
+    assert "p_after_id" not in params
+    assert [d["deal_id"] for d in page["deals"]] == ["d0", "d1"]
+    assert all("sort_value" not in d for d in page["deals"])
+    assert page["has_more"] is True
+    assert decode_cursor(page["next_cursor"], "deal_created_at", True) == ("2025-01-02", "d1")
+
+
+def test_next_page_seeks_past_cursor_and_last_page_has_no_cursor():
+    cursor = encode_cursor("roi", False, {"sort_value": "42.5", "deal_id": "d9"})
+    with patch("app.services.deal_listing.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=_rows(1, start=10))
+        page = DealListing().page("user-1", sort="roi", desc=False, cursor=cursor, limit=2)
+
+    params = mock_supabase.rpc.call_args.args[1]
+    assert (params["p_after_value"], params["p_after_id"]) == ("42.5", "d9")
+    assert params["p_sort"] == "roi" and params["p_sort_desc"] is False
+    assert page["has_more"] is False and page["next_cursor"] is None
+
+
+def test_cursor_from_another_sort_is_rejected():
+    cursor = encode_cursor("roi", True, {"sort_value": "42.5", "deal_id": "d9"})
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "deal_created_at", True)
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor", "roi", True)
+
+
+def test_counts_read_materialized_buckets_in_one_query():
+    rows = [
+        {"bucket_type": "all", "bucket": "all", "count": 100000},
+        {"bucket_type": "stage", "bucket": "new", "count": 60000},
+        {"bucket_type": "stage", "bucket": "ordered", "count": 0},
+        {"bucket_type": "source", "bucket": "csv", "count": 90000},
+        {"bucket_type": "asin_status", "bucket": "asin_found", "count": 70000},
+        {"bucket_type": "asin_status", "bucket": "needs_asin", "count": 30000},
+    ]
+    with patch("app.services.deal_listing.supabase") as mock_supabase:
+        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = MagicMock(data=rows)
+        counts = DealListing().counts("user-1")
+
+    mock_supabase.table.assert_called_once_with("deal_filter_counts")
+    assert counts["all"] == 100000
+    assert counts["stage"] == {"new": 60000}
+    assert DealListing.asin_status_counts(counts) == {
+        "all": 100000, "asin_found": 70000, "needs_selection": 0, "needs_asin": 30000, "manual_entry": 0,
+    }
+    assert DealListing.filtered_total(counts, {"stage": None}) == 100000
+    assert DealListing.filtered_total(counts, {"asin_status": "needs_asin"}) == 30000
+    assert DealListing.filtered_total(counts, {"source": "csv", "min_roi": 20}) is None
+
+
+def test_purchase_history_reads_rollup_once_for_rows_without_it():
+    deals = [
+        {"deal_id": "d1", "product_id": "p1"},
+        {"deal_id": "d2", "product_id": "p2"},
+        {"deal_id": "d3", "product_id": "p3", "bought_last_30d": 4, "bought_last_60d": 4, "bought_last_90d": 9},
+    ]
+    rollup = [{"product_id": "p1", "bought_last_30d": 2, "bought_last_60d": 5, "bought_last_90d": 12}]
+    with patch("app.services.deal_listing.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value.in_
+        query.return_value.execute.return_value = MagicMock(data=rollup)
+        DealListing().add_purchase_history(deals)
+
+    mock_supabase.table.assert_called_once_with("product_purchase_rollup")
+    assert sorted(query.call_args.args[1]) == ["p1", "p2"]
+    assert [d["bought_last_90d"] for d in deals] == [12, 0, 9]
+    assert deals[0]["bought_last_60d"] == 5 and deals[1]["bought_last_30d"] == 0
+
+
+def test_purchase_history_defaults_to_zero_when_rollup_fails():
+    deals = [{"deal_id": "d1", "product_id": "p1"}]
+    with patch("app.services.deal_listing.supabase") as mock_supabase:
+        mock_supabase.table.side_effect = Exception("relation does not exist")
+        DealListing().add_purchase_history(deals)
+
+    assert deals[0]["bought_last_30d"] == 0 and deals[0]["bought_last_90d"] == 0
+
+
+def test_analyzer_offset_page_keeps_category_filter():
+    from app.routers.analyzer import get_analyzer_products, AnalyzerFilters
+
+    with patch("app.routers.analyzer.supabase") as mock_supabase, \
+         patch("app.routers.analyzer.deal_listing") as mock_listing:
+        mock_listing.filtered_total.return_value = None
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value
+        asyncio.run(get_analyzer_products(
+            AnalyzerFilters(category="Toys"), page=3, page_size=50, cursor=None,
+            sort_by="profit_amount", sort_order="desc", current_user=MagicMock(id="user-1")
+        ))
+
+    query.eq.assert_called_once_with("category", "Toys")
+    query.eq.return_value.order.assert_called_once_with("profit.desc,deal_id.desc")
+    query.eq.return_value.order.return_value.range.assert_called_once_with(100, 150)
+    mock_listing.page.assert_not_called()
+
+
+def test_analyzer_rejects_unsupported_sort_key():
+    from fastapi import HTTPException
+    from app.routers.analyzer import get_analyzer_products, AnalyzerFilters
+
+    with patch("app.routers.analyzer.deal_listing") as mock_listing:
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(get_analyzer_products(
+                AnalyzerFilters(), page=1, page_size=50, cursor=None,
+                sort_by="margin_percentage", sort_order="desc", current_user=MagicMock(id="user-1")
+            ))
+
+    assert error.value.status_code == 400
+    mock_listing.page.assert_not_called()
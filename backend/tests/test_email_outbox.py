@@ -0,0 +1,98 @@
+"""
+Tests for the email outbox: enqueue, batched dispatch and the drain loop.
+"""
+import json
+import pytest
+import httpx
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services.email_outbox import EmailOutbox
+
+
+class _Unlimited:
+    async def acquire_async(self):
+        return None
+
+    def penalize(self):
+        self.penalized = True
+
+
+def _row(i, provider="resend", **extra):
+    return {
+        "id": f"row-{i}",
+        "idempotency_key": f"test:{i}",
+        "provider": provider,
+        "from_email": "noreply@habexa.com",
+        "from_name": "Habexa",
+        "to_email": f"user{i}@example.com",
+        "subject": "Hello",
+        "html_body": "<p>Hi</p>",
+        **extra,
+    }
+
+
+def test_enqueue_is_idempotent_and_nudges_drain():
+    outbox = EmailOutbox()
+    outbox._nudge = MagicMock()
+    with patch("app.services.email_outbox.supabase") as mock_supabase:
+        upsert = mock_supabase.table.return_value.upsert
+        upsert.return_value.execute.side_effect = [MagicMock(data=[{"id": "row-1"}]), MagicMock(data=[])]
+
+        first = outbox.enqueue("a@example.com", "Welcome", "<p>Hi</p>", idempotency_key="welcome:user-1")
+        second = outbox.enqueue("a@example.com", "Welcome", "<p>Hi</p>", idempotency_key="welcome:user-1")
+
+    assert (first, second) == ("row-1", None)
+    assert upsert.call_args.kwargs == {"on_conflict": "idempotency_key", "ignore_duplicates": True}
+    assert upsert.call_args.args[0]["idempotency_key"] == "welcome:user-1"
+    outbox._nudge.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_dispatch_batches_resend_and_classifies_failures():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path == "/emails/batch":
+            return httpx.Response(200, json={"data": [{"id": f"m{i}"} for i in range(len(json.loads(request.content)))]})
+        if json.loads(request.content)["to"] == ["user1@example.com"]:
+            return httpx.Response(503, text="unavailable")
+        return httpx.Response(422, text="invalid attachment")
+
+    rows = [_row(i) for i in range(2, 152)]
+    rows += [_row(0, attachments=[{"filename": "a.pdf", "content": "JVBERg=="}]),
+             _row(1, attachments=[{"filename": "b.pdf", "content": "JVBERg=="}])]
+
+    limiter = _Unlimited()
+    outbox = EmailOutbox(limiters={"resend": limiter})
+    with patch("app.services.email_outbox._api_key", return_value="key"):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            results = await outbox.dispatch(rows, client)
+
+    by_id = {r["id"]: r for r in results}
+    assert len(results) == len(rows)
+    # 150 plain emails in two batch calls, attachments sent one by one
+    assert sorted(r.url.path for r in requests) == ["/emails", "/emails", "/emails/batch", "/emails/batch"]
+    assert by_id["row-2"]["status"] == "sent" and by_id["row-2"]["provider_message_id"] == "m0"
+    assert by_id["row-1"]["status"] == "retry"
+    assert by_id["row-0"]["status"] == "failed"
+    assert {r.headers["Idempotency-Key"] for r in requests if r.url.path == "/emails"} == {"test:0", "test:1"}
+
+
+@pytest.mark.asyncio
+async def test_drain_claims_sends_and_completes():
+    outbox = EmailOutbox()
+    outbox.dispatch = AsyncMock(return_value=[
+        {"id": "row-1", "status": "sent", "provider_message_id": "m1", "error": None},
+        {"id": "row-2", "status": "retry", "provider_message_id": None, "error": "HTTP 503"},
+    ])
+    with patch("app.services.email_outbox.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.side_effect = [
+            MagicMock(data=[_row(1), _row(2)]),
+            MagicMock(data=None),
+        ]
+        totals = await outbox.drain(time_budget=5)
+
+    assert totals == {"claimed": 2, "sent": 1, "retry": 1, "failed": 0}
+    calls = [c.args for c in mock_supabase.rpc.call_args_list]
+    assert calls[0][0] == "claim_email_outbox"
+    assert calls[1] == ("complete_email_outbox", {"p_results": outbox.dispatch.return_value})
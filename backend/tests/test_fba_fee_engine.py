@@ -0,0 +1,53 @@
+"""
+Golden tests for the local FBA fee engine (schedule 2025-01).
+"""
+from unittest.mock import patch
+from app.services.fba_fee_engine import FBAFeeEngine, item_dimensions
+
+
+def _engine():
+    with patch("app.services.fba_fee_engine.get_redis_client", return_value=None):
+        engine = FBAFeeEngine("2025-01")
+        engine.get_drift()  # Cache empty drift so estimates don't touch Redis
+    return engine
+
+
+def test_small_standard_item():
+    engine = _engine()
+    fees = engine.estimate(12.99, "Toys & Games", weight_lb=0.3, length_in=6, width_in=4, height_in=0.5)
+
+    assert fees["size_tier"] == "Small Standard"
+    assert fees["fba_fulfillment_fee"] == 3.24
+    assert fees["referral_fee"] == 1.95
+    assert fees["total"] == 5.19
+    assert fees["confidence"] >= 0.7
+
+
+def test_large_standard_uses_dimensional_weight_and_price_bands():
+    engine = _engine()
+    # 12x10x6 / 139 = 5.18 lb dimensional > 2 lb actual
+    fees = engine.estimate(8.99, "Beauty & Personal Care", weight_lb=2.0, length_in=12, width_in=10, height_in=6)
+
+    assert fees["size_tier"] == "Large Standard"
+    assert fees["fba_fulfillment_fee"] == round(6.36 + (720 / 139 - 3.0) * 0.32 - 0.77, 2)
+    assert fees["referral_rate"] == 0.08  # Beauty <= $10
+
+
+def test_confidence_drops_for_missing_dimensions_band_edges_and_unknown_category():
+    engine = _engine()
+
+    no_dims = engine.estimate(25.00, "Toys & Games")
+    unknown_category = engine.estimate(25.00, "Everything Else", weight_lb=0.3, length_in=6, width_in=4, height_in=0.5)
+    no_category = engine.estimate(25.00, None, weight_lb=0.3, length_in=6, width_in=4, height_in=0.5)
+    near_band_edge = engine.estimate(25.00, "Toys & Games", weight_lb=0.49, length_in=6, width_in=4, height_in=0.5)
+
+    # No dimensions, a guessed referral rate, or within half an ounce of a band -> SP-API
+    for fees in (no_dims, unknown_category, no_category, near_band_edge):
+        assert fees["confidence"] < 0.7
+    assert no_category["referral_rate"] == 0.15
+    assert engine.needs_sp_api("B000000001", no_category)
+
+
+def test_item_dimensions_from_keepa_units():
+    dims = item_dimensions({"package_weight": 454, "package_length": 254, "package_width": 127, "package_height": 0})
+    assert dims == {"weight_lb": 1.001, "length_in": 10.0, "width_in": 5.0, "height_in": None}
@@ -0,0 +1,80 @@
+"""
+Tests for batched Keepa deep analysis.
+"""
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+from app.services.keepa_analysis_service import KeepaAnalysisService, KEEPA_EPOCH
+
+
+def _keepa_minutes(days_ago: int) -> int:
+    return int((datetime.utcnow() - timedelta(days=days_ago) - KEEPA_EPOCH).total_seconds() // 60)
+
+
+def _product(asin, low_cents):
+    return {
+        "asin": asin,
+        "stats": {"current": [0, 0, 0, 5000], "avg90": [0, 0, 0, 6000]},
+        "offers": [
+            {"sellerId": "S1", "isFBA": True, "offerCSV": [_keepa_minutes(30), low_cents, 0, _keepa_minutes(1), 2499, 0]},
+            {"sellerId": "S2", "isFBA": False, "offerCSV": [_keepa_minutes(2), 2299, 0]},
+        ],
+    }
+
+
+def _keepa_client(chunks):
+    client = MagicMock()
+
+    async def iter_products_batches(asins, **kwargs):
+        assert kwargs["days"] == 365
+        for products in chunks:
+            yield {"raw_response": {"tokensConsumed": 13 * len(products)}, "products": products}
+    client.iter_products_batches = iter_products_batches
+    return client
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_parses_every_product_from_chunked_requests():
+    service = KeepaAnalysisService()
+    service.api_key = "test"
+    chunks = [[_product("B000000001", 1899), _product("B000000002", 2099)], [_product("B000000003", 1999)]]
+    with patch("app.services.keepa_analysis_service.get_keepa_client", return_value=_keepa_client(chunks)):
+        batch = await service.analyze_batch(["B000000001", "B000000002", "B000000003", "B000000004"])
+
+    assert batch["requests"] == 2 and batch["tokens_used"] == 39
+    assert batch["missing"] == ["B000000004"]
+    analysis = batch["analyses"]["B000000001"]
+    assert analysis["lowest_fba_price_12m"] == 18.99
+    assert analysis["current_sales_rank"] == 5000 and analysis["avg_sales_rank_90d"] == 6000
+    assert analysis["fba_seller_count"] == 1 and analysis["fbm_seller_count"] == 1
+    assert "offers" not in analysis["raw_basic_response"]
+
+
+def test_worst_case_batch_matches_single_product_calculation():
+    service = KeepaAnalysisService()
+    lows, costs, fees = [18.99, None, 12.50], [8.00, 5.00, 11.00], [5.25, 4.00, 4.75]
+
+    batch = service.calculate_worst_case_batch(lows, costs, fees)
+
+    for low, cost, fee, worst_case in zip(lows, costs, fees, batch):
+        single = service.calculate_worst_case_profit(low, cost, fee)
+        for key in ("worst_case_profit", "worst_case_margin", "still_profitable"):
+            assert worst_case[key] == single[key]
+    assert batch[2]["still_profitable"] is False
+
+
+def test_store_batch_upserts_all_asins_in_one_request():
+    service = KeepaAnalysisService()
+    analyses = {
+        "B000000001": {"lowest_fba_price_12m": 18.99, "fba_seller_count": 1},
+        "B000000002": {"lowest_fba_price_12m": None},
+    }
+    with patch("app.services.keepa_analysis_service.supabase") as mock_supabase:
+        stored = service.store_batch(analyses, {"B000000001": {"worst_case_profit": 4.2, "still_profitable": True}})
+
+    assert stored == 2
+    rows = mock_supabase.table.return_value.upsert.call_args.args[0]
+    assert mock_supabase.table.return_value.upsert.call_args.kwargs == {"on_conflict": "asin"}
+    assert [r["asin"] for r in rows] == ["B000000001", "B000000002"]
+    assert rows[0]["worst_case_profit"] == 4.2 and rows[1]["worst_case_profit"] is None
+    assert set(rows[0]) == set(rows[1])  # Same columns on every row for the bulk upsert
@@ -0,0 +1,113 @@
+"""
+Tests for KeepaClient chunking, token pacing and retries.
+Verifies lists > 100 ASINs are split instead of truncated.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.keepa_client import KeepaClient, KeepaTokenBudget
+
+
+def _response(status_code, data):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.json.return_value = data
+    return resp
+
+
+class FakeAsyncClient:
+    """Stands in for httpx.AsyncClient; records requested chunk sizes."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.chunk_sizes = []
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def get(self, url, params=None):
+        asins = params["asin"].split(",")
+        self.chunk_sizes.append(len(asins))
+        return self.responder(asins, len(self.chunk_sizes))
+
+
+def _ok(asins):
+    return _response(200, {
+        "tokensLeft": 5000,
+        "refillRate": 20,
+        "refillIn": 1000,
+        "tokensConsumed": len(asins),
+        "products": [{"asin": a, "stats": {"current": [1999, 2099]}} for a in asins],
+    })
+
+
+@pytest.fixture
+def keepa_client():
+    with patch.dict("os.environ", {"KEEPA_API_KEY": "test_key"}):
+        yield KeepaClient()
+
+
+@pytest.mark.asyncio
+async def test_batch_over_100_asins_is_chunked_not_truncated(keepa_client):
+    """350 ASINs = 4 requests (100/100/100/50), all ASINs returned."""
+    asins = [f"B{i:09d}" for i in range(350)]
+    fake = FakeAsyncClient(lambda chunk, n: _ok(chunk))
+
+    with patch("app.services.keepa_client.httpx.AsyncClient", fake):
+        results = await keepa_client.get_products_batch(asins)
+
+    assert sorted(fake.chunk_sizes) == [50, 100, 100, 100]
+    assert len(results) == 350
+    assert results["B000000000"]["current"]["amazon_price"] == 19.99
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_retried(keepa_client):
+    """A 503 on one chunk is retried and its ASINs still come back."""
+    asins = [f"B{i:09d}" for i in range(150)]
+
+    def responder(chunk, call_number):
+        if call_number == 1:
+            return _response(503, {})
+        return _ok(chunk)
+
+    fake = FakeAsyncClient(responder)
+
+    with patch("app.services.keepa_client.httpx.AsyncClient", fake), \
+         patch("app.services.keepa_client.asyncio.sleep"):
+        results = await keepa_client.get_products_batch(asins)
+
+    assert len(fake.chunk_sizes) == 3
+    assert len(results) == 150
+
+
+@pytest.mark.asyncio
+async def test_iter_products_batches_yields_per_chunk(keepa_client):
+    """The async iterator yields one result per 100-ASIN chunk."""
+    asins = [f"B{i:09d}" for i in range(250)]
+    fake = FakeAsyncClient(lambda chunk, n: _ok(chunk))
+
+    chunk_sizes = []
+    with patch("app.services.keepa_client.httpx.AsyncClient", fake):
+        async for chunk_result in keepa_client.iter_products_batches(asins):
+            chunk_sizes.append(len(chunk_result))
+
+    assert sorted(chunk_sizes) == [50, 100, 100]
+
+
+def test_token_budget_waits_when_depleted():
+    """Budget asks callers to wait when tokensLeft can't cover a chunk."""
+    budget = KeepaTokenBudget()
+    assert budget.wait_seconds(100) == 0  # Unknown budget - don't block
+
+    budget.update({"tokensLeft": 10, "refillRate": 60, "refillIn": 1000})
+    assert budget.wait_seconds(5) == 0
+    assert budget.wait_seconds(70) > 0
+
+    budget.update({"tokensLeft": 500, "tokensConsumed": 600}, asin_count=100)
+    assert budget.estimate_cost(100) == 600
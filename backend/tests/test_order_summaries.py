@@ -0,0 +1,73 @@
+"""
+Tests for keyset-paginated order summaries.
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.order_summaries import OrderSummaries, encode_cursor, decode_cursor
+from app.services.deal_listing import InvalidCursor
+
+
+def _row(i, supplier_id="sup-1"):
+    return {
+        "id": f"order-{i}",
+        "created_at": f"2025-01-{10 - i:02d}T00:00:00+00:00",
+        "status": "draft",
+        "supplier_id": supplier_id,
+        "supplier_name": "Acme",
+        "supplier_contact_name": None,
+        "supplier_contact_email": "po@acme.test",
+        "items_count": 3,
+        "total_units": 48,
+        "subtotal": 120.0,
+        "total_discount": 5.0,
+        "discounted_subtotal": 115.0,
+    }
+
+
+def test_page_seeks_past_cursor_and_reports_next_page():
+    with patch("app.services.order_summaries.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[_row(1), _row(2), _row(3, supplier_id=None)])
+        page = OrderSummaries().page("user-1", status="draft", cursor=encode_cursor(_row(0)), limit=2)
+
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "list_order_summaries"
+    assert params["p_limit"] == 3 and params["p_status"] == "draft"
+    assert (params["p_after_created_at"], params["p_after_id"]) == (_row(0)["created_at"], "order-0")
+
+    assert [o["id"] for o in page["orders"]] == ["order-1", "order-2"]
+    assert page["has_more"] is True
+    assert decode_cursor(page["next_cursor"]) == (_row(2)["created_at"], "order-2")
+    order = page["orders"][0]
+    assert order["supplier"] == {"id": "sup-1", "name": "Acme", "contact_name": None, "contact_email": "po@acme.test"}
+    assert "supplier_name" not in order and order["discounted_subtotal"] == 115.0
+
+
+def test_last_page_has_no_cursor_and_orders_without_supplier():
+    with patch("app.services.order_summaries.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[_row(1, supplier_id=None)])
+        page = OrderSummaries().page("user-1")
+
+    assert "p_after_id" not in mock_supabase.rpc.call_args.args[1]
+    assert page["next_cursor"] is None and page["has_more"] is False
+    assert page["orders"][0]["supplier"] is None
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_full_size_pages_still_detect_more_and_bad_limits_are_clamped():
+    with patch("app.services.order_summaries.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[_row(1)] * 1001)
+        page = OrderSummaries().page("user-1", limit=1000)
+        assert mock_supabase.rpc.call_args.args[1]["p_limit"] == 1001
+        assert len(page["orders"]) == 1000 and page["has_more"] is True
+
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=[])
+        page = OrderSummaries().page("user-1", limit=0)
+        assert mock_supabase.rpc.call_args.args[1]["p_limit"] == 2
+        assert page == {"orders": [], "next_cursor": None, "has_more": False}
+
+        OrderSummaries().page("user-1", limit=5000)
+        assert mock_supabase.rpc.call_args.args[1]["p_limit"] == 1001
@@ -0,0 +1,117 @@
+"""
+Tests for PO PDF rendering, the PO PDF store and PO reuse on resend.
+"""
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services.po_pdf_renderer import PORenderer, POPdfStore, _templates
+from app.services.po_email_service import POEmailService
+
+
+def _order(lines=50):
+    return {
+        "id": "order-1",
+        "user_id": "user-1",
+        "supplier": {"name": "Acme", "contact_email": "po@acme.test", "phone": None},
+        "items": [
+            {"quantity": i + 1, "unit_cost": "2.50", "product": {"asin": f"B{i:09d}", "title": "Widget " * 20}}
+            for i in range(lines)
+        ],
+    }
+
+
+def test_render_reuses_cached_templates():
+    pytest.importorskip("reportlab")
+    renderer = PORenderer()
+    _templates.cache_clear()
+
+    first = renderer.render(_order(), "PO-2026-10-00001")
+    second = renderer.render(_order(lines=3), "PO-2026-10-00002")
+
+    assert first.startswith(b"%PDF") and second.startswith(b"%PDF")
+    assert len(first) > len(second)
+    assert _templates.cache_info().misses == 1
+
+
+def test_orders_load_only_printed_columns_in_chunks():
+    with patch("app.services.po_pdf_renderer.supabase") as mock_supabase, \
+            patch("app.services.po_pdf_renderer.ORDER_CHUNK_SIZE", 2):
+        in_ = mock_supabase.table.return_value.select.return_value.eq.return_value.in_
+        in_.return_value.execute.return_value = MagicMock(data=[{"id": "o1"}])
+        orders = PORenderer().load_orders("user-1", ["o1", "o2", "o3"])
+
+    columns = mock_supabase.table.return_value.select.call_args.args[0]
+    assert "products(asin, title)" in columns and "products(*)" not in columns
+    assert [len(c.args[1]) for c in in_.call_args_list] == [2, 1]
+    assert list(orders) == ["o1"]
+
+
+def test_store_round_trip(tmp_path):
+    store = POPdfStore(str(tmp_path))
+    assert store.get("user-1", "PO-1") is None
+    path = store.put("user-1", "PO-1", b"%PDF-1.4 test")
+    assert path == str(tmp_path / "user-1" / "PO-1.pdf")
+    assert store.get("user-1", "PO-1") == b"%PDF-1.4 test"
+
+
+@pytest.mark.asyncio
+async def test_resend_reads_stored_pdf_without_rendering():
+    with patch("app.services.po_email_service.supabase") as mock_supabase, \
+            patch("app.services.po_email_service.po_pdf_store") as mock_store:
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
+        query.gte.return_value.order.return_value.limit.return_value.execute.return_value = MagicMock(
+            data=[{"id": "gen-1", "po_number": "PO-2026-10-00001"}]
+        )
+        mock_store.get.return_value = b"%PDF stored"
+
+        service = POEmailService("user-1")
+        service.generate_po_pdf = AsyncMock()
+        service.generate_po_number = AsyncMock()
+        document = await service.get_po_document("order-1", not_before="2026-10-01T00:00:00+00:00")
+
+    assert document == {
+        "po_number": "PO-2026-10-00001",
+        "po_generation_id": "gen-1",
+        "pdf_bytes": b"%PDF stored",
+        "reused": True,
+    }
+    query.gte.assert_called_once_with("created_at", "2026-10-01T00:00:00+00:00")
+    mock_store.get.assert_called_once_with("user-1", "PO-2026-10-00001")
+    service.generate_po_pdf.assert_not_called()
+    service.generate_po_number.assert_not_called()
+
+
+def test_batch_job_gives_each_order_its_own_po_number(tmp_path):
+    from app.tasks.po_documents import render_purchase_orders
+
+    generations = []
+
+    def generate_po_number():
+        # Like the SQL function: MAX(seq) + 1 over the rows inserted so far
+        seq = max((int(g["po_number"].split("-")[-1]) for g in generations), default=0) + 1
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=f"PO-2026-10-{seq:05d}")))
+
+    def insert(row):
+        assert row["po_number"] not in {g["po_number"] for g in generations}, "duplicate PO number"
+        generations.append({**row, "id": f"gen-{len(generations) + 1}"})
+        return MagicMock(execute=MagicMock(return_value=MagicMock(data=[generations[-1]])))
+
+    orders = {f"order-{i}": {**_order(lines=2), "id": f"order-{i}"} for i in range(3)}
+    store = POPdfStore(str(tmp_path))
+    with patch("app.tasks.po_documents.supabase") as task_supabase, \
+            patch("app.services.po_email_service.supabase") as service_supabase, \
+            patch("app.tasks.po_documents.po_pdf_store", store), \
+            patch("app.tasks.po_documents.po_renderer") as renderer:
+        renderer.load_orders.return_value = orders
+        renderer.render.side_effect = lambda order, po_number: f"%PDF {order['id']} {po_number}".encode()
+        service_supabase.rpc.side_effect = lambda name: generate_po_number()
+        task_supabase.table.return_value.select.return_value.eq.return_value.in_.return_value\
+            .execute.return_value = MagicMock(data=[])
+        task_supabase.table.return_value.insert.side_effect = insert
+
+        result = render_purchase_orders("user-1", list(orders))
+
+    assert result["rendered"] == 3 and result["failed"] == []
+    numbers = [g["po_number"] for g in generations]
+    assert len(set(numbers)) == 3
+    for g in generations:
+        assert store.get("user-1", g["po_number"]) == f"%PDF {g['supplier_order_id']} {g['po_number']}".encode()
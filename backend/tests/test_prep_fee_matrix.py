@@ -0,0 +1,119 @@
+"""
+Tests for the in-memory prep center fee matrix.
+"""
+import httpx
+import pytest
+from unittest.mock import patch, MagicMock
+from postgrest import SyncPostgrestClient
+from app.services.prep_fee_matrix import PrepFeeSchedule, PrepFeeMatrix, LOAD_PAGE_SIZE
+
+
+def _fee(fee_id, center_id, service_code, fee_type="per_unit", base_cost=0.0, **extra):
+    return {
+        "id": fee_id,
+        "prep_center_id": center_id,
+        "service_code": service_code,
+        "service_name": extra.pop("service_name", service_code),
+        "fee_type": fee_type,
+        "base_cost": base_cost,
+        **extra,
+    }
+
+
+CENTERS = [
+    {"id": "c1", "company_name": "Budget Prep", "capabilities": {"turnaround_days": 5}},
+    {"id": "c2", "company_name": "Full Service", "capabilities": {"polybagging": True, "hazmat": True, "turnaround_days": 2}},
+]
+
+FEES = [
+    _fee("f1", "c1", "FNSKU", base_cost=0.30, tiered_pricing=[{"min_qty": 0, "max_qty": 99, "cost": 0.25}]),
+    _fee("f2", "c1", None, "per_day", 0.01, service_name="Storage - monthly", days=30),
+    _fee("f3", "c2", "FNSKU", base_cost=0.40),
+    _fee("f4", "c2", "POLYBAG_SMALL", base_cost=0.20),
+    _fee("f5", "c2", "STORAGE", "per_pound", 0.10),
+    _fee("f6", "c2", "HAZMAT", "percentage", percentage_rate=10, minimum_charge=1.0),
+]
+
+PLAIN = {"id": "p1", "category": "Toys", "item_weight": 2}
+POLYBAGGED = {"id": "p2", "category": "Baby Products", "item_weight": 1, "item_length": 4}
+HAZMAT = {"id": "p3", "category": "Toys", "is_hazmat": True, "wholesale_cost": 30, "item_weight": 2}
+
+
+def test_assigns_every_product_in_one_pass():
+    schedule = PrepFeeSchedule(CENTERS, FEES)
+    plain, polybagged, hazmat = schedule.assign([PLAIN, POLYBAGGED, HAZMAT])
+
+    # Tier price for FNSKU plus storage matched by name ("STORAGE" in "Storage - monthly")
+    assert plain["prep_center_id"] == "c1"
+    assert plain["total_prep_cost_per_unit"] == pytest.approx(0.55)
+    assert plain["breakdown"] == {"FNSKU": 0.25, "STORAGE": 0.3}
+    assert [s["fee_id"] for s in plain["required_services"]] == ["f1", "f2"]
+    assert plain["assignment_reason"] == "auto_cheapest"
+
+    # Only c2 can polybag / handle hazmat
+    assert polybagged["prep_center_id"] == "c2"
+    assert polybagged["total_prep_cost_per_unit"] == pytest.approx(0.70)
+    assert hazmat["prep_center_id"] == "c2"
+    assert hazmat["breakdown"]["HAZMAT"] == 3.0
+    assert hazmat["total_prep_cost_per_unit"] == pytest.approx(3.6)
+
+
+def test_strategies_and_unassignable_products():
+    schedule = PrepFeeSchedule(CENTERS, FEES)
+    assert schedule.assign([PLAIN], "fastest")[0]["prep_center_id"] == "c2"
+    assert schedule.assign([PLAIN], "capability")[0]["prep_center_id"] == "c1"
+
+    no_hazmat = PrepFeeSchedule(CENTERS[:1], FEES)
+    assert no_hazmat.assign([PLAIN, HAZMAT]) == [no_hazmat.assign([PLAIN])[0], None]
+    assert PrepFeeSchedule([], []).assign([PLAIN]) == [None]
+
+
+def test_schedule_is_loaded_once_until_invalidated():
+    with patch("app.services.prep_fee_matrix.supabase") as mock_supabase, \
+            patch("app.services.prep_fee_matrix.get_redis_client") as mock_redis:
+        mock_redis.return_value = MagicMock(get=MagicMock(return_value="1"))
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value
+        query.range.return_value.execute.side_effect = [MagicMock(data=CENTERS), MagicMock(data=FEES)] * 2
+
+        matrix = PrepFeeMatrix()
+        first = matrix.assign("user-1", [PLAIN, POLYBAGGED])
+        second = matrix.assign("user-1", [HAZMAT])
+        assert query.range.call_count == 2
+        assert [a["prep_center_id"] for a in first + second] == ["c1", "c2", "c2"]
+
+        matrix.invalidate("user-1")
+        mock_redis.return_value.incr.assert_called_once_with("prep_fees:version:user-1")
+        matrix.assign("user-1", [PLAIN])
+        assert query.range.call_count == 4
+
+
+def test_pages_order_on_one_unique_key_and_failed_loads_are_not_cached():
+    requests = []
+    responses = iter([
+        httpx.Response(200, json=CENTERS),
+        httpx.Response(500, json={"message": "canceling statement due to statement timeout"}),
+        httpx.Response(200, json=CENTERS),
+        httpx.Response(200, json=FEES),
+    ])
+
+    def handler(request):
+        requests.append((
+            request.url.path.rsplit("/", 1)[-1], request.url.params.get_list("order"), request.headers["range"]
+        ))
+        return next(responses)
+
+    rest = SyncPostgrestClient("http://test/rest/v1")
+    rest.session = httpx.Client(base_url="http://test/rest/v1", transport=httpx.MockTransport(handler))
+
+    with patch("app.services.prep_fee_matrix.supabase", MagicMock(table=rest.from_)), \
+            patch("app.services.prep_fee_matrix.get_redis_client", return_value=None):
+        matrix = PrepFeeMatrix()
+        with pytest.raises(Exception, match="statement timeout"):
+            matrix.assign("user-1", [PLAIN])
+        assert "user-1" not in matrix._schedules
+
+        assert matrix.assign("user-1", [PLAIN])[0]["prep_center_id"] == "c1"
+
+    # One order param each - PostgREST applies only one - and full-size pages
+    page = f"0-{LOAD_PAGE_SIZE - 1}"
+    assert requests[2:] == [("prep_centers", ["created_at,id"], page), ("prep_center_fees", ["display_order,id"], page)]
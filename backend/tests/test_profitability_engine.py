@@ -0,0 +1,114 @@
+"""
+Golden-value tests for the columnar profitability engine and its adapters.
+"""
+import pytest
+from app.services.profitability_engine import profitability_engine, to_cents
+from app.services.profit_calculator import calculate_profit
+from app.services.profitability_calculator import ProfitabilityCalculator
+from app.services.cost_calculator import (
+    calculate_inbound_shipping,
+    calculate_landed_cost,
+    calculate_net_profit,
+    calculate_roi,
+)
+
+# sell, fees, buy, pack, prep, weight_lb, sellers, bsr ->
+# landed, profit, break_even, roi, margin, tier, risk
+GOLDEN = [
+    (20.00, 6.50, 5.00, 1, 0.10, 1.0, 3, 5000,
+     5.45, 8.05, 11.95, 147.71, 40.25, "excellent", "low"),
+    (12.99, 5.19, 24.00, 6, 0.10, None, 60, 20000,
+     4.28, 3.52, 9.47, 82.24, 27.1, "excellent", "high"),
+    (24.99, 8.10, 11.00, 1, 0.50, 2.0, 20, 45000,
+     12.20, 4.69, 20.30, 38.44, 18.77, "good", "high"),
+    (15.00, 4.50, 8.40, 1, 0.10, 0.3, 15, 30000,
+     8.61, 1.89, 13.11, 21.95, 12.6, "marginal", "high"),
+    (9.99, 4.20, 6.00, 1, 0.25, 1.5, 5, 90000,
+     6.78, -0.99, 10.98, -14.6, -9.91, "unprofitable", "high"),
+]
+
+
+def test_golden_values_in_one_columnar_pass():
+    columns = list(zip(*GOLDEN))
+    result = profitability_engine.compute(
+        sell_price=columns[0], fees_total=columns[1], buy_cost=columns[2], pack_size=columns[3],
+        prep_cost=columns[4], weight_lb=columns[5], seller_count=columns[6], bsr=columns[7],
+        inbound_rate=0.35,
+    )
+    rows = profitability_engine.rows(result)
+
+    for row, golden in zip(rows, GOLDEN):
+        landed, profit, break_even, roi, margin, tier, risk = golden[8:]
+        assert row["landed_cost"] == landed
+        assert row["net_profit"] == profit
+        assert row["break_even_price"] == break_even
+        assert row["roi"] == roi
+        assert row["margin"] == margin
+        assert row["profit_tier"] == tier
+        assert row["risk_level"] == risk
+
+
+def test_money_is_fixed_point_half_up():
+    # 0.5 lb * $0.35 = 0.175, stored as 0.17499999... in binary
+    assert to_cents([0.175, 2.675, 1.005]).tolist() == [18, 268, 101]
+    assert calculate_inbound_shipping(None, user_rate=0.35) == 0.18
+
+
+def test_invalid_rows_and_supplier_ships_direct():
+    rows = profitability_engine.rows(profitability_engine.compute(
+        sell_price=[None, 20.0, 20.0],
+        fees_total=[3.0, 6.0, 6.0],
+        buy_cost=[5.0, 0, 5.0],
+        supplier_ships_direct=[False, False, True],
+        weight_lb=[1.0, 1.0, 1.0],
+    ))
+
+    assert [r["valid"] for r in rows] == [False, False, True]
+    assert rows[0]["profit_tier"] == "unprofitable"
+    assert rows[2]["inbound_shipping"] == 0.0
+    assert rows[2]["landed_cost"] == 5.10
+
+
+def test_adapters_agree_with_engine():
+    engine = profitability_engine.compute_one(
+        sell_price=24.99, fees_total=8.10, buy_cost=11.00, prep_cost=0.50, inbound_shipping=0.70,
+    )
+
+    legacy = calculate_profit(11.00, 24.99, fba_fee=4.35, referral_fee=3.75, prep_cost=0.50, inbound_shipping=0.70)
+    assert legacy["net_profit"] == engine["net_profit"] == 4.69
+    assert legacy["roi"] == engine["roi"]
+
+    landed = calculate_landed_cost(11.00, 0.70, 0.50)
+    net = calculate_net_profit(24.99, 8.10, landed)
+    assert (landed, net, calculate_roi(net, landed)) == (12.20, 4.69, engine["roi"])
+
+    calc = ProfitabilityCalculator.calculate(
+        {"id": "p1", "sell_price": 24.99, "fees_total": 8.10, "prep_cost_per_unit": 0.50, "item_weight": 2.0},
+        {"buy_cost": 11.00},
+    )
+    assert calc["profit_amount"] == 4.69
+    assert calc["roi_percentage"] == round(engine["roi"], 1)
+
+
+def test_calculate_batch_runs_one_engine_pass():
+    products = [{"id": f"p{i}", "sell_price": 20.0, "fees_total": 6.5} for i in range(3)]
+    sources = [{"product_id": "p0", "buy_cost": 5.0}, {"product_id": "p2", "wholesale_cost": 30.0, "pack_size": 6}]
+
+    results = ProfitabilityCalculator.calculate_batch(products, sources)
+
+    assert [r["product_id"] for r in results] == ["p0", "p1", "p2"]
+    assert results[1]["profit_amount"] is None  # No source -> no buy cost
+    assert results[0]["profit_amount"] == results[2]["profit_amount"]  # $30 / 6-pack = $5 per unit
+
+
+@pytest.mark.parametrize("sell,fees,landed,worst,expected_fees,expected_profit", [
+    (20.0, 6.0, 5.0, 12.0, 3.60, 3.40),  # Fees scale with the worst price
+    (20.0, 0.0, 5.0, 12.0, 3.60, 3.40),  # No fees known -> 30% of price
+])
+def test_worst_case_profit(sell, fees, landed, worst, expected_fees, expected_profit):
+    row = profitability_engine.compute_one(
+        sell_price=sell, fees_total=fees, buy_cost=landed, prep_cost=0, inbound_shipping=0,
+        worst_case_price=worst,
+    )
+    assert row["worst_case_fees"] == expected_fees
+    assert row["worst_case_profit"] == expected_profit
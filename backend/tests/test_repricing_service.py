@@ -0,0 +1,106 @@
+"""
+Tests for API-free re-pricing of stored analyses.
+"""
+import httpx
+from unittest.mock import patch, MagicMock
+from postgrest import SyncPostgrestClient
+from app.services.repricing_service import RepricingService, PAGE_SIZE
+
+SETTINGS = {"inbound_rate_per_lb": 0.35, "default_prep_cost": 0.10}
+
+
+def _row(product_id, buy_cost=5.0, promo=None, direct=False, rate_override=None, prep_override=None,
+         assigned=None, roi=None, avg_90d=None):
+    return {
+        "product_id": product_id,
+        "analysis_id": f"a-{product_id}",
+        "buy_cost": buy_cost,
+        "promo_buy_cost": promo,
+        "supplier_ships_direct": direct,
+        "inbound_rate_override": rate_override,
+        "prep_cost_override": prep_override,
+        "assigned_prep_cost": assigned,
+        "prices": {"30d_avg": None, "90d_avg": avg_90d, "365d_avg": None},
+        "analysis": {
+            "id": f"a-{product_id}", "sell_price": 20.0, "fees_total": 6.5, "item_weight_lb": 1.0,
+            "worst_case_price": 12.0, "roi": roi, "net_profit": None, "total_landed_cost": None,
+        },
+    }
+
+
+def test_compute_matches_stage2_with_prep_precedence():
+    service = RepricingService()
+    rows = [_row("p1"), _row("p2", prep_override=0.5, assigned=0.9), _row("p3", assigned=0.9), _row("p4", buy_cost=None)]
+
+    computed = service.compute(rows, SETTINGS)
+
+    assert computed[0]["total_landed_cost"] == 5.45  # 5.00 + 0.10 prep + 1 lb * 0.35
+    assert computed[0]["net_profit"] == 8.05
+    assert computed[0]["passed_stage2"] is True
+    assert computed[0]["worst_case_fees"] == 3.90  # Fees scale with the 365-day low
+    assert [c["prep_cost"] for c in computed[:3]] == [0.10, 0.50, 0.90]  # Override > assignment > default
+    assert computed[3] is None  # No buy cost - nothing to price
+
+
+def test_setting_changes_only_touch_dependent_products():
+    rows = [_row("p1"), _row("p2", direct=True), _row("p3", rate_override=0.2), _row("p4", assigned=0.4)]
+
+    inbound = RepricingService.affected(rows, ["inbound_rate_per_lb"])
+    prep = RepricingService.affected(rows, ["default_prep_cost"])
+
+    assert [r["product_id"] for r in inbound] == ["p1", "p4"]
+    assert [r["product_id"] for r in prep] == ["p1", "p2", "p3"]
+
+
+def test_recompute_writes_only_changed_rows_in_one_rpc():
+    service = RepricingService()
+    unchanged = _row("p1")
+    unchanged["analysis"].update(service.compute([unchanged], SETTINGS)[0])
+    rows = [unchanged, _row("p2"), _row("p3", promo=4.0)]
+
+    with patch.object(service, "load_rows", return_value=rows), \
+            patch("app.services.repricing_service.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=2)
+        result = service.recompute("user-1", SETTINGS)
+
+    assert result == {"checked": 3, "updated": 2}
+    mock_supabase.rpc.assert_called_once()
+    name, params = mock_supabase.rpc.call_args.args
+    assert name == "reprice_analyses"
+    assert [r["id"] for r in params["p_rows"]] == ["a-p2", "a-p3"]
+    assert params["p_rows"][1]["promo_net_profit"] == 9.05
+    mock_supabase.table.assert_not_called()
+
+
+def test_what_if_reports_roi_shift_without_writing():
+    service = RepricingService()
+    rows = [_row("p1"), _row("p2", avg_90d=16.0)]
+
+    with patch.object(service, "load_rows", return_value=rows), \
+            patch("app.services.repricing_service.supabase") as mock_supabase:
+        cheaper = service.what_if("user-1", SETTINGS, {"inbound_rate_per_lb": 0.0})
+        averaged = service.what_if("user-1", SETTINGS, {}, pricing_mode="90d_avg")
+
+    assert cheaper["products"] == 2
+    assert cheaper["avg_roi_shift"] > 0
+    assert averaged["avg_roi_shift"] < 0  # p2 prices at its lower 90-day average
+    # $4 lower price, fees scale down 6.50 -> 5.20: $2.70 less profit
+    assert averaged["after"]["total_net_profit"] == round(cheaper["before"]["total_net_profit"] - 2.70, 2)
+    mock_supabase.rpc.assert_not_called()
+    mock_supabase.table.assert_not_called()
+
+
+def test_load_products_pages_through_every_analyzed_product():
+    rows = [{"id": f"p{i:05d}", "analysis_id": f"a{i}"} for i in range(PAGE_SIZE + 5)]
+
+    def handler(request):
+        start, end = (int(n) for n in request.headers["range"].split("-"))
+        return httpx.Response(200, json=rows[start:end + 1])
+
+    rest = SyncPostgrestClient("http://test/rest/v1")
+    rest.session = httpx.Client(base_url="http://test/rest/v1", transport=httpx.MockTransport(handler))
+
+    with patch("app.services.repricing_service.supabase", MagicMock(table=rest.from_)):
+        products = RepricingService()._load_products("user-1", None)
+
+    assert products == rows
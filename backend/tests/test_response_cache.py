@@ -0,0 +1,105 @@
+"""
+Tests for the tag-invalidated response cache.
+"""
+import time
+import orjson
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
+from app.services import response_cache
+from app.services.response_cache import cached, invalidate_user, TAG_KEY
+
+
+REDIS = "app.services.response_cache.get_redis_client"
+USER = SimpleNamespace(id="user-1", email="a@example.com")
+
+
+def _client(entry=None, versions=("3",)):
+    client = MagicMock()
+    pipe = MagicMock()
+    client.pipeline.return_value = pipe
+    raw = orjson.dumps(entry).decode() if entry else None
+    pipe.execute.return_value = [raw, list(versions)]
+    return client, pipe
+
+
+def _endpoint(result):
+    compute = AsyncMock(return_value=result)
+
+    @cached(ttl=10, tags=("deals:{user_id}",))
+    async def get_deals(stage=None, limit: int = 50, current_user=None):
+        return await compute(stage=stage, limit=limit)
+
+    return get_deals, compute
+
+
+@pytest.mark.asyncio
+async def test_key_uses_user_id_and_entry_records_tag_versions():
+    get_deals, compute = _endpoint({"deals": [1]})
+    client, pipe = _client()
+    with patch(REDIS, return_value=client):
+        assert await get_deals(stage="new", current_user=USER) == {"deals": [1]}
+
+    compute.assert_awaited_once()
+    pipe.mget.assert_called_once_with([TAG_KEY.format(tag="deals:user-1")])
+    key, value = client.set.call_args.args
+    assert "a@example.com" not in key
+    entry = orjson.loads(value)
+    assert entry["v"] == {"deals": [1]} and entry["t"] == {"deals:user-1": "3"}
+    assert client.set.call_args.kwargs["ex"] == 20  # ttl + stale window
+    client.hincrby.assert_called_once_with("rcache:stats", "get_deals:miss", 1)
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_and_bumped_tag_forces_a_miss():
+    get_deals, compute = _endpoint({"deals": ["new"]})
+    entry = {"v": {"deals": ["old"]}, "t": {"deals:user-1": "3"}, "f": time.time() + 5}
+
+    client, _ = _client(entry, versions=("3",))
+    with patch(REDIS, return_value=client):
+        assert await get_deals(current_user=USER) == {"deals": ["old"]}
+    compute.assert_not_awaited()
+
+    client, _ = _client(entry, versions=("4",))
+    with patch(REDIS, return_value=client):
+        assert await get_deals(current_user=USER) == {"deals": ["new"]}
+    compute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_served_stale_while_one_refresh_runs():
+    get_deals, compute = _endpoint({"deals": ["new"]})
+    entry = {"v": {"deals": ["old"]}, "t": {"deals:user-1": "3"}, "f": time.time() - 1}
+    client, _ = _client(entry)
+    client.set.side_effect = [True, None]  # Refresh lock, then the rebuilt entry
+    client.mget.return_value = ["3"]
+    with patch(REDIS, return_value=client):
+        assert await get_deals(current_user=USER) == {"deals": ["old"]}
+
+        # The running refresh is referenced until it finishes
+        [task] = response_cache._refresh_tasks
+        await task
+        await asyncio.sleep(0)
+        assert not response_cache._refresh_tasks
+
+    lock_call = client.set.call_args_list[0]
+    lock_key = lock_call.args[0]
+    entry_key = client.pipeline.return_value.get.call_args.args[0]
+    # Same arguments on another endpoint must not share the lock
+    assert lock_key == entry_key.replace("rcache:", "rcache:refresh:", 1) and lock_call.kwargs["nx"] is True
+    compute.assert_awaited_once()
+    assert orjson.loads(client.set.call_args.args[1])["v"] == {"deals": ["new"]}
+    client.delete.assert_called_once_with(lock_key)
+    client.hincrby.assert_called_once_with("rcache:stats", "get_deals:stale", 1)
+
+
+def test_invalidate_user_bumps_user_and_entity_tags():
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    with patch(REDIS, return_value=client):
+        invalidate_user("user-1", ["asin:user-1:B0TEST"])
+
+    bumped = [c.args[0] for c in pipe.incr.call_args_list]
+    assert bumped == [TAG_KEY.format(tag="deals:user-1"), TAG_KEY.format(tag="asin:user-1:B0TEST")]
+    pipe.execute.assert_called_once()
@@ -0,0 +1,132 @@
+"""
+Tests for the sales velocity model and cached market intelligence.
+"""
+import math
+import time
+import orjson
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services.sales_velocity_model import (
+    SalesVelocityModel,
+    fit_curves,
+    PRIOR_CURVES,
+    UNITS_PER_DROP,
+    ALL_CATEGORIES,
+    LOAD_PAGE_SIZE,
+)
+from app.services.market_intelligence import MarketIntelligenceService, CACHE_KEY
+
+
+def _observations(category, scale, slope, count=40):
+    rows = []
+    for i in range(count):
+        rank = 500 * (i + 1)
+        units = scale * rank ** slope
+        rows.append({"category": category, "sales_rank": rank, "drops_30": units / UNITS_PER_DROP})
+    return rows
+
+
+def _loaded_model(curves, version=3):
+    model = SalesVelocityModel()
+    model._curves = curves
+    model._version = version
+    model._checked_at = model._loaded_at = time.time()
+    return model
+
+
+def test_fit_recovers_category_curves():
+    rows = _observations("Toys & Games", 80000, -0.7) + _observations("Pet Supplies", 20000, -0.5)
+    rows.append({"category": "Toys & Games", "sales_rank": 1000, "drops_30": 0})  # Ignored
+
+    curves = fit_curves(rows)
+
+    toys = curves["toys & games"]
+    assert toys["slope"] == pytest.approx(-0.7) and math.exp(toys["intercept"]) == pytest.approx(80000)
+    assert toys["samples"] == 40 and toys["r_squared"] == pytest.approx(1.0)
+    assert curves["pet supplies"]["slope"] == pytest.approx(-0.5)
+    assert curves[ALL_CATEGORIES]["samples"] == 80
+    # Too few observations for a curve of its own
+    assert "baby" not in fit_curves(rows + _observations("Baby", 1000, -0.6, count=5))
+
+
+def test_estimate_falls_back_from_category_to_overall_to_priors():
+    model = _loaded_model({"toys & games": (math.log(80000), -0.7), ALL_CATEGORIES: (math.log(30000), -0.6)})
+
+    assert model.estimate_monthly_units(10000, " Toys & Games") == round(80000 * 10000 ** -0.7)
+    assert model.estimate_monthly_units(10000, "Pet Supplies") == round(30000 * 10000 ** -0.6)
+    assert model.estimate_monthly_units(None, "Toys & Games") is None
+
+    priors = _loaded_model({}, version=0)
+    intercept, slope = PRIOR_CURVES["home & kitchen"]
+    assert priors.estimate_monthly_units(5000, "Home & Kitchen") == round(math.exp(intercept) * 5000 ** slope)
+    assert priors.estimate_monthly_units(5000, "Unknown") == priors.estimate_monthly_units(5000, "Grocery & Gourmet Food")
+
+
+def test_training_rows_are_paged_in_asin_order():
+    full_page = _observations("Toys & Games", 80000, -0.7, count=LOAD_PAGE_SIZE)
+    with patch("app.services.sales_velocity_model.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value
+        query.order.return_value.range.return_value.execute.side_effect = [
+            MagicMock(data=full_page), MagicMock(data=full_page[:10])
+        ]
+        rows = SalesVelocityModel()._load_training_rows()
+
+    assert len(rows) == LOAD_PAGE_SIZE + 10
+    query.order.assert_called_with("asin")
+    assert [c.args for c in query.order.return_value.range.call_args_list] == [
+        (0, LOAD_PAGE_SIZE), (LOAD_PAGE_SIZE, 2 * LOAD_PAGE_SIZE)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_market_intelligence_uses_stored_data_and_caches_until_stale():
+    model = _loaded_model({ALL_CATEGORIES: (math.log(30000), -0.6)})
+    fetched = (datetime.utcnow() - timedelta(hours=2)).isoformat()
+    row = {"asin": "B0TEST", "current_sales_rank": 10000, "keepa_drops_30": 40, "keepa_drops_90": 60,
+           "category": "Toys & Games", "keepa_last_fetched": fetched}
+    client = MagicMock()
+    client.get.return_value = None
+    service = MarketIntelligenceService()
+
+    with patch("app.services.market_intelligence.sales_velocity_model", model), \
+            patch("app.services.market_intelligence.get_redis_client", return_value=client), \
+            patch("app.services.market_intelligence.supabase") as mock_supabase, \
+            patch("app.services.market_intelligence.fetch_and_store_keepa_data", new_callable=AsyncMock) as live:
+        mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value \
+            .order.return_value.limit.return_value.execute.return_value = MagicMock(data=[row])
+
+        result = await service.get("B0TEST", "user-1")
+
+        live.assert_not_awaited()
+        assert result["source"] == "stored" and result["model_version"] == 3
+        assert result["est_monthly_sales"] == round(30000 * 10000 ** -0.6)
+        assert result["sales_trend"] == "increasing"
+        key, value = client.set.call_args.args
+        assert key == CACHE_KEY.format(asin="B0TEST")
+        assert 21 * 3600 < client.set.call_args.kwargs["ex"] <= 22 * 3600  # Until the data is 24h old
+
+        client.get.return_value = value
+        assert (await service.get("B0TEST", "user-1"))["source"] == "cache"
+        assert mock_supabase.table.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_market_intelligence_refreshes_stale_data_from_keepa():
+    model = _loaded_model({}, version=0)
+    stale = {"asin": "B0TEST", "current_sales_rank": 9000, "keepa_last_fetched": (datetime.utcnow() - timedelta(days=3)).isoformat()}
+    fresh = {"asin": "B0TEST", "current_sales_rank": 7000, "keepa_last_fetched": datetime.utcnow().isoformat(),
+             "keepa_raw_response": {"products": [{"stats": {"salesRankDrops30": 12, "salesRankDrops90": 36}}]}}
+    client = MagicMock()
+    client.get.return_value = orjson.dumps({"data": {}, "fetched_at": time.time(), "model_version": 2}).decode()
+
+    with patch("app.services.market_intelligence.sales_velocity_model", model), \
+            patch("app.services.market_intelligence.get_redis_client", return_value=client), \
+            patch.object(MarketIntelligenceService, "_stored_row", return_value=stale), \
+            patch("app.services.market_intelligence.fetch_and_store_keepa_data", new_callable=AsyncMock, return_value=fresh) as live:
+        result = await MarketIntelligenceService().get("B0TEST", "user-1")
+
+    # Cached entry from an older model version is ignored
+    live.assert_awaited_once_with("B0TEST", "user-1", force_refresh=True)
+    assert result["source"] == "keepa" and result["sales_rank"] == 7000
+    assert result["drops_30"] == 12 and result["sales_trend"] == "stable"
@@ -0,0 +1,131 @@
+"""
+Tests for SP-API rate adaptation, 429 back-off and catalog fan-out.
+"""
+import time
+import asyncio
+import fakeredis
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services.rate_limiter import TokenBucketRateLimiter
+from app.services.sp_api_client import SPAPIClient
+
+
+@pytest.fixture
+def make_limiter():
+    server = fakeredis.FakeServer()
+
+    def make(name="sp_item_offers", rate=2.0, burst=2, operation="getItemOffers"):
+        with patch(
+            "app.services.rate_limiter.redis.from_url",
+            return_value=fakeredis.FakeRedis(server=server, decode_responses=True),
+        ):
+            return TokenBucketRateLimiter(name, rate=rate, burst=burst, operation=operation)
+
+    return make
+
+
+def test_observed_rate_limit_is_shared_by_every_worker(make_limiter):
+    worker_a, worker_b = make_limiter(), make_limiter()
+
+    worker_a.observe_rate_limit(5.0)
+    assert worker_a.rate == 5.0
+
+    worker_b.get_status()  # Any refill picks up the rate another worker saw
+    assert worker_b.rate == 5.0
+
+    worker_b.observe_rate_limit(0)  # Missing/garbage headers are ignored
+    assert worker_b.rate == 5.0
+
+
+def test_shared_bucket_ignores_rate_headers_and_expired_rate_reverts(make_limiter):
+    shared = make_limiter(name="sp_catalog", operation=None)
+    shared.observe_rate_limit(0.0167)  # e.g. a getOrders response
+    assert shared.rate == 2.0
+
+    limiter = make_limiter(rate=0.5)
+    limiter.observe_rate_limit(5.0)
+    assert limiter.rate == 5.0
+    limiter.redis.delete(limiter.key_rate)  # Observed rate expired
+    limiter.get_status()
+    assert limiter.rate == 0.5
+
+
+def test_bucket_paces_to_the_adapted_rate(make_limiter):
+    limiter = make_limiter(rate=2.0, burst=2)
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) == 0
+    assert limiter._try_acquire(1) == pytest.approx(0.5, abs=0.05)
+
+    limiter.observe_rate_limit(10.0)
+    assert limiter._try_acquire(1) == pytest.approx(0.1, abs=0.05)
+
+
+def test_penalize_makes_every_worker_back_off(make_limiter):
+    worker_a, worker_b = make_limiter(rate=1.0, burst=5), make_limiter(rate=1.0, burst=5)
+    assert worker_b._try_acquire(1) == 0
+
+    worker_a.penalize()  # worker_a got a 429
+
+    assert worker_b._try_acquire(1) == pytest.approx(1.0, abs=0.05)
+    later = time.time() + 3
+    with patch("app.services.rate_limiter.time.time", return_value=later):
+        assert worker_b._try_acquire(1) == 0  # Refilled after the pause
+
+
+def _response(status, rate="1.0", body=None):
+    response = MagicMock(status_code=status, headers={"x-amzn-RateLimit-Limit": rate}, text="")
+    response.json.return_value = body or {}
+    return response
+
+
+@pytest.fixture
+def client():
+    sp = SPAPIClient()
+    sp.app_configured = True
+    sp._get_app_access_token = AsyncMock(return_value="Atza|token")
+    return sp
+
+
+@pytest.mark.asyncio
+async def test_request_adapts_rate_and_backs_off_on_429(client):
+    limiter = MagicMock()
+    limiter.acquire_async = AsyncMock(return_value=True)
+    http = MagicMock()
+    http.request = AsyncMock(side_effect=[_response(429, "1.0"), _response(200, "5.0", {"items": []})])
+
+    with patch("app.services.sp_api_client.get_limiter", return_value=limiter), \
+         patch("app.services.sp_api_client.httpx.AsyncClient") as async_client, \
+         patch("app.services.sp_api_client.asyncio.sleep", new=AsyncMock()) as sleep:
+        async_client.return_value.__aenter__.return_value = http
+        result = await client._request("GET", "/catalog/2022-04-01/items", "ATVPDKIKX0DER", limiter_name="catalog")
+
+    assert result == {"items": []}
+    assert [c.args[0] for c in limiter.observe_rate_limit.call_args_list] == [1.0, 5.0]
+    limiter.penalize.assert_called_once()
+    assert 1.6 <= sleep.await_args.args[0] <= 2.4  # First back-off step, with jitter
+    assert limiter.acquire_async.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_catalog_fan_out_dedupes_caps_concurrency_and_yields_in_completion_order(client):
+    delays = {"B1": 0.1, "B2": 0.01, "B3": 0.03, "B4": 0.0, "B5": 0.02}
+    in_flight, peak = 0, 0
+
+    async def fetch(asin, marketplace_id, included_data):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(delays[asin])
+        in_flight -= 1
+        if asin == "B3":
+            raise RuntimeError("throttled")
+        return {"processed": {"asin": asin}}
+
+    client.get_catalog_item = fetch
+    results = [item async for item in client.iter_catalog_items(["B1", "B2", "B1", "B3", "B4", "B5"], concurrency=2)]
+
+    assert sorted(asin for asin, _ in results) == ["B1", "B2", "B3", "B4", "B5"]
+    assert dict(results)["B3"] is None
+    assert peak == 2
+    # B1 is slow: the other worker drains everything queued behind it first
+    assert [asin for asin, _ in results] == ["B2", "B3", "B4", "B5", "B1"]
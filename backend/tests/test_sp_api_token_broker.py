@@ -0,0 +1,143 @@
+"""
+Tests for the shared LWA token cache and SP-API token rejection handling.
+"""
+import asyncio
+import fakeredis
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.services import sp_api_token_broker
+from app.services.sp_api_token_broker import SPAPITokenBroker
+from app.services.sp_api_client import _is_token_rejected
+from app.services.amazon_oauth import AmazonOAuthService
+
+KEY = SPAPITokenBroker.user_key("user-1", "ATVPDKIKX0DER")
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "test-secret")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    with patch("app.services.sp_api_token_broker.get_redis_client", return_value=client):
+        yield client
+
+
+def _refresher(token="Atza|token-1", delay=0.0):
+    calls = []
+
+    async def refresh():
+        calls.append(token)
+        await asyncio.sleep(delay)
+        return token, 3600
+
+    return refresh, calls
+
+
+@pytest.mark.asyncio
+async def test_local_then_redis_then_refresh(redis_client):
+    refresh, calls = _refresher()
+    worker_a, worker_b = SPAPITokenBroker(), SPAPITokenBroker()
+
+    assert await worker_a.get_token(KEY, refresh, kind="user") == "Atza|token-1"
+    assert await worker_a.get_token(KEY, refresh, kind="user") == "Atza|token-1"
+    # Another process finds it in Redis (encrypted) instead of refreshing
+    assert await worker_b.get_token(KEY, refresh, kind="user") == "Atza|token-1"
+
+    assert calls == ["Atza|token-1"]
+    assert "Atza" not in redis_client.get(KEY)
+    assert worker_a.get_stats()["process"]["user"]["local_hits"] == 1
+    assert worker_b.get_stats()["process"]["user"]["redis_hits"] == 1
+    assert worker_a.get_stats()["shared"]["user"]["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_refresh_once(redis_client):
+    refresh, calls = _refresher(delay=0.3)
+    brokers = [SPAPITokenBroker() for _ in range(5)]
+
+    tokens = await asyncio.gather(*[b.get_token(KEY, refresh, kind="user") for b in brokers])
+
+    assert tokens == ["Atza|token-1"] * 5
+    assert len(calls) == 1
+    assert sum(b.get_stats()["process"]["user"].get("waited_for_refresh", 0) for b in brokers) == 4
+    assert not redis_client.exists(f"{KEY}:lock")
+
+
+@pytest.mark.asyncio
+async def test_waiter_refreshes_itself_if_lock_holder_never_finishes(redis_client):
+    redis_client.set(f"{KEY}:lock", "dead-worker", ex=30)
+    refresh, calls = _refresher()
+
+    with patch.object(sp_api_token_broker, "REFRESH_WAIT_SECONDS", 0.3):
+        token = await SPAPITokenBroker().get_token(KEY, refresh, kind="user")
+
+    assert token == "Atza|token-1" and len(calls) == 1
+    assert redis_client.get(f"{KEY}:lock") == "dead-worker"  # Not ours to release
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_local_and_shared_token(redis_client):
+    broker = SPAPITokenBroker()
+    first, _ = _refresher("Atza|old")
+    await broker.get_token(KEY, first, kind="user")
+
+    broker.invalidate(KEY)
+    assert not redis_client.exists(KEY)
+
+    second, calls = _refresher("Atza|new")
+    assert await broker.get_token(KEY, second, kind="user") == "Atza|new"
+    assert calls == ["Atza|new"]
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_other_processes_local_copies(redis_client):
+    worker_a, worker_b = SPAPITokenBroker(), SPAPITokenBroker()
+    old, _ = _refresher("Atza|old-account")
+    assert await worker_a.get_token(KEY, old, kind="user") == "Atza|old-account"
+
+    worker_b.invalidate(KEY)
+
+    new, calls = _refresher("Atza|new-account")
+    with patch.object(sp_api_token_broker, "GENERATION_CHECK_SECONDS", 0):
+        assert await worker_a.get_token(KEY, new, kind="user") == "Atza|new-account"
+    assert calls == ["Atza|new-account"]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_and_connect_invalidate_the_users_token():
+    with patch("app.services.amazon_oauth.supabase") as mock_supabase, \
+            patch("app.services.amazon_oauth.token_broker") as broker:
+        broker.user_key.side_effect = SPAPITokenBroker.user_key
+        mock_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value = MagicMock(
+            data=[{"marketplace_id": "ATVPDKIKX0DER"}, {"marketplace_id": "A2EUQ1WTGCTBG2"}]
+        )
+        assert await AmazonOAuthService().disconnect("user-1") is True
+
+        invalidated = {c.args[0] for c in broker.invalidate.call_args_list}
+        assert invalidated == {KEY, SPAPITokenBroker.user_key("user-1", "A2EUQ1WTGCTBG2")}
+
+        broker.invalidate.reset_mock()
+        token_response = MagicMock(status_code=200)
+        token_response.json.return_value = {"refresh_token": "Atzr|new-account"}
+        http = MagicMock()
+        http.__aenter__.return_value.post = AsyncMock(return_value=token_response)
+        with patch("app.services.amazon_oauth.httpx.AsyncClient", return_value=http), \
+                patch("app.services.amazon_oauth.encrypt_token", return_value="encrypted"):
+            result = await AmazonOAuthService().exchange_code_for_token("code", "user-1")
+
+        assert result["success"] is True
+        broker.invalidate.assert_called_once_with(KEY)
+
+
+def _response(status, errors=None):
+    response = MagicMock(status_code=status)
+    response.json.return_value = {"errors": errors or []}
+    return response
+
+
+def test_only_token_rejections_invalidate():
+    assert _is_token_rejected(_response(401))
+    assert _is_token_rejected(_response(403, [{"code": "Unauthorized", "message": "Access to requested resource is denied."}]))
+    assert _is_token_rejected(_response(403, [{"code": "InvalidInput", "message": "The access token you provided has expired."}]))
+    assert not _is_token_rejected(_response(403, [{"code": "InvalidInput", "message": "Seller is not registered in marketplace"}]))
+    assert not _is_token_rejected(_response(403))
+    assert not _is_token_rejected(_response(429))
@@ -0,0 +1,91 @@
+"""
+Tests for bulk Telegram deal promotion.
+"""
+import httpx
+from unittest.mock import patch, MagicMock
+from postgrest import SyncPostgrestClient
+from app.services.telegram_deal_promotion import TelegramDealPromoter, PAGE_SIZE
+
+
+def test_promote_uses_one_rpc_for_all_deals():
+    rows = [
+        {"deal_id": "d1", "product_id": "p1", "created": True},
+        {"deal_id": "d2", "product_id": "p2", "created": False},
+        {"deal_id": "d3", "product_id": "p1", "created": True},
+    ]
+    with patch("app.services.telegram_deal_promotion.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.return_value = MagicMock(data=rows)
+        promotion = TelegramDealPromoter().promote("user-1")
+
+    mock_supabase.rpc.assert_called_once_with("promote_telegram_deals", {
+        "p_user_id": "user-1", "p_deal_ids": None, "p_limit": None
+    })
+    mock_supabase.table.assert_not_called()
+    assert promotion == {
+        "deal_to_product": {"d1": "p1", "d2": "p2", "d3": "p1"},
+        "product_ids": ["p1", "p2"],
+        "created": 1,
+    }
+
+
+def test_fallback_inserts_missing_products_and_links_deals_in_bulk():
+    deals = [{"id": f"d{i}", "asin": f"B00000000{i % 3}"} for i in range(6)]
+    tables = {name: MagicMock() for name in ("telegram_deals", "products")}
+
+    deals_query = tables["telegram_deals"].select.return_value.eq.return_value.in_.return_value
+    deals_query.execute.return_value = MagicMock(data=deals)
+    products_query = tables["products"].select.return_value.eq.return_value.in_.return_value.order.return_value
+    products_query.execute.return_value = MagicMock(data=[{"id": "p0", "asin": "B000000000"}])
+    tables["products"].insert.return_value.execute.return_value = MagicMock(data=[
+        {"id": "p1", "asin": "B000000001"}, {"id": "p2", "asin": "B000000002"}
+    ])
+
+    with patch("app.services.telegram_deal_promotion.supabase") as mock_supabase:
+        mock_supabase.rpc.return_value.execute.side_effect = Exception("function promote_telegram_deals does not exist")
+        mock_supabase.table.side_effect = lambda name: tables[name]
+        promotion = TelegramDealPromoter().promote("user-1", deal_ids=[d["id"] for d in deals])
+
+    inserted = tables["products"].insert.call_args.args[0]
+    assert sorted(p["asin"] for p in inserted) == ["B000000001", "B000000002"]
+    tables["products"].insert.assert_called_once()
+
+    upserted = tables["telegram_deals"].upsert.call_args.args[0]
+    assert tables["telegram_deals"].upsert.call_args.kwargs == {"on_conflict": "id"}
+    assert {d["id"]: d["product_id"] for d in upserted} == {
+        "d0": "p0", "d1": "p1", "d2": "p2", "d3": "p0", "d4": "p1", "d5": "p2"
+    }
+    assert all(d["status"] == "analyzing" for d in upserted)
+    assert promotion["product_ids"] == ["p0", "p1", "p2"]
+    assert promotion["created"] == 2
+
+
+def _rest_client(rows, requests):
+    def handler(request):
+        start, end = (int(n) for n in request.headers["range"].split("-"))
+        requests.append(request.url.params.get_list("order"))
+        return httpx.Response(200, json=rows[start:end + 1])
+
+    rest = SyncPostgrestClient("http://test/rest/v1")
+    rest.session = httpx.Client(base_url="http://test/rest/v1", transport=httpx.MockTransport(handler))
+    return MagicMock(table=rest.from_)
+
+
+def test_fallback_pages_all_pending_deals_on_one_unique_order_key():
+    rows = [{"id": f"d{i}", "asin": "B000000001"} for i in range(2 * PAGE_SIZE + 5)]
+    requests = []
+
+    with patch("app.services.telegram_deal_promotion.supabase", _rest_client(rows, requests)):
+        deals = TelegramDealPromoter._load_deals("user-1", None, None)
+
+    assert deals == rows
+    # One order param - PostgREST applies only one, and extracted_at alone isn't unique
+    assert all(order == ["extracted_at,id"] for order in requests)
+
+
+def test_fallback_honours_limit():
+    rows = [{"id": f"d{i}", "asin": "B000000001"} for i in range(PAGE_SIZE)]
+
+    with patch("app.services.telegram_deal_promotion.supabase", _rest_client(rows, [])):
+        deals = TelegramDealPromoter._load_deals("user-1", None, 100)
+
+    assert deals == rows[:100]
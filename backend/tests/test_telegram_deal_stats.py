@@ -0,0 +1,56 @@
+"""
+Tests for the materialized Telegram deal stats.
+"""
+from unittest.mock import patch, MagicMock
+from app.services.telegram_deal_stats import TelegramDealStats
+
+
+def test_stats_read_from_bucket_rows():
+    rows = [
+        {"bucket_type": "all", "bucket": "all", "count": 12},
+        {"bucket_type": "status", "bucket": "pending", "count": 5},
+        {"bucket_type": "status", "bucket": "analyzed", "count": 6},
+        {"bucket_type": "status", "bucket": "error", "count": 1},
+        {"bucket_type": "status", "bucket": "skipped", "count": 0},
+        {"bucket_type": "profitable", "bucket": "profitable", "count": 4},
+        {"bucket_type": "roi", "bucket": "15_30", "count": 2},
+        {"bucket_type": "roi", "bucket": "30_50", "count": 3},
+        {"bucket_type": "roi", "bucket": "100_plus", "count": 1},
+    ]
+    with patch("app.services.telegram_deal_stats.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value
+        query.execute.return_value = MagicMock(data=rows)
+        stats = TelegramDealStats().get("user-1")
+
+    mock_supabase.table.assert_called_once_with("telegram_deal_stats")
+    assert stats["total"] == 12
+    assert (stats["pending"], stats["analyzed"], stats["error"], stats["profitable"]) == (5, 6, 1, 4)
+    assert stats["roi_buckets"] == {"lt_0": 0, "0_15": 0, "15_30": 2, "30_50": 3, "50_100": 0, "100_plus": 1}
+
+
+def test_stats_table_missing_returns_none():
+    with patch("app.services.telegram_deal_stats.supabase") as mock_supabase:
+        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.side_effect = Exception(
+            'relation "telegram_deal_stats" does not exist'
+        )
+        assert TelegramDealStats().get("user-1") is None
+
+
+def test_fallback_count_matches_trigger_buckets():
+    deals = [
+        {"status": "pending", "analysis_id": None, "analyses": None},
+        {"status": "Analyzed", "analysis_id": "a1", "analyses": {"roi": 45}},
+        {"status": "analyzed", "analysis_id": "a2", "analyses": [{"roi": None}]},
+        {"status": "analyzed", "analysis_id": None, "analyses": None},
+        {"status": "error", "analysis_id": None, "analyses": None},
+        {"status": "analyzing", "analysis_id": None, "analyses": None},
+    ]
+    with patch("app.services.telegram_deal_stats.supabase") as mock_supabase:
+        query = mock_supabase.table.return_value.select.return_value.eq.return_value
+        query.execute.return_value = MagicMock(data=deals)
+        stats = TelegramDealStats().count_from_deals("user-1")
+
+    assert (stats["total"], stats["pending"], stats["analyzed"], stats["error"]) == (6, 1, 3, 1)
+    assert stats["profitable"] == 1
+    assert stats["roi_buckets"]["30_50"] == 1 and stats["roi_buckets"]["0_15"] == 1
+    assert sum(stats["roi_buckets"].values()) == 2
@@ -0,0 +1,157 @@
+"""
+Tests for Redis usage metering and its batched flush to Postgres.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import fakeredis
+import httpx
+from postgrest import SyncPostgrestClient
+
+from app.services.stripe_service import StripeWebhookHandler
+from app.services.usage_meter import UsageMeter, DIRTY_KEY, RECORDS_KEY, LIMIT_KEY, LIMIT_TTL, METERED_FEATURES
+
+USER = SimpleNamespace(id="user-1", email="seller@example.com")
+
+
+def _meter(client):
+    meter = UsageMeter()
+    meter._consume_script = MagicMock()
+    meter._seed_script = MagicMock()
+    return meter, patch("app.services.usage_meter.get_redis_client", return_value=client)
+
+
+def test_consume_is_one_script_call_when_seeded():
+    meter, redis_patch = _meter(MagicMock())
+    meter._consume_script.return_value = [1, 7, 100]
+
+    with redis_patch, patch("app.services.usage_meter.supabase") as mock_supabase:
+        result = meter.consume(USER, "analyses_per_month", 5)
+
+    assert result == {"allowed": True, "used": 7, "limit": 100}
+    assert meter._consume_script.call_count == 1
+    mock_supabase.table.assert_not_called()
+    assert json.loads(meter._consume_script.call_args.kwargs["args"][2])["quantity"] == 5
+
+
+def test_consume_seeds_from_postgres_on_miss_then_enforces_limit():
+    client = MagicMock()
+    meter, redis_patch = _meter(client)
+    meter._consume_script.side_effect = [[-1, 0, 0], [0, 10, 10]]
+
+    with redis_patch, patch.object(meter, "_prime") as prime:
+        result = meter.consume(USER, "analyses_per_month")
+
+    prime.assert_called_once_with(client, USER, "analyses_per_month")
+    assert result == {"allowed": False, "used": 10, "limit": 10}
+
+
+def test_consume_without_redis_falls_back():
+    meter, redis_patch = _meter(None)
+    with redis_patch:
+        assert meter.consume(USER, "analyses_per_month") is None
+
+
+def test_plan_change_webhook_drops_the_cached_limit():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    meter = UsageMeter()
+    limit_key = LIMIT_KEY.format(user_id="user-1", feature="analyses_per_month")
+    tier_limits = iter([{"analyses_per_month": 10}, {"analyses_per_month": 500}])
+    subscription = {
+        "id": "sub_1",
+        "status": "active",
+        "items": {"data": [{"price": {"id": "price_pro", "recurring": {"interval": "month"}}}]},
+        "current_period_start": 1735689600,
+        "current_period_end": 1738368000,
+    }
+
+    with patch("app.services.usage_meter.get_redis_client", return_value=client), \
+            patch("app.services.usage_meter.supabase") as mock_supabase, \
+            patch("app.services.stripe_service.supabase") as stripe_supabase, \
+            patch("app.services.usage_meter.usage_meter", meter), \
+            patch("app.services.permissions_service.PermissionsService.get_effective_limits",
+                  side_effect=lambda user: next(tier_limits)):
+        mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value = MagicMock(
+            data=[{"analyses_used_this_period": 10, "last_usage_reset": "2025-01-01T00:00:00+00:00"}]
+        )
+        stripe_supabase.table.return_value.update.return_value.eq.return_value.execute.return_value = MagicMock(
+            data=[{"user_id": "user-1"}]
+        )
+
+        assert meter.consume(USER, "analyses_per_month")["allowed"] is False
+        assert 0 < client.ttl(limit_key) <= LIMIT_TTL
+
+        asyncio.run(StripeWebhookHandler.handle_subscription_updated(subscription))
+        assert not client.exists(limit_key)
+
+        # Upgrade applies to the very next action, not after the limit expires
+        assert meter.consume(USER, "analyses_per_month") == {"allowed": True, "used": 11, "limit": 500}
+
+
+def test_flush_writes_counters_for_their_period_and_requeues_failures():
+    client = MagicMock()
+    client.spop.return_value = ["user-1:analyses_per_month", "user-2:analyses_per_month"]
+    client.hgetall.side_effect = [
+        {"used": "42", "period": "2025-01-01T00:00:00+00:00"},
+        {"used": "3", "period": ""},
+    ]
+    pipe = client.pipeline.return_value
+    pipe.execute.return_value = [[], True]
+
+    query = MagicMock()
+    query.update.return_value = query
+    query.eq.return_value = query
+    query.is_.return_value = query
+    query.execute.side_effect = [MagicMock(), Exception("timeout")]
+
+    meter, redis_patch = _meter(client)
+    with redis_patch, patch("app.services.usage_meter.supabase") as mock_supabase:
+        mock_supabase.table.return_value = query
+        result = meter.flush()
+
+    assert result == {"counters": 1, "records": 0}
+    query.update.assert_any_call({"analyses_used_this_period": 42})
+    query.eq.assert_any_call("last_usage_reset", "2025-01-01T00:00:00+00:00")
+    query.is_.assert_called_once_with("last_usage_reset", "null")
+    client.sadd.assert_called_once_with(DIRTY_KEY, "user-2:analyses_per_month")
+
+
+def test_flush_bulk_inserts_usage_records_in_chunks():
+    client = MagicMock()
+    client.spop.return_value = []
+    records = [json.dumps({"user_id": "user-1", "feature": "analyses_per_month", "quantity": 1})] * 1200
+    client.pipeline.return_value.execute.return_value = [records, True]
+
+    meter, redis_patch = _meter(client)
+    with redis_patch, patch("app.services.usage_meter.supabase") as mock_supabase:
+        result = meter.flush()
+
+    assert result == {"counters": 0, "records": 1200}
+    # 1,200 metered actions = 3 inserts
+    assert mock_supabase.table.return_value.insert.call_count == 3
+    client.rpush.assert_not_called()
+    client.pipeline.return_value.ltrim.assert_called_once_with(RECORDS_KEY, 5000, -1)
+
+
+def test_reconcile_pages_every_metered_subscription():
+    rows = [{"user_id": f"user-{i:04d}", "last_usage_reset": None} for i in range(1500)]
+
+    def handler(request):
+        start, end = (int(n) for n in request.headers["range"].split("-"))
+        assert request.url.params.get_list("order") == ["user_id"]
+        return httpx.Response(200, json=rows[start:end + 1])
+
+    rest = SyncPostgrestClient("http://test/rest/v1")
+    rest.session = httpx.Client(base_url="http://test/rest/v1", transport=httpx.MockTransport(handler))
+    client = MagicMock()
+    client.info.return_value = {"run_id": "run-2"}
+    meter, redis_patch = _meter(client)
+
+    with redis_patch, patch("app.services.usage_meter.supabase", MagicMock(table=rest.from_)):
+        checked = meter.reconcile(force=True)
+
+    assert checked == len(rows) * len(METERED_FEATURES)
+    assert meter._seed_script.call_count == checked
+    client.set.assert_called_once()
@@ -0,0 +1,172 @@
+"""
+Tests for the batch analysis work queue: pull sizing, leases and finalize.
+"""
+import time
+import threading
+import fakeredis
+import pytest
+from unittest.mock import patch
+from app.tasks.work_queue import (
+    adaptive_pull_size, JobWorkQueue, MICRO_BATCH_SIZE, MAX_PULL_SIZE, PULL_LEASE_SECONDS, ACTIVE_JOBS_KEY
+)
+
+
+@pytest.fixture
+def server():
+    fake_server = fakeredis.FakeServer()
+    with patch(
+        "app.tasks.work_queue.redis.from_url",
+        side_effect=lambda *args, **kwargs: fakeredis.FakeRedis(server=fake_server, decode_responses=True),
+    ):
+        yield fake_server
+
+
+def _products(n):
+    return [{"id": f"p{i}", "asin": f"B{i:09d}"} for i in range(n)]
+
+
+def test_pull_size_is_whole_micro_batches_within_one_keepa_group():
+    for latency in (None, 0.01, 0.2, 0.7, 5.0):
+        size = adaptive_pull_size(latency, 10_000, 8)
+        assert size % MICRO_BATCH_SIZE == 0
+        assert MICRO_BATCH_SIZE <= size <= MAX_PULL_SIZE
+
+
+def test_pull_size_shrinks_as_latency_grows():
+    fast = adaptive_pull_size(0.1, 10_000, 8, target_seconds=20)
+    slow = adaptive_pull_size(0.5, 10_000, 8, target_seconds=20)
+    assert fast == MAX_PULL_SIZE
+    assert slow == 40
+
+
+def test_first_pull_and_tail_are_small():
+    assert adaptive_pull_size(None, 10_000, 8) == MICRO_BATCH_SIZE
+    # 100 left across 8 workers - don't hand one worker the whole tail
+    assert adaptive_pull_size(0.01, 100, 8) == MICRO_BATCH_SIZE
+
+
+def test_pulls_hand_out_every_product_once_in_order(server):
+    queue = JobWorkQueue("job-1", workers=2)
+    assert queue.enqueue(_products(95), "user-1") == 5
+    assert JobWorkQueue.active_jobs() == {"job-1": "user-1"}
+
+    pulled = []
+    while True:
+        pull_number, products = queue.pull()
+        if not products:
+            break
+        assert len(products) % MICRO_BATCH_SIZE == 0 or len(pulled) + len(products) == 95
+        pulled.extend(products)
+        assert queue.status()["leases"] >= 1
+
+    assert [p["id"] for p in pulled] == [f"p{i}" for i in range(95)]
+    assert queue.status() == {"remaining": 95, "queued_batches": 0, "leases": 5}
+
+
+def test_complete_counts_down_and_only_the_last_completion_finishes(server):
+    queue = JobWorkQueue("job-1", workers=1)
+    queue.enqueue(_products(40), "user-1")
+
+    first, first_products = queue.pull()
+    second, second_products = queue.pull()
+    assert first != second
+    assert queue.complete(first, len(first_products)) == 20
+    assert queue.complete(second, len(second_products)) == 0
+    assert queue.status()["leases"] == 0
+
+    # Completing the same pull twice doesn't count it twice
+    assert queue.complete(second, len(second_products)) == 0
+
+
+def test_expired_lease_is_requeued_and_counted_once(server):
+    queue = JobWorkQueue("job-1", workers=1)
+    queue.enqueue(_products(40), "user-1")
+
+    dead_pull, dead_products = queue.pull()  # This worker dies
+    assert queue.requeue_expired() == 0  # Lease still valid
+
+    assert queue.requeue_expired(now=time.time() + PULL_LEASE_SECONDS + 1) == 20
+    retry_pull, retry_products = queue.pull()
+    assert retry_products == dead_products  # Back at the front of the queue
+    last_pull, last_products = queue.pull()
+
+    assert queue.complete(retry_pull, 20) == 20
+    # The original worker finishing late doesn't count the products again
+    assert queue.complete(dead_pull, 20) == 20
+    assert queue.complete(last_pull, len(last_products)) == 0
+
+
+def test_slow_pull_keeps_its_lease_while_processing(server):
+    queue = JobWorkQueue("job-1", workers=1)
+    queue.enqueue(_products(40), "user-1")
+    pull_number, _ = queue.pull()
+    first_deadline = queue.redis.zscore(queue.key_leases, pull_number)
+
+    with patch("app.tasks.work_queue.LEASE_RENEW_SECONDS", 0.01):
+        with queue.keep_leased(pull_number):
+            time.sleep(0.05)
+
+    # Renewed, so it isn't requeued at the original deadline
+    assert queue.redis.zscore(queue.key_leases, pull_number) > first_deadline
+    assert queue.requeue_expired(now=first_deadline + 0.001) == 0
+    assert queue.complete(pull_number, 20) == 20
+
+    # A lease that already expired and was requeued can't be renewed back
+    lost_pull, _ = queue.pull()
+    queue.requeue_expired(now=time.time() + PULL_LEASE_SECONDS + 1)
+    assert queue.renew(lost_pull) is False
+    assert queue.status()["leases"] == 0
+
+
+def test_exactly_one_finalize_fires_across_concurrent_workers(server):
+    JobWorkQueue("job-1").enqueue(_products(400), "user-1")
+    finalizes = []
+
+    def worker():
+        queue = JobWorkQueue("job-1", workers=8)
+        while True:
+            pull_number, products = queue.pull()
+            if not products:
+                return
+            if queue.complete(pull_number, len(products)) <= 0 and queue.claim_finalize():
+                finalizes.append(pull_number)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(finalizes) == 1
+    assert JobWorkQueue("job-1").claim_finalize() is False
+
+
+def test_cleanup_removes_job_from_watchdog(server):
+    queue = JobWorkQueue("job-1")
+    queue.enqueue(_products(20), "user-1")
+    queue.cleanup()
+
+    assert queue.status() is None
+    assert not fakeredis.FakeRedis(server=server).exists(ACTIVE_JOBS_KEY)
+
+
+def test_sweep_restarts_dead_pulls_and_finalizes_orphaned_jobs(server):
+    from app.tasks import analysis
+
+    stalled = JobWorkQueue("job-stalled")
+    stalled.enqueue(_products(20), "user-1")
+    stalled.pull()  # Worker dies holding the only pull
+    stalled.redis.zadd(stalled.key_leases, {"1": 0})  # Lease long expired
+
+    orphaned = JobWorkQueue("job-orphaned")
+    orphaned.enqueue(_products(20), "user-2")
+    pull_number, products = orphaned.pull()
+    orphaned.complete(pull_number, len(products))  # Worker dies before claim_finalize
+
+    with patch.object(analysis.analysis_worker, "delay") as start_worker, \
+         patch.object(analysis.finalize_batch, "delay") as finalize:
+        analysis.sweep_work_queues()
+
+    start_worker.assert_called_once_with("job-stalled", "user-1", -1)
+    finalize.assert_called_once_with(None, "job-orphaned")
+    assert stalled.status() == {"remaining": 20, "queued_batches": 1, "leases": 0}
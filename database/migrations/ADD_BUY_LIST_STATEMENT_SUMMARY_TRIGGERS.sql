@@ -0,0 +1,79 @@
+-- ============================================================================
+-- Statement-level buy list summaries
+-- ============================================================================
+-- update_buy_list_summary() ran FOR EACH ROW and re-aggregated the whole
+-- list with six subqueries per inserted/updated/deleted item. With items
+-- now written in one bulk statement (BuyListBuilder), a 300-item insert
+-- would re-aggregate the list 300 times.
+--
+-- The triggers below run once per statement, read the affected buy_list_ids
+-- from the transition tables and recompute each list's totals in a single
+-- aggregate, inside the same transaction as the item write.
+--
+-- Run after ADD_BUY_LISTS_TABLES.sql.
+-- ============================================================================
+
+CREATE OR REPLACE FUNCTION refresh_buy_list_summaries(p_buy_list_ids UUID[])
+RETURNS VOID AS $$
+  UPDATE buy_lists b
+  SET
+    total_products = s.total_products,
+    total_units = s.total_units,
+    total_cost = s.total_cost,
+    expected_revenue = s.expected_revenue,
+    expected_profit = s.expected_profit,
+    expected_roi = CASE WHEN s.total_cost > 0 THEN s.expected_profit / s.total_cost * 100 ELSE 0 END,
+    updated_at = NOW()
+  FROM (
+    SELECT
+      bl.id,
+      COUNT(DISTINCT i.product_id) AS total_products,
+      COALESCE(SUM(i.quantity), 0) AS total_units,
+      COALESCE(SUM(i.total_cost), 0) AS total_cost,
+      COALESCE(SUM(i.quantity * i.expected_sell_price), 0) AS expected_revenue,
+      COALESCE(SUM(i.expected_profit), 0) AS expected_profit
+    FROM unnest(p_buy_list_ids) AS bl(id)
+    LEFT JOIN buy_list_items i ON i.buy_list_id = bl.id
+    GROUP BY bl.id
+  ) s
+  WHERE b.id = s.id;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION buy_list_items_refresh_summaries()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM refresh_buy_list_summaries(ARRAY(SELECT DISTINCT buy_list_id FROM new_items));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM refresh_buy_list_summaries(ARRAY(SELECT DISTINCT buy_list_id FROM old_items));
+  ELSE
+    PERFORM refresh_buy_list_summaries(ARRAY(
+      SELECT buy_list_id FROM new_items UNION SELECT buy_list_id FROM old_items
+    ));
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_buy_list_summary_insert ON buy_list_items;
+DROP TRIGGER IF EXISTS trigger_update_buy_list_summary_update ON buy_list_items;
+DROP TRIGGER IF EXISTS trigger_update_buy_list_summary_delete ON buy_list_items;
+DROP FUNCTION IF EXISTS update_buy_list_summary();
+
+DROP TRIGGER IF EXISTS trg_buy_list_items_summary_insert ON buy_list_items;
+CREATE TRIGGER trg_buy_list_items_summary_insert
+  AFTER INSERT ON buy_list_items
+  REFERENCING NEW TABLE AS new_items
+  FOR EACH STATEMENT EXECUTE FUNCTION buy_list_items_refresh_summaries();
+
+DROP TRIGGER IF EXISTS trg_buy_list_items_summary_update ON buy_list_items;
+CREATE TRIGGER trg_buy_list_items_summary_update
+  AFTER UPDATE ON buy_list_items
+  REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+  FOR EACH STATEMENT EXECUTE FUNCTION buy_list_items_refresh_summaries();
+
+DROP TRIGGER IF EXISTS trg_buy_list_items_summary_delete ON buy_list_items;
+CREATE TRIGGER trg_buy_list_items_summary_delete
+  AFTER DELETE ON buy_list_items
+  REFERENCING OLD TABLE AS old_items
+  FOR EACH STATEMENT EXECUTE FUNCTION buy_list_items_refresh_summaries();
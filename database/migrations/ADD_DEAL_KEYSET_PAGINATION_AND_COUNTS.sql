@@ -0,0 +1,488 @@
+-- ============================================================================
+-- Keyset-paginated deal listing + materialized filter counts
+-- ============================================================================
+-- filter_product_deals pages with LIMIT/OFFSET, so page N reads and throws
+-- away N * limit rows, and the UI filter counts come from get_asin_stats /
+-- a full product_deals scan on every request.
+--
+-- This migration adds:
+-- 1. product_sources.user_id (denormalized from products, set by trigger) and
+--    an index on (user_id, created_at, id) for the default deal ordering
+-- 2. list_product_deals: same rows as filter_product_deals, paged by a
+--    (sort key, deal_id) cursor instead of an offset
+-- 3. deal_filter_counts: per-user deal counts by stage, source and ASIN
+--    status, kept current by triggers on product_sources and products
+--
+-- Run after ADD_PACK_AND_SALES_FIELDS_TO_VIEW.sql. filter_product_deals and
+-- get_asin_stats are left in place for offset-based callers.
+-- ============================================================================
+
+-- ============================================================================
+-- 1. product_sources.user_id
+-- ============================================================================
+
+ALTER TABLE product_sources ADD COLUMN IF NOT EXISTS user_id UUID;
+
+UPDATE product_sources ps
+SET user_id = p.user_id
+FROM products p
+WHERE p.id = ps.product_id
+  AND ps.user_id IS DISTINCT FROM p.user_id;
+
+CREATE OR REPLACE FUNCTION product_sources_set_user_id()
+RETURNS TRIGGER AS $$
+BEGIN
+  SELECT p.user_id INTO NEW.user_id FROM products p WHERE p.id = NEW.product_id;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_sources_set_user_id ON product_sources;
+CREATE TRIGGER trg_product_sources_set_user_id
+  BEFORE INSERT OR UPDATE OF product_id ON product_sources
+  FOR EACH ROW EXECUTE FUNCTION product_sources_set_user_id();
+
+-- Keyset on created_at needs a non-null key (the column already defaults to NOW())
+UPDATE product_sources SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE product_sources ALTER COLUMN created_at SET NOT NULL;
+
+-- Newest-first deal listing: the first page and every following page is an
+-- index range scan of (limit) rows
+CREATE INDEX IF NOT EXISTS idx_product_sources_user_keyset
+ON product_sources(user_id, created_at DESC, id DESC)
+WHERE is_active = TRUE;
+
+-- ============================================================================
+-- 2. list_product_deals (keyset pagination)
+-- ============================================================================
+-- p_sort: deal_created_at (default), roi, profit, sell_price, bsr,
+--         fba_seller_count, seller_count, asin, title
+-- p_after_value / p_after_id: sort_value and deal_id of the last row of the
+--         previous page (NULL for the first page)
+--
+-- NULL sort keys (e.g. ROI before analysis) sort last in either direction.
+-- Only deal_created_at is backed by an index; the computed keys still need a
+-- top-N sort over the user's deals, but no page has to skip past earlier ones.
+
+DROP FUNCTION IF EXISTS list_product_deals(
+    UUID, TEXT, TEXT, TEXT, UUID, TEXT, DECIMAL, DECIMAL, DECIMAL, INTEGER, INTEGER, BOOLEAN, TEXT,
+    TEXT, BOOLEAN, TEXT, UUID, INTEGER
+);
+
+CREATE OR REPLACE FUNCTION list_product_deals(
+    p_user_id UUID,
+    p_asin_status TEXT DEFAULT NULL,
+    p_stage TEXT DEFAULT NULL,
+    p_source TEXT DEFAULT NULL,
+    p_supplier_id UUID DEFAULT NULL,
+    p_category TEXT DEFAULT NULL,
+    p_min_roi DECIMAL DEFAULT NULL,
+    p_max_roi DECIMAL DEFAULT NULL,
+    p_min_profit DECIMAL DEFAULT NULL,
+    p_max_bsr INTEGER DEFAULT NULL,
+    p_max_fba_sellers INTEGER DEFAULT NULL,
+    p_amazon_sells BOOLEAN DEFAULT NULL,
+    p_search TEXT DEFAULT NULL,
+    p_sort TEXT DEFAULT 'deal_created_at',
+    p_sort_desc BOOLEAN DEFAULT TRUE,
+    p_after_value TEXT DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    -- Match filter_product_deals
+    deal_id UUID,
+    product_id UUID,
+    user_id UUID,
+    asin TEXT,
+    title TEXT,
+    image_url TEXT,
+    sell_price DECIMAL,
+    fees_total DECIMAL,
+    bsr INTEGER,
+    seller_count INTEGER,
+    fba_seller_count INTEGER,
+    amazon_sells BOOLEAN,
+    product_status TEXT,
+    analysis_id UUID,
+    supplier_id UUID,
+    supplier_name TEXT,
+    buy_cost DECIMAL,
+    moq INTEGER,
+    pack_size INTEGER,
+    wholesale_cost DECIMAL,
+    percent_off DECIMAL,
+    promo_qty INTEGER,
+    source TEXT,
+    source_detail TEXT,
+    stage TEXT,
+    notes TEXT,
+    is_active BOOLEAN,
+    deal_created_at TIMESTAMPTZ,
+    deal_updated_at TIMESTAMPTZ,
+    profit DECIMAL,
+    roi DECIMAL,
+    total_investment DECIMAL,
+    upc TEXT,
+    asin_status TEXT,
+    -- Cursor for the next page (with deal_id)
+    sort_value TEXT
+) AS $$
+DECLARE
+  v_sort_column TEXT;
+  v_sort_type TEXT;
+  v_direction TEXT := CASE WHEN p_sort_desc THEN 'DESC' ELSE 'ASC' END;
+  v_compare TEXT := CASE WHEN p_sort_desc THEN '<' ELSE '>' END;
+  v_after TEXT;
+BEGIN
+  -- Whitelisted sort keys and the type the cursor value is cast back to
+  SELECT k.col, k.typ INTO v_sort_column, v_sort_type
+  FROM (VALUES
+    ('deal_created_at', 'TIMESTAMPTZ'),
+    ('roi', 'NUMERIC'),
+    ('profit', 'NUMERIC'),
+    ('sell_price', 'NUMERIC'),
+    ('bsr', 'INTEGER'),
+    ('fba_seller_count', 'INTEGER'),
+    ('seller_count', 'INTEGER'),
+    ('asin', 'TEXT'),
+    ('title', 'TEXT')
+  ) AS k(col, typ)
+  WHERE k.col = p_sort;
+
+  IF v_sort_column IS NULL THEN
+    v_sort_column := 'deal_created_at';
+    v_sort_type := 'TIMESTAMPTZ';
+  END IF;
+
+  IF p_after_id IS NULL THEN
+    v_after := 'TRUE';
+  ELSIF v_sort_column = 'deal_created_at' THEN
+    -- NOT NULL key: a plain row comparison the keyset index can seek to
+    v_after := format('(d.deal_created_at, d.deal_id) %s ($15::TIMESTAMPTZ, $16)', v_compare);
+  ELSIF p_after_value IS NULL THEN
+    -- Already into the NULL tail
+    v_after := format('d.%1$I IS NULL AND d.deal_id %2$s $16', v_sort_column, v_compare);
+  ELSE
+    v_after := format(
+      '((d.%1$I, d.deal_id) %2$s ($15::%3$s, $16) OR d.%1$I IS NULL)',
+      v_sort_column, v_compare, v_sort_type
+    );
+  END IF;
+
+  RETURN QUERY EXECUTE format($query$
+    SELECT d.*, d.%1$I::TEXT AS sort_value
+    FROM (
+      SELECT
+        ps.id AS deal_id,
+        p.id AS product_id,
+        p.user_id,
+        p.asin,
+        p.title,
+        p.image_url,
+        p.sell_price,
+        p.fees_total,
+        p.bsr,
+        p.seller_count,
+        p.fba_seller_count,
+        p.amazon_sells,
+        p.status AS product_status,
+        p.analysis_id,
+        ps.supplier_id,
+        s.name AS supplier_name,
+        ps.buy_cost,
+        ps.moq,
+        ps.pack_size,
+        ps.wholesale_cost,
+        ps.percent_off,
+        ps.promo_qty,
+        ps.source,
+        ps.source_detail,
+        ps.stage,
+        ps.notes,
+        ps.is_active,
+        ps.created_at AS deal_created_at,
+        ps.updated_at AS deal_updated_at,
+        CASE
+          WHEN ps.buy_cost > 0 AND p.sell_price > 0 THEN
+            ROUND(p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost, 2)
+          ELSE NULL
+        END AS profit,
+        CASE
+          WHEN ps.buy_cost > 0 AND p.sell_price > 0 THEN
+            ROUND(((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100, 1)
+          ELSE NULL
+        END AS roi,
+        CASE
+          WHEN ps.buy_cost > 0 THEN ROUND(ps.buy_cost * ps.moq, 2)
+          ELSE NULL
+        END AS total_investment,
+        p.upc,
+        CASE
+          WHEN p.asin IS NOT NULL
+            AND p.asin != ''
+            AND p.asin NOT LIKE 'PENDING_%%'
+            AND p.asin NOT LIKE 'Unknown%%' THEN 'found'
+          WHEN p.status = 'needs_selection' THEN 'multiple_found'
+          WHEN (p.upc IS NOT NULL AND p.upc != '') THEN 'not_found'
+          ELSE 'manual'
+        END AS asin_status
+      FROM product_sources ps
+      JOIN products p ON p.id = ps.product_id
+      LEFT JOIN suppliers s ON s.id = ps.supplier_id
+      WHERE ps.user_id = $1
+        AND ps.is_active = TRUE
+        AND (
+          $2::TEXT IS NULL
+          OR ($2 = 'asin_found'
+              AND p.asin IS NOT NULL AND p.asin != ''
+              AND p.asin NOT LIKE 'PENDING_%%' AND p.asin NOT LIKE 'Unknown%%')
+          OR ($2 = 'needs_selection' AND p.status = 'needs_selection')
+          OR ($2 = 'needs_asin'
+              AND p.upc IS NOT NULL AND p.upc != ''
+              AND (p.asin IS NULL OR p.asin = '' OR p.asin LIKE 'PENDING_%%' OR p.asin LIKE 'Unknown%%'))
+          OR ($2 = 'manual_entry'
+              AND (p.upc IS NULL OR p.upc = '')
+              AND (p.asin IS NULL OR p.asin = '' OR p.asin LIKE 'PENDING_%%' OR p.asin LIKE 'Unknown%%'))
+        )
+        AND ($3::TEXT IS NULL OR ps.stage = $3)
+        AND ($4::TEXT IS NULL OR ps.source = $4)
+        AND ($5::UUID IS NULL OR ps.supplier_id = $5)
+        AND ($6::TEXT IS NULL OR p.category = $6)
+        AND ($7::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND ((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100 >= $7))
+        AND ($8::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND ((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100 <= $8))
+        AND ($9::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND (p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) >= $9))
+        AND ($10::INTEGER IS NULL OR p.bsr <= $10)
+        AND ($11::INTEGER IS NULL OR p.fba_seller_count <= $11)
+        AND ($12::BOOLEAN IS NULL OR p.amazon_sells = $12)
+        AND (
+          $13::TEXT IS NULL
+          OR p.asin ILIKE '%%' || $13 || '%%'
+          OR p.upc ILIKE '%%' || $13 || '%%'
+          OR p.title ILIKE '%%' || $13 || '%%'
+        )
+    ) d
+    WHERE %3$s
+    ORDER BY d.%1$I %2$s NULLS LAST, d.deal_id %2$s
+    LIMIT $14
+  $query$, v_sort_column, v_direction, v_after)
+  USING
+    p_user_id, p_asin_status, p_stage, p_source, p_supplier_id, p_category,
+    p_min_roi, p_max_roi, p_min_profit, p_max_bsr, p_max_fba_sellers, p_amazon_sells, p_search,
+    p_limit, p_after_value, p_after_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT EXECUTE ON FUNCTION list_product_deals TO authenticated;
+GRANT EXECUTE ON FUNCTION list_product_deals TO anon;
+
+COMMENT ON FUNCTION list_product_deals IS 'Deals for a user with filter_product_deals filters, keyset-paginated on (sort key, deal_id)';
+
+-- ============================================================================
+-- 3. deal_filter_counts (materialized UI filter counts)
+-- ============================================================================
+-- One row per (user, bucket). bucket_type is 'all', 'stage', 'source' or
+-- 'asin_status'. Counts are of active deals - the rows the listing shows.
+-- asin_status buckets overlap the same way the filters do (a needs_selection
+-- product with a UPC is also needs_asin).
+
+CREATE TABLE IF NOT EXISTS deal_filter_counts (
+    user_id UUID NOT NULL,
+    bucket_type TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, bucket_type, bucket)
+);
+
+ALTER TABLE deal_filter_counts ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own deal counts" ON deal_filter_counts;
+CREATE POLICY "Users can view own deal counts" ON deal_filter_counts
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Buckets one deal counts towards. Stage follows GET /products/stats: a deal
+-- still in 'new' shows under analyzing / reviewed by its product status.
+CREATE OR REPLACE FUNCTION deal_count_buckets(
+    p_stage TEXT,
+    p_source TEXT,
+    p_product_status TEXT,
+    p_asin TEXT,
+    p_upc TEXT
+)
+RETURNS TABLE (bucket_type TEXT, bucket TEXT) AS $$
+DECLARE
+  v_has_asin BOOLEAN := p_asin IS NOT NULL AND p_asin != ''
+    AND p_asin NOT LIKE 'PENDING_%' AND p_asin NOT LIKE 'Unknown%';
+  v_has_upc BOOLEAN := p_upc IS NOT NULL AND p_upc != '';
+  v_stage TEXT := COALESCE(NULLIF(p_stage, ''), 'new');
+BEGIN
+  IF v_stage = 'new' THEN
+    v_stage := CASE p_product_status
+      WHEN 'analyzing' THEN 'analyzing'
+      WHEN 'analyzed' THEN 'reviewed'
+      ELSE 'new'
+    END;
+  END IF;
+
+  bucket_type := 'all'; bucket := 'all'; RETURN NEXT;
+  bucket_type := 'stage'; bucket := v_stage; RETURN NEXT;
+  bucket_type := 'source'; bucket := COALESCE(NULLIF(p_source, ''), 'manual'); RETURN NEXT;
+
+  bucket_type := 'asin_status';
+  IF v_has_asin THEN
+    bucket := 'asin_found'; RETURN NEXT;
+  END IF;
+  IF p_product_status = 'needs_selection' THEN
+    bucket := 'needs_selection'; RETURN NEXT;
+  END IF;
+  IF NOT v_has_asin AND v_has_upc THEN
+    bucket := 'needs_asin'; RETURN NEXT;
+  END IF;
+  IF NOT v_has_asin AND NOT v_has_upc THEN
+    bucket := 'manual_entry'; RETURN NEXT;
+  END IF;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION bump_deal_filter_counts(
+    p_user_id UUID,
+    p_stage TEXT,
+    p_source TEXT,
+    p_product_status TEXT,
+    p_asin TEXT,
+    p_upc TEXT,
+    p_delta BIGINT
+)
+RETURNS VOID AS $$
+BEGIN
+  IF p_user_id IS NULL OR p_delta = 0 THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO deal_filter_counts (user_id, bucket_type, bucket, count, updated_at)
+  SELECT p_user_id, b.bucket_type, b.bucket, p_delta, NOW()
+  FROM deal_count_buckets(p_stage, p_source, p_product_status, p_asin, p_upc) b
+  ON CONFLICT (user_id, bucket_type, bucket)
+  DO UPDATE SET count = deal_filter_counts.count + EXCLUDED.count, updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deal added, removed, (de)activated or moved between stage / source
+CREATE OR REPLACE FUNCTION product_sources_deal_counts()
+RETURNS TRIGGER AS $$
+DECLARE
+  p RECORD;
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_active IS TRUE THEN
+    SELECT user_id, status, asin, upc INTO p FROM products WHERE id = OLD.product_id;
+    -- Not found: the product is being deleted and its trigger already subtracted
+    IF FOUND THEN
+      PERFORM bump_deal_filter_counts(p.user_id, OLD.stage, OLD.source, p.status, p.asin, p.upc, -1);
+    END IF;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_active IS TRUE THEN
+    SELECT user_id, status, asin, upc INTO p FROM products WHERE id = NEW.product_id;
+    IF FOUND THEN
+      PERFORM bump_deal_filter_counts(p.user_id, NEW.stage, NEW.source, p.status, p.asin, p.upc, 1);
+    END IF;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_product_sources_deal_counts ON product_sources;
+CREATE TRIGGER trg_product_sources_deal_counts
+  AFTER INSERT OR DELETE ON product_sources
+  FOR EACH ROW EXECUTE FUNCTION product_sources_deal_counts();
+
+DROP TRIGGER IF EXISTS trg_product_sources_deal_counts_update ON product_sources;
+CREATE TRIGGER trg_product_sources_deal_counts_update
+  AFTER UPDATE OF is_active, stage, source, product_id ON product_sources
+  FOR EACH ROW
+  WHEN (
+    OLD.is_active IS DISTINCT FROM NEW.is_active
+    OR OLD.stage IS DISTINCT FROM NEW.stage
+    OR OLD.source IS DISTINCT FROM NEW.source
+    OR OLD.product_id IS DISTINCT FROM NEW.product_id
+  )
+  EXECUTE FUNCTION product_sources_deal_counts();
+
+-- Product ASIN / UPC / status changes move all of its active deals at once.
+-- Deletes run BEFORE so the cascaded product_sources rows are still visible.
+CREATE OR REPLACE FUNCTION products_deal_counts()
+RETURNS TRIGGER AS $$
+DECLARE
+  d RECORD;
+BEGIN
+  FOR d IN
+    SELECT ps.stage, ps.source, COUNT(*) AS n
+    FROM product_sources ps
+    WHERE ps.product_id = OLD.id AND ps.is_active = TRUE
+    GROUP BY ps.stage, ps.source
+  LOOP
+    PERFORM bump_deal_filter_counts(OLD.user_id, d.stage, d.source, OLD.status, OLD.asin, OLD.upc, -d.n);
+    IF TG_OP = 'UPDATE' THEN
+      PERFORM bump_deal_filter_counts(NEW.user_id, d.stage, d.source, NEW.status, NEW.asin, NEW.upc, d.n);
+    END IF;
+  END LOOP;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_deal_counts_update ON products;
+CREATE TRIGGER trg_products_deal_counts_update
+  AFTER UPDATE OF asin, upc, status, user_id ON products
+  FOR EACH ROW
+  WHEN (
+    OLD.asin IS DISTINCT FROM NEW.asin
+    OR OLD.upc IS DISTINCT FROM NEW.upc
+    OR OLD.status IS DISTINCT FROM NEW.status
+    OR OLD.user_id IS DISTINCT FROM NEW.user_id
+  )
+  EXECUTE FUNCTION products_deal_counts();
+
+DROP TRIGGER IF EXISTS trg_products_deal_counts_delete ON products;
+CREATE TRIGGER trg_products_deal_counts_delete
+  BEFORE DELETE ON products
+  FOR EACH ROW EXECUTE FUNCTION products_deal_counts();
+
+-- Recount from scratch (all users, or one). Used to backfill below and to
+-- reconcile if counts are ever suspected to have drifted.
+DROP FUNCTION IF EXISTS rebuild_deal_filter_counts(UUID);
+
+CREATE OR REPLACE FUNCTION rebuild_deal_filter_counts(p_user_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  rebuilt INTEGER;
+BEGIN
+  DELETE FROM deal_filter_counts WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+  INSERT INTO deal_filter_counts (user_id, bucket_type, bucket, count, updated_at)
+  SELECT p.user_id, b.bucket_type, b.bucket, COUNT(*), NOW()
+  FROM product_sources ps
+  JOIN products p ON p.id = ps.product_id
+  CROSS JOIN LATERAL deal_count_buckets(ps.stage, ps.source, p.status, p.asin, p.upc) b
+  WHERE ps.is_active = TRUE
+    AND p.user_id IS NOT NULL
+    AND (p_user_id IS NULL OR p.user_id = p_user_id)
+  GROUP BY p.user_id, b.bucket_type, b.bucket;
+
+  GET DIAGNOSTICS rebuilt = ROW_COUNT;
+  RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_deal_filter_counts();
+
+ANALYZE product_sources;
+ANALYZE deal_filter_counts;
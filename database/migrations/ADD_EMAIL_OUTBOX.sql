@@ -0,0 +1,161 @@
+-- ============================================================================
+-- Email outbox
+-- ============================================================================
+-- EmailService and POEmailService used to call the provider inline:
+-- blocking HTTP (or the SendGrid SDK) inside async handlers, one round trip
+-- per email, and a failed send was only logged.
+--
+-- email_outbox: callers insert a row and return. idempotency_key is unique,
+-- so enqueueing the same logical email twice is a no-op, and it is sent to
+-- providers that support it (Resend's Idempotency-Key) so a retried request
+-- is not delivered twice.
+--
+-- claim_email_outbox: the drain worker leases due rows with
+-- FOR UPDATE SKIP LOCKED, so concurrent workers never take the same row.
+-- Rows whose lease expired (worker died mid-send) become claimable again.
+--
+-- complete_email_outbox: records a whole batch of results in one statement.
+-- Retries back off exponentially (30s, 60s, ... capped at 1h) until
+-- max_attempts; sent/failed also update the linked email_tracking,
+-- po_generations and supplier_orders rows named in context (leaving
+-- supplier_orders.updated_at alone, which PO reuse compares against).
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES profiles(id) ON DELETE CASCADE,
+    idempotency_key TEXT NOT NULL UNIQUE,
+
+    -- Message
+    provider TEXT NOT NULL, -- resend, sendgrid, postmark, ses
+    from_email TEXT NOT NULL,
+    from_name TEXT,
+    to_email TEXT NOT NULL,
+    cc_emails TEXT[] DEFAULT '{}',
+    bcc_emails TEXT[] DEFAULT '{}',
+    subject TEXT NOT NULL,
+    html_body TEXT,
+    text_body TEXT,
+    attachments JSONB, -- [{"filename", "content" (base64), "content_type"}], cleared once sent
+
+    -- Rows to update when the email is sent or fails
+    context JSONB DEFAULT '{}', -- {"tracking_id", "po_generation_id", "supplier_order_id"}
+
+    -- Delivery
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 6,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    provider_message_id TEXT,
+    last_error TEXT,
+    sent_at TIMESTAMPTZ,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+ON email_outbox(next_attempt_at)
+WHERE status IN ('pending', 'sending');
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_user ON email_outbox(user_id, created_at DESC);
+
+ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own outbox emails" ON email_outbox;
+CREATE POLICY "Users can view own outbox emails" ON email_outbox
+    FOR SELECT USING (auth.uid() = user_id);
+
+DROP FUNCTION IF EXISTS claim_email_outbox(INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION claim_email_outbox(
+    p_limit INTEGER DEFAULT 500,
+    p_lease_seconds INTEGER DEFAULT 300
+)
+RETURNS SETOF email_outbox AS $$
+  UPDATE email_outbox o
+  SET status = 'sending',
+      locked_until = NOW() + make_interval(secs => p_lease_seconds),
+      updated_at = NOW()
+  WHERE o.id IN (
+    SELECT id
+    FROM email_outbox
+    WHERE (status = 'pending' AND next_attempt_at <= NOW())
+       OR (status = 'sending' AND locked_until < NOW())
+    ORDER BY next_attempt_at
+    LIMIT LEAST(GREATEST(p_limit, 1), 1000)
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING o.*;
+$$ LANGUAGE sql;
+
+DROP FUNCTION IF EXISTS complete_email_outbox(JSONB);
+
+-- p_results: [{"id", "status": "sent" | "retry" | "failed", "provider_message_id", "error"}]
+CREATE OR REPLACE FUNCTION complete_email_outbox(p_results JSONB)
+RETURNS VOID AS $$
+BEGIN
+  WITH r AS (
+    SELECT *
+    FROM jsonb_to_recordset(p_results)
+      AS x(id UUID, status TEXT, provider_message_id TEXT, error TEXT)
+  )
+  UPDATE email_outbox o
+  SET attempts = o.attempts + 1,
+      status = CASE
+        WHEN r.status = 'sent' THEN 'sent'
+        WHEN r.status = 'retry' AND o.attempts + 1 < o.max_attempts THEN 'pending'
+        ELSE 'failed'
+      END,
+      next_attempt_at = CASE
+        WHEN r.status = 'retry'
+          THEN NOW() + make_interval(secs => LEAST(30 * POWER(2, o.attempts), 3600))
+        ELSE o.next_attempt_at
+      END,
+      provider_message_id = COALESCE(r.provider_message_id, o.provider_message_id),
+      last_error = r.error,
+      sent_at = CASE WHEN r.status = 'sent' THEN NOW() ELSE o.sent_at END,
+      attachments = CASE WHEN r.status = 'sent' THEN NULL ELSE o.attachments END,
+      locked_until = NULL,
+      updated_at = NOW()
+  FROM r
+  WHERE o.id = r.id;
+
+  -- Side effects of final outcomes only
+  UPDATE email_tracking t
+  SET status = CASE WHEN o.status = 'sent' THEN 'sent' ELSE 'failed' END,
+      email_id = o.provider_message_id,
+      sent_at = o.sent_at,
+      updated_at = NOW()
+  FROM email_outbox o
+  WHERE o.id IN (SELECT (x->>'id')::UUID FROM jsonb_array_elements(p_results) x)
+    AND o.status IN ('sent', 'failed')
+    AND t.id = (o.context->>'tracking_id')::UUID;
+
+  UPDATE po_generations g
+  SET status = CASE WHEN o.status = 'sent' THEN 'sent' ELSE 'failed' END,
+      email_sent_at = o.sent_at,
+      email_subject = o.subject,
+      email_recipient = o.to_email,
+      email_cc = o.cc_emails,
+      email_bcc = o.bcc_emails,
+      updated_at = NOW()
+  FROM email_outbox o
+  WHERE o.id IN (SELECT (x->>'id')::UUID FROM jsonb_array_elements(p_results) x)
+    AND o.status IN ('sent', 'failed')
+    AND g.id = (o.context->>'po_generation_id')::UUID;
+
+  UPDATE supplier_orders so
+  SET status = 'sent',
+      sent_date = o.sent_at
+  FROM email_outbox o
+  WHERE o.id IN (SELECT (x->>'id')::UUID FROM jsonb_array_elements(p_results) x)
+    AND o.status = 'sent'
+    AND so.id = (o.context->>'supplier_order_id')::UUID
+    AND so.status = 'draft';
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION claim_email_outbox(INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION complete_email_outbox(JSONB) TO service_role;
@@ -0,0 +1,89 @@
+-- ============================================================================
+-- Order summaries for the orders list
+-- ============================================================================
+-- GET /orders used to embed every order's items with full products(*) rows
+-- (and, when the nested join failed, ran one suppliers and one order_items
+-- query per order), then computed item subtotals in Python - hundreds of
+-- round trips and megabytes of product payload to render a list.
+--
+-- order_summaries: one row per order with supplier name, item count, unit
+-- total, gross subtotal, discount and discounted subtotal, aggregated from
+-- order_items through the order_id index.
+--
+-- list_order_summaries: newest-first pages of order_summaries, seeking past
+-- the (created_at, id) of the previous page's last row instead of skipping
+-- an offset. Items are only aggregated for the rows on the page.
+--
+-- Full item detail still comes from GET /orders/{id}.
+-- ============================================================================
+
+-- Keyset needs a non-null key (the column already defaults to NOW())
+UPDATE orders SET created_at = NOW() WHERE created_at IS NULL;
+ALTER TABLE orders ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_keyset
+ON orders(user_id, created_at DESC, id DESC);
+
+CREATE OR REPLACE VIEW order_summaries
+WITH (security_invoker = true) AS
+SELECT
+    o.id,
+    o.user_id,
+    o.supplier_id,
+    o.status,
+    o.notes,
+    o.total_amount,
+    o.sent_at,
+    o.sent_to,
+    o.created_at,
+    o.updated_at,
+    s.name AS supplier_name,
+    s.contact_name AS supplier_contact_name,
+    s.contact_email AS supplier_contact_email,
+    COALESCE(i.items_count, 0)::INTEGER AS items_count,
+    COALESCE(i.total_units, 0)::INTEGER AS total_units,
+    ROUND(COALESCE(i.subtotal, 0), 2) AS subtotal,
+    ROUND(COALESCE(i.total_discount, 0), 2) AS total_discount,
+    ROUND(COALESCE(i.subtotal, 0) - COALESCE(i.total_discount, 0), 2) AS discounted_subtotal
+FROM orders o
+LEFT JOIN suppliers s ON s.id = o.supplier_id
+LEFT JOIN LATERAL (
+    SELECT
+        COUNT(*) AS items_count,
+        SUM(oi.quantity) AS total_units,
+        SUM(oi.quantity * oi.unit_cost) AS subtotal,
+        SUM(COALESCE(oi.discount, 0)) AS total_discount
+    FROM order_items oi
+    WHERE oi.order_id = o.id
+) i ON TRUE;
+
+GRANT SELECT ON order_summaries TO authenticated;
+GRANT SELECT ON order_summaries TO service_role;
+
+DROP FUNCTION IF EXISTS list_order_summaries(UUID, TEXT, UUID, TIMESTAMPTZ, UUID, INTEGER);
+
+CREATE OR REPLACE FUNCTION list_order_summaries(
+    p_user_id UUID,
+    p_status TEXT DEFAULT NULL,
+    p_supplier_id UUID DEFAULT NULL,
+    p_after_created_at TIMESTAMPTZ DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 100
+)
+RETURNS SETOF order_summaries AS $$
+  SELECT *
+  FROM order_summaries os
+  WHERE os.user_id = p_user_id
+    AND (p_status IS NULL OR os.status = p_status)
+    AND (p_supplier_id IS NULL OR os.supplier_id = p_supplier_id)
+    AND (
+      p_after_id IS NULL
+      OR (os.created_at, os.id) < (p_after_created_at, p_after_id)
+    )
+  ORDER BY os.created_at DESC, os.id DESC
+  -- Pages of up to 1000 plus the one-row lookahead the API uses for has_more
+  LIMIT LEAST(GREATEST(p_limit, 1), 1001);
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION list_order_summaries(UUID, TEXT, UUID, TIMESTAMPTZ, UUID, INTEGER) TO authenticated;
+GRANT EXECUTE ON FUNCTION list_order_summaries(UUID, TEXT, UUID, TIMESTAMPTZ, UUID, INTEGER) TO service_role;
@@ -0,0 +1,421 @@
+-- ============================================================================
+-- Purchase history rollup for deal listings
+-- ============================================================================
+-- get_deals used to load every sent/confirmed/in-transit/received supplier
+-- order ID for the user and run three supplier_order_items queries (30, 60
+-- and 90 days) with that whole list in an IN filter, for every page.
+--
+-- product_purchase_daily holds units ordered per product per day (UTC),
+-- counting items of orders in those statuses. Triggers on
+-- supplier_order_items and supplier_orders keep it current as items are
+-- added, changed or removed and as orders move in or out of those statuses.
+-- The rolling 30/60/90-day windows are summed from the daily rows at read
+-- time (product_purchase_rollup), so nothing has to age counts out.
+--
+-- list_product_deals is redefined to return bought_last_30d/60d/90d,
+-- joined after LIMIT so a page costs the same however many orders exist.
+--
+-- Run after ADD_DEAL_KEYSET_PAGINATION_AND_COUNTS.sql.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS product_purchase_daily (
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day)
+);
+
+ALTER TABLE product_purchase_daily ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own purchase history" ON product_purchase_daily;
+CREATE POLICY "Users can view own purchase history" ON product_purchase_daily
+    FOR SELECT USING (
+        EXISTS (SELECT 1 FROM products WHERE products.id = product_purchase_daily.product_id AND products.user_id = auth.uid())
+    );
+
+-- Rolling windows per product (only products with purchases in the last 90 days).
+-- security_invoker: readers only see their own products through the table's RLS
+CREATE OR REPLACE VIEW product_purchase_rollup
+WITH (security_invoker = true) AS
+SELECT
+    product_id,
+    COALESCE(SUM(quantity) FILTER (WHERE day >= CURRENT_DATE - 30), 0)::INTEGER AS bought_last_30d,
+    COALESCE(SUM(quantity) FILTER (WHERE day >= CURRENT_DATE - 60), 0)::INTEGER AS bought_last_60d,
+    COALESCE(SUM(quantity), 0)::INTEGER AS bought_last_90d
+FROM product_purchase_daily
+WHERE day >= CURRENT_DATE - 90
+GROUP BY product_id;
+
+GRANT SELECT ON product_purchase_rollup TO authenticated;
+
+-- Order statuses whose items count as bought
+CREATE OR REPLACE FUNCTION purchase_counts_for_status(p_status TEXT)
+RETURNS BOOLEAN AS $$
+  SELECT COALESCE(p_status IN ('sent', 'confirmed', 'in_transit', 'received'), FALSE);
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION bump_product_purchase_daily(p_product_id UUID, p_ordered_at TIMESTAMPTZ, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+  IF p_product_id IS NULL OR p_delta = 0 THEN
+    RETURN;
+  END IF;
+  -- Product being deleted (cascade): its daily rows go with it
+  IF NOT EXISTS (SELECT 1 FROM products WHERE id = p_product_id) THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO product_purchase_daily (product_id, day, quantity)
+  VALUES (p_product_id, (COALESCE(p_ordered_at, NOW()) AT TIME ZONE 'UTC')::DATE, p_delta)
+  ON CONFLICT (product_id, day)
+  DO UPDATE SET quantity = product_purchase_daily.quantity + EXCLUDED.quantity;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Item added, removed or changed
+CREATE OR REPLACE FUNCTION supplier_order_items_purchase_daily()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') AND EXISTS (
+    SELECT 1 FROM supplier_orders o
+    WHERE o.id = OLD.supplier_order_id AND purchase_counts_for_status(o.status)
+  ) THEN
+    PERFORM bump_product_purchase_daily(OLD.product_id, OLD.created_at, -OLD.quantity);
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') AND EXISTS (
+    SELECT 1 FROM supplier_orders o
+    WHERE o.id = NEW.supplier_order_id AND purchase_counts_for_status(o.status)
+  ) THEN
+    PERFORM bump_product_purchase_daily(NEW.product_id, NEW.created_at, NEW.quantity);
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_supplier_order_items_purchase_daily ON supplier_order_items;
+CREATE TRIGGER trg_supplier_order_items_purchase_daily
+  AFTER INSERT OR DELETE ON supplier_order_items
+  FOR EACH ROW EXECUTE FUNCTION supplier_order_items_purchase_daily();
+
+DROP TRIGGER IF EXISTS trg_supplier_order_items_purchase_daily_update ON supplier_order_items;
+CREATE TRIGGER trg_supplier_order_items_purchase_daily_update
+  AFTER UPDATE OF quantity, product_id, supplier_order_id, created_at ON supplier_order_items
+  FOR EACH ROW
+  WHEN (
+    OLD.quantity IS DISTINCT FROM NEW.quantity
+    OR OLD.product_id IS DISTINCT FROM NEW.product_id
+    OR OLD.supplier_order_id IS DISTINCT FROM NEW.supplier_order_id
+    OR OLD.created_at IS DISTINCT FROM NEW.created_at
+  )
+  EXECUTE FUNCTION supplier_order_items_purchase_daily();
+
+-- Order moves in or out of the counted statuses: all its items at once.
+-- Deletes run BEFORE so the cascaded items are still visible.
+CREATE OR REPLACE FUNCTION supplier_orders_purchase_daily()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_was_counted BOOLEAN := purchase_counts_for_status(OLD.status);
+  v_is_counted BOOLEAN := TG_OP = 'UPDATE' AND purchase_counts_for_status(NEW.status);
+  v_sign INTEGER;
+BEGIN
+  IF v_was_counted <> v_is_counted THEN
+    v_sign := CASE WHEN v_is_counted THEN 1 ELSE -1 END;
+
+    INSERT INTO product_purchase_daily (product_id, day, quantity)
+    SELECT i.product_id, (i.created_at AT TIME ZONE 'UTC')::DATE, v_sign * SUM(i.quantity)
+    FROM supplier_order_items i
+    JOIN products p ON p.id = i.product_id
+    WHERE i.supplier_order_id = OLD.id
+    GROUP BY 1, 2
+    ON CONFLICT (product_id, day)
+    DO UPDATE SET quantity = product_purchase_daily.quantity + EXCLUDED.quantity;
+  END IF;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_supplier_orders_purchase_daily_update ON supplier_orders;
+CREATE TRIGGER trg_supplier_orders_purchase_daily_update
+  AFTER UPDATE OF status ON supplier_orders
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION supplier_orders_purchase_daily();
+
+DROP TRIGGER IF EXISTS trg_supplier_orders_purchase_daily_delete ON supplier_orders;
+CREATE TRIGGER trg_supplier_orders_purchase_daily_delete
+  BEFORE DELETE ON supplier_orders
+  FOR EACH ROW EXECUTE FUNCTION supplier_orders_purchase_daily();
+
+-- Recount from supplier_order_items (backfill below; also for reconciling)
+DROP FUNCTION IF EXISTS rebuild_product_purchase_daily();
+
+CREATE OR REPLACE FUNCTION rebuild_product_purchase_daily()
+RETURNS INTEGER AS $$
+DECLARE
+  rebuilt INTEGER;
+BEGIN
+  DELETE FROM product_purchase_daily;
+
+  INSERT INTO product_purchase_daily (product_id, day, quantity)
+  SELECT i.product_id, (i.created_at AT TIME ZONE 'UTC')::DATE, SUM(i.quantity)
+  FROM supplier_order_items i
+  JOIN supplier_orders o ON o.id = i.supplier_order_id
+  WHERE purchase_counts_for_status(o.status)
+  GROUP BY 1, 2;
+
+  GET DIAGNOSTICS rebuilt = ROW_COUNT;
+  RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_product_purchase_daily();
+
+-- ============================================================================
+-- list_product_deals with purchase history
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS list_product_deals(
+    UUID, TEXT, TEXT, TEXT, UUID, TEXT, DECIMAL, DECIMAL, DECIMAL, INTEGER, INTEGER, BOOLEAN, TEXT,
+    TEXT, BOOLEAN, TEXT, UUID, INTEGER
+);
+
+CREATE OR REPLACE FUNCTION list_product_deals(
+    p_user_id UUID,
+    p_asin_status TEXT DEFAULT NULL,
+    p_stage TEXT DEFAULT NULL,
+    p_source TEXT DEFAULT NULL,
+    p_supplier_id UUID DEFAULT NULL,
+    p_category TEXT DEFAULT NULL,
+    p_min_roi DECIMAL DEFAULT NULL,
+    p_max_roi DECIMAL DEFAULT NULL,
+    p_min_profit DECIMAL DEFAULT NULL,
+    p_max_bsr INTEGER DEFAULT NULL,
+    p_max_fba_sellers INTEGER DEFAULT NULL,
+    p_amazon_sells BOOLEAN DEFAULT NULL,
+    p_search TEXT DEFAULT NULL,
+    p_sort TEXT DEFAULT 'deal_created_at',
+    p_sort_desc BOOLEAN DEFAULT TRUE,
+    p_after_value TEXT DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    -- Match filter_product_deals
+    deal_id UUID,
+    product_id UUID,
+    user_id UUID,
+    asin TEXT,
+    title TEXT,
+    image_url TEXT,
+    sell_price DECIMAL,
+    fees_total DECIMAL,
+    bsr INTEGER,
+    seller_count INTEGER,
+    fba_seller_count INTEGER,
+    amazon_sells BOOLEAN,
+    product_status TEXT,
+    analysis_id UUID,
+    supplier_id UUID,
+    supplier_name TEXT,
+    buy_cost DECIMAL,
+    moq INTEGER,
+    pack_size INTEGER,
+    wholesale_cost DECIMAL,
+    percent_off DECIMAL,
+    promo_qty INTEGER,
+    source TEXT,
+    source_detail TEXT,
+    stage TEXT,
+    notes TEXT,
+    is_active BOOLEAN,
+    deal_created_at TIMESTAMPTZ,
+    deal_updated_at TIMESTAMPTZ,
+    profit DECIMAL,
+    roi DECIMAL,
+    total_investment DECIMAL,
+    upc TEXT,
+    asin_status TEXT,
+    -- Cursor for the next page (with deal_id)
+    sort_value TEXT,
+    -- From product_purchase_daily, for the page's products only
+    bought_last_30d INTEGER,
+    bought_last_60d INTEGER,
+    bought_last_90d INTEGER
+) AS $$
+DECLARE
+  v_sort_column TEXT;
+  v_sort_type TEXT;
+  v_direction TEXT := CASE WHEN p_sort_desc THEN 'DESC' ELSE 'ASC' END;
+  v_compare TEXT := CASE WHEN p_sort_desc THEN '<' ELSE '>' END;
+  v_after TEXT;
+BEGIN
+  -- Whitelisted sort keys and the type the cursor value is cast back to
+  SELECT k.col, k.typ INTO v_sort_column, v_sort_type
+  FROM (VALUES
+    ('deal_created_at', 'TIMESTAMPTZ'),
+    ('roi', 'NUMERIC'),
+    ('profit', 'NUMERIC'),
+    ('sell_price', 'NUMERIC'),
+    ('bsr', 'INTEGER'),
+    ('fba_seller_count', 'INTEGER'),
+    ('seller_count', 'INTEGER'),
+    ('asin', 'TEXT'),
+    ('title', 'TEXT')
+  ) AS k(col, typ)
+  WHERE k.col = p_sort;
+
+  IF v_sort_column IS NULL THEN
+    v_sort_column := 'deal_created_at';
+    v_sort_type := 'TIMESTAMPTZ';
+  END IF;
+
+  IF p_after_id IS NULL THEN
+    v_after := 'TRUE';
+  ELSIF v_sort_column = 'deal_created_at' THEN
+    -- NOT NULL key: a plain row comparison the keyset index can seek to
+    v_after := format('(d.deal_created_at, d.deal_id) %s ($15::TIMESTAMPTZ, $16)', v_compare);
+  ELSIF p_after_value IS NULL THEN
+    -- Already into the NULL tail
+    v_after := format('d.%1$I IS NULL AND d.deal_id %2$s $16', v_sort_column, v_compare);
+  ELSE
+    v_after := format(
+      '((d.%1$I, d.deal_id) %2$s ($15::%3$s, $16) OR d.%1$I IS NULL)',
+      v_sort_column, v_compare, v_sort_type
+    );
+  END IF;
+
+  RETURN QUERY EXECUTE format($query$
+    SELECT
+      page.*,
+      COALESCE(pr.bought_last_30d, 0)::INTEGER,
+      COALESCE(pr.bought_last_60d, 0)::INTEGER,
+      COALESCE(pr.bought_last_90d, 0)::INTEGER
+    FROM (
+    SELECT d.*, d.%1$I::TEXT AS sort_value
+    FROM (
+      SELECT
+        ps.id AS deal_id,
+        p.id AS product_id,
+        p.user_id,
+        p.asin,
+        p.title,
+        p.image_url,
+        p.sell_price,
+        p.fees_total,
+        p.bsr,
+        p.seller_count,
+        p.fba_seller_count,
+        p.amazon_sells,
+        p.status AS product_status,
+        p.analysis_id,
+        ps.supplier_id,
+        s.name AS supplier_name,
+        ps.buy_cost,
+        ps.moq,
+        ps.pack_size,
+        ps.wholesale_cost,
+        ps.percent_off,
+        ps.promo_qty,
+        ps.source,
+        ps.source_detail,
+        ps.stage,
+        ps.notes,
+        ps.is_active,
+        ps.created_at AS deal_created_at,
+        ps.updated_at AS deal_updated_at,
+        CASE
+          WHEN ps.buy_cost > 0 AND p.sell_price > 0 THEN
+            ROUND(p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost, 2)
+          ELSE NULL
+        END AS profit,
+        CASE
+          WHEN ps.buy_cost > 0 AND p.sell_price > 0 THEN
+            ROUND(((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100, 1)
+          ELSE NULL
+        END AS roi,
+        CASE
+          WHEN ps.buy_cost > 0 THEN ROUND(ps.buy_cost * ps.moq, 2)
+          ELSE NULL
+        END AS total_investment,
+        p.upc,
+        CASE
+          WHEN p.asin IS NOT NULL
+            AND p.asin != ''
+            AND p.asin NOT LIKE 'PENDING_%%'
+            AND p.asin NOT LIKE 'Unknown%%' THEN 'found'
+          WHEN p.status = 'needs_selection' THEN 'multiple_found'
+          WHEN (p.upc IS NOT NULL AND p.upc != '') THEN 'not_found'
+          ELSE 'manual'
+        END AS asin_status
+      FROM product_sources ps
+      JOIN products p ON p.id = ps.product_id
+      LEFT JOIN suppliers s ON s.id = ps.supplier_id
+      WHERE ps.user_id = $1
+        AND ps.is_active = TRUE
+        AND (
+          $2::TEXT IS NULL
+          OR ($2 = 'asin_found'
+              AND p.asin IS NOT NULL AND p.asin != ''
+              AND p.asin NOT LIKE 'PENDING_%%' AND p.asin NOT LIKE 'Unknown%%')
+          OR ($2 = 'needs_selection' AND p.status = 'needs_selection')
+          OR ($2 = 'needs_asin'
+              AND p.upc IS NOT NULL AND p.upc != ''
+              AND (p.asin IS NULL OR p.asin = '' OR p.asin LIKE 'PENDING_%%' OR p.asin LIKE 'Unknown%%'))
+          OR ($2 = 'manual_entry'
+              AND (p.upc IS NULL OR p.upc = '')
+              AND (p.asin IS NULL OR p.asin = '' OR p.asin LIKE 'PENDING_%%' OR p.asin LIKE 'Unknown%%'))
+        )
+        AND ($3::TEXT IS NULL OR ps.stage = $3)
+        AND ($4::TEXT IS NULL OR ps.source = $4)
+        AND ($5::UUID IS NULL OR ps.supplier_id = $5)
+        AND ($6::TEXT IS NULL OR p.category = $6)
+        AND ($7::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND ((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100 >= $7))
+        AND ($8::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND ((p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) / ps.buy_cost) * 100 <= $8))
+        AND ($9::DECIMAL IS NULL OR (ps.buy_cost > 0 AND p.sell_price > 0
+             AND (p.sell_price - COALESCE(p.fees_total, 0) - ps.buy_cost) >= $9))
+        AND ($10::INTEGER IS NULL OR p.bsr <= $10)
+        AND ($11::INTEGER IS NULL OR p.fba_seller_count <= $11)
+        AND ($12::BOOLEAN IS NULL OR p.amazon_sells = $12)
+        AND (
+          $13::TEXT IS NULL
+          OR p.asin ILIKE '%%' || $13 || '%%'
+          OR p.upc ILIKE '%%' || $13 || '%%'
+          OR p.title ILIKE '%%' || $13 || '%%'
+        )
+    ) d
+    WHERE %3$s
+    ORDER BY d.%1$I %2$s NULLS LAST, d.deal_id %2$s
+    LIMIT $14
+    ) page
+    -- Joined after LIMIT: purchase history is read for the page's rows only
+    LEFT JOIN LATERAL (
+      SELECT
+        SUM(ppd.quantity) FILTER (WHERE ppd.day >= CURRENT_DATE - 30) AS bought_last_30d,
+        SUM(ppd.quantity) FILTER (WHERE ppd.day >= CURRENT_DATE - 60) AS bought_last_60d,
+        SUM(ppd.quantity) AS bought_last_90d
+      FROM product_purchase_daily ppd
+      WHERE ppd.product_id = page.product_id
+        AND ppd.day >= CURRENT_DATE - 90
+    ) pr ON TRUE
+    ORDER BY page.%1$I %2$s NULLS LAST, page.deal_id %2$s
+  $query$, v_sort_column, v_direction, v_after)
+  USING
+    p_user_id, p_asin_status, p_stage, p_source, p_supplier_id, p_category,
+    p_min_roi, p_max_roi, p_min_profit, p_max_bsr, p_max_fba_sellers, p_amazon_sells, p_search,
+    p_limit, p_after_value, p_after_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+GRANT EXECUTE ON FUNCTION list_product_deals TO authenticated;
+GRANT EXECUTE ON FUNCTION list_product_deals TO anon;
+
+COMMENT ON FUNCTION list_product_deals IS 'Deals for a user with filter_product_deals filters and 30/60/90-day purchase quantities, keyset-paginated on (sort key, deal_id)';
+ANALYZE product_purchase_daily;
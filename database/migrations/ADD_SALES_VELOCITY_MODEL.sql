@@ -0,0 +1,80 @@
+-- ============================================================================
+-- Sales velocity model (BSR -> monthly units)
+-- ============================================================================
+-- Monthly unit estimates used to come from three unrelated heuristics
+-- (market intelligence: drops_30 * 1.5, GeniusScorer: hard-coded curves,
+-- ProfitabilityCalculator: BSR buckets). SalesVelocityModel now fits one
+-- power curve per category,
+--
+--   units_per_month = exp(intercept) * sales_rank ^ slope
+--
+-- from the Keepa history we already store, and every estimator uses it.
+--
+-- sales_velocity_training: one observation per ASIN (the freshest of
+-- products / keepa_analysis) with a sales rank, Keepa's 30-day sales rank
+-- drops and the category.
+--
+-- sales_velocity_models: fitted parameters. Each refit inserts a new
+-- version (one row per category plus '*' for the all-category curve);
+-- the highest version is the active model. Older versions are kept for
+-- comparison and rollback.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS sales_velocity_models (
+    version INTEGER NOT NULL,
+    category TEXT NOT NULL,  -- '*' = fitted across all categories
+    intercept DOUBLE PRECISION NOT NULL,
+    slope DOUBLE PRECISION NOT NULL,
+    samples INTEGER NOT NULL,
+    r_squared DOUBLE PRECISION,
+    rank_min INTEGER,
+    rank_max INTEGER,
+    fitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (version, category)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_velocity_models_version ON sales_velocity_models(version DESC);
+
+ALTER TABLE sales_velocity_models ENABLE ROW LEVEL SECURITY;
+
+-- Curves are market-level (no user data); anyone signed in may read them
+DROP POLICY IF EXISTS "Authenticated users can view sales velocity models" ON sales_velocity_models;
+CREATE POLICY "Authenticated users can view sales velocity models" ON sales_velocity_models
+    FOR SELECT USING (auth.role() = 'authenticated');
+
+-- Training observations, one per ASIN
+CREATE OR REPLACE VIEW sales_velocity_training AS
+SELECT DISTINCT ON (asin)
+    asin,
+    category,
+    sales_rank,
+    drops_30,
+    observed_at
+FROM (
+    SELECT
+        p.asin,
+        p.category,
+        COALESCE(p.sales_rank_30_day_avg, p.current_sales_rank, p.bsr) AS sales_rank,
+        COALESCE(
+            (p.keepa_raw_response->'products'->0->'stats'->>'salesRankDrops30')::INTEGER,
+            p.sales_rank_drops_30_day
+        ) AS drops_30,
+        p.keepa_last_fetched AS observed_at
+    FROM products p
+    WHERE p.keepa_last_fetched IS NOT NULL
+
+    UNION ALL
+
+    SELECT
+        k.asin,
+        k.raw_basic_response->'categoryTree'->0->>'name' AS category,
+        COALESCE(k.avg_sales_rank_90d, k.current_sales_rank) AS sales_rank,
+        (k.raw_basic_response->'stats'->>'salesRankDrops30')::INTEGER AS drops_30,
+        k.analyzed_at AS observed_at
+    FROM keepa_analysis k
+) observations
+WHERE sales_rank > 0
+  AND drops_30 IS NOT NULL
+ORDER BY asin, observed_at DESC NULLS LAST;
+
+GRANT SELECT ON sales_velocity_training TO service_role;
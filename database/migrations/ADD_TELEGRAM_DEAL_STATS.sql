@@ -0,0 +1,218 @@
+-- ============================================================================
+-- Materialized Telegram deal stats
+-- ============================================================================
+-- GET /deals/stats read every telegram_deals row for the user (joined to
+-- analyses.roi) and counted statuses in Python, so it got slower with every
+-- deal the channels produced.
+--
+-- telegram_deal_stats: per-user counts by status, profitable deals and an
+-- ROI histogram of analyzed deals, kept current by triggers on
+-- telegram_deals (insert, delete, status / analysis / user changes) and on
+-- analyses (ROI changes, deletes). The endpoint reads the user's rows.
+--
+-- reconcile_telegram_deal_stats recounts from telegram_deals and fixes only
+-- the rows that drifted (e.g. an ROI update racing a deal's re-link); the
+-- reconcile_telegram_deal_stats task runs it hourly.
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS telegram_deal_stats (
+    user_id UUID NOT NULL,
+    bucket_type TEXT NOT NULL, -- all, status, profitable, roi
+    bucket TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, bucket_type, bucket)
+);
+
+ALTER TABLE telegram_deal_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can view own telegram deal stats" ON telegram_deal_stats;
+CREATE POLICY "Users can view own telegram deal stats" ON telegram_deal_stats
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Buckets one deal counts towards. ROI follows the old endpoint: only
+-- analyzed deals with an analysis count, a NULL ROI counts as 0, and
+-- profitable means ROI >= 30.
+CREATE OR REPLACE FUNCTION telegram_deal_buckets(
+    p_status TEXT,
+    p_has_analysis BOOLEAN,
+    p_roi NUMERIC
+)
+RETURNS TABLE (bucket_type TEXT, bucket TEXT) AS $$
+DECLARE
+  v_status TEXT := LOWER(COALESCE(NULLIF(p_status, ''), 'pending'));
+  v_roi NUMERIC := COALESCE(p_roi, 0);
+BEGIN
+  bucket_type := 'all'; bucket := 'all'; RETURN NEXT;
+  bucket_type := 'status'; bucket := v_status; RETURN NEXT;
+
+  IF v_status = 'analyzed' AND p_has_analysis THEN
+    bucket_type := 'roi';
+    bucket := CASE
+      WHEN v_roi < 0 THEN 'lt_0'
+      WHEN v_roi < 15 THEN '0_15'
+      WHEN v_roi < 30 THEN '15_30'
+      WHEN v_roi < 50 THEN '30_50'
+      WHEN v_roi < 100 THEN '50_100'
+      ELSE '100_plus'
+    END;
+    RETURN NEXT;
+
+    IF v_roi >= 30 THEN
+      bucket_type := 'profitable'; bucket := 'profitable'; RETURN NEXT;
+    END IF;
+  END IF;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION bump_telegram_deal_stats(
+    p_user_id UUID,
+    p_status TEXT,
+    p_has_analysis BOOLEAN,
+    p_roi NUMERIC,
+    p_delta BIGINT
+)
+RETURNS VOID AS $$
+BEGIN
+  IF p_user_id IS NULL OR p_delta = 0 THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO telegram_deal_stats (user_id, bucket_type, bucket, count, updated_at)
+  SELECT p_user_id, b.bucket_type, b.bucket, p_delta, NOW()
+  FROM telegram_deal_buckets(p_status, p_has_analysis, p_roi) b
+  ON CONFLICT (user_id, bucket_type, bucket)
+  DO UPDATE SET count = telegram_deal_stats.count + EXCLUDED.count, updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deal added, removed, or its status / analysis / owner changed
+CREATE OR REPLACE FUNCTION telegram_deals_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+  v_roi NUMERIC;
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    -- Analysis not found: it is being deleted and its trigger already
+    -- moved this deal out of the ROI buckets
+    SELECT roi INTO v_roi FROM analyses WHERE id = OLD.analysis_id;
+    PERFORM bump_telegram_deal_stats(OLD.user_id, OLD.status, FOUND, v_roi, -1);
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    SELECT roi INTO v_roi FROM analyses WHERE id = NEW.analysis_id;
+    PERFORM bump_telegram_deal_stats(NEW.user_id, NEW.status, FOUND, v_roi, 1);
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_telegram_deals_stats ON telegram_deals;
+CREATE TRIGGER trg_telegram_deals_stats
+  AFTER INSERT OR DELETE ON telegram_deals
+  FOR EACH ROW EXECUTE FUNCTION telegram_deals_stats();
+
+DROP TRIGGER IF EXISTS trg_telegram_deals_stats_update ON telegram_deals;
+CREATE TRIGGER trg_telegram_deals_stats_update
+  AFTER UPDATE OF status, analysis_id, user_id ON telegram_deals
+  FOR EACH ROW
+  WHEN (
+    OLD.status IS DISTINCT FROM NEW.status
+    OR OLD.analysis_id IS DISTINCT FROM NEW.analysis_id
+    OR OLD.user_id IS DISTINCT FROM NEW.user_id
+  )
+  EXECUTE FUNCTION telegram_deals_stats();
+
+-- An analysis' ROI changing (or the analysis going away) moves every
+-- analyzed deal linked to it. Deletes run BEFORE so the linked deals are
+-- still there; the ON DELETE SET NULL that follows nets to zero above.
+CREATE OR REPLACE FUNCTION analyses_telegram_deal_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+  d RECORD;
+BEGIN
+  FOR d IN
+    SELECT td.user_id, COUNT(*) AS n
+    FROM telegram_deals td
+    WHERE td.analysis_id = OLD.id AND LOWER(td.status) = 'analyzed'
+    GROUP BY td.user_id
+  LOOP
+    PERFORM bump_telegram_deal_stats(d.user_id, 'analyzed', TRUE, OLD.roi, -d.n);
+    PERFORM bump_telegram_deal_stats(d.user_id, 'analyzed', TG_OP = 'UPDATE',
+                                     CASE WHEN TG_OP = 'UPDATE' THEN NEW.roi END, d.n);
+  END LOOP;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_analyses_telegram_deal_stats_update ON analyses;
+CREATE TRIGGER trg_analyses_telegram_deal_stats_update
+  AFTER UPDATE OF roi ON analyses
+  FOR EACH ROW
+  WHEN (OLD.roi IS DISTINCT FROM NEW.roi)
+  EXECUTE FUNCTION analyses_telegram_deal_stats();
+
+DROP TRIGGER IF EXISTS trg_analyses_telegram_deal_stats_delete ON analyses;
+CREATE TRIGGER trg_analyses_telegram_deal_stats_delete
+  BEFORE DELETE ON analyses
+  FOR EACH ROW EXECUTE FUNCTION analyses_telegram_deal_stats();
+
+-- Recount (all users, or one) and correct the rows that differ. Returns the
+-- number of rows corrected, so drift shows up in the task's logs.
+DROP FUNCTION IF EXISTS reconcile_telegram_deal_stats(UUID);
+
+CREATE OR REPLACE FUNCTION reconcile_telegram_deal_stats(p_user_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  corrected INTEGER;
+  removed INTEGER;
+BEGIN
+  CREATE TEMP TABLE IF NOT EXISTS _telegram_deal_stats_fresh (
+    user_id UUID, bucket_type TEXT, bucket TEXT, count BIGINT
+  ) ON COMMIT DROP;
+  TRUNCATE _telegram_deal_stats_fresh;
+
+  INSERT INTO _telegram_deal_stats_fresh
+  SELECT td.user_id, b.bucket_type, b.bucket, COUNT(*)
+  FROM telegram_deals td
+  LEFT JOIN analyses a ON a.id = td.analysis_id
+  CROSS JOIN LATERAL telegram_deal_buckets(td.status, a.id IS NOT NULL, a.roi) b
+  WHERE td.user_id IS NOT NULL
+    AND (p_user_id IS NULL OR td.user_id = p_user_id)
+  GROUP BY td.user_id, b.bucket_type, b.bucket;
+
+  INSERT INTO telegram_deal_stats (user_id, bucket_type, bucket, count, updated_at)
+  SELECT f.user_id, f.bucket_type, f.bucket, f.count, NOW()
+  FROM _telegram_deal_stats_fresh f
+  LEFT JOIN telegram_deal_stats s
+    ON s.user_id = f.user_id AND s.bucket_type = f.bucket_type AND s.bucket = f.bucket
+  WHERE s.count IS DISTINCT FROM f.count
+  ON CONFLICT (user_id, bucket_type, bucket)
+  DO UPDATE SET count = EXCLUDED.count, updated_at = NOW();
+  GET DIAGNOSTICS corrected = ROW_COUNT;
+
+  -- Buckets with no deals left
+  UPDATE telegram_deal_stats s
+  SET count = 0, updated_at = NOW()
+  WHERE (p_user_id IS NULL OR s.user_id = p_user_id)
+    AND s.count <> 0
+    AND NOT EXISTS (
+      SELECT 1 FROM _telegram_deal_stats_fresh f
+      WHERE f.user_id = s.user_id AND f.bucket_type = s.bucket_type AND f.bucket = s.bucket
+    );
+  GET DIAGNOSTICS removed = ROW_COUNT;
+
+  RETURN corrected + removed;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION reconcile_telegram_deal_stats(UUID) TO service_role;
+
+SELECT reconcile_telegram_deal_stats();
+
+ANALYZE telegram_deal_stats;
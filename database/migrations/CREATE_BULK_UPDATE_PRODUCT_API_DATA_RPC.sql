@@ -0,0 +1,80 @@
+-- ============================================================================
+-- Bulk write-back of SP-API / Keepa data to products
+-- ============================================================================
+-- APIBatchFetcher extracts catalog and Keepa fields as each API batch lands
+-- and writes them back here, one call per batch of up to 100 products,
+-- instead of one UPDATE round trip per ASIN.
+--
+-- p_rows: JSON array of objects with "asin" plus API-data columns. Rows may
+-- carry different columns (SP-API fields, Keepa fields or both); a column a
+-- row doesn't mention keeps its current value. Only the columns the
+-- SP-API / Keepa extractors produce can be written (v_api_columns, kept in
+-- sync with API_DATA_COLUMNS in api_batch_fetcher.py); any other key is
+-- ignored. Values are cast with jsonb_populate_record, so JSON columns
+-- (sp_api_raw_response, keepa_raw_response) stay JSON.
+--
+-- Returns the ASINs that were updated. Only p_user_id's products are
+-- touched. The function trusts p_user_id, so it is executable by the
+-- backend's service role only - never by authenticated / anon callers.
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS bulk_update_product_api_data(UUID, JSONB);
+
+CREATE OR REPLACE FUNCTION bulk_update_product_api_data(p_user_id UUID, p_rows JSONB)
+RETURNS SETOF TEXT AS $$
+DECLARE
+  v_set TEXT;
+  v_api_columns TEXT[] := ARRAY[
+    -- SP-API catalog (SPAPIExtractor)
+    'binding', 'brand', 'brand_name', 'browse_nodes', 'bsr', 'bullet_points', 'category',
+    'category_rank', 'color', 'current_sales_rank', 'description', 'dimension_unit', 'ean',
+    'features', 'image_url', 'images', 'is_oversized', 'is_top_level_category', 'isbn',
+    'item_height', 'item_length', 'item_weight', 'item_width', 'manufacturer', 'model_number',
+    'package_height', 'package_length', 'package_quantity', 'package_weight', 'package_width',
+    'part_number', 'product_group', 'product_type', 'size', 'style', 'subcategory', 'title',
+    'upc', 'weight_unit',
+    -- Keepa (KeepaExtractor)
+    'age_in_days', 'amazon_price_30_day_avg', 'amazon_price_90_day_avg', 'amazon_price_current',
+    'buy_box_price', 'buy_box_price_30d_avg', 'buy_box_price_365d_avg', 'buy_box_price_90d_avg',
+    'buybox_price_current', 'fba_fees', 'fba_seller_count', 'first_available_date', 'in_stock',
+    'is_hazmat', 'lowest_price', 'new_price_30_day_avg', 'new_price_90_day_avg',
+    'new_price_current', 'out_of_stock_percentage', 'rating_average', 'review_count',
+    'review_velocity', 'sales_rank_180_day_avg', 'sales_rank_30_day_avg', 'sales_rank_90_day_avg',
+    'sales_rank_drops_30_day', 'sales_rank_drops_90_day', 'seller_count',
+    -- Raw responses
+    'sp_api_raw_response', 'sp_api_last_fetched', 'keepa_raw_response', 'keepa_last_fetched'
+  ];
+BEGIN
+  -- Columns any row sets, limited to API-data columns that exist on products
+  SELECT string_agg(
+    format('%1$I = CASE WHEN r.data ? %1$L THEN v.%1$I ELSE p.%1$I END', c.column_name),
+    ', '
+  )
+  INTO v_set
+  FROM information_schema.columns c
+  WHERE c.table_schema = 'public'
+    AND c.table_name = 'products'
+    AND c.column_name = ANY(v_api_columns)
+    AND EXISTS (
+      SELECT 1 FROM jsonb_array_elements(p_rows) e(data) WHERE e.data ? c.column_name
+    );
+
+  IF v_set IS NULL THEN
+    RETURN;
+  END IF;
+
+  RETURN QUERY EXECUTE format(
+    'UPDATE products p
+     SET %s, updated_at = NOW()
+     FROM jsonb_array_elements($2) AS r(data),
+          LATERAL jsonb_populate_record(NULL::products, r.data) AS v
+     WHERE p.user_id = $1
+       AND p.asin = r.data->>''asin''
+     RETURNING p.asin',
+    v_set
+  ) USING p_user_id, p_rows;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION bulk_update_product_api_data(UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION bulk_update_product_api_data(UUID, JSONB) TO service_role;
@@ -0,0 +1,89 @@
+-- ============================================================================
+-- Set-based promotion of Telegram deals to products
+-- ============================================================================
+-- POST /deals/analyze-batch used to promote up to 100 deals one at a time:
+-- re-read the deal, look its ASIN up in products, insert a product if
+-- missing, update the deal - four round trips per deal.
+--
+-- promote_telegram_deals does it for any number of deals in one call:
+-- one read of the deals, one insert of the products that don't exist yet,
+-- one read resolving every ASIN to a product, one update linking the deals
+-- and marking them 'analyzing'.
+--
+-- p_deal_ids: deals to promote (any status); NULL = the user's pending deals
+-- p_limit: cap on deals promoted, oldest first; NULL = all
+--
+-- Returns (deal_id, product_id, created) per promoted deal; created is true
+-- when this call inserted the product. Promotions for one user are
+-- serialized so two calls can't both create the same ASIN.
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS promote_telegram_deals(UUID, UUID[], INTEGER);
+
+CREATE OR REPLACE FUNCTION promote_telegram_deals(
+    p_user_id UUID,
+    p_deal_ids UUID[] DEFAULT NULL,
+    p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE (deal_id UUID, product_id UUID, created BOOLEAN) AS $$
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('promote_telegram_deals:' || p_user_id::TEXT));
+
+  CREATE TEMP TABLE IF NOT EXISTS _promote_deals (id UUID, asin TEXT) ON COMMIT DROP;
+  CREATE TEMP TABLE IF NOT EXISTS _promote_products (asin TEXT, product_id UUID, created BOOLEAN) ON COMMIT DROP;
+  TRUNCATE _promote_deals, _promote_products;
+
+  INSERT INTO _promote_deals (id, asin)
+  SELECT td.id, td.asin
+  FROM telegram_deals td
+  WHERE td.user_id = p_user_id
+    AND td.asin IS NOT NULL AND td.asin != ''
+    AND CASE
+      WHEN p_deal_ids IS NULL THEN td.status = 'pending'
+      ELSE td.id = ANY(p_deal_ids)
+    END
+  ORDER BY td.extracted_at, td.id
+  LIMIT p_limit;
+
+  -- Products for ASINs the user doesn't have yet
+  WITH inserted AS (
+    INSERT INTO products (user_id, asin, status)
+    SELECT DISTINCT p_user_id, d.asin
+    FROM _promote_deals d
+    WHERE NOT EXISTS (
+      SELECT 1 FROM products p WHERE p.user_id = p_user_id AND p.asin = d.asin
+    )
+    ON CONFLICT DO NOTHING
+    RETURNING products.asin, products.id
+  )
+  INSERT INTO _promote_products (asin, product_id, created)
+  SELECT i.asin, i.id, TRUE FROM inserted i;
+
+  -- Existing products (oldest one if an ASIN has several)
+  INSERT INTO _promote_products (asin, product_id, created)
+  SELECT DISTINCT ON (p.asin) p.asin, p.id, FALSE
+  FROM products p
+  WHERE p.user_id = p_user_id
+    AND p.asin IN (SELECT d.asin FROM _promote_deals d)
+    AND p.asin NOT IN (SELECT pp.asin FROM _promote_products pp)
+  ORDER BY p.asin, p.created_at, p.id;
+
+  UPDATE telegram_deals td
+  SET status = 'analyzing',
+      product_id = pp.product_id
+  FROM _promote_deals d
+  JOIN _promote_products pp ON pp.asin = d.asin
+  WHERE td.id = d.id;
+
+  RETURN QUERY
+  SELECT d.id, pp.product_id, pp.created
+  FROM _promote_deals d
+  JOIN _promote_products pp ON pp.asin = d.asin;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION promote_telegram_deals(UUID, UUID[], INTEGER) TO service_role;
+
+-- Resolving deal ASINs to the user's products (idx_products_user_asin_no_supplier
+-- only covers products without a supplier)
+CREATE INDEX IF NOT EXISTS idx_products_user_asin ON products(user_id, asin);
@@ -0,0 +1,68 @@
+-- ============================================================================
+-- Bulk re-pricing of stored analyses
+-- ============================================================================
+-- RepricingService recomputes the derived profitability columns of analyses
+-- (landed cost, profit, ROI, promo and worst case) from market data already
+-- stored, when cost settings, product_sources costs or prep assignments
+-- change. This function applies one batch of recomputed rows in a single
+-- UPDATE instead of one round trip per analysis.
+--
+-- p_rows: JSON array of objects with "id" and the derived columns below.
+-- Only p_user_id's analyses are updated. The function trusts p_user_id, so
+-- it is executable by the backend's service role only.
+-- ============================================================================
+
+DROP FUNCTION IF EXISTS reprice_analyses(UUID, JSONB);
+
+CREATE OR REPLACE FUNCTION reprice_analyses(p_user_id UUID, p_rows JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+  updated_count INTEGER;
+BEGIN
+  UPDATE analyses a
+  SET
+    buy_cost = r.buy_cost,
+    inbound_shipping = r.inbound_shipping,
+    prep_cost = r.prep_cost,
+    total_landed_cost = r.total_landed_cost,
+    net_profit = r.net_profit,
+    roi = r.roi,
+    profit_margin = r.profit_margin,
+    stage2_roi = r.roi,
+    passed_stage2 = r.passed_stage2,
+    promo_buy_cost = r.promo_buy_cost,
+    promo_landed_cost = r.promo_landed_cost,
+    promo_net_profit = r.promo_net_profit,
+    promo_roi = r.promo_roi,
+    worst_case_fees = COALESCE(r.worst_case_fees, a.worst_case_fees),
+    worst_case_profit = COALESCE(r.worst_case_profit, a.worst_case_profit),
+    still_profitable_at_worst = COALESCE(r.still_profitable_at_worst, a.still_profitable_at_worst),
+    updated_at = NOW()
+  FROM jsonb_to_recordset(p_rows) AS r(
+    id UUID,
+    buy_cost NUMERIC,
+    inbound_shipping NUMERIC,
+    prep_cost NUMERIC,
+    total_landed_cost NUMERIC,
+    net_profit NUMERIC,
+    roi NUMERIC,
+    profit_margin NUMERIC,
+    passed_stage2 BOOLEAN,
+    promo_buy_cost NUMERIC,
+    promo_landed_cost NUMERIC,
+    promo_net_profit NUMERIC,
+    promo_roi NUMERIC,
+    worst_case_fees NUMERIC,
+    worst_case_profit NUMERIC,
+    still_profitable_at_worst BOOLEAN
+  )
+  WHERE a.id = r.id
+    AND a.user_id = p_user_id;
+
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+  RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION reprice_analyses(UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION reprice_analyses(UUID, JSONB) TO service_role;
@@ -125,14 +125,14 @@ const Orders = () => {
                   </TableCell>
                   <TableCell>
                     <Typography variant="body2" fontFamily="monospace">
-                      {order.items && order.items.length > 0 
-                        ? `${order.items.length} item${order.items.length > 1 ? 's' : ''}`
+                      {order.items_count > 0
+                        ? `${order.items_count} item${order.items_count > 1 ? 's' : ''}`
                         : order.asin || 'N/A'}
                     </Typography>
                   </TableCell>
                   <TableCell>
                     <Typography variant="body2">
-                      {order.items_count || order.quantity || 'N/A'}
+                      {order.total_units || order.quantity || 'N/A'}
                     </Typography>
                   </TableCell>
                   <TableCell>
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark SPAPIClient.iter_catalog_items against a local mock SP-API server.
+
+The mock enforces the documented getCatalogItem quota (2 req/s, burst 2) with
+its own token bucket, returns 429 when it is exceeded, and sends the
+x-amzn-RateLimit-Limit header like the real API. A good run gets close to
+2.0 req/s with few or no 429s.
+
+Usage:
+    REDIS_URL=redis://localhost:6379/0 python scripts/benchmark_catalog_fetcher.py [num_asins]
+
+Requirements:
+    A local Redis (the catalog limiter is the shared Redis token bucket)
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Settings needs these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.services.sp_api_client import sp_api_client
+from app.services.sp_api_token_broker import token_broker
+from app.services.rate_limiter import rate_limiters
+
+DOCUMENTED_RATE = 2.0   # getCatalogItem requests per second
+DOCUMENTED_BURST = 2
+MOCK_LATENCY_SECONDS = 0.15
+
+
+class MockQuota:
+    """Server-side token bucket matching the documented catalog quota."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.throttled = 0
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.accepted += 1
+                return True
+            self.throttled += 1
+            return False
+
+
+quota = MockQuota(DOCUMENTED_RATE, DOCUMENTED_BURST)
+
+
+class MockCatalogHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(MOCK_LATENCY_SECONDS)
+        asin = self.path.split("?")[0].rstrip("/").split("/")[-1]
+        if not quota.take():
+            self._send(429, {"errors": [{"code": "QuotaExceeded"}]})
+            return
+        self._send(200, {
+            "asin": asin,
+            "summaries": [{"itemName": f"Mock {asin}", "brandName": "Mock"}],
+            "images": [],
+            "salesRanks": [],
+        })
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("x-amzn-RateLimit-Limit", str(DOCUMENTED_RATE))
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+async def run_benchmark(num_asins: int) -> dict:
+    # Unique ASINs per run so the 24h catalog cache can't serve them
+    run_id = uuid.uuid4().hex[:4].upper()
+    asins = [f"B{run_id}{i:05d}" for i in range(num_asins)]
+
+    start = time.monotonic()
+    received = 0
+    first_result_at = None
+    async for asin, catalog in sp_api_client.iter_catalog_items(asins):
+        received += 1 if catalog else 0
+        if first_result_at is None:
+            first_result_at = time.monotonic() - start
+    elapsed = time.monotonic() - start
+
+    return {
+        "asins": num_asins,
+        "received": received,
+        "elapsed_seconds": round(elapsed, 2),
+        "first_result_seconds": round(first_result_at or 0, 2),
+        "throughput_rps": round(quota.accepted / elapsed, 2) if elapsed else 0,
+        "documented_rps": DOCUMENTED_RATE,
+        "server_429s": quota.throttled,
+    }
+
+
+def main():
+    num_asins = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCatalogHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    # Point the client at the mock and skip LWA
+    sp_api_client.endpoints = {region: f"http://127.0.0.1:{port}" for region in sp_api_client.endpoints}
+    sp_api_client.app_configured = True
+    token_broker._store(token_broker.app_key(sp_api_client.app_lwa_id), "benchmark-token", 3600)
+
+    # Start from a full bucket at the documented rate
+    limiter = rate_limiters["catalog"]
+    limiter.redis.delete(limiter.key_tokens, limiter.key_last_update, limiter.key_rate)
+    limiter.rate = DOCUMENTED_RATE
+
+    print(f"🚀 Fetching {num_asins} catalog items from mock SP-API on port {port}...")
+    result = asyncio.run(run_benchmark(num_asins))
+    server.shutdown()
+
+    print(json.dumps(result, indent=2))
+    efficiency = result["throughput_rps"] / DOCUMENTED_RATE * 100
+    print(f"📊 Achieved {efficiency:.0f}% of documented quota with {result['server_429s']} throttled requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+-- ============================================================================
+-- Deal listing benchmark: OFFSET vs keyset pages, counted vs materialized
+-- filter counts, at 100k deals for one user.
+--
+-- Needs ADD_DEAL_KEYSET_PAGINATION_AND_COUNTS.sql applied. Everything runs in
+-- one transaction that is rolled back - nothing is left behind. Run against a
+-- staging database with psql (not the Supabase SQL editor - it uses \gset):
+--
+--   psql "$DATABASE_URL" -f scripts/benchmark_deal_pagination.sql
+--
+-- Deals are attached to the first auth user; its own deals are counted too.
+-- ============================================================================
+
+\set deals 100000
+\set page_size 50
+\timing on
+
+BEGIN;
+
+SELECT id AS uid FROM auth.users ORDER BY created_at LIMIT 1 \gset
+
+-- Seed: products + deals (the count triggers fire for every row, so this
+-- also shows their insert overhead)
+INSERT INTO products (id, user_id, asin, upc, title, status, sell_price, fees_total, bsr)
+SELECT
+    gen_random_uuid(),
+    :'uid',
+    CASE WHEN i % 10 < 7 THEN 'BNCH' || lpad(i::text, 6, '0') WHEN i % 10 = 7 THEN 'PENDING_' || i END,
+    CASE WHEN i % 10 < 9 THEN lpad(i::text, 12, '0') END,
+    'Benchmark product ' || i,
+    (ARRAY['pending', 'analyzed', 'analyzing', 'needs_selection'])[1 + i % 4],
+    round((10 + random() * 40)::numeric, 2),
+    round((3 + random() * 8)::numeric, 2),
+    (random() * 500000)::int
+FROM generate_series(1, :deals) AS i;
+
+INSERT INTO product_sources (product_id, buy_cost, moq, source, stage, created_at)
+SELECT
+    p.id,
+    round((2 + random() * 20)::numeric, 2),
+    1,
+    (ARRAY['csv', 'telegram', 'manual'])[1 + (row_number() OVER ()) % 3],
+    (ARRAY['new', 'reviewed', 'buy_list'])[1 + (row_number() OVER ()) % 3],
+    NOW() - (random() * interval '365 days')
+FROM products p
+WHERE p.user_id = :'uid' AND p.title LIKE 'Benchmark product %';
+
+ANALYZE products;
+ANALYZE product_sources;
+
+-- Cursors for the row before page 1,000 and before the last page
+SELECT created_at::text AS mid_value, id AS mid_id
+FROM product_sources
+WHERE user_id = :'uid' AND is_active = TRUE
+ORDER BY created_at DESC, id DESC
+OFFSET 49949 LIMIT 1 \gset
+
+SELECT created_at::text AS deep_value, id AS deep_id
+FROM product_sources
+WHERE user_id = :'uid' AND is_active = TRUE
+ORDER BY created_at DESC, id DESC
+OFFSET (:deals - :page_size - 1) LIMIT 1 \gset
+
+\echo
+\echo '== First page =='
+SELECT count(*) FROM filter_product_deals(:'uid', p_limit => :page_size, p_offset => 0);
+SELECT count(*) FROM list_product_deals(:'uid', p_limit => :page_size);
+
+\echo
+\echo '== Page 1,000 (offset 49,950) vs. the same page by cursor =='
+SELECT count(*) FROM filter_product_deals(:'uid', p_limit => :page_size, p_offset => 49950);
+SELECT count(*) FROM list_product_deals(:'uid', p_after_value => :'mid_value', p_after_id => :'mid_id', p_limit => :page_size);
+
+\echo
+\echo '== Last page (offset deals - page_size) vs. cursor =='
+SELECT count(*) FROM filter_product_deals(:'uid', p_limit => :page_size, p_offset => :deals - :page_size);
+SELECT count(*) FROM list_product_deals(:'uid', p_after_value => :'deep_value', p_after_id => :'deep_id', p_limit => :page_size);
+
+\echo
+\echo '== ROI sort, deepest page by cursor (no index - top-N sort) =='
+SELECT sort_value AS roi_value, deal_id AS roi_id
+FROM list_product_deals(:'uid', p_sort => 'roi', p_limit => :deals - :page_size)
+ORDER BY roi DESC NULLS LAST, deal_id DESC
+OFFSET (:deals - :page_size - 1) LIMIT 1 \gset
+SELECT count(*) FROM list_product_deals(:'uid', p_sort => 'roi', p_after_value => :'roi_value', p_after_id => :'roi_id', p_limit => :page_size);
+
+\echo
+\echo '== Filter counts: get_asin_stats + count(exact) vs. deal_filter_counts =='
+SELECT get_asin_stats(:'uid');
+SELECT count(*) FROM product_deals WHERE user_id = :'uid';
+SELECT bucket_type, bucket, count FROM deal_filter_counts WHERE user_id = :'uid' ORDER BY 1, 2;
+
+\echo
+\echo '== Trigger upkeep: 1,000 stage moves and 1,000 ASIN changes =='
+UPDATE product_sources SET stage = 'ordered'
+WHERE id IN (SELECT id FROM product_sources WHERE user_id = :'uid' LIMIT 1000);
+UPDATE products SET asin = 'BNCHX' || id::text
+WHERE id IN (SELECT id FROM products WHERE user_id = :'uid' AND asin LIKE 'PENDING_%' LIMIT 1000);
+
+\echo
+\echo '== Counts still match a full recount =='
+SELECT c.bucket_type, c.bucket, c.count AS maintained, r.count AS recounted
+FROM (SELECT * FROM deal_filter_counts WHERE user_id = :'uid') c
+FULL JOIN (
+    SELECT b.bucket_type, b.bucket, count(*) AS count
+    FROM product_sources ps
+    JOIN products p ON p.id = ps.product_id
+    CROSS JOIN LATERAL deal_count_buckets(ps.stage, ps.source, p.status, p.asin, p.upc) b
+    WHERE ps.is_active = TRUE AND p.user_id = :'uid'
+    GROUP BY 1, 2
+) r USING (bucket_type, bucket)
+WHERE c.count IS DISTINCT FROM r.count;
+
+ROLLBACK;
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark email sending against the local provider stand-in
+(scripts/email_provider_standin.py), which injects latency, 503s and
+optionally 429s.
+
+- inline: one blocking request per email from inside an async handler,
+  like EmailService._send_resend did before; a failed send is lost
+- outbox: EmailOutbox.dispatch over the whole backlog - provider batches,
+  concurrent requests on one pooled client, paced by an in-process token
+  bucket at the provider's rate - re-dispatching the rows marked for retry
+  (the drain does the same after a backoff)
+
+Reports emails per second, HTTP requests, lost emails, duplicate
+deliveries and the longest event loop stall seen by a 10ms ticker.
+Outbox reads and writes in Supabase are left out.
+
+Usage:
+    python scripts/benchmark_email_outbox.py [num_emails] [provider] [latency_ms] [fail_rate]
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+from pathlib import Path
+
+# Settings needs these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from email_provider_standin import serve
+
+NUM_EMAILS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+PROVIDER = sys.argv[2] if len(sys.argv) > 2 else "resend"
+LATENCY_MS = float(sys.argv[3]) if len(sys.argv) > 3 else 80
+FAIL_RATE = float(sys.argv[4]) if len(sys.argv) > 4 else 0.05
+
+server, standin = serve(0, latency_ms=LATENCY_MS, fail_rate=FAIL_RATE, seed=42)
+BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ["EMAIL_API_BASE_URL"] = BASE_URL
+os.environ[f"{PROVIDER.upper()}_API_KEY"] = "benchmark"
+
+import httpx
+from app.services.email_outbox import EmailOutbox, PROVIDERS
+
+TICK_SECONDS = 0.01
+MAX_ROUNDS = 10
+
+
+class LocalBucket:
+    """In-process stand-in for the Redis token bucket, same rate and burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+
+    async def acquire_async(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self):
+        self.tokens = 0
+
+
+def make_rows(n: int):
+    return [
+        {
+            "id": f"row-{i}",
+            "idempotency_key": f"benchmark:{i}",
+            "provider": PROVIDER,
+            "from_email": "noreply@habexa.com",
+            "from_name": "Habexa",
+            "to_email": f"user{i}@example.com",
+            "subject": "Your trial ends in 3 days",
+            "html_body": "<p>Hi there,</p><p>Your trial is ending soon.</p>",
+            "text_body": None,
+        }
+        for i in range(n)
+    ]
+
+
+async def watch_loop(stop: asyncio.Event, stalls: list):
+    while not stop.is_set():
+        before = time.monotonic()
+        await asyncio.sleep(TICK_SECONDS)
+        stalls.append(time.monotonic() - before - TICK_SECONDS)
+
+
+async def watched(coro):
+    stop, stalls = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop(stop, stalls))
+    await asyncio.sleep(0)
+    result = await coro
+    stop.set()
+    await watcher
+    return result, max(stalls, default=0.0)
+
+
+async def send_inline(rows):
+    """The old path: a synchronous request per email, errors only logged."""
+    delivered = 0
+    for row in rows:
+        response = httpx.post(
+            f"{BASE_URL}/emails",
+            headers={"Authorization": "Bearer benchmark"},
+            json={"from": row["from_email"], "to": [row["to_email"]],
+                  "subject": row["subject"], "html": row["html_body"]},
+        )
+        delivered += response.status_code == 200
+        await asyncio.sleep(0)
+    return {"delivered": delivered, "rounds": 1}
+
+
+async def send_outbox(rows):
+    settings = PROVIDERS[PROVIDER]
+    outbox = EmailOutbox(limiters={PROVIDER: LocalBucket(settings["rate"], settings["burst"])})
+    pending, delivered, rounds = rows, 0, 0
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=10)) as client:
+        while pending and rounds < MAX_ROUNDS:
+            rounds += 1
+            results = await outbox.dispatch(pending, client)
+            delivered += sum(r["status"] == "sent" for r in results)
+            retry = {r["id"] for r in results if r["status"] == "retry"}
+            pending = [row for row in pending if row["id"] in retry]
+    return {"delivered": delivered, "rounds": rounds}
+
+
+def measure(name, fn, rows):
+    before = dict(standin.stats)
+    start = time.monotonic()
+    result, max_stall = asyncio.run(watched(fn(rows)))
+    elapsed = time.monotonic() - start
+    after = dict(standin.stats)
+    return {
+        "path": name,
+        "emails": len(rows),
+        "seconds": round(elapsed, 2),
+        "emails_per_second": round(len(rows) / elapsed, 1),
+        "requests": after["requests"] - before["requests"],
+        "delivered": result["delivered"],
+        "lost": len(rows) - result["delivered"],
+        "duplicates": after["duplicates"] - before["duplicates"],
+        "rounds": result["rounds"],
+        "max_loop_stall_ms": round(max_stall * 1000, 1),
+    }
+
+
+def main():
+    rows = make_rows(NUM_EMAILS)
+    print(f"🚀 Sending {NUM_EMAILS} emails via {PROVIDER} stand-in "
+          f"({LATENCY_MS:.0f}ms latency, {FAIL_RATE:.0%} 503s)...")
+    results = [
+        measure("inline", send_inline, rows),
+        measure("outbox", send_outbox, rows),
+    ]
+    print(json.dumps(results, indent=2))
+
+    before, after = results
+    print(f"📊 {NUM_EMAILS} emails: {before['emails_per_second']} -> {after['emails_per_second']} emails/s, "
+          f"{before['requests']} -> {after['requests']} requests, lost {before['lost']} -> {after['lost']}, "
+          f"event loop stall {before['max_loop_stall_ms']}ms -> {after['max_loop_stall_ms']}ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
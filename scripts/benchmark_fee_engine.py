@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Fee-stage benchmark for a large analysis: every item through SP-API
+getMyFeesEstimate (old) vs. the local FBA fee engine with SP-API only for
+low-confidence items and the calibration sample (new).
+
+SP-API time is modelled from the documented quota (batch of 20 items per
+request, 0.5 req/s - same as rate_limiters["fees_estimate"]); local time is
+measured. Catalog data is synthetic but shaped like Keepa output: ~12% of
+items have no package dimensions and ~10% have no recognised category.
+
+Usage:
+    python scripts/benchmark_fee_engine.py [num_asins]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+from pathlib import Path
+
+# Settings needs these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.services.fba_fee_engine import fba_fee_engine
+
+SP_API_FEES_BATCH_SIZE = 20
+SP_API_FEES_RATE = 0.5  # requests per second
+
+CATEGORIES = [
+    "Health & Household", "Beauty & Personal Care", "Grocery & Gourmet Food",
+    "Toys & Games", "Home & Kitchen", "Pet Supplies", "Office Products",
+    "Sports & Outdoors", "Tools & Home Improvement", "Baby Products",
+]
+
+
+def synthetic_items(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        has_dims = rng.random() > 0.12
+        known_category = rng.random() > 0.10
+        length = rng.uniform(2, 20)
+        items.append({
+            "asin": f"B{i:09d}",
+            "price": round(rng.lognormvariate(3.0, 0.6), 2),
+            "category": rng.choice(CATEGORIES) if known_category else "Everything Else",
+            "weight_lb": round(rng.lognormvariate(-0.4, 0.9), 3) if has_dims else None,
+            "length_in": round(length, 2) if has_dims else None,
+            "width_in": round(rng.uniform(1, min(length, 14)), 2) if has_dims else None,
+            "height_in": round(rng.uniform(0.3, 8), 2) if has_dims else None,
+        })
+    return items
+
+
+def sp_api_seconds(item_count: int) -> float:
+    return math.ceil(item_count / SP_API_FEES_BATCH_SIZE) / SP_API_FEES_RATE
+
+
+def main():
+    num_asins = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    items = synthetic_items(num_asins)
+
+    start = time.perf_counter()
+    sp_api_items = 0
+    sampled = 0
+    for item in items:
+        estimate = fba_fee_engine.estimate(
+            item["price"],
+            category=item["category"],
+            weight_lb=item["weight_lb"],
+            length_in=item["length_in"],
+            width_in=item["width_in"],
+            height_in=item["height_in"],
+        )
+        if fba_fee_engine.needs_sp_api(item["asin"], estimate):
+            sp_api_items += 1
+            if estimate["confidence"] >= 0.7:
+                sampled += 1
+    local_seconds = time.perf_counter() - start
+
+    before = {
+        "sp_api_items": num_asins,
+        "sp_api_requests": math.ceil(num_asins / SP_API_FEES_BATCH_SIZE),
+        "fee_stage_seconds": round(sp_api_seconds(num_asins), 1),
+    }
+    after = {
+        "local_items": num_asins - sp_api_items,
+        "sp_api_items": sp_api_items,
+        "of_which_calibration_sample": sampled,
+        "sp_api_requests": math.ceil(sp_api_items / SP_API_FEES_BATCH_SIZE),
+        "local_compute_seconds": round(local_seconds, 3),
+        "fee_stage_seconds": round(sp_api_seconds(sp_api_items) + local_seconds, 1),
+    }
+
+    print(f"🧪 Fee stage for {num_asins} ASINs (schedule {fba_fee_engine.version})")
+    print(json.dumps({"sp_api_only": before, "local_engine": after}, indent=2))
+    print(f"📊 SP-API fee requests {before['sp_api_requests']} -> {after['sp_api_requests']}, "
+          f"fee stage {before['fee_stage_seconds']}s -> {after['fee_stage_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark TOP PRODUCTS Keepa analysis: per-ASIN path vs. batch mode.
+
+Runs both against an in-process mock of Keepa's /product endpoint that
+charges tokens like Keepa does (1 per product, +6 per 10 offers) and adds
+request latency. Reports Keepa tokens, requests and wall-clock seconds per
+100 products.
+
+- per-ASIN: what batch_analyze_top_products did before - for every deal,
+  run_async(analyze_product(asin)), i.e. a new event loop and a basic plus
+  an offers request per ASIN
+- batch: KeepaAnalysisService.analyze_batch (100 ASINs per request) plus
+  the one-pass worst-case calculation
+
+Database writes are left out of both.
+
+Usage:
+    python scripts/benchmark_keepa_analysis.py [num_asins]
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# Settings needs these to import; nothing talks to Supabase or Keepa here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("KEEPA_API_KEY", "benchmark")
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.services.keepa_analysis_service import keepa_analysis_service
+
+REQUEST_LATENCY_SECONDS = 0.25
+PER_PRODUCT_LATENCY_SECONDS = 0.005
+TOKENS_PER_PRODUCT = 1
+TOKENS_PER_10_OFFERS = 6
+
+
+class MockKeepa:
+    """Counts requests and tokens; answers /product like Keepa."""
+
+    def __init__(self):
+        self.requests = 0
+        self.tokens = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        asins = params["asin"].split(",")
+        offers = int(params.get("offers") or 0)
+        cost = len(asins) * (TOKENS_PER_PRODUCT + TOKENS_PER_10_OFFERS * ((offers + 9) // 10))
+        self.requests += 1
+        self.tokens += cost
+
+        await asyncio.sleep(REQUEST_LATENCY_SECONDS + PER_PRODUCT_LATENCY_SECONDS * len(asins))
+        products = [self.product(asin, with_offers=bool(offers)) for asin in asins]
+        return httpx.Response(200, json={
+            "products": products,
+            "tokensLeft": 1_000_000,
+            "refillIn": 60_000,
+            "refillRate": 1_000,
+            "tokensConsumed": cost,
+        })
+
+    @staticmethod
+    def product(asin: str, with_offers: bool) -> dict:
+        # Offer seen 30 days ago, in Keepa minutes (since 2011-01-01)
+        recent = int((time.time() - 1293840000) // 60) - 60 * 24 * 30
+        product = {"asin": asin, "stats": {"current": [0, 0, 0, 12000], "avg90": [0, 0, 0, 15000]}}
+        if with_offers:
+            product["offers"] = [
+                {"sellerId": f"S{i}", "isFBA": i % 2 == 0, "offerCSV": [recent, 1899 + i * 50, 0]}
+                for i in range(20)
+            ]
+        return product
+
+
+def per_asin_path(asins):
+    analyses = []
+    for asin in asins:
+        async def analyze(asin=asin):
+            basic, offers = await asyncio.gather(
+                keepa_analysis_service._get_basic_product_data(asin),
+                keepa_analysis_service._get_offers_data(asin),
+            )
+            return keepa_analysis_service._parse_analysis(asin, basic, offers)
+        # run_async: a fresh event loop per ASIN
+        analysis = asyncio.run(analyze())
+        if analysis.get("lowest_fba_price_12m"):
+            keepa_analysis_service.calculate_worst_case_profit(analysis["lowest_fba_price_12m"], 8.0, 5.25)
+        analyses.append(analysis)
+    return analyses
+
+
+def batch_path(asins):
+    batch = asyncio.run(keepa_analysis_service.analyze_batch(asins))
+    analyses = list(batch["analyses"].values())
+    keepa_analysis_service.calculate_worst_case_batch(
+        [a.get("lowest_fba_price_12m") for a in analyses], [8.0] * len(analyses), [5.25] * len(analyses)
+    )
+    return analyses
+
+
+def measure(name, fn, asins, mock):
+    mock.requests = mock.tokens = 0
+    start = time.monotonic()
+    analyses = fn(asins)
+    elapsed = time.monotonic() - start
+    per_100 = 100 / len(asins)
+    return {
+        "path": name,
+        "analyzed": len(analyses),
+        "keepa_requests": mock.requests,
+        "keepa_tokens": mock.tokens,
+        "requests_per_100": round(mock.requests * per_100, 1),
+        "tokens_per_100": round(mock.tokens * per_100),
+        "seconds": round(elapsed, 2),
+        "seconds_per_100": round(elapsed * per_100, 2),
+    }
+
+
+def main():
+    num_asins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    asins = [f"B{i:09d}" for i in range(num_asins)]
+
+    mock = MockKeepa()
+    transport = httpx.MockTransport(mock.handle)
+    real_client = httpx.AsyncClient
+    httpx.AsyncClient = lambda *args, **kwargs: real_client(*args, transport=transport, **kwargs)
+
+    print(f"🚀 Analyzing {num_asins} ASINs against mock Keepa "
+          f"({REQUEST_LATENCY_SECONDS * 1000:.0f}ms per request)...")
+    results = [
+        measure("per-asin", per_asin_path, asins, mock),
+        measure("batch", batch_path, asins, mock),
+    ]
+    print(json.dumps(results, indent=2))
+
+    before, after = results
+    print(f"📊 Per 100 products: {before['seconds_per_100']}s -> {after['seconds_per_100']}s, "
+          f"{before['tokens_per_100']} -> {after['tokens_per_100']} tokens, "
+          f"{before['requests_per_100']} -> {after['requests_per_100']} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark PO PDF rendering for 50-line orders.
+
+- per-call: styles rebuilt for every PDF and the render run inline in an
+  async handler, like POEmailService.generate_po_pdf did before
+- cached: PORenderer with process-wide cached styles, rendered in a worker
+  thread (the API path) and back-to-back in one job (render_purchase_orders)
+
+Reports PDFs per second and the longest event loop stall seen by a 10ms
+ticker while the API-style paths run. Order loading and database writes
+are left out.
+
+Usage:
+    python scripts/benchmark_po_pdf.py [num_pdfs] [lines_per_order]
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+from pathlib import Path
+
+# Settings needs these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.services.po_pdf_renderer import po_renderer, _templates
+
+TICK_SECONDS = 0.01
+
+
+def make_order(lines: int) -> dict:
+    return {
+        "id": "benchmark-order",
+        "supplier": {"name": "Benchmark Supplier", "contact_email": "po@example.com", "address": "1 Main St"},
+        "items": [
+            {
+                "quantity": 12 + i,
+                "unit_cost": 3.25 + i * 0.1,
+                "product": {"asin": f"B{i:09d}", "title": f"Benchmark product {i} with a fairly long listing title"},
+            }
+            for i in range(lines)
+        ],
+    }
+
+
+def render_per_call(order, po_number):
+    _templates.cache_clear()
+    return po_renderer.render(order, po_number)
+
+
+async def watch_loop(stop: asyncio.Event, stalls: list):
+    while not stop.is_set():
+        before = time.monotonic()
+        await asyncio.sleep(TICK_SECONDS)
+        stalls.append(time.monotonic() - before - TICK_SECONDS)
+
+
+async def api_path(render, order, num_pdfs, off_loop: bool):
+    """num_pdfs sequential requests while a ticker measures event loop stalls."""
+    stop, stalls = asyncio.Event(), []
+    watcher = asyncio.create_task(watch_loop(stop, stalls))
+    await asyncio.sleep(0)
+    for i in range(num_pdfs):
+        if off_loop:
+            await asyncio.to_thread(render, order, f"PO-BENCH-{i:05d}")
+        else:
+            render(order, f"PO-BENCH-{i:05d}")
+            await asyncio.sleep(0)
+    stop.set()
+    await watcher
+    return max(stalls, default=0.0)
+
+
+def measure(name, fn, num_pdfs):
+    start = time.monotonic()
+    max_stall = fn()
+    elapsed = time.monotonic() - start
+    return {
+        "path": name,
+        "pdfs": num_pdfs,
+        "seconds": round(elapsed, 2),
+        "pdfs_per_second": round(num_pdfs / elapsed, 1),
+        "max_loop_stall_ms": round(max_stall * 1000, 1) if max_stall is not None else None,
+    }
+
+
+def main():
+    num_pdfs = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    order = make_order(lines)
+    po_renderer.render(order, "PO-WARMUP")
+
+    def batch_job():
+        for i in range(num_pdfs):
+            po_renderer.render(order, f"PO-BENCH-{i:05d}")
+
+    print(f"🚀 Rendering {num_pdfs} POs with {lines} lines each...")
+    results = [
+        measure("per-call, on loop", lambda: asyncio.run(api_path(render_per_call, order, num_pdfs, off_loop=False)), num_pdfs),
+        measure("cached, off loop", lambda: asyncio.run(api_path(po_renderer.render, order, num_pdfs, off_loop=True)), num_pdfs),
+        measure("cached, batch job", batch_job, num_pdfs),
+    ]
+    print(json.dumps(results, indent=2))
+
+    before, api, batch = results
+    print(f"📊 {lines}-line POs: {before['pdfs_per_second']} -> {batch['pdfs_per_second']} PDFs/s (batch job), "
+          f"event loop stall {before['max_loop_stall_ms']}ms -> {api['max_loop_stall_ms']}ms")
+
+
+if __name__ == "__main__":
+    main()
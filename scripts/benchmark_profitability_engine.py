@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Profitability benchmark: per-row Decimal calculation (how
+ProfitabilityCalculator.calculate_batch worked - one dict and a dozen Decimal
+operations per product) vs. one columnar ProfitabilityEngine pass.
+
+Also counts rows where the two disagree on profit, landed cost or tier.
+Money matches to the cent; the engine assigns tiers from ROI as stored (2
+decimals), so a row at 14.995% ROI is "marginal" there and "unprofitable"
+in the per-row path.
+
+Usage:
+    python scripts/benchmark_profitability_engine.py [num_rows]
+"""
+import os
+import sys
+import json
+import time
+import random
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+
+# Settings needs these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.services.profitability_engine import profitability_engine
+
+CENT = Decimal("0.01")
+
+
+def synthetic_rows(n: int, seed: int = 11):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        sell = round(rng.lognormvariate(3.0, 0.6), 2)
+        rows.append({
+            "sell_price": sell,
+            "fees_total": round(sell * rng.uniform(0.25, 0.4), 2),
+            "buy_cost": round(sell * rng.uniform(0.2, 0.8) * 6, 2),
+            "pack_size": rng.choice([1, 1, 2, 6, 12]),
+            "prep_cost": rng.choice([0.10, 0.25, 0.50]),
+            "weight_lb": round(rng.lognormvariate(-0.4, 0.9), 3) if rng.random() > 0.1 else None,
+            "seller_count": rng.randint(1, 80),
+            "bsr": rng.randint(100, 900_000),
+        })
+    return rows
+
+
+def legacy_row(row, inbound_rate=Decimal("0.35")):
+    """Previous per-row path: Decimal arithmetic on one product dict."""
+    sell = Decimal(str(row["sell_price"]))
+    fees = Decimal(str(row["fees_total"]))
+    unit_cost = Decimal(str(row["buy_cost"])) / Decimal(row["pack_size"])
+    prep = Decimal(str(row["prep_cost"]))
+    weight = Decimal(str(row["weight_lb"] or 0.5))
+    inbound = (weight * inbound_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+    landed = unit_cost.quantize(CENT, rounding=ROUND_HALF_UP) + prep + inbound
+    profit = sell - fees - landed
+    roi = profit / landed * 100 if landed > 0 else Decimal(0)
+    margin = profit / sell * 100 if sell > 0 else Decimal(0)
+    tier = "excellent" if roi >= 50 else "good" if roi >= 30 else "marginal" if roi >= 15 else "unprofitable"
+    if margin > 40 and row["seller_count"] < 10 and row["bsr"] < 10000:
+        risk = "low"
+    elif margin < 20 or row["seller_count"] > 50 or row["bsr"] > 100000:
+        risk = "high"
+    else:
+        risk = "medium"
+    return {
+        "net_profit": float(profit.quantize(CENT, rounding=ROUND_HALF_UP)),
+        "landed_cost": float(landed),
+        "roi": float(roi.quantize(CENT, rounding=ROUND_HALF_UP)),
+        "profit_tier": tier,
+        "risk_level": risk,
+    }
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = synthetic_rows(num_rows)
+
+    start = time.perf_counter()
+    legacy = [legacy_row(row) for row in rows]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = {key: [row[key] for row in rows] for key in rows[0]}
+    result = profitability_engine.compute(inbound_rate=0.35, **columns)
+    engine_seconds = time.perf_counter() - start
+
+    profit = result["net_profit_cents"] / 100
+    landed = result["landed_cost_cents"] / 100
+    mismatches = sum(
+        1 for i, old in enumerate(legacy)
+        if round(profit[i], 2) != old["net_profit"] or round(landed[i], 2) != old["landed_cost"]
+        or result["profit_tier"][i] != old["profit_tier"]
+    )
+
+    print(f"🧪 Profitability for {num_rows} rows")
+    print(json.dumps({
+        "per_row_decimal_seconds": round(legacy_seconds, 3),
+        "columnar_engine_seconds": round(engine_seconds, 3),
+        "speedup": round(legacy_seconds / engine_seconds, 1),
+        "rows_differing": mismatches,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
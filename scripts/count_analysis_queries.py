@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Count the Supabase requests a batch analysis job makes.
+
+Runs the analyze_chunk task body over a synthetic job (every product analyzed
+successfully, each with two product_sources rows) with the Supabase client
+replaced by a recorder that counts every executed request by table and
+operation. SP-API/Keepa are replaced by a batch_analyzer stub and Redis by
+fakeredis, so only database round trips are counted - no timings.
+
+Run it on two checkouts to compare before/after a change.
+
+Usage:
+    python scripts/count_analysis_queries.py [num_products] [chunks]
+"""
+import os
+import sys
+import types
+import asyncio
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+# Settings and create_client need these to import; nothing talks to Supabase here
+os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "benchmark.benchmark.benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark.benchmark.benchmark")
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+import fakeredis
+
+NUM_PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+CHUNKS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+USER_ID = "00000000-0000-0000-0000-000000000001"
+JOB_ID = "count-analysis-queries"
+
+PRODUCTS = [{"id": f"product-{i}", "asin": f"B{i:09d}"} for i in range(NUM_PRODUCTS)]
+
+
+class Recorder:
+    """Chainable stand-in for the Supabase client; execute() records the request."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params=None):
+        return _Query(self, f"rpc:{name}", "call")
+
+
+class _Query:
+    def __init__(self, recorder, name, operation="select"):
+        self.recorder, self.name, self.operation = recorder, name, operation
+        self.filters = {}
+
+    @property
+    def not_(self):
+        return self
+
+    def __getattr__(self, method):
+        def chain(*args, **kwargs):
+            if method in ("select", "update", "upsert", "insert", "delete"):
+                self.operation = method
+            elif method in ("eq", "in_") and len(args) == 2:
+                self.filters[args[0]] = args[1]
+            return self
+        return chain
+
+    def execute(self):
+        self.recorder.counts[(self.name, self.operation)] += 1
+        return types.SimpleNamespace(data=self._rows(), count=None)
+
+    def _rows(self):
+        if self.name == "product_sources" and self.operation == "select":
+            ids = self.filters.get("product_id")
+            ids = ids if isinstance(ids, list) else [ids]
+            return [
+                {"id": f"{pid}-{n}", "product_id": pid, "supplier_id": f"supplier-{n}", "buy_cost": 5.0 + n}
+                for pid in ids for n in range(2)
+            ]
+        if self.name == "amazon_connections":
+            return [{"marketplace_id": "ATVPDKIKX0DER"}]
+        if self.name == "analyses" and self.operation == "upsert":
+            return [{"id": "analysis-1"}]
+        return []
+
+
+async def analyze_products(asins, **kwargs):
+    return {
+        asin: {"success": True, "title": f"Product {asin}", "sell_price": 24.99, "fees_total": 7.5,
+               "net_profit": 6.0, "roi": 40.0, "bsr": 1200, "seller_count": 4}
+        for asin in asins
+    }
+
+
+def main():
+    server = fakeredis.FakeServer()
+    recorder = Recorder()
+
+    with patch("redis.from_url", side_effect=lambda *a, **kw: fakeredis.FakeRedis(
+        server=server, decode_responses=kw.get("decode_responses", False)
+    )):
+        from app.tasks import analysis
+        modules = [m for m in list(sys.modules.values()) if getattr(m, "supabase", None) is not None
+                   and getattr(m, "__name__", "").startswith("app.")]
+        patches = [patch.object(m, "supabase", recorder) for m in modules]
+        patches.append(patch.object(analysis.batch_analyzer, "analyze_products", analyze_products))
+        for p in patches:
+            p.start()
+        try:
+            # What batch_analyze_parallel does before handing out work, if this tree prefetches a context
+            if hasattr(analysis, "build_analysis_context"):
+                analysis.build_analysis_context(USER_ID, [p["id"] for p in PRODUCTS]).save(JOB_ID)
+
+            chunk_size = -(-NUM_PRODUCTS // CHUNKS)
+            for index in range(CHUNKS):
+                chunk = PRODUCTS[index * chunk_size:(index + 1) * chunk_size]
+                if chunk:
+                    analysis.analyze_chunk.run(JOB_ID, USER_ID, chunk, index)
+        finally:
+            for p in patches:
+                p.stop()
+
+    total = sum(recorder.counts.values())
+    print(f"\n{NUM_PRODUCTS} products in {CHUNKS} chunks: {total} Supabase requests "
+          f"({total / NUM_PRODUCTS:.2f} per product)\n")
+    for (name, operation), count in sorted(recorder.counts.items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>6}  {operation:<7} {name}")
+
+
+if __name__ == "__main__":
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    main()
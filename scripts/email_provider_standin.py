@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the email providers' HTTP APIs, for exercising the email
+outbox offline (throughput, batching, retries, idempotency).
+
+Implements:
+- Resend:   POST /emails, POST /emails/batch (Idempotency-Key honoured)
+- Postmark: POST /email/batch
+- SendGrid: POST /v3/mail/send
+- GET /stats: requests, delivered messages, injected failures, duplicates
+
+Nothing is delivered; messages are counted. Point the app at it with
+EMAIL_API_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python scripts/email_provider_standin.py [--port 8025] [--latency-ms 80]
+        [--fail-rate 0.05] [--rate-limit 0]
+"""
+import sys
+import json
+import time
+import random
+import uuid
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StandinState:
+    """Counters and options shared by the handler threads."""
+
+    def __init__(self, latency_ms: float = 80, fail_rate: float = 0.0, rate_limit: float = 0, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.rate_limit = rate_limit  # requests per second, 0 = unlimited
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.idempotency_keys = {}
+        self.stats = {"requests": 0, "messages": 0, "failures": 0, "rate_limited": 0, "duplicates": 0}
+
+    def admit(self) -> int:
+        """Status code to answer with before looking at the body: 200, 429 or 503."""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                if now - self.window_start >= 1:
+                    self.window_start, self.window_requests = now, 0
+                self.window_requests += 1
+                if self.window_requests > self.rate_limit:
+                    self.stats["rate_limited"] += 1
+                    return 429
+            if self.fail_rate and self.random.random() < self.fail_rate:
+                self.stats["failures"] += 1
+                return 503
+        return 200
+
+    def deliver(self, count: int, idempotency_key: str = None):
+        """Returns the earlier response for a repeated idempotency key, else None."""
+        with self.lock:
+            if idempotency_key and idempotency_key in self.idempotency_keys:
+                self.stats["duplicates"] += 1
+                return self.idempotency_keys[idempotency_key]
+            self.stats["messages"] += count
+        return None
+
+    def remember(self, idempotency_key: str, response):
+        if idempotency_key:
+            with self.lock:
+                self.idempotency_keys[idempotency_key] = response
+
+
+def make_handler(state: StandinState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body=None, headers=None):
+            data = json.dumps(body if body is not None else {}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with state.lock:
+                    self._reply(200, dict(state.stats))
+            else:
+                self._reply(404, {"message": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"null")
+            time.sleep(state.latency)
+
+            status = state.admit()
+            if status == 429:
+                return self._reply(429, {"message": "rate limited"}, {"Retry-After": "1"})
+            if status == 503:
+                return self._reply(503, {"message": "unavailable"})
+
+            key = self.headers.get("Idempotency-Key")
+            if self.path == "/emails":
+                response = state.deliver(1, key) or {"id": str(uuid.uuid4())}
+                state.remember(key, response)
+                return self._reply(200, response)
+            if self.path == "/emails/batch":
+                response = state.deliver(len(payload), key) or {"data": [{"id": str(uuid.uuid4())} for _ in payload]}
+                state.remember(key, response)
+                return self._reply(200, response)
+            if self.path == "/email/batch":
+                state.deliver(len(payload))
+                return self._reply(200, [
+                    {"ErrorCode": 0, "Message": "OK", "MessageID": str(uuid.uuid4()), "To": m.get("To")}
+                    for m in payload
+                ])
+            if self.path == "/v3/mail/send":
+                state.deliver(1)
+                self.send_response(202)
+                self.send_header("X-Message-Id", uuid.uuid4().hex)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._reply(404, {"message": "not found"})
+
+    return Handler
+
+
+def serve(port: int = 0, **options):
+    """Start the stand-in in a background thread; returns (server, state)."""
+    state = StandinState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    args = parser.parse_args()
+
+    server, state = serve(args.port, latency_ms=args.latency_ms, fail_rate=args.fail_rate,
+                          rate_limit=args.rate_limit)
+    print(f"📮 Email provider stand-in on http://127.0.0.1:{server.server_address[1]} "
+          f"(latency {args.latency_ms}ms, fail rate {args.fail_rate}, rate limit {args.rate_limit or 'none'})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {state.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()